@@ -137,11 +137,33 @@ export const BackupRestoreSection: React.FC<BackupRestoreSectionProps> = ({ user
       const res = await api.post('/admin/backup/restore', formData, {
         headers: { 'Content-Type': 'multipart/form-data' },
       });
-      setRestoreResult(res.data);
-      setRestoreProgress(t('backup.restore_completed'));
+      const { task_id } = res.data;
+
+      // The restore runs in the background: poll until it finishes
+      const interval = setInterval(async () => {
+        try {
+          const statusRes = await api.get(`/admin/backup/restore/status/${task_id}`);
+          const d = statusRes.data;
+          setRestoreProgress(d.message || '');
+
+          if (d.status === 'done') {
+            clearInterval(interval);
+            setRestoreResult(d.summary);
+            setRestoreProgress(t('backup.restore_completed'));
+            setRestoreLoading(false);
+          } else if (d.status === 'error') {
+            clearInterval(interval);
+            setError(d.error || t('backup.error_restoring'));
+            setRestoreLoading(false);
+          }
+        } catch {
+          clearInterval(interval);
+          setError(t('backup.error_restoring'));
+          setRestoreLoading(false);
+        }
+      }, 2000);
     } catch (err: any) {
       setError(err.response?.data?.detail || t('backup.error_restoring'));
-    } finally {
       setRestoreLoading(false);
     }
   };
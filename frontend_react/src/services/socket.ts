@@ -23,6 +23,13 @@ export function getSocket(): Socket {
         socket?.disconnect();
       }
     });
+
+    // The server coalesces bursts into one EVENT_BATCH: replay each event to its usual listeners
+    socket.on('EVENT_BATCH', (batch: { events?: [string, unknown][] }) => {
+      for (const [event, payload] of batch?.events || []) {
+        socket?.listeners(event).forEach((listener) => listener(payload));
+      }
+    });
   }
   return socket;
 }
@@ -34,6 +34,9 @@ from gcal_service import gcal_service
 from analytics_service import analytics_service
 from services.liquidation_service import liquidation_service
 from services.financial_dashboard_service import financial_dashboard_service
+from services.tenant_prompt_cache import invalidate_tenant_prompt_context
+from services.holiday_service import invalidate_holiday_calendar
+from services.phone_lookup import find_conversation, find_patient_id, phone_key
 from email_service import (
     email_service,
     send_welcome_email,
@@ -45,6 +48,7 @@ logger = logging.getLogger(__name__)
 # Configuración
 from core.credentials import (
     get_tenant_credential,
+    invalidate_tenant_credential,
     save_tenant_credential,
     CREDENTIALS_FERNET_KEY,
     encrypt_value,
@@ -547,16 +551,8 @@ async def get_patient_clinical_context(
     # sin tener su propio registro como paciente, o linked_patient_id apunta al menor).
     conv_family = None
     if phone:
-        _cf_variants = generate_phone_variants(phone)
-        _cf_placeholders = ", ".join(f"${i+2}" for i in range(len(_cf_variants)))
-        conv_family = await db.pool.fetchrow(
-            f"""
-            SELECT family_patient_ids FROM chat_conversations
-            WHERE tenant_id = $1 AND external_user_id IN ({_cf_placeholders})
-            LIMIT 1
-        """,
-            tenant_id,
-            *_cf_variants,
+        conv_family = await find_conversation(
+            db.pool, tenant_id, phone, channel=None, columns="family_patient_ids"
         )
 
     # Cargar familiares vinculados desde family_patient_ids
@@ -676,19 +672,16 @@ async def get_patient_clinical_context(
     if patient and not conv:
         # Legacy link: guardian_phone set via link-guardian, no conversation record yet
         guardian_phone_val = patient.get("guardian_phone")
-        if guardian_phone_val:
-            guardian_phone_variants = generate_phone_variants(guardian_phone_val)
-            g_placeholders = ", ".join(f"${i+2}" for i in range(len(guardian_phone_variants)))
+        guardian_id = await find_patient_id(db.pool, tenant_id, guardian_phone_val) if guardian_phone_val else None
+        if guardian_id:
             guardian_row = await db.pool.fetchrow(
-                f"""
+                """
                 SELECT id, first_name, last_name, phone_number, status
                 FROM patients
-                WHERE tenant_id = $1 AND phone_number IN ({g_placeholders})
-                AND status != 'deleted'
-                LIMIT 1
+                WHERE id = $1 AND tenant_id = $2
             """,
+                guardian_id,
                 tenant_id,
-                *guardian_phone_variants,
             )
             if guardian_row:
                 if family_members_data is None:
@@ -728,23 +721,19 @@ async def get_patient_clinical_context(
     if not patient:
         # Si el "phone" no empieza con + o no son solo números, lo tratamos como plataforma_id
         is_pure_platform_id = not (phone.startswith("+") or phone.isdigit())
-        if not is_pure_platform_id:
-            # Generar múltiples variantes de formato para matchear (argentino)
-            phone_variants = generate_phone_variants(phone)
-            # Loggear para debug
-            logger.info(f"🔍 Buscando paciente por teléfono: variants={phone_variants}")
-            placeholders = ", ".join(f"${i+2}" for i in range(len(phone_variants)))
+        phone_patient_id = None if is_pure_platform_id else await find_patient_id(db.pool, tenant_id, phone)
+        if phone_patient_id:
+            # Cualquier formato del número matchea por phone_key (services/phone_lookup.py)
             patient = await db.pool.fetchrow(
-                f"""
+                """
                 SELECT id, first_name, last_name, phone_number, status, urgency_level, urgency_reason, preferred_schedule,
                        acquisition_source, meta_ad_id, meta_ad_headline, meta_ad_body, external_ids, medical_history,
                        family_patient_ids
                 FROM patients 
-                WHERE tenant_id = $1 AND phone_number IN ({placeholders})
-                AND status != 'deleted'
+                WHERE id = $1 AND tenant_id = $2
             """,
+                phone_patient_id,
                 tenant_id,
-                *phone_variants,
             )
 
     # 1c. Fallback: buscar por external_ids (IG/FB), instagram_psid, facebook_psid
@@ -913,9 +902,14 @@ async def delete_user(user_id: str, user_data=Depends(verify_ceo_token)):
             "SELECT COUNT(*) FROM professionals WHERE user_id = $1", uid
         )
         deleted_info["professionals_deleted"] = prof_count
+        prof_tenants = await db.pool.fetch(
+            "SELECT DISTINCT tenant_id FROM professionals WHERE user_id = $1", uid
+        )
 
         # Eliminar profesionales
         await db.pool.execute("DELETE FROM professionals WHERE user_id = $1", uid)
+        for _row in prof_tenants:
+            await invalidate_tenant_prompt_context(_row["tenant_id"])
 
     # 2. Eliminar el usuario
     await db.execute("DELETE FROM users WHERE id = $1", user_id)
@@ -1076,6 +1070,12 @@ async def update_user_status(
                     else:
                         raise
 
+        # El nombre del profesional principal del prompt depende de is_active
+        for _row in await db.pool.fetch(
+            "SELECT DISTINCT tenant_id FROM professionals WHERE user_id = $1", uid
+        ):
+            await invalidate_tenant_prompt_context(_row["tenant_id"])
+
     # Enviar email de bienvenida al aprobar (activar) un profesional o secretaria
     if payload.status == "active" and target_user["role"] in (
         "professional",
@@ -1417,6 +1417,7 @@ async def get_integration_config(
                 target_tenant_id,
                 webhook_token,
             )
+            await invalidate_tenant_credential(target_tenant_id, "WEBHOOK_ACCESS_TOKEN")
 
         config["access_token"] = webhook_token
 
@@ -1485,6 +1486,7 @@ async def get_integration_config(
                 target_tenant_id,
                 webhook_token,
             )
+            await invalidate_tenant_credential(target_tenant_id, "WEBHOOK_ACCESS_TOKEN")
 
         config["access_token"] = webhook_token
 
@@ -1623,6 +1625,7 @@ async def save_integration_config(
                 desc,
                 target_tenant_id,
             )
+        await invalidate_tenant_credential(target_tenant_id, key)
 
     return {"message": f"Integración {provider} actualizada correctamente."}
     """Lista simple de tenants para selectores (id, name)."""
@@ -2068,20 +2071,19 @@ async def mark_chat_session_read(
             cleaned,
         )
 
-        # If exact match updated 0 rows, try digits-only match
+        # If exact match updated 0 rows, match by phone_key
         # Handles cases like "299 589-1350" matching "+5492995891350"
         if result and "UPDATE 0" in str(result):
-            digits_only = re.sub(r"[^\d]", "", cleaned)
-            if digits_only:
+            cleaned_key = phone_key(cleaned)
+            if cleaned_key:
                 await db.execute(
                     """
                     UPDATE chat_conversations
                     SET last_read_at = NOW(), updated_at = NOW()
-                    WHERE tenant_id = $1 AND channel = 'whatsapp'
-                      AND REGEXP_REPLACE(external_user_id, '[^0-9]', '', 'g') LIKE '%' || $2
+                    WHERE tenant_id = $1 AND channel = 'whatsapp' AND phone_key = $2
                 """,
                     tenant_id,
-                    digits_only,
+                    cleaned_key,
                 )
     except Exception as e:
         logger.warning(f"mark_chat_session_read error for phone={cleaned}: {e}")
@@ -3032,6 +3034,8 @@ async def create_or_update_credential(
                 target_tenant_id,
             )
             action = "created"
+        # Un update por id puede mover la fila de tenant/nombre: invalidar todo.
+        await invalidate_tenant_credential()
 
         logger.info(
             f"Credential {action}: name={payload.name} scope={payload.scope} tenant={target_tenant_id} by {user_data.email}"
@@ -3075,6 +3079,7 @@ async def delete_credential(
             id,
             allowed_ids,
         )
+        await invalidate_tenant_credential()
         return {"status": "deleted"}
     except Exception as e:
         logger.error(f"Error deleting credential: {e}")
@@ -3179,6 +3184,7 @@ async def update_credential(
             target_tenant_id,
             cred_id,
         )
+        await invalidate_tenant_credential()
 
         logger.info(
             f"Credential updated: id={cred_id} name={payload.name} scope={payload.scope} by {user_data.email}"
@@ -4164,6 +4170,7 @@ async def update_tenant(
     updates.append("updated_at = NOW()")
     query = f"UPDATE tenants SET {', '.join(updates)} WHERE id = ${len(params)}"
     await db.pool.execute(query, *params)
+    await invalidate_tenant_prompt_context(tenant_id)
     # If country_code was in the payload, drop the cached tz so the new value
     # is picked up immediately on the next AI tool call.
     if "country_code" in data and data["country_code"] is not None:
@@ -4173,6 +4180,7 @@ async def update_tenant(
             invalidate_tenant_tz_cache(tenant_id)
         except Exception:
             pass
+        await invalidate_holiday_calendar(tenant_id)
     logger.info(
         f"Tenant {tenant_id} updated: calendar_provider={data.get('calendar_provider')} (persisted)"
     )
@@ -4332,6 +4340,7 @@ async def create_holiday(
             professional_id,
             scope,
         )
+        await invalidate_holiday_calendar(tenant_id)
         return {"id": new_id, "status": "created"}
     except Exception as e:
         if "uq_tenant_holidays_tenant_date_type" in str(e) or "uq_tenant_holidays_tenant_date_type_prof" in str(e):
@@ -4382,7 +4391,7 @@ async def toggle_holiday(
                 existing["id"],
                 tenant_id,
             )
-            return {"status": "toggled_closed", "holiday_id": None}
+            result = {"status": "toggled_closed", "holiday_id": None}
         else:
             professional_id = data.get("professional_id")
             scope = data.get("scope", "global")
@@ -4409,7 +4418,11 @@ async def toggle_holiday(
                 professional_id,
                 scope,
             )
-            return {"status": "toggled_open", "holiday_id": new_id}
+            result = {"status": "toggled_open", "holiday_id": new_id}
+
+    # Después del commit: si no, otra réplica podría recargar la fila vieja.
+    await invalidate_holiday_calendar(tenant_id)
+    return result
 
 
 @router.put(
@@ -4522,6 +4535,7 @@ async def update_holiday(
     params.append(tenant_id)
     query = f"UPDATE tenant_holidays SET {', '.join(updates)} WHERE id = ${len(params) - 1} AND tenant_id = ${len(params)}"
     await db.pool.execute(query, *params)
+    await invalidate_holiday_calendar(tenant_id)
     return {"status": "updated"}
 
 
@@ -4541,6 +4555,7 @@ async def delete_holiday(
     )
     if result == "DELETE 0":
         raise HTTPException(status_code=404, detail="Feriado no encontrado")
+    await invalidate_holiday_calendar(tenant_id)
     return {"status": "deleted"}
 
 
@@ -4685,6 +4700,7 @@ async def create_tenant_faq(
         embedding_error = str(e)
         logger.error(f"📚 FAQ {new_id} embedding failed: {e}", exc_info=True)
 
+    await invalidate_tenant_prompt_context(tenant_id)
     return {
         "id": new_id,
         "status": "created",
@@ -4761,6 +4777,7 @@ async def update_faq(
         embedding_error = str(e)
         logger.error(f"📚 FAQ {faq_id} re-embedding failed: {e}", exc_info=True)
 
+    await invalidate_tenant_prompt_context(row["tenant_id"])
     return {
         "status": "updated",
         "embedding_status": embedding_status,
@@ -4788,7 +4805,7 @@ async def delete_faq(
     try:
         from services.embedding_service import delete_faq_embedding
 
-        await delete_faq_embedding(faq_id)
+        await delete_faq_embedding(faq_id, row["tenant_id"])
         logger.info(f"📚 FAQ {faq_id} embedding deleted")
     except Exception as e:
         logger.warning(
@@ -4799,6 +4816,7 @@ async def delete_faq(
         faq_id,
         allowed_ids,
     )
+    await invalidate_tenant_prompt_context(row["tenant_id"])
     return {"status": "deleted"}
 
 
@@ -5167,6 +5185,7 @@ async def update_clinic_settings(
                 status_code=500, detail="Error al guardar la configuración de notificaciones de Telegram."
             )
 
+    await invalidate_tenant_prompt_context(resolved_tenant_id)
     return {"status": "ok", "ui_language": getattr(payload, "ui_language", None)}
 
 
@@ -5189,77 +5208,55 @@ async def search_patients_by_symptoms(
     Búsqueda semántica de pacientes por síntomas. Aislado por tenant_id (Regla de Oro).
     - CEO: retorna pacientes de todas sus sedes (allowed_ids).
     - Staff/Profesional: retorna pacientes solo de su sede activa.
+    Full-text sobre los mensajes del paciente (services/search_service.py).
     """
+    from services.search_service import search_patients_by_messages
+
     try:
-        is_ceo = user_data.role == "ceo"
+        tenant_ids = allowed_ids if user_data.role == "ceo" else [tenant_id]
+        items, _ = await search_patients_by_messages(db.pool, tenant_ids, query, limit=limit)
+        return items
 
-        if is_ceo:
-            # CEO: buscar en chat_messages sin filtro de sede (los patient_ids luego se filtran)
-            chat_matches = await db.pool.fetch(
-                """
-                SELECT DISTINCT patient_id
-                FROM chat_messages
-                WHERE content ILIKE $1
-                LIMIT $2
-            """,
-                f"%{query}%",
-                limit,
-            )
-        else:
-            # Staff: filtrar chat_messages por tenant_id de la sede activa
-            chat_matches = await db.pool.fetch(
-                """
-                SELECT DISTINCT cm.patient_id
-                FROM chat_messages cm
-                JOIN patients p ON cm.patient_id = p.id
-                WHERE cm.content ILIKE $1
-                  AND p.tenant_id = $2
-                LIMIT $3
-            """,
-                f"%{query}%",
-                tenant_id,
-                limit,
-            )
+    except Exception as e:
+        logger.error(f"Error en búsqueda semántica: {e}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor")
 
-        patient_ids = [
-            row["patient_id"] for row in chat_matches if row["patient_id"] is not None
-        ]
 
-        if not patient_ids:
-            return []
+@router.get(
+    "/patients/search",
+    tags=["Pacientes"],
+    summary="Búsqueda de pacientes (nombre, teléfono, DNI o síntomas) con paginación",
+)
+async def search_patients_endpoint(
+    q: str,
+    scope: str = "patients",
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    user_data=Depends(verify_admin_token),
+    allowed_ids: List[int] = Depends(get_allowed_tenant_ids),
+    tenant_id: int = Depends(get_resolved_tenant_id),
+):
+    """
+    Búsqueda rankeada con paginación por cursor (keyset).
+    - scope=patients: nombre, apellido, teléfono o DNI de la sede activa.
+    - scope=messages: síntomas en los mensajes del paciente (CEO: todas sus sedes).
+    Devuelve {items, next_cursor}; pasar next_cursor para la página siguiente.
+    """
+    from services.search_service import search_patients, search_patients_by_messages
 
-        if is_ceo:
-            # CEO: filtrar por sus sedes permitidas
-            patients = await db.pool.fetch(
-                """
-                SELECT id, first_name, last_name, phone_number, email, insurance_provider, dni, created_at
-                FROM patients
-                WHERE id = ANY($1::int[])
-                  AND tenant_id = ANY($2::int[])
-                  AND status = 'active'
-            """,
-                patient_ids,
-                allowed_ids,
+    if scope not in ("patients", "messages"):
+        raise HTTPException(status_code=400, detail="scope debe ser 'patients' o 'messages'")
+    try:
+        if scope == "messages":
+            tenant_ids = allowed_ids if user_data.role == "ceo" else [tenant_id]
+            items, next_cursor = await search_patients_by_messages(
+                db.pool, tenant_ids, q, limit=limit, cursor=cursor
             )
         else:
-            # Staff: filtrar por su sede activa
-            patients = await db.pool.fetch(
-                """
-                SELECT id, first_name, last_name, phone_number, email, insurance_provider, dni, created_at
-                FROM patients
-                WHERE id = ANY($1::int[])
-                  AND tenant_id = $2
-                  AND status = 'active'
-            """,
-                patient_ids,
-                tenant_id,
-            )
-
-        return [dict(row) for row in patients]
-
-    except Exception as e:
-        logger.error(f"Error en búsqueda semántica: {e}")
-        raise HTTPException(status_code=500, detail="Error interno del servidor")
+            items, next_cursor = await search_patients(db.pool, [tenant_id], q, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
 
 
 # ==================== ENDPOINTS SEGURO / OBRAS SOCIALES ====================
@@ -5435,18 +5432,14 @@ async def create_patient(
 
         # Vincular conversaciones de chat existentes por teléfono (múltiples formatos)
         try:
-            phone_variants = generate_phone_variants(raw_phone)
-            # También incluir el normalized_phone y raw_phone originales
-            all_variants = list(set(phone_variants + [normalized_phone, raw_phone]))
-            placeholders = ", ".join(f"${i+3}" for i in range(len(all_variants)))
-            linked = await db.pool.execute(f"""
+            linked = await db.pool.execute("""
                 UPDATE chat_conversations
                 SET linked_patient_id = $1, linked_at = NOW()
                 WHERE tenant_id = $2
                   AND channel = 'whatsapp'
-                  AND external_user_id IN ({placeholders})
+                  AND phone_key = $3
                   AND linked_patient_id IS NULL
-            """, row["id"], tenant_id, *all_variants)
+            """, row["id"], tenant_id, phone_key(normalized_phone))
             if linked and linked != "UPDATE 0":
                 logger.info(f"✅ Linked conversations for patient {row['id']}")
         except Exception as link_err:
@@ -6006,6 +5999,8 @@ async def list_patients(
     Cuando professional_id se proporciona, filtra solo pacientes con al menos un turno con ese profesional (RBAC).
     Cuando assigned_professional_id se proporciona, filtra por profesional asignado.
     """
+    from services.search_service import patient_match_sql
+
     query = """
         SELECT p.id, p.first_name, p.last_name, p.phone_number, p.email,
                p.insurance_provider as obra_social, p.insurance_id as obra_social_number, p.dni, p.city, p.birth_date, p.created_at, p.status,
@@ -6038,10 +6033,16 @@ async def list_patients(
         params.append(assigned_professional_id)
         query += f" AND p.assigned_professional_id = ${len(params)}"
 
-    if search:
-        params.append(f"%{search}%")
-        query += f" AND (p.first_name ILIKE ${len(params)} OR p.last_name ILIKE ${len(params)} OR p.phone_number ILIKE ${len(params)} OR p.dni ILIKE ${len(params)})"
-        query += f""" ORDER BY
+    # Indexed ranked match on search_name / phone_digits / dni_digits (services/search_service.py)
+    search = (search or "").strip()
+    match = patient_match_sql(search, alias="p", first_param=len(params) + 1) if search else None
+    if search and match is None:
+        return []
+    if match:
+        where_sql, rank_sql, match_params = match
+        params.extend(match_params)
+        query += f" AND {where_sql}"
+        query += f""" ORDER BY {rank_sql} DESC,
             CASE WHEN EXISTS (SELECT 1 FROM appointments a WHERE a.patient_id = p.id AND a.tenant_id = p.tenant_id)
                  THEN 0 ELSE 1 END,
             p.created_at DESC LIMIT ${len(params) + 1}"""
@@ -6493,6 +6494,8 @@ async def create_professional(
                 detail="La clínica elegida no existe. Creá una sede primero en Sedes (Clínicas).",
             )
 
+        await invalidate_tenant_prompt_context(tenant_id)
+
         # Enviar email de bienvenida si el profesional está activo
         if professional.is_active:
             asyncio.create_task(
@@ -6697,6 +6700,7 @@ async def update_professional(
             else:
                 raise
 
+        await invalidate_tenant_prompt_context(prof_row["tenant_id"])
         return {"id": id, "status": "updated"}
     except HTTPException:
         raise
@@ -9865,13 +9869,8 @@ async def get_professional_conversation_insights(
                         timestamp=datetime.now(tz.utc),
                         tenant_id=tenant_id,
                     )
-                    await token_tracker.track_usage(token_usage)
-                # Update tenant totals
-                await db.pool.execute(
-                    "UPDATE tenants SET total_tokens_used = COALESCE(total_tokens_used, 0) + $1, total_tool_calls = COALESCE(total_tool_calls, 0) + 1 WHERE id = $2",
-                    total_tokens,
-                    tenant_id,
-                )
+                    # Fila + totales del tenant se escriben en el próximo flush en lote
+                    await token_tracker.track_usage(token_usage, update_tenant_totals=True)
                 logger.info(
                     f"📊 Insights tokens tracked: {total_tokens} (in={input_tokens}, out={output_tokens}) cost=${cost_usd:.4f} tenant={tenant_id}"
                 )
@@ -9951,6 +9950,7 @@ async def connect_sovereign_calendar(
                 encrypted,
                 tenant_id,
             )
+        await invalidate_tenant_credential(tenant_id, "access_token")
         await db.pool.execute(
             """
             UPDATE tenants
@@ -9960,6 +9960,7 @@ async def connect_sovereign_calendar(
             """,
             tenant_id,
         )
+        await invalidate_tenant_prompt_context(tenant_id)
         logger.info(
             f"Calendar connect-sovereign: tenant_id={tenant_id}, calendar_provider=google"
         )
@@ -10493,6 +10494,7 @@ async def create_insurance_provider(
         )
     except Exception:
         pass
+    await invalidate_tenant_prompt_context(tenant_id)
     return {"status": "created", "id": row["id"]}
 
 
@@ -10559,6 +10561,7 @@ async def update_insurance_provider(
         )
     except Exception:
         pass
+    await invalidate_tenant_prompt_context(tenant_id)
     return {"status": "updated", "id": provider_id}
 
 
@@ -10580,6 +10583,7 @@ async def delete_insurance_provider(
     )
     if result == "DELETE 0":
         raise HTTPException(status_code=404, detail="Obra social no encontrada")
+    await invalidate_tenant_prompt_context(tenant_id)
     try:
         from services.embedding_service import delete_insurance_embedding
         import asyncio
@@ -10615,6 +10619,7 @@ async def toggle_insurance_provider_active(
         provider_id,
         tenant_id,
     )
+    await invalidate_tenant_prompt_context(tenant_id)
     return {"status": "updated", "id": provider_id, "is_active": new_value}
 
 
@@ -10645,6 +10650,7 @@ async def reorder_insurance_providers(
             item.id,
             tenant_id,
         )
+    await invalidate_tenant_prompt_context(tenant_id)
     return {"status": "reordered", "count": len(body.order)}
 
 
@@ -10903,6 +10909,7 @@ async def create_derivation_rule(
         )
     except Exception:
         pass
+    await invalidate_tenant_prompt_context(tenant_id)
     return {"status": "created", "id": row["id"]}
 
 
@@ -10978,6 +10985,7 @@ async def update_derivation_rule(
         )
     except Exception:
         pass
+    await invalidate_tenant_prompt_context(tenant_id)
     return {"status": "updated", "id": rule_id}
 
 
@@ -10999,6 +11007,7 @@ async def delete_derivation_rule(
     )
     if result == "DELETE 0":
         raise HTTPException(status_code=404, detail="Regla de derivación no encontrada")
+    await invalidate_tenant_prompt_context(tenant_id)
     try:
         from services.embedding_service import delete_derivation_embedding
         import asyncio
@@ -11034,6 +11043,7 @@ async def toggle_derivation_rule_active(
         rule_id,
         tenant_id,
     )
+    await invalidate_tenant_prompt_context(tenant_id)
     return {"status": "updated", "id": rule_id, "is_active": new_value}
 
 
@@ -11064,6 +11074,7 @@ async def reorder_derivation_rules(
             item.id,
             tenant_id,
         )
+    await invalidate_tenant_prompt_context(tenant_id)
     return {"status": "reordered", "count": len(body.order)}
 
 
@@ -11157,6 +11168,7 @@ async def create_operational_rule(
         body.is_active,
         user_email,
     )
+    await invalidate_tenant_prompt_context(tenant_id)
     return {"status": "created", "id": row["id"]}
 
 
@@ -11191,6 +11203,7 @@ async def update_operational_rule(
     )
     if result == "UPDATE 0":
         raise HTTPException(404, "Regla no encontrada")
+    await invalidate_tenant_prompt_context(tenant_id)
     return {"status": "updated", "id": rule_id}
 
 
@@ -11211,6 +11224,7 @@ async def delete_operational_rule(
     )
     if result == "DELETE 0":
         raise HTTPException(404, "Regla no encontrada")
+    await invalidate_tenant_prompt_context(tenant_id)
     return {"status": "deleted", "id": rule_id}
 
 
@@ -11231,6 +11245,7 @@ async def toggle_operational_rule(
     )
     if not row:
         raise HTTPException(404, "Regla no encontrada")
+    await invalidate_tenant_prompt_context(tenant_id)
     return {"status": "updated", "id": row["id"], "is_active": row["is_active"]}
 
 
@@ -11772,6 +11787,7 @@ async def create_treatment_type(
                     tt_id,
                     pid,
                 )
+        await invalidate_tenant_prompt_context(tenant_id)
         return {"status": "created", "code": treatment.code}
     except asyncpg.UniqueViolationError:
         raise HTTPException(
@@ -11854,6 +11870,7 @@ async def update_treatment_type(
     )
     if result == "UPDATE 0":
         raise HTTPException(status_code=404, detail="Tipo de tratamiento no encontrado")
+    await invalidate_tenant_prompt_context(tenant_id)
     # Sync treatment instruction embedding if instructions were provided
     if treatment.pre_instructions or treatment.post_instructions:
         try:
@@ -11907,6 +11924,7 @@ async def delete_treatment_type(
             tenant_id,
             code,
         )
+        await invalidate_tenant_prompt_context(tenant_id)
         return {
             "status": "deactivated",
             "code": code,
@@ -11938,6 +11956,7 @@ async def delete_treatment_type(
     )
     if result == "DELETE 0":
         raise HTTPException(status_code=404, detail="Tipo de tratamiento no encontrado")
+    await invalidate_tenant_prompt_context(tenant_id)
     return {"status": "deleted", "code": code}
 
 
@@ -18841,6 +18860,7 @@ async def delete_telegram_config(
         resolved_tenant_id,
         [TELEGRAM_BOT_TOKEN, TELEGRAM_WEBHOOK_SECRET, TELEGRAM_WEBHOOK_ACCESS_TOKEN],
     )
+    await invalidate_tenant_credential(resolved_tenant_id)
 
     # Stop bot polling
     try:
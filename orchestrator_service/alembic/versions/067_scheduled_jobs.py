@@ -0,0 +1,39 @@
+"""067 - scheduled_jobs table for the lease-based job scheduler
+
+Persists one row per periodic job (last_run_at, next_run_at, duration,
+status, error, owner) so that N orchestrator replicas can share the
+schedule: the replica holding the job lease re-reads next_run_at before
+running, and restarts can catch up on a run missed while down.
+
+Revision ID: 067
+Revises: 066
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "067"
+down_revision = "066"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "scheduled_jobs",
+        sa.Column("job_name", sa.Text(), primary_key=True),
+        sa.Column("schedule", sa.Text(), nullable=True),
+        sa.Column("last_run_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("next_run_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_duration_ms", sa.Integer(), nullable=True),
+        sa.Column("last_status", sa.String(20), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("last_run_by", sa.Text(), nullable=True),
+        sa.Column("run_count", sa.BigInteger(), nullable=False, server_default=sa.text("0")),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("scheduled_jobs")
@@ -0,0 +1,36 @@
+"""068 - gcal_sync_cursors table for incremental Google Calendar sync
+
+One row per professional holding Google's nextSyncToken, so the background
+gcal_sync job only fetches changed events instead of availability checks
+calling Google inline.
+
+Revision ID: 068
+Revises: 067
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "068"
+down_revision = "067"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "gcal_sync_cursors",
+        sa.Column("tenant_id", sa.Integer(), sa.ForeignKey("tenants.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("professional_id", sa.Integer(), sa.ForeignKey("professionals.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("calendar_id", sa.Text(), nullable=False),
+        sa.Column("sync_token", sa.Text(), nullable=True),
+        sa.Column("last_synced_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_full_sync_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("gcal_sync_cursors")
@@ -0,0 +1,70 @@
+"""069 - bulk_send_jobs / bulk_send_recipients for the background bulk-send engine
+
+Nova mass actions (accion_masiva) no longer send inline: a job row plus one
+row per recipient is written up front and services/bulk_messaging.py drains
+it with a worker pool, so progress survives restarts and every recipient
+has its own result.
+
+Revision ID: 069
+Revises: 068
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+
+
+revision = "069"
+down_revision = "068"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "bulk_send_jobs",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column("tenant_id", sa.Integer(), sa.ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("action", sa.String(30), nullable=False),
+        sa.Column("params", JSONB(), nullable=False, server_default=sa.text("'{}'::jsonb")),
+        sa.Column("status", sa.String(20), nullable=False, server_default="pending"),
+        sa.Column("total_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("sent_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("failed_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_by", sa.Text(), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("resume_after", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("heartbeat_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("idx_bulk_send_jobs_tenant", "bulk_send_jobs", ["tenant_id", "created_at"])
+    op.create_index("idx_bulk_send_jobs_status", "bulk_send_jobs", ["status"])
+
+    op.create_table(
+        "bulk_send_recipients",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column("job_id", sa.BigInteger(), sa.ForeignKey("bulk_send_jobs.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("tenant_id", sa.Integer(), sa.ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("patient_id", sa.Integer(), nullable=True),
+        sa.Column("phone", sa.Text(), nullable=False),
+        sa.Column("patient_name", sa.Text(), nullable=True),
+        sa.Column("status", sa.String(20), nullable=False, server_default="pending"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("sent_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index("idx_bulk_send_recipients_job_status", "bulk_send_recipients", ["job_id", "status"])
+    # Rolling 24h unique-recipient count for the messaging tier.
+    op.create_index(
+        "idx_bulk_send_recipients_tenant_sent",
+        "bulk_send_recipients",
+        ["tenant_id", "sent_at"],
+        postgresql_where=sa.text("status = 'sent'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("bulk_send_recipients")
+    op.drop_table("bulk_send_jobs")
@@ -0,0 +1,72 @@
+"""070 - search columns and indexes for patients / chat_messages
+
+Patient search (admin list, Nova, the agent's find_patient) and the symptom
+search over chat history used ILIKE '%term%' scans; services/search_service.py
+now queries these instead:
+
+- patients.search_name: lower-cased, accent-free "first last" (GIN trigram)
+- patients.phone_digits / dni_digits: digits only (GIN trigram)
+- chat_messages: GIN full-text index on to_tsvector('spanish', content) for
+  patient messages (role = 'user')
+
+pg_trgm is required (the trigram indexes below and search_service's
+word_similarity / <% need it); 055 already created it, so this is a no-op
+unless it was dropped since.
+
+Revision ID: 070
+Revises: 069
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "070"
+down_revision = "069"
+branch_labels = None
+depends_on = None
+
+# Must match services/search_service.py (ACCENTS / PLAIN).
+_SEARCH_NAME = (
+    "translate(lower(coalesce(first_name, '') || ' ' || coalesce(last_name, '')), "
+    "'áéíóúüñàèìòùâêîôûäëïöü', 'aeiouunaeiouaeiouaeiou')"
+)
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    op.execute(f"""
+        ALTER TABLE patients
+            ADD COLUMN IF NOT EXISTS search_name TEXT GENERATED ALWAYS AS ({_SEARCH_NAME}) STORED,
+            ADD COLUMN IF NOT EXISTS phone_digits TEXT
+                GENERATED ALWAYS AS (regexp_replace(coalesce(phone_number, ''), '[^0-9]', '', 'g')) STORED,
+            ADD COLUMN IF NOT EXISTS dni_digits TEXT
+                GENERATED ALWAYS AS (regexp_replace(coalesce(dni, ''), '[^0-9]', '', 'g')) STORED
+    """)
+
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_patients_search_name_trgm "
+        "ON patients USING gin (search_name gin_trgm_ops)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_patients_phone_digits_trgm "
+        "ON patients USING gin (phone_digits gin_trgm_ops)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_patients_dni_digits_trgm "
+        "ON patients USING gin (dni_digits gin_trgm_ops)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_chat_messages_content_fts "
+        "ON chat_messages USING gin (to_tsvector('spanish', content)) WHERE role = 'user'"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS idx_chat_messages_content_fts")
+    op.execute("DROP INDEX IF EXISTS idx_patients_dni_digits_trgm")
+    op.execute("DROP INDEX IF EXISTS idx_patients_phone_digits_trgm")
+    op.execute("DROP INDEX IF EXISTS idx_patients_search_name_trgm")
+    op.execute("ALTER TABLE patients DROP COLUMN IF EXISTS dni_digits")
+    op.execute("ALTER TABLE patients DROP COLUMN IF EXISTS phone_digits")
+    op.execute("ALTER TABLE patients DROP COLUMN IF EXISTS search_name")
@@ -0,0 +1,50 @@
+"""071 - phone_key on chat_conversations / patients for indexed phone lookups
+
+Conversations and patients were matched by phone with
+external_user_id ILIKE '%<digits>%' or IN (<Python-built format variants>),
+which cannot use a btree index. phone_key is the canonical national form
+(last 10 digits, so +5492996114843, +542996114843, 542996114843 and
+02996114843 share one key); it is a generated column, so every write keeps
+it current and adding it backfills existing rows. services/phone_lookup.py
+is the resolver built on it.
+
+Revision ID: 071
+Revises: 070
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "071"
+down_revision = "070"
+branch_labels = None
+depends_on = None
+
+# Must match services/phone_lookup.py::phone_key.
+_KEY = "right(NULLIF(regexp_replace(coalesce({col}, ''), '[^0-9]', '', 'g'), ''), 10)"
+
+
+def upgrade() -> None:
+    op.execute(
+        "ALTER TABLE chat_conversations ADD COLUMN IF NOT EXISTS phone_key TEXT "
+        f"GENERATED ALWAYS AS ({_KEY.format(col='external_user_id')}) STORED"
+    )
+    op.execute(
+        "ALTER TABLE patients ADD COLUMN IF NOT EXISTS phone_key TEXT "
+        f"GENERATED ALWAYS AS ({_KEY.format(col='phone_number')}) STORED"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_chat_conv_tenant_phone_key "
+        "ON chat_conversations (tenant_id, phone_key) WHERE phone_key IS NOT NULL"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_patients_tenant_phone_key "
+        "ON patients (tenant_id, phone_key) WHERE phone_key IS NOT NULL"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS idx_patients_tenant_phone_key")
+    op.execute("DROP INDEX IF EXISTS idx_chat_conv_tenant_phone_key")
+    op.execute("ALTER TABLE patients DROP COLUMN IF EXISTS phone_key")
+    op.execute("ALTER TABLE chat_conversations DROP COLUMN IF EXISTS phone_key")
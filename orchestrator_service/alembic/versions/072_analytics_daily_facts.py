@@ -0,0 +1,170 @@
+"""072 - daily analytics fact tables maintained from appointment/payment changes
+
+The finance dashboard and the CEO professionals report re-aggregated raw
+appointments, treatment_plan_payments and professional_payouts on every
+load (the professionals report ran six queries per professional).
+services/analytics_rollup.py now keeps:
+
+- analytics_daily_appointments: one row per tenant / UTC day / professional
+  / treatment code with the counters and amounts those reports sum.
+- analytics_daily_cash: plan payments (by method) and payouts per tenant / day.
+- analytics_dirty_days: (tenant, day) pairs whose facts must be rebuilt.
+  AFTER triggers on the three source tables mark the old and new day of
+  every changed row; existing history is queued here by this migration and
+  rebuilt by the refresh job (or by the first dashboard read of the range).
+
+Revision ID: 072
+Revises: 071
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "072"
+down_revision = "071"
+branch_labels = None
+depends_on = None
+
+_MONEY = sa.Numeric(14, 2)
+
+
+def _amount(name):
+    return sa.Column(name, _MONEY, nullable=False, server_default="0")
+
+
+def _count(name):
+    return sa.Column(name, sa.Integer(), nullable=False, server_default="0")
+
+
+def upgrade() -> None:
+    op.create_table(
+        "analytics_daily_appointments",
+        sa.Column("tenant_id", sa.Integer(), sa.ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        # 0 / '' stand for "no professional" / "no type" so they can be part of the key
+        sa.Column("professional_id", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("treatment_code", sa.String(50), nullable=False, server_default=""),
+        _count("appointments"),
+        _count("completed"),
+        _count("cancelled"),
+        _count("no_show"),
+        _count("active"),
+        _count("billable"),
+        _count("billed_count"),
+        _count("paid_count"),
+        _count("partial_count"),
+        _amount("billed_amount"),
+        _amount("paid_amount"),
+        _amount("pending_amount"),
+        _amount("completed_billed_amount"),
+        _amount("estimated_revenue"),
+        sa.Column("refreshed_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint("tenant_id", "day", "professional_id", "treatment_code"),
+    )
+    op.create_table(
+        "analytics_daily_cash",
+        sa.Column("tenant_id", sa.Integer(), sa.ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        _amount("plan_payments"),
+        _amount("plan_cash"),
+        _amount("plan_card"),
+        _amount("payouts"),
+        sa.Column("refreshed_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint("tenant_id", "day"),
+    )
+    op.create_table(
+        "analytics_dirty_days",
+        sa.Column("tenant_id", sa.Integer(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("marked_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint("tenant_id", "day"),
+    )
+
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION analytics_mark_dirty() RETURNS trigger AS $$
+        BEGIN
+            IF TG_TABLE_NAME = 'appointments' THEN
+                IF TG_OP <> 'INSERT' THEN
+                    INSERT INTO analytics_dirty_days (tenant_id, day)
+                    VALUES (OLD.tenant_id, (OLD.appointment_datetime AT TIME ZONE 'UTC')::date)
+                    ON CONFLICT DO NOTHING;
+                END IF;
+                IF TG_OP <> 'DELETE' THEN
+                    INSERT INTO analytics_dirty_days (tenant_id, day)
+                    VALUES (NEW.tenant_id, (NEW.appointment_datetime AT TIME ZONE 'UTC')::date)
+                    ON CONFLICT DO NOTHING;
+                END IF;
+            ELSIF TG_TABLE_NAME = 'treatment_plan_payments' THEN
+                -- payment_date is TIMESTAMPTZ here (migration 019): bucket by UTC day
+                IF TG_OP <> 'INSERT' THEN
+                    INSERT INTO analytics_dirty_days (tenant_id, day)
+                    VALUES (OLD.tenant_id, (OLD.payment_date AT TIME ZONE 'UTC')::date)
+                    ON CONFLICT DO NOTHING;
+                END IF;
+                IF TG_OP <> 'DELETE' THEN
+                    INSERT INTO analytics_dirty_days (tenant_id, day)
+                    VALUES (NEW.tenant_id, (NEW.payment_date AT TIME ZONE 'UTC')::date)
+                    ON CONFLICT DO NOTHING;
+                END IF;
+            ELSE
+                IF TG_OP <> 'INSERT' THEN
+                    INSERT INTO analytics_dirty_days (tenant_id, day)
+                    VALUES (OLD.tenant_id, OLD.payment_date)
+                    ON CONFLICT DO NOTHING;
+                END IF;
+                IF TG_OP <> 'DELETE' THEN
+                    INSERT INTO analytics_dirty_days (tenant_id, day)
+                    VALUES (NEW.tenant_id, NEW.payment_date)
+                    ON CONFLICT DO NOTHING;
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    # Only columns the facts depend on: reminder/sync/notes updates do not mark anything.
+    op.execute(
+        """
+        CREATE TRIGGER trg_appointments_analytics_dirty
+        AFTER INSERT OR DELETE OR UPDATE OF
+            tenant_id, appointment_datetime, professional_id, appointment_type,
+            status, payment_status, billing_amount
+        ON appointments
+        FOR EACH ROW EXECUTE FUNCTION analytics_mark_dirty()
+        """
+    )
+    for table in ("treatment_plan_payments", "professional_payouts"):
+        op.execute(
+            f"""
+            CREATE TRIGGER trg_{table}_analytics_dirty
+            AFTER INSERT OR DELETE OR UPDATE OF tenant_id, payment_date, amount, payment_method
+            ON {table}
+            FOR EACH ROW EXECUTE FUNCTION analytics_mark_dirty()
+            """
+        )
+
+    # Queue the existing history; the refresh job builds it in batches.
+    op.execute(
+        """
+        INSERT INTO analytics_dirty_days (tenant_id, day)
+        SELECT DISTINCT tenant_id, (appointment_datetime AT TIME ZONE 'UTC')::date FROM appointments
+        UNION
+        SELECT DISTINCT tenant_id, (payment_date AT TIME ZONE 'UTC')::date FROM treatment_plan_payments
+        UNION
+        SELECT DISTINCT tenant_id, payment_date FROM professional_payouts
+        ON CONFLICT DO NOTHING
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_professional_payouts_analytics_dirty ON professional_payouts")
+    op.execute("DROP TRIGGER IF EXISTS trg_treatment_plan_payments_analytics_dirty ON treatment_plan_payments")
+    op.execute("DROP TRIGGER IF EXISTS trg_appointments_analytics_dirty ON appointments")
+    op.execute("DROP FUNCTION IF EXISTS analytics_mark_dirty()")
+    op.drop_table("analytics_dirty_days")
+    op.drop_table("analytics_daily_cash")
+    op.drop_table("analytics_daily_appointments")
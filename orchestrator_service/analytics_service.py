@@ -13,7 +13,14 @@ class AnalyticsService:
         """
         Calculates performance metrics for all professionals within the given date range.
         Using REAL data from appointments, patients, and clinical records.
+
+        Counters, revenue, top treatment and busiest day come from the daily
+        fact table (services/analytics_rollup.py); unique/returning patients
+        are not additive per day and come from one grouped appointments query.
+        A fixed number of queries runs regardless of how many professionals.
         """
+        from services.analytics_rollup import ensure_fresh, to_day
+
         try:
             # 1. Fetch basic professional info (solo profesionales dentales, no secretarias)
             professionals = await db.pool.fetch(
@@ -25,38 +32,130 @@ class AnalyticsService:
             """,
                 tenant_id,
             )
+            if not professionals:
+                return []
+
+            start_day, end_day = to_day(start_date), to_day(end_date)
+            await ensure_fresh(db.pool, tenant_id, start_day, end_day)
+
+            # 2. Status counts + revenue estimation per professional (fact table).
+            # Revenue fallback chain (billing_amount > treatment base_price >
+            # professional.consultation_price > tenant.consultation_price) is applied by the rollup.
+            stats_rows = await db.pool.fetch(
+                """
+                SELECT
+                    professional_id,
+                    SUM(appointments) AS total,
+                    SUM(completed) AS completed,
+                    SUM(cancelled) AS cancelled,
+                    SUM(no_show) AS no_show,
+                    SUM(estimated_revenue) AS total_revenue,
+                    SUM(paid_count) AS paid_count,
+                    SUM(partial_count) AS partial_count
+                FROM analytics_daily_appointments
+                WHERE tenant_id = $1 AND day >= $2 AND day <= $3
+                GROUP BY professional_id
+            """,
+                tenant_id,
+                start_day,
+                end_day,
+            )
+            stats_by_prof = {r["professional_id"]: r for r in stats_rows}
+
+            # 3. Patients seen and "returning" patients (an appointment BEFORE start_date)
+            patient_rows = await db.pool.fetch(
+                """
+                SELECT
+                    a1.professional_id,
+                    COUNT(DISTINCT a1.patient_id) AS unique_patients,
+                    COUNT(DISTINCT a1.patient_id) FILTER (WHERE EXISTS (
+                        SELECT 1 FROM appointments a2
+                        WHERE a2.patient_id = a1.patient_id
+                        AND a2.tenant_id = a1.tenant_id
+                        AND a2.appointment_datetime < $2
+                    )) AS returning_patients
+                FROM appointments a1
+                WHERE a1.tenant_id = $1
+                AND a1.appointment_datetime >= $2
+                AND a1.appointment_datetime < ($3::date + INTERVAL '1 day')
+                GROUP BY a1.professional_id
+            """,
+                tenant_id,
+                start_day,
+                end_day,
+            )
+            patients_by_prof = {r["professional_id"]: r for r in patient_rows}
+
+            # 4. Top treatment per professional
+            top_rows = await db.pool.fetch(
+                """
+                SELECT DISTINCT ON (f.professional_id)
+                    f.professional_id, f.treatment_code AS appointment_type, tt.name, f.cnt
+                FROM (
+                    SELECT professional_id, treatment_code, SUM(active) AS cnt
+                    FROM analytics_daily_appointments
+                    WHERE tenant_id = $1 AND day >= $2 AND day <= $3
+                    GROUP BY professional_id, treatment_code
+                    HAVING SUM(active) > 0
+                ) f
+                LEFT JOIN treatment_types tt ON tt.code = f.treatment_code AND tt.tenant_id = $1
+                ORDER BY f.professional_id, f.cnt DESC
+            """,
+                tenant_id,
+                start_day,
+                end_day,
+            )
+            top_by_prof = {r["professional_id"]: r for r in top_rows}
+
+            # 5. Busiest day of the week per professional
+            busiest_rows = await db.pool.fetch(
+                """
+                SELECT DISTINCT ON (professional_id) professional_id, dow, cnt
+                FROM (
+                    SELECT professional_id, EXTRACT(DOW FROM day)::int AS dow, SUM(active) AS cnt
+                    FROM analytics_daily_appointments
+                    WHERE tenant_id = $1 AND day >= $2 AND day <= $3
+                    GROUP BY professional_id, dow
+                    HAVING SUM(active) > 0
+                ) d
+                ORDER BY professional_id, cnt DESC
+            """,
+                tenant_id,
+                start_day,
+                end_day,
+            )
+            busiest_by_prof = {r["professional_id"]: r for r in busiest_rows}
+
+            days_es = [
+                "Domingo",
+                "Lunes",
+                "Martes",
+                "Miércoles",
+                "Jueves",
+                "Viernes",
+                "Sábado",
+            ]
 
             results = []
 
             for prof in professionals:
                 prof_id = prof["id"]
                 full_name = f"{prof['first_name']} {prof['last_name'] or ''}".strip()
-
-                # 2. Aggregations from APPOINTMENTS
-                # Status counts
-                stats = await db.pool.fetchrow(
-                    """
-                    SELECT 
-                        COUNT(*) as total,
-                        COUNT(*) FILTER (WHERE status = 'completed') as completed,
-                        COUNT(*) FILTER (WHERE status = 'cancelled') as cancelled,
-                        COUNT(*) FILTER (WHERE status = 'no_show') as no_show,
-                        COUNT(DISTINCT patient_id) as unique_patients
-                    FROM appointments
-                    WHERE professional_id = $1
-                    AND appointment_datetime BETWEEN $2 AND $3
-                    AND tenant_id = $4
-                """,
-                    prof_id,
-                    start_date,
-                    end_date,
-                    tenant_id,
+                stats = stats_by_prof.get(prof_id)
+                patients = patients_by_prof.get(prof_id)
+                top_treatment = top_by_prof.get(prof_id)
+                busiest_day = busiest_by_prof.get(prof_id)
+
+                total_apts = int(stats["total"] or 0) if stats else 0
+                completed_apts = int(stats["completed"] or 0) if stats else 0
+                cancelled_apts = int(stats["cancelled"] or 0) if stats else 0
+                no_show_count = int(stats["no_show"] or 0) if stats else 0
+                estimated_revenue = float(stats["total_revenue"] or 0) if stats else 0.0
+                unique_patients = patients["unique_patients"] or 0 if patients else 0
+                returning_patients_count = (
+                    patients["returning_patients"] or 0 if patients else 0
                 )
 
-                total_apts = stats["total"] or 0
-                completed_apts = stats["completed"] or 0
-                cancelled_apts = stats["cancelled"] or 0
-
                 # Rates
                 completion_rate = (
                     (completed_apts / total_apts) * 100 if total_apts > 0 else 0
@@ -64,117 +163,17 @@ class AnalyticsService:
                 cancellation_rate = (
                     (cancelled_apts / total_apts) * 100 if total_apts > 0 else 0
                 )
-
-                # 3. Revenue Estimation — multi-source fallback chain:
-                # billing_amount > treatment base_price > professional.consultation_price > tenant.consultation_price
-                revenue_row = await db.pool.fetchrow(
-                    """
-                    SELECT
-                        COALESCE(SUM(
-                            CASE
-                                WHEN a.billing_amount IS NOT NULL AND a.billing_amount > 0 THEN a.billing_amount
-                                WHEN tt.base_price IS NOT NULL AND tt.base_price > 0 THEN tt.base_price
-                                WHEN p.consultation_price IS NOT NULL AND p.consultation_price > 0 THEN p.consultation_price
-                                WHEN te.consultation_price IS NOT NULL AND te.consultation_price > 0 THEN te.consultation_price
-                                ELSE 0
-                            END
-                        ), 0) as total_revenue,
-                        COUNT(*) FILTER (WHERE a.payment_status = 'paid') as paid_count,
-                        COUNT(*) FILTER (WHERE a.payment_status = 'partial') as partial_count,
-                        COUNT(*) FILTER (WHERE a.billing_amount > 0) as with_billing
-                    FROM appointments a
-                    LEFT JOIN treatment_types tt ON a.appointment_type = tt.code AND tt.tenant_id = a.tenant_id
-                    LEFT JOIN professionals p ON a.professional_id = p.id
-                    LEFT JOIN tenants te ON a.tenant_id = te.id
-                    WHERE a.professional_id = $1
-                    AND a.appointment_datetime BETWEEN $2 AND $3
-                    AND a.tenant_id = $4
-                    AND a.status IN ('completed', 'confirmed', 'scheduled')
-                """,
-                    prof_id,
-                    start_date,
-                    end_date,
-                    tenant_id,
-                )
-                estimated_revenue = float(revenue_row["total_revenue"] or 0)
-
-                # 4. Retention Analysis (Patients seen in this period who had prior visits)
-                # "Returning Patient": A patient who has an appointment BEFORE start_date
-                returning_patients_count = await db.pool.fetchval(
-                    """
-                    SELECT COUNT(DISTINCT patient_id)
-                    FROM appointments a1
-                    WHERE professional_id = $1
-                    AND appointment_datetime BETWEEN $2 AND $3
-                    AND EXISTS (
-                        SELECT 1 FROM appointments a2
-                        WHERE a2.patient_id = a1.patient_id
-                        AND a2.appointment_datetime < $2
-                    )
-                """,
-                    prof_id,
-                    start_date,
-                    end_date,
-                )
-
                 retention_rate = (
-                    (returning_patients_count / stats["unique_patients"]) * 100
-                    if stats["unique_patients"] > 0
+                    (returning_patients_count / unique_patients) * 100
+                    if unique_patients > 0
                     else 0
                 )
-
-                no_show_count = stats["no_show"] or 0
                 no_show_rate = (
                     (no_show_count / total_apts) * 100 if total_apts > 0 else 0
                 )
                 avg_revenue = estimated_revenue / total_apts if total_apts > 0 else 0
 
-                # 5. Top treatment for this professional
-                top_treatment = await db.pool.fetchrow(
-                    """
-                    SELECT a.appointment_type, tt.name, COUNT(*) as cnt
-                    FROM appointments a
-                    LEFT JOIN treatment_types tt ON a.appointment_type = tt.code AND tt.tenant_id = a.tenant_id
-                    WHERE a.professional_id = $1
-                    AND a.appointment_datetime BETWEEN $2 AND $3
-                    AND a.tenant_id = $4
-                    AND a.status IN ('completed', 'confirmed', 'scheduled')
-                    GROUP BY a.appointment_type, tt.name
-                    ORDER BY cnt DESC LIMIT 1
-                """,
-                    prof_id,
-                    start_date,
-                    end_date,
-                    tenant_id,
-                )
-
-                # 6. Busiest day of the week
-                busiest_day = await db.pool.fetchrow(
-                    """
-                    SELECT EXTRACT(DOW FROM appointment_datetime)::int as dow, COUNT(*) as cnt
-                    FROM appointments
-                    WHERE professional_id = $1
-                    AND appointment_datetime BETWEEN $2 AND $3
-                    AND tenant_id = $4
-                    AND status IN ('completed', 'confirmed', 'scheduled')
-                    GROUP BY dow ORDER BY cnt DESC LIMIT 1
-                """,
-                    prof_id,
-                    start_date,
-                    end_date,
-                    tenant_id,
-                )
-                days_es = [
-                    "Domingo",
-                    "Lunes",
-                    "Martes",
-                    "Miércoles",
-                    "Jueves",
-                    "Viernes",
-                    "Sábado",
-                ]
-
-                # 7. Strategic Tags
+                # 6. Strategic Tags
                 tags = []
                 if completion_rate > 90 and total_apts > 5:
                     tags.append("High Performance")
@@ -197,15 +196,15 @@ class AnalyticsService:
                         "metrics": {
                             "total_appointments": total_apts,
                             "completed_appointments": completed_apts,
-                            "unique_patients": stats["unique_patients"] or 0,
+                            "unique_patients": unique_patients,
                             "completion_rate": round(completion_rate, 1),
                             "cancellation_rate": round(cancellation_rate, 1),
                             "no_show_rate": round(no_show_rate, 1),
                             "revenue": estimated_revenue,
                             "avg_revenue_per_appointment": round(avg_revenue, 0),
                             "retention_rate": round(retention_rate, 1),
-                            "paid_appointments": revenue_row["paid_count"] or 0,
-                            "partial_payments": revenue_row["partial_count"] or 0,
+                            "paid_appointments": int(stats["paid_count"] or 0) if stats else 0,
+                            "partial_payments": int(stats["partial_count"] or 0) if stats else 0,
                         },
                         "top_treatment": {
                             "name": (
@@ -215,7 +214,7 @@ class AnalyticsService:
                             )
                             if top_treatment
                             else "N/A",
-                            "count": top_treatment["cnt"] if top_treatment else 0,
+                            "count": int(top_treatment["cnt"]) if top_treatment else 0,
                         },
                         "busiest_day": days_es[busiest_day["dow"]]
                         if busiest_day
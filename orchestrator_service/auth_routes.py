@@ -655,6 +655,15 @@ async def update_profile(payload: ProfileUpdate, request: Request):
                 *name_params,
             )
 
+        if prof_fields or name_updates:
+            # The agent prompt includes professional data: drop every affected clinic's cached context
+            from services.tenant_prompt_cache import invalidate_tenant_prompt_context
+
+            for row in await db.pool.fetch(
+                "SELECT DISTINCT tenant_id FROM professionals WHERE user_id = $1", uuid.UUID(user_id)
+            ):
+                await invalidate_tenant_prompt_context(row["tenant_id"])
+
     return {"message": "Perfil actualizado correctamente."}
 
 
@@ -2,9 +2,11 @@
 Vault: credenciales por tenant. Para Chatwoot y agente IA.
 CLINICASV1.0 - paridad con Version Estable.
 """
+import asyncio
 import logging
 import os
-from typing import Optional, Any
+import time
+from typing import Any, Dict, Optional, Tuple
 from cryptography.fernet import Fernet
 
 # Configuración Global de Seguridad
@@ -62,28 +64,147 @@ TELEGRAM_WEBHOOK_SECRET = "TELEGRAM_WEBHOOK_SECRET"
 TELEGRAM_WEBHOOK_ACCESS_TOKEN = "TELEGRAM_WEBHOOK_ACCESS_TOKEN"
 
 
+# ── Cache en proceso ─────────────────────────────────────────────────────────
+# get_tenant_credential se llama varias veces por turno (agente, YCloud, Meta,
+# Telegram). Se cachea el valor ya desencriptado (TTL corto) y también la
+# ausencia de fila (negative cache) para no repetir SELECT + Fernet.
+# Invalidación: invalidate_tenant_credential() limpia el cache local y publica
+# en Redis para que las demás réplicas hagan lo mismo. El TTL acota la
+# ventana de inconsistencia si Redis no está disponible.
+CREDENTIAL_CACHE_TTL_SECONDS = 60
+CREDENTIAL_NEGATIVE_TTL_SECONDS = 30
+CREDENTIAL_INVALIDATE_CHANNEL = "credentials:invalidate"
+WEBHOOK_TOKEN_MAP_TTL_SECONDS = 300
+WEBHOOK_TOKEN_MAP_MIN_REFRESH_SECONDS = 10
+_LISTENER_RETRY_SECONDS = 60
+
+# (tenant_id, name) -> (expires_at, decrypted value or None)
+_CREDENTIAL_CACHE: Dict[Tuple[int, str], Tuple[float, Optional[str]]] = {}
+_cache_generation = 0
+# access token -> tenant_id (WEBHOOK_ACCESS_TOKEN desencriptado)
+_WEBHOOK_TOKEN_MAP: Dict[str, int] = {}
+_webhook_map_loaded_at: Optional[float] = None
+_webhook_map_lock: Optional[asyncio.Lock] = None
+_listener_task: Optional[asyncio.Task] = None
+_listener_retry_at = 0.0
+
+
+def _env_fallback(name: str) -> Optional[str]:
+    """Fallback a variable de entorno global (Nexus Resilience Protocol)."""
+    env_val = os.getenv(name)
+    # Fallback específico para tokens de Meta (Nexus Resilience)
+    if not env_val and name == "META_USER_LONG_TOKEN":
+        env_val = os.getenv("META_ADS_TOKEN")
+    return env_val.strip() if env_val else None
+
+
+def _drop_cached_credentials(tenant_id: Optional[int] = None, name: Optional[str] = None) -> None:
+    """Limpia el cache local. tenant_id=None → todo; name=None → todo el tenant."""
+    global _cache_generation, _webhook_map_loaded_at
+    _cache_generation += 1
+    if tenant_id is None:
+        _CREDENTIAL_CACHE.clear()
+    elif name is None:
+        for key in [k for k in _CREDENTIAL_CACHE if k[0] == tenant_id]:
+            del _CREDENTIAL_CACHE[key]
+    else:
+        _CREDENTIAL_CACHE.pop((tenant_id, name), None)
+    if name is None or name == WEBHOOK_ACCESS_TOKEN:
+        _webhook_map_loaded_at = None
+
+
+def _apply_invalidation_message(data: Any) -> None:
+    """Payload: "*", "<tenant_id>:*" o "<tenant_id>:<name>"."""
+    raw = str(data or "")
+    if raw == "*":
+        _drop_cached_credentials()
+        return
+    tenant_part, _, name = raw.partition(":")
+    try:
+        tenant_id = int(tenant_part)
+    except ValueError:
+        return
+    _drop_cached_credentials(tenant_id, None if name in ("", "*") else name)
+
+
+async def _ensure_invalidation_listener() -> None:
+    """Suscribe (una vez por proceso) al canal Redis de invalidación."""
+    global _listener_task, _listener_retry_at
+    if _listener_task is not None and not _listener_task.done():
+        return
+    if time.monotonic() < _listener_retry_at:
+        return
+    _listener_retry_at = time.monotonic() + _LISTENER_RETRY_SECONDS
+    try:
+        from services.relay import get_redis
+
+        redis = get_redis()
+        if redis is None:
+            return
+        pubsub = redis.pubsub()
+        await pubsub.subscribe(CREDENTIAL_INVALIDATE_CHANNEL)
+    except Exception as e:
+        logger.warning(f"Credential cache: pubsub unavailable, relying on TTL: {e}")
+        return
+
+    async def listen():
+        try:
+            async for msg in pubsub.listen():
+                if msg.get("type") == "message":
+                    _apply_invalidation_message(msg.get("data"))
+        except Exception as e:
+            logger.warning(f"Credential cache: pubsub listener stopped: {e}")
+        finally:
+            # Mensajes perdidos mientras no hubo listener: empezar de cero.
+            _drop_cached_credentials()
+
+    _listener_task = asyncio.create_task(listen(), name="credential-invalidation")
+
+
+async def invalidate_tenant_credential(tenant_id: Optional[int] = None, name: Optional[str] = None) -> None:
+    """Invalida credenciales cacheadas en este proceso y en las demás réplicas.
+
+    Llamar después de cualquier escritura directa a la tabla credentials.
+    tenant_id=None invalida todo (p. ej. updates por id que pueden mover la fila).
+    """
+    _drop_cached_credentials(tenant_id, name)
+    message = "*" if tenant_id is None else f"{tenant_id}:{name or '*'}"
+    try:
+        from services.relay import get_redis
+
+        redis = get_redis()
+        if redis is not None:
+            await redis.publish(CREDENTIAL_INVALIDATE_CHANNEL, message)
+    except Exception as e:
+        logger.warning(f"Credential cache: could not publish invalidation: {e}")
+
+
 async def get_tenant_credential(tenant_id: int, name: str) -> Optional[str]:
-    """Obtiene el valor de una credencial del tenant desde la tabla credentials."""
-    pool = get_pool()
-    row = await pool.fetchrow(
-        "SELECT value FROM credentials WHERE tenant_id = $1 AND name = $2 LIMIT 1",
-        tenant_id,
-        name,
-    )
-    if not row or not row["value"]:
-        # Fallback a variable de entorno global (Nexus Resilience Protocol)
-        import os
-        env_val = os.getenv(name)
-        
-        # Fallback específico para tokens de Meta (Nexus Resilience)
-        if not env_val and name == "META_USER_LONG_TOKEN":
-            env_val = os.getenv("META_ADS_TOKEN")
-            
-        return env_val.strip() if env_val else None
+    """Obtiene el valor de una credencial del tenant desde la tabla credentials (cacheado)."""
+    cache_key = (tenant_id, name)
+    entry = _CREDENTIAL_CACHE.get(cache_key)
+    now = time.monotonic()
+    if entry is not None and entry[0] > now:
+        value = entry[1]
+    else:
+        await _ensure_invalidation_listener()
+        generation = _cache_generation
+        pool = get_pool()
+        row = await pool.fetchrow(
+            "SELECT value FROM credentials WHERE tenant_id = $1 AND name = $2 LIMIT 1",
+            tenant_id,
+            name,
+        )
+        # Intentar decriptar si es un valor encriptado (Fernet)
+        value = decrypt_value(str(row["value"])) if row and row["value"] else None
+        # Si hubo una invalidación durante el SELECT, no cachear un valor viejo.
+        if generation == _cache_generation:
+            ttl = CREDENTIAL_CACHE_TTL_SECONDS if value else CREDENTIAL_NEGATIVE_TTL_SECONDS
+            _CREDENTIAL_CACHE[cache_key] = (now + ttl, value)
 
-    
-    # Intentar decriptar si es un valor encriptado (Fernet)
-    return decrypt_value(str(row["value"]))
+    if not value:
+        return _env_fallback(name)
+    return value
 
 
 async def get_tenant_credential_int(tenant_id: int, name: str) -> Optional[int]:
@@ -97,15 +218,50 @@ async def get_tenant_credential_int(tenant_id: int, name: str) -> Optional[int]:
         return None
 
 
-async def resolve_tenant_from_webhook_token(access_token: str) -> Optional[int]:
-    """Resuelve tenant_id desde WEBHOOK_ACCESS_TOKEN (para webhook Chatwoot)."""
+async def _load_webhook_token_map() -> None:
+    """Carga todos los WEBHOOK_ACCESS_TOKEN (desencriptados) en un dict token -> tenant."""
+    global _webhook_map_loaded_at
+    generation = _cache_generation
     pool = get_pool()
-    row = await pool.fetchrow(
-        "SELECT tenant_id FROM credentials WHERE name = $1 AND value = $2 LIMIT 1",
+    rows = await pool.fetch(
+        "SELECT tenant_id, value FROM credentials WHERE name = $1 AND tenant_id IS NOT NULL",
         WEBHOOK_ACCESS_TOKEN,
-        access_token.strip(),
     )
-    return int(row["tenant_id"]) if row else None
+    token_map: Dict[str, int] = {}
+    for row in rows:
+        if row["value"]:
+            token_map[decrypt_value(str(row["value"])).strip()] = int(row["tenant_id"])
+    _WEBHOOK_TOKEN_MAP.clear()
+    _WEBHOOK_TOKEN_MAP.update(token_map)
+    _webhook_map_loaded_at = time.monotonic() if generation == _cache_generation else None
+
+
+async def resolve_tenant_from_webhook_token(access_token: str) -> Optional[int]:
+    """Resuelve tenant_id desde WEBHOOK_ACCESS_TOKEN (para webhook Chatwoot).
+
+    Usa un mapa token -> tenant en memoria (también funciona con tokens
+    encriptados). Un token desconocido fuerza a lo sumo una recarga cada
+    WEBHOOK_TOKEN_MAP_MIN_REFRESH_SECONDS, así tokens inválidos no golpean la DB.
+    """
+    global _webhook_map_lock
+    token = (access_token or "").strip()
+    if not token:
+        return None
+    await _ensure_invalidation_listener()
+    if _webhook_map_lock is None:
+        _webhook_map_lock = asyncio.Lock()
+
+    def _is_stale(max_age: float) -> bool:
+        return _webhook_map_loaded_at is None or time.monotonic() - _webhook_map_loaded_at >= max_age
+
+    if _is_stale(WEBHOOK_TOKEN_MAP_TTL_SECONDS) or (
+        token not in _WEBHOOK_TOKEN_MAP and _is_stale(WEBHOOK_TOKEN_MAP_MIN_REFRESH_SECONDS)
+    ):
+        async with _webhook_map_lock:
+            # Otra corrutina pudo recargar mientras esperábamos el lock.
+            if _is_stale(WEBHOOK_TOKEN_MAP_MIN_REFRESH_SECONDS):
+                await _load_webhook_token_map()
+    return _WEBHOOK_TOKEN_MAP.get(token)
 
 
 async def save_tenant_credential(tenant_id: int, name: str, value: str, category: str = "general") -> bool:
@@ -120,6 +276,7 @@ async def save_tenant_credential(tenant_id: int, name: str, value: str, category
             ON CONFLICT (tenant_id, name) 
             DO UPDATE SET value = $3, category = $4, updated_at = NOW()
         """, tenant_id, name, final_value, category)
+        await invalidate_tenant_credential(tenant_id, name)
         return True
     except Exception as e:
         logger.error(f"Error saving credential {name} for tenant {tenant_id}: {e}")
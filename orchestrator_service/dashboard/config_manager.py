@@ -188,7 +188,11 @@ class ConfigManager:
                 
                 # Actualizar variable de entorno en tiempo de ejecución
                 os.environ[key] = str_value
-                
+
+                if key == "OPENAI_MODEL":
+                    from services.llm_client_pool import invalidate_tenant_llm
+                    invalidate_tenant_llm(tenant_id)
+
                 return True
                 
         except Exception as e:
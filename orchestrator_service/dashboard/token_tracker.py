@@ -11,6 +11,8 @@ from dataclasses import dataclass
 from decimal import Decimal
 import json
 
+import asyncpg
+
 logger = logging.getLogger(__name__)
 
 # Precios por 1M tokens (USD) - Actualizado Marzo 2026 v2
@@ -51,6 +53,31 @@ MODEL_PRICING = {
 # Backward compat alias
 OPENAI_PRICING = MODEL_PRICING
 
+# Escritura en lote: track_usage() solo acumula en memoria; un flusher por proceso
+# escribe cada TOKEN_USAGE_FLUSH_SECONDS (o al llegar a FLUSH_BATCH filas) con
+# COPY + un único UPDATE agregado de tenants, y close() vacía el buffer al apagar.
+FLUSH_INTERVAL_SECONDS = float(os.getenv("TOKEN_USAGE_FLUSH_SECONDS", "5"))
+FLUSH_BATCH = 500
+# Tope del buffer si la DB no responde: se descartan las filas más viejas
+MAX_BUFFERED_ROWS = 20_000
+TOKEN_USAGE_COLUMNS = (
+    "conversation_id", "patient_phone", "model", "input_tokens", "output_tokens",
+    "total_tokens", "cost_usd", "timestamp", "tenant_id",
+)
+_INSERT_TOKEN_USAGE_SQL = (
+    f"INSERT INTO token_usage ({', '.join(TOKEN_USAGE_COLUMNS)}) "
+    f"VALUES ({', '.join(f'${i}' for i in range(1, len(TOKEN_USAGE_COLUMNS) + 1))})"
+)
+# Errores propios de una fila (NULL en NOT NULL, texto demasiado largo, tipo no
+# codificable): reintentar el lote nunca los arregla, así que esas filas se descartan.
+# Cualquier otro error (conexión, DB caída) devuelve el lote entero al buffer.
+_BAD_ROW_ERRORS = (
+    asyncpg.exceptions.DataError,
+    asyncpg.exceptions.IntegrityConstraintViolationError,
+    ValueError,
+    TypeError,
+)
+
 
 async def track_service_usage(pool, tenant_id: int, model: str, input_tokens: int, output_tokens: int, source: str = "unknown", phone: str = "system"):
     """
@@ -74,12 +101,8 @@ async def track_service_usage(pool, tenant_id: int, model: str, input_tokens: in
             timestamp=datetime.utcnow(),
             tenant_id=tenant_id,
         )
-        await token_tracker.track_usage(usage)
-        # Update tenant totals
-        await pool.execute(
-            "UPDATE tenants SET total_tokens_used = COALESCE(total_tokens_used, 0) + $1, total_tool_calls = COALESCE(total_tool_calls, 0) + 1 WHERE id = $2",
-            total, tenant_id
-        )
+        # Buffered: token_usage row + tenant totals are written by the batch flusher
+        await token_tracker.track_usage(usage, update_tenant_totals=True)
         logger.info(f"📊 Service tokens tracked: {source} | {model} | {total} tokens | ${cost}")
     except Exception as e:
         logger.warning(f"⚠️ Service token tracking failed (non-fatal): {e}")
@@ -104,6 +127,13 @@ class TokenTracker:
         self.db_pool = db_pool
         self.logger = logging.getLogger(__name__)
         self._table_ready = False
+        self._rows: List[Tuple] = []
+        # tenant_id -> [tokens, tool_calls] pendientes de sumar en tenants
+        self._tenant_totals: Dict[int, List[int]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+        self._closed = False
+        self.stats = {"buffered": 0, "flushed_rows": 0, "flushes": 0, "flush_errors": 0, "dropped": 0, "bad_rows": 0}
 
     async def ensure_table(self):
         """Crea la tabla de tracking de tokens si no existe"""
@@ -150,33 +180,132 @@ class TokenTracker:
         total_cost = input_cost + output_cost
         return total_cost.quantize(Decimal('0.000001'))  # 6 decimales
     
-    async def track_usage(self, usage: TokenUsage):
-        """Registra uso de tokens en la base de datos"""
+    async def track_usage(self, usage: TokenUsage, update_tenant_totals: bool = False):
+        """
+        Encola el uso de tokens para la próxima escritura en lote (no toca la DB).
+        update_tenant_totals=True además suma total_tokens y una llamada a los
+        contadores de tenants en el mismo flush.
+        """
+        self._rows.append((
+            usage.conversation_id,
+            usage.patient_phone,
+            usage.model,
+            usage.input_tokens,
+            usage.output_tokens,
+            usage.total_tokens,
+            Decimal(str(usage.cost_usd)),
+            usage.timestamp,
+            usage.tenant_id,
+        ))
+        if update_tenant_totals and usage.tenant_id is not None:
+            totals = self._tenant_totals.setdefault(usage.tenant_id, [0, 0])
+            totals[0] += usage.total_tokens
+            totals[1] += 1
+        self.stats["buffered"] += 1
+        if self._closed:
+            await self.flush()
+        elif len(self._rows) >= FLUSH_BATCH and not self._flush_lock.locked():
+            asyncio.create_task(self.flush(), name="token-usage-flush")
+        else:
+            self._ensure_flusher()
+        return True
+
+    def _ensure_flusher(self):
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop(), name="token-usage-flusher")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL_SECONDS)
+            await self.flush()
+
+    async def flush(self) -> int:
+        """
+        Escribe lo acumulado: COPY a token_usage + un UPDATE agregado de tenants, en una transacción.
+        Filas inválidas se descartan (ver _write_rows); un error de conexión devuelve todo al buffer.
+        """
+        async with self._flush_lock:
+            rows, self._rows = self._rows, []
+            totals, self._tenant_totals = self._tenant_totals, {}
+            if not rows and not totals:
+                return 0
+            try:
+                async with self.db_pool.acquire() as conn:
+                    async with conn.transaction():
+                        written = await self._write_rows(conn, rows) if rows else 0
+                        if totals:
+                            # Orden por id: dos réplicas flusheando a la vez bloquean las filas en el mismo orden
+                            ids = sorted(totals)
+                            await conn.execute(
+                                """
+                                UPDATE tenants t
+                                SET total_tokens_used = COALESCE(t.total_tokens_used, 0) + v.tokens,
+                                    total_tool_calls = COALESCE(t.total_tool_calls, 0) + v.calls
+                                FROM unnest($1::int[], $2::bigint[], $3::int[]) AS v(id, tokens, calls)
+                                WHERE t.id = v.id
+                                """,
+                                ids,
+                                [totals[i][0] for i in ids],
+                                [totals[i][1] for i in ids],
+                            )
+            except Exception as e:
+                self.stats["flush_errors"] += 1
+                self._requeue(rows, totals)
+                self.logger.error(f"❌ Error escribiendo lote de token_usage ({len(rows)} filas): {e}")
+                return 0
+            self.stats["flushes"] += 1
+            self.stats["flushed_rows"] += written
+            self.logger.debug(f"✅ Tokens trackeados en lote: {written} filas, {len(totals)} tenants")
+            return written
+
+    async def _write_rows(self, conn, rows: List[Tuple]) -> int:
+        """
+        COPY del lote en un savepoint; si falla por una fila inválida, reintenta
+        fila por fila (un savepoint cada una), descarta y loguea las inválidas y
+        deja el resto en la transacción del flush.
+        """
         try:
-            async with self.db_pool.acquire() as conn:
-                await conn.execute("""
-                    INSERT INTO token_usage 
-                    (conversation_id, patient_phone, model, input_tokens, output_tokens, 
-                     total_tokens, cost_usd, timestamp, tenant_id)
-                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
-                """,
-                usage.conversation_id,
-                usage.patient_phone,
-                usage.model,
-                usage.input_tokens,
-                usage.output_tokens,
-                usage.total_tokens,
-                float(usage.cost_usd),  # Convertir a float para PostgreSQL
-                usage.timestamp,
-                usage.tenant_id
+            async with conn.transaction():
+                await conn.copy_records_to_table(
+                    "token_usage", records=rows, columns=list(TOKEN_USAGE_COLUMNS)
                 )
-                
-                self.logger.debug(f"✅ Tokens trackeados: {usage.total_tokens} tokens, ${usage.cost_usd}")
-                return True
-        except Exception as e:
-            self.logger.error(f"❌ Error trackeando tokens: {e}")
-            return False
-    
+            return len(rows)
+        except _BAD_ROW_ERRORS as e:
+            self.logger.warning(f"⚠️ COPY de token_usage rechazado ({e}); reintentando fila por fila")
+
+        written = 0
+        for row in rows:
+            try:
+                async with conn.transaction():
+                    await conn.execute(_INSERT_TOKEN_USAGE_SQL, *row)
+                written += 1
+            except _BAD_ROW_ERRORS as e:
+                self.stats["bad_rows"] += 1
+                self.logger.error(f"❌ Fila de token_usage descartada ({e}): {row!r:.300}")
+        return written
+
+    def _requeue(self, rows: List[Tuple], totals: Dict[int, List[int]]):
+        """Devuelve un lote fallido al buffer (delante de lo nuevo) para el próximo flush."""
+        self._rows = rows + self._rows
+        overflow = len(self._rows) - MAX_BUFFERED_ROWS
+        if overflow > 0:
+            del self._rows[:overflow]
+            self.stats["dropped"] += overflow
+            self.logger.warning(f"⚠️ token_usage buffer lleno: {overflow} filas descartadas")
+        for tenant_id, (tokens, calls) in totals.items():
+            current = self._tenant_totals.setdefault(tenant_id, [0, 0])
+            current[0] += tokens
+            current[1] += calls
+
+    async def close(self):
+        """Detiene el flusher y escribe lo pendiente (shutdown)."""
+        self._closed = True
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+
     async def get_daily_usage(self, tenant_id: int, days: int = 30) -> List[Dict]:
         """Obtiene uso diario de tokens para un tenant"""
         try:
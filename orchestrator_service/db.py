@@ -165,8 +165,6 @@ class Database:
         Soporta persistencia de IDs de Chatwoot (Spec 34) para respuesta de la IA.
         Automáticamente vincula el paciente existente por teléfono (linked_patient_id).
         """
-        import re
-        
         # 1. Buscar conversación existente
         # ✅ Fase 2: Buscar por ID de Chatwoot primero para evitar splits de ID numérico vs Handle
         existing = None
@@ -244,48 +242,18 @@ class Database:
         # 3. Vincular paciente existente por teléfono (solo WhatsApp, no IG/FB)
         if channel == 'whatsapp' and external_user_id:
             try:
-                # Generar variantes de formato para matchear números de teléfono
-                digits = re.sub(r"\D", "", external_user_id)
-                variants = {digits, "+" + digits, external_user_id}
-                if digits.startswith("549") and len(digits) > 3:
-                    variants.add("54" + digits[3:])
-                    variants.add("+54" + digits[3:])
-                elif digits.startswith("54") and len(digits) > 3:
-                    variants.add("549" + digits[2:])
-                    variants.add("+549" + digits[2:])
-                if digits.startswith("011") and len(digits) > 3:
-                    rest = digits[3:]
-                    variants.add("54911" + rest)
-                    variants.add("+54911" + rest)
-                    variants.add("11" + rest)
-                    variants.add("+11" + rest)
-                elif digits.startswith("11") and len(digits) > 3:
-                    variants.add("549" + digits)
-                    variants.add("+549" + digits)
-                
-                variants_list = list(variants)
-                placeholders = ", ".join(f"${i+2}" for i in range(len(variants_list)))
-                
-                # Buscar paciente existente por múltiples formatos de teléfono
-                patient = await self.pool.fetchrow(
-                    f"""
-                    SELECT id FROM patients
-                    WHERE tenant_id = $1
-                      AND phone_number IN ({placeholders})
-                      AND status != 'deleted'
-                    LIMIT 1
-                """,
-                    tenant_id,
-                    *variants_list,
-                )
+                # Buscar paciente existente por phone_key (cualquier formato del número)
+                from services.phone_lookup import find_patient_id
+
+                patient_id = await find_patient_id(self.pool, tenant_id, external_user_id)
                 
-                if patient:
+                if patient_id:
                     # Setear linked_patient_id si no está ya seteado
                     await self.pool.execute("""
                         UPDATE chat_conversations
                         SET linked_patient_id = $1, linked_at = NOW()
                         WHERE id = $2 AND linked_patient_id IS NULL
-                    """, patient["id"], conv_id)
+                    """, patient_id, conv_id)
             except Exception as link_err:
                 logger.warning(f"⚠️ Error linking patient to conversation {conv_id}: {link_err}")
         
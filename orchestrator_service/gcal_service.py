@@ -13,6 +13,10 @@ logger = logging.getLogger(__name__)
 GOOGLE_CREDENTIALS_JSON = os.getenv("GOOGLE_CREDENTIALS")
 # GOOGLE_CALENDAR_ID REMOVED - STRICT MULTI-TENANCY ENFORCED
 
+class SyncTokenExpired(Exception):
+    """Google invalidated the sync token (HTTP 410): a full resync is required."""
+
+
 class GCalService:
     def __init__(self):
         self.service = self._authenticate()
@@ -127,5 +131,42 @@ class GCalService:
             logger.error(f"Error fetching daily events for {calendar_id}: {e}")
             return []
 
+    def sync_events(self, calendar_id: str, sync_token=None, time_min=None, time_max=None):
+        """
+        Incremental listing for the background sync (events.list + syncToken).
+        Without sync_token it does a full listing of [time_min, time_max).
+        Returns (items, next_sync_token). Cancelled events come back with
+        status == 'cancelled' and must be removed locally.
+        Raises SyncTokenExpired when Google answers 410 (full resync needed).
+        """
+        if not self.service or not calendar_id:
+            return [], None
+
+        params = {"calendarId": calendar_id, "singleEvents": True, "maxResults": 2500}
+        if sync_token:
+            params["syncToken"] = sync_token
+        else:
+            params["timeMin"] = time_min
+            if time_max:
+                params["timeMax"] = time_max
+            params["showDeleted"] = False
+
+        items = []
+        page_token = None
+        while True:
+            if page_token:
+                params["pageToken"] = page_token
+            try:
+                result = self.service.events().list(**params).execute()
+            except HttpError as error:
+                if getattr(error, "resp", None) is not None and error.resp.status == 410:
+                    raise SyncTokenExpired(calendar_id) from error
+                raise
+            items.extend(result.get("items", []))
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                return items, result.get("nextSyncToken")
+
+
 # Singleton instance
 gcal_service = GCalService()
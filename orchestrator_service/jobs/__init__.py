@@ -7,6 +7,9 @@ Jobs disponibles:
 - lead_recovery: Recuperación de leads que no agendaron
 - nova_morning: Resumen matutino diario via Telegram (hora configurable por tenant)
 - smart_alerts: Alertas proactivas cada 4h (no-shows, sin confirmar, morosidad)
+- gcal_sync: Sincronización incremental de Google Calendar (cada minuto)
+- analytics_rollup: Tablas de hechos diarias de analítica (cada minuto + reconciliación nocturna)
+- memory_embeddings: Embeddings faltantes de memorias de pacientes (al iniciar + cada 6h)
 """
 
 import logging
@@ -56,10 +59,34 @@ try:
 except ImportError as e:
     logger.warning(f"⚠️ No se pudo importar job business_insights: {e}")
 
+try:
+    from . import gcal_sync
+    logger.info("✅ Job de sincronización Google Calendar importado correctamente")
+except ImportError as e:
+    logger.warning(f"⚠️ No se pudo importar job gcal_sync: {e}")
+
+try:
+    from . import bulk_send
+    logger.info("✅ Job de envíos masivos importado correctamente")
+except ImportError as e:
+    logger.warning(f"⚠️ No se pudo importar job bulk_send: {e}")
+
 try:
     from . import weekly_backup
     logger.info("✅ Job de backup semanal importado correctamente")
 except ImportError as e:
     logger.warning(f"⚠️ No se pudo importar job weekly_backup: {e}")
 
+try:
+    from . import analytics_rollup
+    logger.info("✅ Job de rollup de analítica importado correctamente")
+except ImportError as e:
+    logger.warning(f"⚠️ No se pudo importar job analytics_rollup: {e}")
+
+try:
+    from . import memory_embeddings
+    logger.info("✅ Job de backfill de embeddings de memorias importado correctamente")
+except ImportError as e:
+    logger.warning(f"⚠️ No se pudo importar job memory_embeddings: {e}")
+
 __all__ = ['followups', 'lead_recovery', 'nova_morning', 'smart_alerts', 'expire_unpaid', 'playbook_executor']
\ No newline at end of file
@@ -199,30 +199,31 @@ async def get_followups_status():
 async def get_scheduler_status():
     """
     Obtiene información sobre el estado del scheduler.
-    
+
+    Combina lo que ve esta réplica (próxima corrida, si está corriendo ahora)
+    con el estado persistido del cluster (última corrida, duración, error y
+    qué réplica la ejecutó).
+
     Returns:
         Dict con información del scheduler y jobs registrados
     """
     try:
-        from .scheduler import scheduler
-        
+        from .scheduler import load_persisted_job_states, scheduler
+
+        persisted = await load_persisted_job_states()
         jobs_info = []
-        for task_func, interval_seconds, run_at_startup in scheduler.tasks:
-            jobs_info.append({
-                "name": task_func.__name__ if hasattr(task_func, '__name__') else str(task_func),
-                "interval_seconds": interval_seconds,
-                "run_at_startup": run_at_startup,
-                "description": task_func.__doc__ or "Sin descripción"
-            })
-        
+        for job in scheduler.status():
+            job["cluster"] = persisted.get(job["name"])
+            jobs_info.append(job)
+
         return {
             "scheduler": {
                 "running": scheduler.running,
-                "total_jobs": len(scheduler.tasks),
+                "total_jobs": len(scheduler.jobs),
                 "jobs": jobs_info
             }
         }
-        
+
     except Exception as e:
         logger.error(f"❌ Error obteniendo estado del scheduler: {e}")
         return {
@@ -232,4 +233,4 @@ async def get_scheduler_status():
                 "total_jobs": 0,
                 "jobs": []
             }
-        }
\ No newline at end of file
+        }
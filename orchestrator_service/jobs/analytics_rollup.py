@@ -0,0 +1,55 @@
+"""Background jobs: keep the daily analytics fact tables current.
+
+- refresh_analytics_rollup (every minute): rebuilds the days the triggers
+  queued in analytics_dirty_days, including the history queued by migration
+  072 on the first runs.
+- reconcile_analytics_rollup (nightly): re-queues and rebuilds a window
+  around today so price changes behind estimated revenue are reflected.
+
+See services/analytics_rollup.py.
+"""
+
+import logging
+
+from .scheduler import schedule_daily_at, scheduler
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_REFRESH_INTERVAL_SECONDS = 60
+
+
+async def refresh_analytics_rollup():
+    """Rebuild the fact rows of every queued (tenant, day)."""
+    try:
+        from db import db
+
+        if not db.pool:
+            return
+
+        from services.analytics_rollup import refresh_dirty_days
+
+        rebuilt = await refresh_dirty_days(db.pool)
+        if rebuilt:
+            logger.info(f"📊 Analytics rollup: {rebuilt} día(s) recalculados")
+    except Exception as e:
+        logger.error(f"📊 refresh_analytics_rollup job error: {e}")
+
+
+@schedule_daily_at(hour=4, minute=30)
+async def reconcile_analytics_rollup():
+    """Nightly reconcile of the recent window of the fact tables."""
+    try:
+        from db import db
+
+        if not db.pool:
+            return
+
+        from services.analytics_rollup import reconcile_recent_days
+
+        rebuilt = await reconcile_recent_days(db.pool)
+        logger.info(f"📊 Analytics rollup reconcile: {rebuilt} día(s) recalculados")
+    except Exception as e:
+        logger.error(f"📊 reconcile_analytics_rollup job error: {e}")
+
+
+scheduler.add_job(refresh_analytics_rollup, ANALYTICS_REFRESH_INTERVAL_SECONDS, run_at_startup=True)
@@ -0,0 +1,35 @@
+"""Background job: resume bulk WhatsApp sends (services/bulk_messaging.py).
+
+Nova starts bulk jobs in-process right away; this job only picks up the ones
+that lost their runner (deploy/restart → stale heartbeat) and the ones parked
+by the messaging-tier limit once their resume_after has passed. Each job
+still runs under its own lease, so two replicas never drain the same job.
+"""
+
+import logging
+
+from .scheduler import scheduler
+
+logger = logging.getLogger(__name__)
+
+BULK_SEND_RESUME_INTERVAL_SECONDS = 60
+
+
+async def resume_bulk_sends():
+    """Restart stale or tier-paused bulk send jobs."""
+    try:
+        from db import db
+
+        if not db.pool:
+            return
+
+        from services.bulk_messaging import resume_bulk_jobs
+
+        resumed = await resume_bulk_jobs(db.pool)
+        if resumed:
+            logger.info(f"📨 Envíos masivos reanudados: {resumed}")
+    except Exception as e:
+        logger.error(f"📨 resume_bulk_sends job error: {e}")
+
+
+scheduler.add_job(resume_bulk_sends, BULK_SEND_RESUME_INTERVAL_SECONDS, run_at_startup=True)
@@ -0,0 +1,38 @@
+"""Background job: incremental Google Calendar sync into google_calendar_blocks.
+
+Runs every minute. Availability checks read only google_calendar_blocks, so
+this job is what keeps Google-provider tenants fresh. Each run costs one
+Google call per professional with a calendar (sync token → usually an empty
+page). See services/gcal_sync.py.
+"""
+
+import logging
+
+from .scheduler import scheduler
+
+logger = logging.getLogger(__name__)
+
+GCAL_SYNC_INTERVAL_SECONDS = 60
+
+
+async def sync_google_calendars():
+    """Pull Google Calendar changes for every professional of google-provider tenants."""
+    try:
+        from db import db
+
+        if not db.pool:
+            return
+
+        from services.gcal_sync import sync_all_google_calendars
+
+        totals = await sync_all_google_calendars(db.pool)
+        if totals["upserted"] or totals["deleted"] or totals["errors"]:
+            logger.info(
+                f"📅 GCal sync: {totals['professionals']} profesionales, "
+                f"{totals['upserted']} upserts, {totals['deleted']} borrados, {totals['errors']} errores"
+            )
+    except Exception as e:
+        logger.error(f"📅 sync_google_calendars job error: {e}")
+
+
+scheduler.add_job(sync_google_calendars, GCAL_SYNC_INTERVAL_SECONDS, run_at_startup=True)
@@ -0,0 +1,44 @@
+"""Background job: embed patient memories stored without an embedding.
+
+Runs at startup (first deploy) and every few hours after that, under the
+scheduler's job lease: one replica embeds the rows, the others skip the
+turn, so a rollout of N replicas does not pay for N backfills. Each run only
+touches rows whose embedding is still NULL (legacy rows, or writes whose
+embedding call failed). See services/patient_memory.backfill_memory_embeddings.
+"""
+
+import logging
+
+from .scheduler import scheduler
+
+logger = logging.getLogger(__name__)
+
+MEMORY_EMBEDDING_BACKFILL_INTERVAL_SECONDS = 6 * 3600
+
+
+async def backfill_patient_memory_embeddings():
+    """Embed missing patient memory embeddings for every tenant."""
+    try:
+        from db import db
+
+        if not db.pool:
+            return
+
+        from services.patient_memory import backfill_memory_embeddings, ensure_memory_table
+
+        await ensure_memory_table(db.pool)
+        tenants = await db.pool.fetch("SELECT id FROM tenants ORDER BY id")
+        total = 0
+        for t in tenants:
+            total += await backfill_memory_embeddings(db.pool, t["id"])
+        if total:
+            logger.info(f"🧠 memory_embedding_backfill_complete: {total} embeddings created")
+    except Exception as e:
+        logger.error(f"🧠 backfill_patient_memory_embeddings job error: {e}")
+
+
+scheduler.add_job(
+    backfill_patient_memory_embeddings,
+    MEMORY_EMBEDDING_BACKFILL_INTERVAL_SECONDS,
+    run_at_startup=True,
+)
@@ -366,6 +366,9 @@ async def _action_send_template(pool, tenant_id, phone, step, variables) -> bool
                     body_params.append({"type": "text", "text": str(variables.get(var_name, "") or "")})
             components = [{"type": "body", "parameters": body_params}] if body_params else None
 
+        from services.bulk_messaging import acquire_send_slot
+
+        await acquire_send_slot(pool, tenant_id)
         yc = YCloudClient(api_key=api_key, business_number=biz_num)
         yc_resp = await yc.send_template(
             to=phone,
@@ -553,6 +556,8 @@ async def _action_send_text(pool, tenant_id, phone, step, variables) -> bool:
             biz_num = await get_tenant_credential(tenant_id, YCLOUD_WHATSAPP_NUMBER)
             if not api_key:
                 return False
+            from services.bulk_messaging import acquire_send_slot
+            await acquire_send_slot(pool, tenant_id)
             yc = YCloudClient(api_key=api_key, business_number=biz_num)
             _yc_resp = await yc.send_text_message(to=phone, text=message)
             _yc_mid = _yc_resp.get("id") if isinstance(_yc_resp, dict) else None
@@ -672,6 +677,8 @@ Respondé SOLO con el mensaje a enviar, o "NO_ENVIAR" si no corresponde."""
             biz_num = await get_tenant_credential(tenant_id, YCLOUD_WHATSAPP_NUMBER)
             if not api_key:
                 return False
+            from services.bulk_messaging import acquire_send_slot
+            await acquire_send_slot(pool, tenant_id)
             yc = YCloudClient(api_key=api_key, business_number=biz_num)
             _yc_resp = await yc.send_text_message(to=phone, text=message)
             _yc_mid = _yc_resp.get("id") if isinstance(_yc_resp, dict) else None
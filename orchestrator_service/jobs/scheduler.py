@@ -1,24 +1,127 @@
 """
-Scheduler simple para jobs periódicos usando asyncio.
+Scheduler para jobs periódicos usando asyncio, seguro con N réplicas.
 Se integra con el evento startup de FastAPI.
 
+Cada réplica corre el mismo loop por job, pero solo una ejecuta cada corrida:
+- Lease por job: `SET jobs:lease:<job> <owner> NX PX` en Redis, renovado
+  mientras el job corre (fallback: pg_try_advisory_lock si no hay Redis).
+- Estado persistido en `scheduled_jobs` (last_run_at / next_run_at /
+  duración / error). Quien toma el lease vuelve a leer next_run_at: si otra
+  réplica ya corrió ese turno, se alinea a su próximo horario en vez de repetir.
+- Catch-up: al reiniciar, una corrida vencida mientras el proceso estaba caído
+  se ejecuta una sola vez (dentro de la ventana catch_up_seconds del job).
+
+Sin Redis ni DB se comporta como antes (corre local en cada proceso).
+
 CLINICASV1.0 - Sistema de Tareas Programadas
 """
 
 import asyncio
+import contextlib
 import logging
-from datetime import datetime, time, timedelta
-from typing import Callable, Coroutine, Any
+import os
 import signal
+import socket
+import time as _time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, time, timedelta, timezone, tzinfo
+from typing import Any, Callable, Coroutine, Dict, Optional
 
 logger = logging.getLogger(__name__)
 
+LEASE_KEY_PREFIX = "jobs:lease:"
+LEASE_TTL_SECONDS = 60
+# Ventana default para recuperar una corrida diaria perdida por un reinicio.
+DAILY_CATCH_UP_SECONDS = 6 * 3600
+# Margen para considerar que otra réplica ya corrió el turno.
+_ALREADY_RAN_TOLERANCE = timedelta(seconds=1)
+
+# Renew / release only if we still own the lease.
+_LUA_RENEW = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_LUA_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_OWNER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+@dataclass
+class JobSpec:
+    """Definición de un job + estadísticas de la última corrida en esta réplica."""
+
+    func: Callable[[], Coroutine[Any, Any, None]]
+    interval_seconds: int = 0
+    run_at_startup: bool = False
+    daily_at: Optional[time] = None
+    tz: Optional[tzinfo] = None
+    catch_up_seconds: Optional[int] = None  # None = siempre recuperar
+    next_run_at: Optional[datetime] = None
+    last_run_at: Optional[datetime] = None
+    last_duration_ms: Optional[int] = None
+    last_status: Optional[str] = None
+    last_error: Optional[str] = None
+    run_count: int = 0
+    skipped_count: int = 0
+    running: bool = field(default=False)
+
+    @property
+    def name(self) -> str:
+        return getattr(self.func, "__name__", str(self.func))
+
+    @property
+    def schedule(self) -> str:
+        if self.daily_at is None:
+            return f"every {self.interval_seconds}s"
+        tz_name = getattr(self.tz, "key", None) or "server"
+        return f"daily {self.daily_at.strftime('%H:%M:%S')} {tz_name}"
+
+    def next_after(self, now: datetime) -> datetime:
+        """Próximo horario (UTC aware) estrictamente posterior a `now`."""
+        if self.daily_at is None:
+            return now + timedelta(seconds=self.interval_seconds)
+        # tz None = hora del servidor, como antes.
+        local_now = now.astimezone(self.tz) if self.tz is not None else now.astimezone()
+        target = datetime.combine(local_now.date(), self.daily_at, tzinfo=local_now.tzinfo)
+        if target <= local_now:
+            target = datetime.combine(local_now.date() + timedelta(days=1), self.daily_at, tzinfo=local_now.tzinfo)
+        return target.astimezone(timezone.utc)
+
+    def as_status(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "schedule": self.schedule,
+            "interval_seconds": self.interval_seconds,
+            "run_at_startup": self.run_at_startup,
+            "running": self.running,
+            "next_run_at": self.next_run_at.isoformat() if self.next_run_at else None,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_duration_ms": self.last_duration_ms,
+            "last_status": self.last_status,
+            "last_error": self.last_error,
+            "run_count": self.run_count,
+            "skipped_count": self.skipped_count,
+            "description": self.func.__doc__ or "Sin descripción",
+        }
+
 
 class JobScheduler:
-    """Scheduler simple para ejecutar jobs periódicos."""
+    """Scheduler de jobs periódicos con lease distribuido por job."""
 
     def __init__(self):
-        self.tasks = []
+        self.jobs: Dict[str, JobSpec] = {}
         self.running = False
         self._running_tasks: list[asyncio.Task] = []
 
@@ -28,7 +131,7 @@ class JobScheduler:
             logger.warning("⚠️ Scheduler ya está ejecutándose")
             return
 
-        logger.info("🚀 Iniciando JobScheduler...")
+        logger.info(f"🚀 Iniciando JobScheduler (owner={_OWNER_ID})...")
         self.running = True
 
         # Registrar handler para shutdown graceful
@@ -36,20 +139,11 @@ class JobScheduler:
         for sig in (signal.SIGTERM, signal.SIGINT):
             loop.add_signal_handler(sig, lambda: asyncio.create_task(self.stop()))
 
-        # Iniciar todos los jobs
-        for task_func, interval_seconds, run_at_startup in self.tasks:
-            if run_at_startup:
-                t = asyncio.create_task(task_func(), name=f"job-startup-{task_func.__name__}")
-                self._running_tasks.append(t)
-
-            # Programar ejecución periódica
-            t = asyncio.create_task(
-                self._run_periodic(task_func, interval_seconds),
-                name=f"job-periodic-{task_func.__name__}",
-            )
+        for spec in self.jobs.values():
+            t = asyncio.create_task(self._run_job(spec), name=f"job-{spec.name}")
             self._running_tasks.append(t)
 
-        logger.info(f"✅ JobScheduler iniciado con {len(self.tasks)} jobs")
+        logger.info(f"✅ JobScheduler iniciado con {len(self.jobs)} jobs")
 
     async def stop(self):
         """Detiene el scheduler de forma graceful — solo cancela sus propias tasks."""
@@ -67,44 +161,251 @@ class JobScheduler:
         await asyncio.gather(*self._running_tasks, return_exceptions=True)
         self._running_tasks.clear()
         logger.info("✅ JobScheduler detenido")
-    
-    def add_job(self, task_func: Callable[[], Coroutine[Any, Any, None]], 
+
+    def add_job(self, task_func: Callable[[], Coroutine[Any, Any, None]],
                 interval_seconds: int, run_at_startup: bool = False):
         """
         Registra un job para ejecución periódica.
-        
+
         Args:
             task_func: Función async a ejecutar
             interval_seconds: Intervalo en segundos entre ejecuciones
-            run_at_startup: Si se ejecuta inmediatamente al iniciar
+            run_at_startup: Si se ejecuta inmediatamente la primera vez que
+                se registra (sin estado persistido previo)
         """
-        self.tasks.append((task_func, interval_seconds, run_at_startup))
+        self._register(JobSpec(func=task_func, interval_seconds=interval_seconds,
+                               run_at_startup=run_at_startup))
         logger.info(f"📋 Job registrado: {task_func.__name__} cada {interval_seconds}s")
-    
-    async def _run_periodic(self, task_func: Callable[[], Coroutine[Any, Any, None]],
-                           interval_seconds: int):
-        """Ejecuta una función periódicamente."""
-        if interval_seconds <= 0:
-            return  # Daily tasks manage their own loop via schedule_daily_at
-        while self.running:
+
+    def _register(self, spec: JobSpec):
+        if spec.name in self.jobs:
+            logger.warning(f"⚠️ Job {spec.name} registrado dos veces — se usa la última definición")
+        self.jobs[spec.name] = spec
+
+    def status(self) -> list[Dict[str, Any]]:
+        return [spec.as_status() for spec in self.jobs.values()]
+
+    # ── Loop por job ──
+
+    async def _run_job(self, spec: JobSpec):
+        """Duerme hasta next_run_at y ejecuta el job bajo lease, para siempre."""
+        try:
+            spec.next_run_at = await self._initial_next_run(spec)
+            while self.running:
+                delay = (spec.next_run_at - _utcnow()).total_seconds()
+                logger.debug(f"⏰ {spec.name} próxima corrida {spec.next_run_at.isoformat()} (en {delay:.0f}s)")
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if not self.running:
+                    break
+                try:
+                    spec.next_run_at = await self._run_once(spec)
+                except Exception as e:
+                    # Falla de coordinación (lease/DB), no del job: reintentar pronto.
+                    logger.error(f"❌ Scheduler no pudo correr {spec.name}: {e}")
+                    spec.next_run_at = _utcnow() + timedelta(seconds=60)
+        except asyncio.CancelledError:
+            pass
+
+    async def _initial_next_run(self, spec: JobSpec) -> datetime:
+        now = _utcnow()
+        persisted = await _load_next_run(spec.name)
+        if persisted is None:
+            return now if spec.run_at_startup else spec.next_after(now)
+        if persisted > now:
+            return persisted
+        # Turno perdido mientras el proceso estaba caído.
+        missed_for = (now - persisted).total_seconds()
+        if spec.catch_up_seconds is None or missed_for <= spec.catch_up_seconds:
+            logger.info(f"⏪ {spec.name}: corrida vencida hace {missed_for:.0f}s — catch-up")
+            return now
+        logger.info(f"⏭️ {spec.name}: corrida vencida hace {missed_for:.0f}s fuera de ventana, se omite")
+        return spec.next_after(now)
+
+    async def _run_once(self, spec: JobSpec) -> datetime:
+        """Ejecuta una corrida si esta réplica gana el lease. Devuelve el próximo horario."""
+        due = spec.next_run_at or _utcnow()
+        async with job_lease(spec.name) as acquired:
+            now = _utcnow()
+            if not acquired:
+                # Otra réplica la está corriendo: saltar este turno.
+                spec.skipped_count += 1
+                logger.debug(f"⏭️ {spec.name}: lease tomado por otra réplica")
+                return spec.next_after(now)
+
+            persisted = await _load_next_run(spec.name)
+            if persisted is not None and persisted > now + _ALREADY_RAN_TOLERANCE:
+                # Otra réplica ya corrió este turno y publicó el siguiente.
+                spec.skipped_count += 1
+                return persisted
+
+            logger.debug(f"⏰ Ejecutando job: {spec.name}")
+            spec.running = True
+            started = _time.monotonic()
+            status, error = "ok", None
             try:
-                await asyncio.sleep(interval_seconds)
-                if self.running:
-                    logger.debug(f"⏰ Ejecutando job: {task_func.__name__}")
-                    await task_func()
-            except asyncio.CancelledError:
-                break
+                await spec.func()
             except Exception as e:
-                logger.error(f"❌ Error en job {task_func.__name__}: {e}")
-                # Esperar antes de reintentar
-                await asyncio.sleep(min(300, interval_seconds))  # Máximo 5 minutos
+                status, error = "error", str(e)[:500]
+                logger.error(f"❌ Error en job {spec.name}: {e}")
+            finally:
+                spec.running = False
+
+            finished = _utcnow()
+            # max(): un sleep que despierta unos ms antes no repite el turno diario.
+            next_run = spec.next_after(max(finished, due))
+            if status == "error" and spec.daily_at is None:
+                # Reintentar antes, como el backoff anterior (máximo 5 minutos).
+                next_run = min(next_run, finished + timedelta(seconds=300))
+            spec.last_run_at = now
+            spec.last_duration_ms = int((_time.monotonic() - started) * 1000)
+            spec.last_status = status
+            spec.last_error = error
+            spec.run_count += 1
+            await _save_run(spec, next_run)
+            return next_run
+
+
+# ── Lease distribuido ──
+
+@contextlib.asynccontextmanager
+async def job_lease(job_name: str, ttl_seconds: int = LEASE_TTL_SECONDS):
+    """
+    Yields True si esta réplica obtuvo el lease exclusivo del job.
+
+    Redis (renovado en background mientras dura el bloque) → advisory lock
+    de Postgres → sin coordinación (True), en ese orden de disponibilidad.
+    """
+    try:
+        from services.relay import get_redis
+        r = get_redis()
+    except Exception:
+        r = None
+
+    if r is not None:
+        key = f"{LEASE_KEY_PREFIX}{job_name}"
+        try:
+            acquired = await r.set(key, _OWNER_ID, nx=True, px=ttl_seconds * 1000)
+        except Exception as e:
+            logger.warning(f"⚠️ Lease Redis no disponible para {job_name}: {e}")
+        else:
+            if not acquired:
+                yield False
+                return
+            renewer = asyncio.create_task(_renew_lease(r, key, ttl_seconds))
+            try:
+                yield True
+            finally:
+                renewer.cancel()
+                try:
+                    await r.eval(_LUA_RELEASE, 1, key, _OWNER_ID)
+                except Exception as e:
+                    logger.debug(f"Lease release failed for {job_name}: {e}")
+            return
+
+    pool = None
+    try:
+        from db import db
+        pool = db.pool
+    except Exception:
+        pass
+    if pool is None:
+        yield True
+        return
+
+    conn = await pool.acquire()
+    try:
+        acquired = await conn.fetchval("SELECT pg_try_advisory_lock(hashtext($1))", f"job:{job_name}")
+        try:
+            yield bool(acquired)
+        finally:
+            if acquired:
+                await conn.execute("SELECT pg_advisory_unlock(hashtext($1))", f"job:{job_name}")
+    finally:
+        await pool.release(conn)
+
+
+async def _renew_lease(r, key: str, ttl_seconds: int):
+    while True:
+        await asyncio.sleep(ttl_seconds / 3)
+        try:
+            if not await r.eval(_LUA_RENEW, 1, key, _OWNER_ID, ttl_seconds * 1000):
+                logger.warning(f"⚠️ Lease {key} perdido durante la ejecución")
+                return
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo renovar lease {key}: {e}")
+
+
+# ── Estado persistido (scheduled_jobs) ──
+
+async def _load_next_run(job_name: str) -> Optional[datetime]:
+    try:
+        from db import db
+        if not db.pool:
+            return None
+        return await db.pool.fetchval(
+            "SELECT next_run_at FROM scheduled_jobs WHERE job_name = $1", job_name
+        )
+    except Exception as e:
+        logger.debug(f"scheduled_jobs read failed for {job_name}: {e}")
+        return None
+
+
+async def _save_run(spec: JobSpec, next_run: datetime):
+    try:
+        from db import db
+        if not db.pool:
+            return
+        await db.pool.execute(
+            """
+            INSERT INTO scheduled_jobs (job_name, schedule, last_run_at, next_run_at,
+                                        last_duration_ms, last_status, last_error,
+                                        last_run_by, run_count, updated_at)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, 1, NOW())
+            ON CONFLICT (job_name) DO UPDATE SET
+                schedule = EXCLUDED.schedule,
+                last_run_at = EXCLUDED.last_run_at,
+                next_run_at = EXCLUDED.next_run_at,
+                last_duration_ms = EXCLUDED.last_duration_ms,
+                last_status = EXCLUDED.last_status,
+                last_error = EXCLUDED.last_error,
+                last_run_by = EXCLUDED.last_run_by,
+                run_count = scheduled_jobs.run_count + 1,
+                updated_at = NOW()
+            """,
+            spec.name, spec.schedule, spec.last_run_at, next_run,
+            spec.last_duration_ms, spec.last_status, spec.last_error, _OWNER_ID,
+        )
+    except Exception as e:
+        logger.debug(f"scheduled_jobs write failed for {spec.name}: {e}")
+
+
+async def load_persisted_job_states() -> Dict[str, Dict[str, Any]]:
+    """Estado de todos los jobs tal como lo ve el cluster (tabla scheduled_jobs)."""
+    try:
+        from db import db
+        if not db.pool:
+            return {}
+        rows = await db.pool.fetch("SELECT * FROM scheduled_jobs")
+    except Exception as e:
+        logger.debug(f"scheduled_jobs status read failed: {e}")
+        return {}
+    states = {}
+    for row in rows:
+        state = dict(row)
+        for k, v in state.items():
+            if isinstance(v, datetime):
+                state[k] = v.isoformat()
+        states[state["job_name"]] = state
+    return states
 
 
 # Instancia global del scheduler
 scheduler = JobScheduler()
 
 
-def schedule_daily_at(hour: int, minute: int = 0, second: int = 0, tz=None):
+def schedule_daily_at(hour: int, minute: int = 0, second: int = 0, tz=None,
+                      catch_up_seconds: Optional[int] = DAILY_CATCH_UP_SECONDS):
     """
     Decorador para programar un job diario a una hora específica.
 
@@ -115,38 +416,16 @@ def schedule_daily_at(hour: int, minute: int = 0, second: int = 0, tz=None):
         tz: zona horaria (tzinfo). Si se pasa, 'hour' se interpreta en ESA zona
             (ej. ZoneInfo('America/Argentina/Buenos_Aires') = hora Argentina).
             Si es None, se usa la hora del servidor (naive = UTC) como hasta ahora.
+        catch_up_seconds: si un reinicio hizo perder la corrida, se recupera
+            solo si no pasó más que esto desde el horario (None = siempre).
     """
     def decorator(task_func: Callable[[], Coroutine[Any, Any, None]]):
-        async def scheduled_task():
-            """Task que calcula el próximo tiempo de ejecución y se auto-reprograma."""
-            while True:
-                now = datetime.now(tz) if tz is not None else datetime.now()
-                target_time = time(hour, minute, second)
-
-                # Calcular segundos hasta la próxima ejecución (en la zona horaria dada si tz != None)
-                if now.time() < target_time:
-                    target_datetime = datetime.combine(now.date(), target_time)
-                else:
-                    target_datetime = datetime.combine(now.date() + timedelta(days=1), target_time)
-                if tz is not None:
-                    target_datetime = target_datetime.replace(tzinfo=tz)
-
-                seconds_until_target = (target_datetime - now).total_seconds()
-
-                logger.info(f"⏰ {task_func.__name__} programado para {target_datetime.strftime('%Y-%m-%d %H:%M:%S')} "
-                          f"(en {seconds_until_target:.0f} segundos)")
-
-                await asyncio.sleep(seconds_until_target)
-                try:
-                    await task_func()
-                except Exception as e:
-                    logger.error(f"❌ Error en job diario {task_func.__name__}: {e}")
-
-        # Registrar como run_at_startup para que el scheduler lo lance una vez.
-        # El loop interno de scheduled_task se encarga de la re-programación.
-        # interval_seconds=0 indica que _run_periodic NO debe lanzarlo de nuevo.
-        scheduler.tasks.append((scheduled_task, 0, True))
-
+        scheduler._register(JobSpec(
+            func=task_func,
+            daily_at=time(hour, minute, second),
+            tz=tz,
+            catch_up_seconds=catch_up_seconds,
+        ))
         return task_func
 
     return decorator
@@ -159,4 +438,4 @@ async def start_scheduler():
 
 async def stop_scheduler():
     """Función para detener el scheduler desde main.py"""
-    await scheduler.stop()
\ No newline at end of file
+    await scheduler.stop()
@@ -897,94 +897,31 @@ def generate_free_slots(
     max_time: Optional[str] = None,
 ) -> List[str]:
     """Genera lista de horarios disponibles (si al menos un profesional tiene el hueco COMPLETO
-    para la duración del tratamiento). Verificación con granularidad de 15 min para evitar solapamientos."""
-    slots = []
+    para la duración del tratamiento). Verificación con granularidad de 15 min para evitar solapamientos.
+    La evaluación es vectorizada (services.availability_engine) con la misma semántica del loop original."""
+    from services.availability_engine import free_slots_from_busy_sets, hhmm_to_minute
 
-    # Parse start and end times
-    try:
-        sh, sm = map(int, start_time_str.split(":"))
-        eh, em = map(int, end_time_str.split(":"))
-    except:
-        sh, sm = 9, 0
-        eh, em = 18, 0
-
-    current = datetime.combine(target_date, datetime.min.time()).replace(
-        hour=sh, minute=sm, tzinfo=get_active_tz()
-    )
-    end_limit = datetime.combine(target_date, datetime.min.time()).replace(
-        hour=eh, minute=em, tzinfo=get_active_tz()
-    )
+    start_minute = hhmm_to_minute(start_time_str)
+    end_minute = hhmm_to_minute(end_time_str)
+    if start_minute is None or end_minute is None:
+        start_minute, end_minute = 9 * 60, 18 * 60
 
+    # No ofrecer turnos en el pasado (si es hoy)
     now = get_now_arg()
-
-    # Un horario está libre si AL MENOS UN profesional está libre durante TODA la duración solicitada
-    while current < end_limit:
-        # No ofrecer turnos en el pasado (si es hoy)
-        if target_date == now.date() and current <= now:
-            current += timedelta(minutes=interval_minutes)
-            continue
-
-        # Filtro por preferencia de horario
-        if time_preference == "mañana" and current.hour >= 13:
-            current += timedelta(minutes=interval_minutes)
-            continue
-        if time_preference == "tarde" and current.hour < 13:
-            current += timedelta(minutes=interval_minutes)
-            continue
-        if time_preference == "noche" and current.hour < 19:
-            current += timedelta(minutes=interval_minutes)
-            continue
-
-        # Filtro por horario mínimo ("después de las X")
-        if min_time:
-            try:
-                min_h, min_m = map(int, min_time.strip().split(":"))
-                if current.hour < min_h or (current.hour == min_h and current.minute < min_m):
-                    current += timedelta(minutes=interval_minutes)
-                    continue
-            except (ValueError, IndexError):
-                pass  # malformed min_time → no filtering
-
-        # Filtro por horario máximo ("antes de las X")
-        if max_time:
-            try:
-                max_h, max_m = map(int, max_time.strip().split(":"))
-                if current.hour > max_h or (current.hour == max_h and current.minute > max_m):
-                    current += timedelta(minutes=interval_minutes)
-                    continue
-            except (ValueError, IndexError):
-                pass  # malformed max_time → no filtering
-
-        # Verificar si algún profesional tiene el hueco libre para TODA la duración
-        time_needed = current + timedelta(minutes=duration_minutes)
-        if time_needed > end_limit:  # No cabe al final del día
-            current += timedelta(minutes=interval_minutes)
-            continue
-
-        any_prof_free = False
-        for prof_id, busy_set in busy_intervals_by_prof.items():
-            slot_free = True
-            # Verificar cada bloque de 15 min dentro de la duración del tratamiento
-            check_time = current
-            while check_time < time_needed:
-                if check_time.strftime("%H:%M") in busy_set:
-                    slot_free = False
-                    break
-                check_time += timedelta(minutes=15)
-
-            if slot_free:
-                any_prof_free = True
-                break
-
-        if any_prof_free:
-            slots.append(current.strftime("%H:%M"))
-
-        if len(slots) >= limit:
-            break
-
-        current += timedelta(minutes=interval_minutes)
-
-    return slots
+    past_cutoff = now.hour * 60 + now.minute if target_date == now.date() else None
+
+    return free_slots_from_busy_sets(
+        busy_intervals_by_prof,
+        start_minute,
+        end_minute,
+        duration_minutes,
+        interval_minutes=interval_minutes,
+        limit=limit,
+        time_preference=time_preference,
+        min_time=min_time,
+        max_time=max_time,
+        not_after_or_at=past_cutoff,
+    )
 
 
 def slots_to_ranges(slots: List[str], interval_minutes: int = 30) -> str:
@@ -1216,14 +1153,28 @@ async def _mark_blocked_profs_busy(
     """Marca TODO el día ocupado en busy_map para cada profesional que tenga un cierre /
     día especial cargado en tenant_holidays (scope='professional') para esa fecha.
 
-    Helper compartido entre el día base de check_availability y la búsqueda multi-día
-    (_get_slots_for_extra_day) para evitar que un path quede atrás (drift). is_holiday
+    La búsqueda multi-día aplica el mismo criterio en _build_availability_bitmap para
+    evitar que un path quede atrás (drift). is_holiday
     con professional_id ya contempla tanto el día especial del profesional
     (scope='professional') como los feriados/cierres globales, así que una sola llamada
     por profesional cubre ambos casos. book_appointment aplica el mismo criterio vía
-    su propio check_prof_block, manteniendo paridad oferta↔reserva.
+    su propio check_prof_block, manteniendo paridad oferta↔reserva. Todos los profesionales
+    se resuelven juntos desde el calendario cacheado del tenant (is_holiday como fallback).
     """
-    from services.holiday_service import is_holiday as _is_holiday
+    from services.holiday_service import (
+        is_holiday as _is_holiday,
+        resolve_professional_holiday_range,
+    )
+
+    try:
+        _resolved = (
+            await resolve_professional_holiday_range(
+                db.pool, tenant_id, target_date, target_date, [p["id"] for p in active_professionals]
+            )
+        ).get(target_date, {})
+    except Exception as e:
+        logger.warning(f"📅 holiday range resolve failed (falling back to per-professional): {e}")
+        _resolved = {}
 
     try:
         sh, sm = int(day_start.split(":")[0]), int(day_start.split(":")[1])
@@ -1233,9 +1184,12 @@ async def _mark_blocked_profs_busy(
 
     for prof in active_professionals:
         prof_id = prof["id"]
-        _is_blocked, _blk_name, _blk_hours = await _is_holiday(
-            db.pool, tenant_id, target_date, professional_id=prof_id
-        )
+        if prof_id in _resolved:
+            _is_blocked, _blk_name, _blk_hours = _resolved[prof_id]
+        else:
+            _is_blocked, _blk_name, _blk_hours = await _is_holiday(
+                db.pool, tenant_id, target_date, professional_id=prof_id
+            )
         # Cierre del profesional sin horario especial → todo el día ocupado.
         # Si trae custom_hours (override_open) se respeta el horario y NO se bloquea.
         if _is_blocked and not _blk_hours:
@@ -1257,6 +1211,10 @@ async def _mark_blocked_profs_busy(
             )
 
 
+# Días que compila cada pasada del bitmap en la búsqueda por rango / expansión.
+_RANGE_CHUNK_DAYS = 7
+
+
 async def _get_slots_for_extra_day(
     target_date,
     tenant_id: int,
@@ -1269,6 +1227,7 @@ async def _get_slots_for_extra_day(
     prefetched_gcal_blocks: Optional[dict] = None,
     min_time: Optional[str] = None,
     max_time: Optional[str] = None,
+    range_cache: Optional[dict] = None,
 ) -> List[str]:
     """Obtiene slots libres para un día extra (para completar opciones multi-día). Versión simplificada.
 
@@ -1279,7 +1238,16 @@ async def _get_slots_for_extra_day(
     prefetched_appointments: dict keyed by date → list of appointment records (avoids per-day DB query)
     prefetched_gcal_blocks: dict keyed by date → list of gcal_block records (avoids per-day DB query)
     When provided, skips the two per-day SELECT queries entirely (N+1 fix).
+    range_cache: estado de pick_representative_slots. Con él, profesionales se resuelven una
+    vez y el bitmap se compila de a _RANGE_CHUNK_DAYS días habilitados (no una pasada por día).
     """
+    if range_cache is not None:
+        return await _get_range_day_slots(
+            range_cache, target_date, tenant_id, tenant_wh, professional_name,
+            treatment_name, duration, time_preference, prefetched_appointments,
+            prefetched_gcal_blocks, min_time, max_time,
+        )
+
     # Verificar feriado antes de cualquier cálculo — si es feriado retornar vacío
     from services.holiday_service import is_holiday as check_is_holiday
 
@@ -1298,7 +1266,99 @@ async def _get_slots_for_extra_day(
     if not tenant_day_cfg and target_date.weekday() == 6:  # domingo sin config
         return []
 
-    # Obtener profesionales activos
+    active_professionals, duration = await _load_extra_day_professionals(
+        tenant_id, professional_name, treatment_name, duration
+    )
+    if not active_professionals:
+        return []
+
+    bitmap = await _build_availability_bitmap(
+        tenant_id,
+        tenant_wh,
+        active_professionals,
+        [target_date],
+        prefetched_appointments=prefetched_appointments,
+        prefetched_gcal_blocks=prefetched_gcal_blocks,
+        holidays={target_date: (_is_hol, _custom_hours)},
+    )
+    return bitmap.free_slots(
+        target_date,
+        duration,
+        step_minutes=15,
+        limit=50,
+        time_preference=time_preference,
+        min_time=min_time,
+        max_time=max_time,
+        now=get_now_arg(),
+    )
+
+
+async def _get_range_day_slots(
+    range_cache: dict,
+    target_date,
+    tenant_id: int,
+    tenant_wh: dict,
+    professional_name: Optional[str],
+    treatment_name: Optional[str],
+    duration: int,
+    time_preference: Optional[str],
+    prefetched_appointments: Optional[dict],
+    prefetched_gcal_blocks: Optional[dict],
+    min_time: Optional[str],
+    max_time: Optional[str],
+) -> List[str]:
+    """Slots de target_date desde range_cache; si el día no está compilado, compila el bitmap
+    de target_date + los próximos días habilitados (hasta _RANGE_CHUNK_DAYS) en una pasada."""
+    day_slots = range_cache["slots"]
+    if target_date not in day_slots:
+        if range_cache.get("professionals") is None:
+            range_cache["professionals"], range_cache["duration"] = await _load_extra_day_professionals(
+                tenant_id, professional_name, treatment_name, duration
+            )
+        is_searchable = range_cache.get("is_searchable") or (lambda d: True)
+        until = range_cache.get("until") or target_date
+        chunk = [target_date] + [
+            d
+            for d in (target_date + timedelta(days=i) for i in range(1, _RANGE_CHUNK_DAYS))
+            if d <= until and d not in day_slots and is_searchable(d)
+        ]
+        if not range_cache["professionals"]:
+            day_slots.update({d: [] for d in chunk})
+        else:
+            bitmap = await _build_availability_bitmap(
+                tenant_id,
+                tenant_wh,
+                range_cache["professionals"],
+                chunk,
+                prefetched_appointments=prefetched_appointments,
+                prefetched_gcal_blocks=prefetched_gcal_blocks,
+            )
+            day_slots.update(
+                bitmap.free_slots_by_day(
+                    range_cache["duration"],
+                    step_minutes=15,
+                    limit=50,
+                    time_preference=time_preference,
+                    min_time=min_time,
+                    max_time=max_time,
+                    now=get_now_arg(),
+                    days=chunk,
+                )
+            )
+    return day_slots.get(target_date, [])
+
+
+async def _load_extra_day_professionals(
+    tenant_id: int,
+    professional_name: Optional[str],
+    treatment_name: Optional[str],
+    duration: int,
+) -> tuple:
+    """Profesionales activos candidatos (por nombre o por tratamiento asignado) y la
+    duración efectiva del tratamiento. La búsqueda multi-día lo resuelve una sola vez.
+
+    Returns: (active_professionals, duration)
+    """
     clean_name = None
     if professional_name:
         clean_name = re.sub(
@@ -1320,7 +1380,7 @@ async def _get_slots_for_extra_day(
 
     active_professionals = await db.pool.fetch(query, *params)
     if not active_professionals:
-        return []
+        return [], duration
 
     # Filtrar por tratamiento si aplica
     if treatment_name and not clean_name:
@@ -1345,188 +1405,110 @@ async def _get_slots_for_extra_day(
                 active_professionals = [
                     p for p in active_professionals if p["id"] in assigned_set
                 ]
-                if not active_professionals:
-                    return []
 
-    # Construir busy_map — use pre-fetched data when available to avoid N+1 queries
-    prof_ids = [p["id"] for p in active_professionals]
+    return list(active_professionals), duration
 
-    if prefetched_appointments is not None:
-        # Use pre-fetched batch data: filter by prof_ids for this day
-        day_key = target_date
-        all_day_apts = prefetched_appointments.get(day_key, [])
-        appointments = [r for r in all_day_apts if r["professional_id"] in prof_ids]
-    else:
-        start_day = datetime.combine(
-            target_date, datetime.min.time(), tzinfo=get_active_tz()
-        )
-        end_day = datetime.combine(target_date, datetime.max.time(), tzinfo=get_active_tz())
-        appointments = await db.pool.fetch(
-            """
-            SELECT professional_id, appointment_datetime as start, duration_minutes
-            FROM appointments
-            WHERE tenant_id = $1 AND (professional_id = ANY($2) OR professional_id IS NULL) AND status IN ('scheduled', 'confirmed')
-            AND (appointment_datetime < $4 AND (appointment_datetime + interval '1 minute' * COALESCE(duration_minutes, 60)) > $3)
-        """,
-            tenant_id,
-            prof_ids,
-            start_day,
-            end_day,
-        )
 
-    if prefetched_gcal_blocks is not None:
-        day_key = target_date
-        all_day_blocks = prefetched_gcal_blocks.get(day_key, [])
-        gcal_blocks = [
-            r for r in all_day_blocks
-            if r["professional_id"] is None or r["professional_id"] in prof_ids
-        ]
-    else:
-        # Ensure start_day/end_day are defined (may not be if prefetched_appointments path ran)
-        if prefetched_appointments is None:
-            # start_day/end_day already set in the appointments fallback block above
-            pass
-        else:
-            # prefetched_appointments was provided (fast path), so start_day/end_day were
-            # never computed — compute them now for the gcal fallback query
-            start_day = datetime.combine(
-                target_date, datetime.min.time(), tzinfo=get_active_tz()
-            )
-            end_day = datetime.combine(target_date, datetime.max.time(), tzinfo=get_active_tz())
-        # GCal blocks (si existen en DB, sin JIT fetch para no ralentizar)
-        gcal_blocks = await db.pool.fetch(
-            """
-            SELECT professional_id, start_datetime as start, end_datetime as end
-            FROM google_calendar_blocks
-            WHERE tenant_id = $1 AND (professional_id = ANY($2) OR professional_id IS NULL)
-            AND (start_datetime < $4 AND end_datetime > $3)
-        """,
-            tenant_id,
-            prof_ids,
-            start_day,
-            end_day,
-        )
+async def _build_availability_bitmap(
+    tenant_id: int,
+    tenant_wh: dict,
+    active_professionals: list,
+    days: list,
+    prefetched_appointments: Optional[dict] = None,
+    prefetched_gcal_blocks: Optional[dict] = None,
+    holidays: Optional[dict] = None,
+):
+    """Compila el AvailabilityBitmap (minuto a minuto, por profesional) de `days`.
 
-    busy_map = {pid: set() for pid in prof_ids}
+    Feriados globales y cierres por profesional (tenant_holidays) se resuelven para todo el
+    rango desde el calendario cacheado del tenant (misma cadena de prioridad que is_holiday,
+    que queda como fallback) → paridad oferta↔reserva con el día base.
+    holidays: date → (is_holiday, custom_hours) ya resueltos (evita re-consultar).
+    Sin datos pre-cargados, turnos y bloques se traen en 2 queries para todo el rango.
+    """
+    from services.availability_engine import compile_availability
+    from services.holiday_service import (
+        is_holiday as check_is_holiday,
+        resolve_holiday_range,
+        resolve_professional_holiday_range,
+    )
 
-    for prof in active_professionals:
-        wh = prof.get("working_hours")
-        if isinstance(wh, str):
-            try:
-                wh = json.loads(wh) if wh else {}
-            except Exception:
-                wh = {}
-        if not isinstance(wh, dict):
-            wh = {}
-        day_config = wh.get(day_name_en, {})
-        if day_config.get("enabled") and day_config.get("slots"):
-            check_time = datetime.combine(target_date, datetime.min.time()).replace(
-                hour=8, minute=0
-            )
-            while check_time.hour < 20:
-                h_m = check_time.strftime("%H:%M")
-                if not is_time_in_working_hours(h_m, day_config):
-                    busy_map[prof["id"]].add(h_m)
-                check_time += timedelta(minutes=15)
-        elif day_config.get("enabled") is False:
-            # Professional explicitly disabled for this day → mark ALL hours as busy
-            check_time = datetime.combine(target_date, datetime.min.time()).replace(
-                hour=6, minute=0
-            )
-            while check_time.hour < 23:
-                busy_map[prof["id"]].add(check_time.strftime("%H:%M"))
-                check_time += timedelta(minutes=15)
-
-    global_busy = set()
-    for b in gcal_blocks:
-        it = b["start"].astimezone(get_active_tz())
-        while it < b["end"].astimezone(get_active_tz()):
-            h_m = it.strftime("%H:%M")
-            if b["professional_id"]:
-                if b["professional_id"] in busy_map:
-                    busy_map[b["professional_id"]].add(h_m)
+    days = sorted(days)
+    holidays = dict(holidays or {})
+    open_days = set()
+    blocked_professionals: dict = {}
+    try:
+        global_holidays = await resolve_holiday_range(db.pool, tenant_id, days[0], days[-1])
+        prof_holidays = await resolve_professional_holiday_range(
+            db.pool, tenant_id, days[0], days[-1], [p["id"] for p in active_professionals]
+        )
+    except Exception as e:
+        logger.warning(f"📅 holiday range resolve failed (falling back to per-day): {e}")
+        global_holidays = prof_holidays = None
+    for d in days:
+        if d not in holidays:
+            if global_holidays is not None:
+                _is_hol, _hol_name, _custom_hours = global_holidays[d]
             else:
-                global_busy.add(h_m)
-            it += timedelta(minutes=15)
-
-    for appt in appointments:
-        it = appt["start"].astimezone(get_active_tz())
-        # Coalesce duración NULL/<=0 (paridad con el día-semilla): evita crashear el día
-        # entero y ofrecer un slot que book_appointment rechazaría por overlap.
-        appt_duration = (
-            appt["duration_minutes"] if appt["duration_minutes"] is not None else 60
-        )
-        if appt_duration <= 0:
-            appt_duration = 30
-        end_it = it + timedelta(minutes=appt_duration)
-        pid = appt["professional_id"]
-        if pid not in busy_map:
+                _is_hol, _hol_name, _custom_hours = await check_is_holiday(db.pool, tenant_id, d)
+            holidays[d] = (_is_hol, _custom_hours)
+        _is_hol, _custom_hours = holidays[d]
+        if _is_hol and not _custom_hours:
             continue
-        # Marcar CADA slot de 15 min desde el inicio exacto + backfill de bordes de 30 min
-        # (igual que el día-semilla): un turno desalineado :15/:45 ya no deja libre el :30.
-        check = it.replace(second=0, microsecond=0)
-        while check < end_it:
-            busy_map[pid].add(check.strftime("%H:%M"))
-            check += timedelta(minutes=15)
-        boundary = it.replace(minute=(it.minute // 30) * 30, second=0, microsecond=0)
-        while boundary < end_it:
-            busy_map[pid].add(boundary.strftime("%H:%M"))
-            boundary += timedelta(minutes=30)
-
-    for pid in busy_map:
-        busy_map[pid].update(global_busy)
-
-    # Determinar rango horario
-    day_start = CLINIC_HOURS_START
-    day_end = CLINIC_HOURS_END
-    tenant_day_slots = (
-        tenant_day_cfg.get("slots", []) if tenant_day_cfg.get("enabled") else []
-    )
-    if tenant_day_slots:
-        day_start = min(s["start"] for s in tenant_day_slots)
-        day_end = max(s["end"] for s in tenant_day_slots)
-        if len(tenant_day_slots) > 1:
-            sorted_slots = sorted(tenant_day_slots, key=lambda s: s["start"])
-            for i in range(len(sorted_slots) - 1):
-                gap_start = sorted_slots[i]["end"]
-                gap_end = sorted_slots[i + 1]["start"]
-                gs_h, gs_m = map(int, gap_start.split(":"))
-                ge_h, ge_m = map(int, gap_end.split(":"))
-                gap_t = datetime.combine(target_date, datetime.min.time()).replace(
-                    hour=gs_h, minute=gs_m
+        open_days.add(d)
+        for prof in active_professionals:
+            if prof_holidays is not None:
+                _is_blocked, _blk_name, _blk_hours = prof_holidays[d][prof["id"]]
+            else:
+                _is_blocked, _blk_name, _blk_hours = await check_is_holiday(
+                    db.pool, tenant_id, d, professional_id=prof["id"]
                 )
-                gap_end_t = datetime.combine(target_date, datetime.min.time()).replace(
-                    hour=ge_h, minute=ge_m
+            # Cierre del profesional sin horario especial → todo el día ocupado.
+            if _is_blocked and not _blk_hours:
+                blocked_professionals.setdefault(d, set()).add(prof["id"])
+                logger.info(
+                    f"📅 PROFESSIONAL BLOCK: prof={prof['id']} ({prof.get('first_name')}) "
+                    f"blocked={_blk_name} date={d}"
                 )
-                while gap_t < gap_end_t:
-                    for pid in busy_map:
-                        busy_map[pid].add(gap_t.strftime("%H:%M"))
-                    gap_t += timedelta(minutes=15)
-
-    # Feriado/override_open con horario especial: acotar el rango al horario reducido
-    # (paridad con el día base que usa _working_holiday_hours)
-    if _custom_hours:
-        day_start = _custom_hours["start"]
-        day_end = _custom_hours["end"]
-
-    # Días especiales por profesional (tenant_holidays scope='professional'):
-    # marcar el día completo ocupado para el profesional que no atiende esa fecha.
-    # Mismo helper que el día base → la búsqueda multi-día deja de ofrecer días de viaje/cierre.
-    await _mark_blocked_profs_busy(
-        tenant_id, target_date, active_professionals, busy_map, day_start, day_end
-    )
 
-    return generate_free_slots(
-        target_date,
-        busy_map,
-        duration_minutes=duration,
-        start_time_str=day_start,
-        end_time_str=day_end,
-        interval_minutes=15,
-        limit=50,
-        time_preference=time_preference,
-        min_time=min_time,
-        max_time=max_time,
+    prof_ids = [p["id"] for p in active_professionals]
+    if open_days and (prefetched_appointments is None or prefetched_gcal_blocks is None):
+        fetched_apts, fetched_blocks = await _batch_fetch_availability_for_range(
+            tenant_id, prof_ids, min(open_days), max(open_days)
+        )
+        if prefetched_appointments is None:
+            prefetched_appointments = fetched_apts
+        if prefetched_gcal_blocks is None:
+            prefetched_gcal_blocks = fetched_blocks
+
+    # El bitmap recorta cada intervalo a su rango: se pasan todos los registros
+    # (un bloque de varios días agrupado en su fecha de inicio también cuenta).
+    prof_id_set = set(prof_ids)
+    appointments = [
+        r
+        for records in (prefetched_appointments or {}).values()
+        for r in records
+        if r["professional_id"] in prof_id_set
+    ]
+    gcal_blocks = [
+        r
+        for records in (prefetched_gcal_blocks or {}).values()
+        for r in records
+        if r["professional_id"] is None or r["professional_id"] in prof_id_set
+    ]
+
+    return compile_availability(
+        days[0],
+        (days[-1] - days[0]).days + 1,
+        active_professionals,
+        tenant_wh,
+        tz=get_active_tz(),
+        default_hours=(CLINIC_HOURS_START, CLINIC_HOURS_END),
+        holidays=holidays,
+        blocked_professionals=blocked_professionals,
+        appointments=appointments,
+        calendar_blocks=gcal_blocks,
+        open_days=open_days,
     )
 
 
@@ -1629,26 +1611,15 @@ async def pick_representative_slots(
     _prefetched_blocks: Optional[dict] = None
     _total_window_days = max(search_range_days, 1) + 30  # range + expansion budget
     _batch_end_date = target_date + timedelta(days=_total_window_days)
+    _range_profs: Optional[list] = None
+    _range_duration = duration
     try:
-        # Resolve prof_ids for batch fetch — re-query here is lightweight (same
-        # query already executed earlier in check_availability; professionals are
-        # cached in the process for this call). We need the IDs scoped correctly.
-        _prof_query = """SELECT p.id FROM professionals p
-                         LEFT JOIN users u ON p.user_id = u.id
-                         WHERE p.is_active = true AND p.tenant_id = $1
-                         AND (p.user_id IS NULL OR (u.status = 'active' AND u.role IN ('professional', 'ceo')))"""
-        _prof_params = [tenant_id]
-        if professional_name:
-            _clean = re.sub(
-                r"^(dr|dra|doctor|doctora)\.?\s+",
-                "",
-                professional_name,
-                flags=re.IGNORECASE,
-            ).strip()
-            _prof_query += " AND (p.first_name ILIKE $2 OR p.last_name ILIKE $2 OR (p.first_name || ' ' || COALESCE(p.last_name, '')) ILIKE $2)"
-            _prof_params.append(f"%{_clean}%")
-        _prof_rows = await db.pool.fetch(_prof_query, *_prof_params)
-        _batch_prof_ids = [r["id"] for r in _prof_rows]
+        # Profesionales + duración se resuelven UNA vez para todo el rango (antes
+        # _get_slots_for_extra_day los re-consultaba por cada día).
+        _range_profs, _range_duration = await _load_extra_day_professionals(
+            tenant_id, professional_name, treatment_name, duration
+        )
+        _batch_prof_ids = [p["id"] for p in _range_profs]
         if _batch_prof_ids:
             _prefetched_apts, _prefetched_blocks = await _batch_fetch_availability_for_range(
                 tenant_id,
@@ -1661,11 +1632,35 @@ async def pick_representative_slots(
                 f"{len(_prefetched_blocks)} gcal-days for range {target_date}..{_batch_end_date}"
             )
     except Exception as _bf_err:
-        # Non-fatal: fall back to per-day queries inside _get_slots_for_extra_day
-        logger.warning(f"📅 batch pre-fetch failed (falling back to per-day): {_bf_err}")
+        # Non-fatal: the range finder re-resolves professionals and fetches per chunk
+        logger.warning(f"📅 batch pre-fetch failed (falling back to per-chunk): {_bf_err}")
+        _range_profs = None
         _prefetched_apts = None
         _prefetched_blocks = None
 
+    def _is_searchable_day(d) -> bool:
+        # Skip excluded weekdays / specific dates (patient rejected them) and closed days
+        if excluded_weekdays and d.weekday() in excluded_weekdays:
+            return False
+        if excluded_dates and d in excluded_dates:
+            return False
+        day_cfg = tenant_wh.get(DAYS_EN[d.weekday()], {})
+        if day_cfg and not day_cfg.get("enabled", True):
+            return False
+        if not day_cfg and d.weekday() == 6:
+            return False
+        return True
+
+    # Estado compartido de la búsqueda multi-día: profesionales ya resueltos y slots
+    # por fecha de los bloques de días ya compilados (ver _get_slots_for_extra_day).
+    _range_cache = {
+        "professionals": _range_profs,
+        "duration": _range_duration,
+        "slots": {},
+        "is_searchable": _is_searchable_day,
+        "until": _batch_end_date,
+    }
+
     # Filter out excluded weekdays from slots
     if excluded_weekdays and target_date.weekday() in excluded_weekdays:
         slots = [] # Target date falls on an excluded day
@@ -1746,18 +1741,10 @@ async def pick_representative_slots(
         if len(days_with_slots) >= max_options * 2: # Suficientes días para elegir
             break
         extra_date = target_date + timedelta(days=day_offset)
-        # Skip excluded weekdays (patient rejected this day of the week)
-        if excluded_weekdays and extra_date.weekday() in excluded_weekdays:
-            continue
-        # Skip excluded specific dates (patient rejected this exact date)
-        if excluded_dates and extra_date in excluded_dates:
+        if not _is_searchable_day(extra_date):
             continue
         extra_day_en = DAYS_EN[extra_date.weekday()]
         extra_day_cfg = tenant_wh.get(extra_day_en, {})
-        if extra_day_cfg and not extra_day_cfg.get("enabled", True):
-            continue
-        if not extra_day_cfg and extra_date.weekday() == 6:
-            continue
         try:
             extra_slots = await _get_slots_for_extra_day(
                 extra_date,
@@ -1771,6 +1758,7 @@ async def pick_representative_slots(
                 prefetched_gcal_blocks=_prefetched_blocks,
                 min_time=min_time,
                 max_time=max_time,
+                range_cache=_range_cache,
             )
         except Exception as e:
             logger.warning(f"Error getting range day slots for {extra_date}: {e}")
@@ -1836,18 +1824,10 @@ async def pick_representative_slots(
             if len(options) >= max_options:
                 break
             extra_date = target_date + timedelta(days=day_offset)
-            # Skip excluded weekdays (patient rejected this day of the week)
-            if excluded_weekdays and extra_date.weekday() in excluded_weekdays:
-                continue
-            # Skip excluded specific dates (patient rejected this exact date)
-            if excluded_dates and extra_date in excluded_dates:
+            if not _is_searchable_day(extra_date):
                 continue
             extra_day_en = DAYS_EN[extra_date.weekday()]
             extra_day_cfg = tenant_wh.get(extra_day_en, {})
-            if extra_day_cfg and not extra_day_cfg.get("enabled", True):
-                continue
-            if not extra_day_cfg and extra_date.weekday() == 6:
-                continue
             try:
                 extra_slots = await _get_slots_for_extra_day(
                     extra_date,
@@ -1861,6 +1841,7 @@ async def pick_representative_slots(
                     prefetched_gcal_blocks=_prefetched_blocks,
                     min_time=min_time,
                     max_time=max_time,
+                    range_cache=_range_cache,
                 )
             except Exception as e:
                 logger.warning(f"Error getting extra day slots for {extra_date}: {e}")
@@ -2167,19 +2148,25 @@ async def check_availability(
                     _ca_input_text = f"{date_query} {treatment_name or ''} {professional_name or ''}"
                     # Ampliar la busqueda con el ultimo mensaje real del paciente (lectura rapida)
                     try:
-                        _last_patient_msg = await db.pool.fetchval(
-                            """
-                            SELECT cm.content FROM chat_messages cm
-                            JOIN chat_conversations cc ON cc.id = cm.conversation_id
-                            WHERE cc.external_user_id ILIKE $1
-                              AND cc.tenant_id = $2
-                              AND cm.role = 'user'
-                            ORDER BY cm.created_at DESC
-                            LIMIT 1
-                            """,
-                            f"%{re.sub(r'[^0-9]', '', _ca_phone or '')}%",
-                            tid,
-                        )
+                        from services.phone_lookup import phone_key
+
+                        _ca_phone_key = phone_key(_ca_phone)
+                        _last_patient_msg = None
+                        if _ca_phone_key:
+                            # Index seek sobre (tenant_id, phone_key) en vez de ILIKE '%dígitos%'
+                            _last_patient_msg = await db.pool.fetchval(
+                                """
+                                SELECT cm.content FROM chat_messages cm
+                                JOIN chat_conversations cc ON cc.id = cm.conversation_id
+                                WHERE cc.tenant_id = $2
+                                  AND cc.phone_key = $1
+                                  AND cm.role = 'user'
+                                ORDER BY cm.created_at DESC
+                                LIMIT 1
+                                """,
+                                _ca_phone_key,
+                                tid,
+                            )
                         if _last_patient_msg:
                             _ca_input_text += f" {_last_patient_msg}"
                             logger.info(
@@ -2768,6 +2755,27 @@ async def check_availability(
         auto_advance_reason = ""
         _working_holiday_hours: dict | None = None  # Custom hours if working holiday
 
+        # Feriados de las 3 semanas resueltos de una vez (calendario cacheado del tenant);
+        # si falla, el loop vuelve a is_holiday día por día.
+        from services.holiday_service import (
+            is_holiday as check_is_holiday,
+            resolve_holiday_range,
+            resolve_professional_holiday_range,
+        )
+
+        _advance_holidays: dict = {}
+        _advance_prof_holidays: dict = {}
+        try:
+            _advance_end = target_date + timedelta(days=20)
+            _advance_holidays = await resolve_holiday_range(db.pool, tid, target_date, _advance_end)
+            if len(active_professionals) == 1:
+                _advance_prof_holidays = await resolve_professional_holiday_range(
+                    db.pool, tid, target_date, _advance_end, [active_professionals[0]["id"]]
+                )
+        except Exception as _hr_err:
+            logger.warning(f"📅 holiday range resolve failed (falling back to per-day): {_hr_err}")
+            _advance_holidays, _advance_prof_holidays = {}, {}
+
         for _advance in range(21):  # Buscar hasta 3 semanas adelante
             day_idx = target_date.weekday()
             day_name_en = days_en[day_idx]
@@ -2789,11 +2797,12 @@ async def check_availability(
                 continue
 
             # Verificar si es feriado
-            from services.holiday_service import is_holiday as check_is_holiday
-
-            _is_hol, _hol_name, _custom_hours = await check_is_holiday(
-                db.pool, tid, target_date
-            )
+            if target_date in _advance_holidays:
+                _is_hol, _hol_name, _custom_hours = _advance_holidays[target_date]
+            else:
+                _is_hol, _hol_name, _custom_hours = await check_is_holiday(
+                    db.pool, tid, target_date
+                )
             if _is_hol and _custom_hours:
                 # Feriado con atención — guardar horario especial y continuar al slot generation
                 _working_holiday_hours = _custom_hours
@@ -2836,11 +2845,13 @@ async def check_availability(
                     # si es el ÚNICO profesional para este pedido, avanzar hasta su próximo día con
                     # atención en vez de cortar. Para tratamientos compartidos (varios profs) NO se
                     # entra acá: el helper marca ocupado al bloqueado y se ofrece al otro ese mismo día.
-                    from services.holiday_service import is_holiday as _check_seed_prof_holiday
-
-                    _sp_blocked, _sp_name, _sp_hours = await _check_seed_prof_holiday(
-                        db.pool, tid, target_date, professional_id=prof["id"]
-                    )
+                    _sp_resolved = _advance_prof_holidays.get(target_date, {}).get(prof["id"])
+                    if _sp_resolved is not None:
+                        _sp_blocked, _sp_name, _sp_hours = _sp_resolved
+                    else:
+                        _sp_blocked, _sp_name, _sp_hours = await check_is_holiday(
+                            db.pool, tid, target_date, professional_id=prof["id"]
+                        )
                     if _sp_blocked and not _sp_hours:
                         prof_closed = True
                         prof_closed_reason = f"El {target_date.strftime('%d/%m')} no hay disponibilidad"
@@ -2906,80 +2917,10 @@ async def check_availability(
             key=lambda p: 0 if p.get("is_priority_professional") else 1,
         )
 
-        # --- CEREBRO HÍBRIDO: google → gcal_service; local → solo tabla appointments ---
-        calendar_provider = await get_tenant_calendar_provider(tenant_id)
-        if calendar_provider == "google":
-            existing_apt_gids = await db.pool.fetch(
-                "SELECT google_calendar_event_id FROM appointments WHERE google_calendar_event_id IS NOT NULL AND tenant_id = $1",
-                tenant_id,
-            )
-            apt_gids_set = {
-                row["google_calendar_event_id"] for row in existing_apt_gids
-            }
-            for prof in active_professionals:
-                prof_id = prof["id"]
-                cal_id = prof.get("google_calendar_id")
-                if not cal_id:
-                    continue
-                try:
-                    g_events = gcal_service.get_events_for_day(
-                        calendar_id=cal_id, date_obj=target_date
-                    )
-                    start_day = datetime.combine(
-                        target_date, datetime.min.time(), tzinfo=get_active_tz()
-                    )
-                    end_day = datetime.combine(
-                        target_date, datetime.max.time(), tzinfo=get_active_tz()
-                    )
-                    await db.pool.execute(
-                        """
-                        DELETE FROM google_calendar_blocks
-                        WHERE professional_id = $1 AND (start_datetime < $3 AND end_datetime > $2) AND tenant_id = $4
-                    """,
-                        prof_id,
-                        start_day,
-                        end_day,
-                        tenant_id,
-                    )
-                    for event in g_events:
-                        g_id = event["id"]
-                        if g_id in apt_gids_set:
-                            continue
-                        summary = event.get("summary", "Ocupado (GCal)")
-                        description = event.get("description", "")
-                        start = event["start"].get("dateTime") or event["start"].get(
-                            "date"
-                        )
-                        end = event["end"].get("dateTime") or event["end"].get("date")
-                        all_day = "date" in event["start"]
-                        try:
-                            dt_start = datetime.fromisoformat(
-                                start.replace("Z", "+00:00")
-                            )
-                            dt_end = datetime.fromisoformat(end.replace("Z", "+00:00"))
-                            await db.pool.execute(
-                                """
-                                INSERT INTO google_calendar_blocks (
-                                    tenant_id, google_event_id, title, description,
-                                    start_datetime, end_datetime, all_day, professional_id, sync_status
-                                ) VALUES ($8, $1, $2, $3, $4, $5, $6, $7, 'synced')
-                                ON CONFLICT (google_event_id) DO NOTHING
-                            """,
-                                g_id,
-                                summary,
-                                description,
-                                dt_start,
-                                dt_end,
-                                all_day,
-                                prof_id,
-                                tenant_id,
-                            )
-                        except Exception as ins_err:
-                            logger.error(
-                                f"Error inserting GCal block {g_id}: {ins_err}"
-                            )
-                except Exception as e:
-                    logger.error(f"JIT Fetch error for prof {prof_id}: {e}")
+        # Bloques de Google Calendar: los mantiene frescos el job gcal_sync
+        # (services/gcal_sync.py, sync incremental en background). Acá solo se
+        # lee google_calendar_blocks — nunca se llama a Google en el camino del
+        # paciente, así una respuesta lenta de Google no frena otras conversaciones.
 
         # 2. Ocupación: siempre appointments (tenant_id); bloques solo si provider google
         prof_ids = [p["id"] for p in active_professionals]
@@ -3811,20 +3752,10 @@ async def find_patient(query: str):
         return "Error: No se pudo identificar la clínica actual."
     
     from services.database import get_db
+    from services.search_service import search_patients
     db = await get_db()
     
-    like_pattern = f"%{query}%"
-    rows = await db.pool.fetch(
-        """
-        SELECT id, first_name, last_name, phone_number, dni 
-        FROM patients 
-        WHERE tenant_id = $1 
-          AND (first_name ILIKE $2 OR last_name ILIKE $2 OR phone_number ILIKE $2 OR dni ILIKE $2)
-        ORDER BY first_name
-        LIMIT 10
-        """,
-        tenant_id, like_pattern
-    )
+    rows, _ = await search_patients(db.pool, [tenant_id], query, limit=10, include_deleted=True)
     
     if not rows:
         return "No se encontraron pacientes con ese criterio de búsqueda."
@@ -4699,14 +4630,6 @@ async def book_appointment(
         )
 
         calendar_provider = await get_tenant_calendar_provider(tenant_id)
-        if calendar_provider == "google":
-            existing_apt_gids = await db.pool.fetch(
-                "SELECT google_calendar_event_id FROM appointments WHERE tenant_id = $1 AND google_calendar_event_id IS NOT NULL",
-                tenant_id,
-            )
-            apt_gids_set = {
-                row["google_calendar_event_id"] for row in existing_apt_gids
-            }
         target_prof = None
 
         for cand in candidates:
@@ -4747,50 +4670,6 @@ async def book_appointment(
                     apt_datetime.strftime("%H:%M"), day_config
                 ):
                     continue
-            if calendar_provider == "google" and cand.get("google_calendar_id"):
-                try:
-                    g_events = gcal_service.get_events_for_day(
-                        calendar_id=cand["google_calendar_id"],
-                        date_obj=apt_datetime.date(),
-                    )
-                    day_start = datetime.combine(
-                        apt_datetime.date(), datetime.min.time(), tzinfo=get_active_tz()
-                    )
-                    day_end = datetime.combine(
-                        apt_datetime.date(), datetime.max.time(), tzinfo=get_active_tz()
-                    )
-                    await db.pool.execute(
-                        "DELETE FROM google_calendar_blocks WHERE tenant_id = $1 AND professional_id = $2 AND start_datetime < $4 AND end_datetime > $3",
-                        tenant_id,
-                        cand["id"],
-                        day_start,
-                        day_end,
-                    )
-                    for event in g_events:
-                        g_id = event["id"]
-                        if g_id in apt_gids_set:
-                            continue
-                        start = event["start"].get("dateTime") or event["start"].get(
-                            "date"
-                        )
-                        end = event["end"].get("dateTime") or event["end"].get("date")
-                        dt_start = datetime.fromisoformat(start.replace("Z", "+00:00"))
-                        dt_end = datetime.fromisoformat(end.replace("Z", "+00:00"))
-                        await db.pool.execute(
-                            """
-                            INSERT INTO google_calendar_blocks (tenant_id, google_event_id, title, start_datetime, end_datetime, professional_id, sync_status)
-                            VALUES ($1, $2, $3, $4, $5, $6, 'synced') ON CONFLICT (google_event_id) DO NOTHING
-                        """,
-                            tenant_id,
-                            g_id,
-                            event.get("summary", "Ocupado"),
-                            dt_start,
-                            dt_end,
-                            cand["id"],
-                        )
-                except Exception as jit_err:
-                    logger.error(f"JIT GCal error in booking: {jit_err}")
-
             if calendar_provider == "google":
                 conflict = await db.pool.fetchval(
                     """
@@ -12762,7 +12641,9 @@ def _resolve_provider(model: str):
 
 
 def get_agent_executable(
-    openai_api_key: Optional[str] = None, model: Optional[str] = None
+    openai_api_key: Optional[str] = None,
+    model: Optional[str] = None,
+    http_async_client=None,
 ):
     key = (openai_api_key or "").strip() or OPENAI_API_KEY
     model_str = (model or "").strip() or DEFAULT_OPENAI_MODEL
@@ -12775,9 +12656,12 @@ def get_agent_executable(
             temperature=0,
             api_key=key,
             base_url=DEEPSEEK_BASE_URL,
+            http_async_client=http_async_client,
         )
     else:
-        llm = ChatOpenAI(model=model_str, temperature=0, api_key=key)
+        llm = ChatOpenAI(
+            model=model_str, temperature=0, api_key=key, http_async_client=http_async_client
+        )
 
     prompt = ChatPromptTemplate.from_messages(
         [
@@ -12795,16 +12679,49 @@ def get_agent_executable(
 
 
 async def get_agent_executable_for_tenant(tenant_id: int):
-    """Devuelve un executor del agente. Auto-detecta provider (OpenAI o DeepSeek) segun el modelo seleccionado."""
+    """Devuelve un executor del agente. Auto-detecta provider (OpenAI o DeepSeek) segun el modelo seleccionado.
+
+    El executor se reutiliza entre turnos (services.llm_client_pool) mientras no
+    cambien el modelo ni la API key del tenant.
+    """
     from core.credentials import get_tenant_credential
+    from services import llm_client_pool
 
     key = await get_tenant_credential(tenant_id, "OPENAI_API_KEY")
     if not key:
         key = OPENAI_API_KEY
-        logger.info(f"🤖 MODEL: Using default OPENAI_API_KEY (no tenant credential)")
+        logger.debug(f"🤖 MODEL: Using default OPENAI_API_KEY (no tenant credential)")
     else:
-        logger.info(f"🤖 MODEL: Using tenant-specific API key for tenant={tenant_id}")
+        logger.debug(f"🤖 MODEL: Using tenant-specific API key for tenant={tenant_id}")
+
+    model = llm_client_pool.get_cached_tenant_model(tenant_id)
+    if model is None:
+        model = await _load_tenant_model(tenant_id)
+        llm_client_pool.set_cached_tenant_model(tenant_id, model)
+
+    # If DeepSeek model, override key
+    if model in DEEPSEEK_MODELS:
+        key = DEEPSEEK_API_KEY
+
+    base_url = DEEPSEEK_BASE_URL if model in DEEPSEEK_MODELS else None
+    try:
+        return llm_client_pool.get_or_build_executor(
+            tenant_id,
+            model,
+            key,
+            lambda: get_agent_executable(
+                openai_api_key=key,
+                model=model,
+                http_async_client=llm_client_pool.get_shared_http_client(base_url),
+            ),
+        )
+    except Exception as pool_err:
+        logger.warning(f"🤖 LLM POOL: falling back to a fresh executor for tenant={tenant_id}: {pool_err}")
+        return get_agent_executable(openai_api_key=key, model=model)
+
 
+async def _load_tenant_model(tenant_id: int) -> str:
+    """Lee system_config.OPENAI_MODEL del tenant (con fallback a DEFAULT_OPENAI_MODEL)."""
     model = DEFAULT_OPENAI_MODEL
     try:
         row = await db.pool.fetchrow(
@@ -12835,15 +12752,10 @@ async def get_agent_executable_for_tenant(tenant_id: int):
         )
         logger.warning(f"🤖 MODEL: Falling back to default: '{DEFAULT_OPENAI_MODEL}'")
 
-    # If DeepSeek model, override key
-    if model in DEEPSEEK_MODELS:
-        key = DEEPSEEK_API_KEY
-        logger.info(f"🤖 MODEL: DeepSeek detected, using DeepSeek API key")
-
     logger.info(
         f"🤖 MODEL FINAL: tenant={tenant_id} model='{model}' provider={'deepseek' if model in DEEPSEEK_MODELS else 'openai'}"
     )
-    return get_agent_executable(openai_api_key=key, model=model)
+    return model
 
 
 agent_executor = get_agent_executable()
@@ -13069,6 +12981,18 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"rag_embedding_sync_skipped: {e}")
 
+    # Patient memories: the embedding backfill runs as a leased scheduler job
+    # (jobs/memory_embeddings.py), so only one replica embeds legacy rows.
+
+    # Webhook queue: consumidores del stream de webhooks entrantes (services/webhook_queue.py)
+    try:
+        from services.webhook_queue import start_webhook_workers
+
+        started = await start_webhook_workers()
+        logger.info(f"📥 Webhook queue workers: {started}")
+    except Exception as e:
+        logger.warning(f"📥 Webhook queue start skipped (webhooks se procesan inline): {e}")
+
     # Telegram bots: start polling for all configured tenants
     try:
         from services.telegram_bot import start_telegram_bots
@@ -13102,6 +13026,29 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"🤖 Telegram bots stop error: {e}")
 
+    # Emitir eventos Socket.IO que quedaron en el buffer de coalescing
+    try:
+        await sio.flush_all()
+    except Exception as e:
+        logger.warning(f"🔌 Socket.IO flush error: {e}")
+
+    # Escribir el uso de tokens que quedó en el buffer del tracker
+    try:
+        from dashboard.token_tracker import token_tracker
+
+        if token_tracker:
+            await token_tracker.close()
+    except Exception as e:
+        logger.warning(f"📊 Token usage flush error: {e}")
+
+    # Detener consumidores de webhooks (lo pendiente queda en el stream y lo reclama otra réplica)
+    try:
+        from services.webhook_queue import stop_webhook_workers
+
+        await stop_webhook_workers()
+    except Exception as e:
+        logger.warning(f"📥 Webhook queue stop error: {e}")
+
     # Detener scheduler de jobs
     try:
         from jobs.scheduler import stop_scheduler
@@ -13111,6 +13058,20 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"❌ Error al detener JobScheduler: {e}")
 
+    try:
+        from services.llm_client_pool import close_shared_http_clients
+
+        await close_shared_http_clients()
+    except Exception as e:
+        logger.warning(f"🤖 LLM pool close error: {e}")
+
+    try:
+        from services.http_clients import close_http_clients
+
+        await close_http_clients()
+    except Exception as e:
+        logger.warning(f"🌐 HTTP clients close error: {e}")
+
     await db.disconnect()
     logger.info("✅ Desconexión completada")
 
@@ -13495,8 +13456,11 @@ def _custom_openapi():
 app.openapi = _custom_openapi
 
 # --- SOCKET.IO CONFIGURATION ---
-# Create Socket.IO instance with async mode
-sio = socketio.AsyncServer(
+# FanoutServer: AsyncServer + Redis manager (multi-réplica), presencia por sala y coalescing
+# de ráfagas por tenant (services/socket_fanout.py). Los call sites de sio.emit no cambian.
+from services.socket_fanout import FanoutServer
+
+sio = FanoutServer(
     async_mode="asgi",
     cors_allowed_origins=origins,
     ping_interval=15,
@@ -14261,6 +14225,22 @@ async def health_ready():
     )
 
 
+@app.get("/health/http", tags=["Health"])
+async def health_http():
+    """Métricas de clientes HTTP salientes por upstream (requests, errores, reintentos, latencia p50/p95)."""
+    from services.http_clients import get_http_stats
+
+    return get_http_stats()
+
+
+@app.get("/health/webhooks", tags=["Health"])
+async def health_webhooks():
+    """Cola de webhooks entrantes: lag y pendientes del consumer group, dead-letter, latencia de procesamiento."""
+    from services.webhook_queue import get_webhook_queue_stats
+
+    return await get_webhook_queue_stats()
+
+
 # --- ENDPOINTS DEL SISTEMA MEJORADO ---
 @app.get("/api/agent/metrics", tags=["Agent Analytics"])
 async def get_agent_metrics(
@@ -17,6 +17,7 @@ from sqlalchemy import (
     Numeric,
     text,
     Time,
+    Computed,
 )
 from sqlalchemy.dialects.postgresql import JSONB, UUID, ARRAY, TIMESTAMP
 from sqlalchemy.orm import relationship, declarative_base
@@ -194,6 +195,11 @@ class ChatConversation(Base):
     # Meta Direct enrichment
     source_entity_id = Column(Text, nullable=True)
     platform_origin = Column(Text, nullable=True)
+    # Canonical phone (last 10 digits) for indexed lookups — services/phone_lookup.py (migration 071)
+    phone_key = Column(
+        Text,
+        Computed("right(NULLIF(regexp_replace(coalesce(external_user_id, ''), '[^0-9]', '', 'g'), ''), 10)", persisted=True),
+    )
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
@@ -201,6 +207,12 @@ class ChatConversation(Base):
 
     __table_args__ = (
         Index("idx_chat_conv_tenant", "tenant_id"),
+        Index(
+            "idx_chat_conv_tenant_phone_key",
+            "tenant_id",
+            "phone_key",
+            postgresql_where=(phone_key != None),
+        ),
         Index("idx_chat_conv_tenant_channel", "tenant_id", "channel"),
         Index(
             "idx_chat_conv_tenant_channel_user",
@@ -629,6 +641,27 @@ class Patient(Base):
         Integer, ForeignKey("professionals.id", ondelete="SET NULL"), nullable=True
     )
 
+    # Search keys (migration 070, services/search_service.py) — GIN trigram indexed
+    search_name = Column(
+        Text,
+        Computed(
+            "translate(lower(coalesce(first_name, '') || ' ' || coalesce(last_name, '')), "
+            "'áéíóúüñàèìòùâêîôûäëïöü', 'aeiouunaeiouaeiouaeiou')",
+            persisted=True,
+        ),
+    )
+    phone_digits = Column(
+        Text, Computed("regexp_replace(coalesce(phone_number, ''), '[^0-9]', '', 'g')", persisted=True)
+    )
+    dni_digits = Column(
+        Text, Computed("regexp_replace(coalesce(dni, ''), '[^0-9]', '', 'g')", persisted=True)
+    )
+    # Canonical phone (last 10 digits) for indexed lookups — services/phone_lookup.py (migration 071)
+    phone_key = Column(
+        Text,
+        Computed("right(NULLIF(regexp_replace(coalesce(phone_number, ''), '[^0-9]', '', 'g'), ''), 10)", persisted=True),
+    )
+
     __table_args__ = (
         UniqueConstraint(
             "tenant_id", "phone_number", name="patients_tenant_id_phone_number_key"
@@ -636,6 +669,12 @@ class Patient(Base):
         UniqueConstraint("tenant_id", "dni", name="patients_tenant_id_dni_key"),
         Index("idx_patients_tenant_phone", "tenant_id", "phone_number"),
         Index("idx_patients_tenant_dni", "tenant_id", "dni"),
+        Index(
+            "idx_patients_tenant_phone_key",
+            "tenant_id",
+            "phone_key",
+            postgresql_where=(phone_key != None),
+        ),
         Index("idx_patients_status", "status"),
         Index("idx_patients_insurance", "insurance_provider"),
         Index(
@@ -2086,3 +2125,153 @@ class AgentTurnLog(Base):
         Index("idx_atl_tenant_phone", "tenant_id", "phone_number"),
         Index("idx_atl_turn", "turn_id"),
     )
+
+
+class ScheduledJob(Base):
+    """Persisted schedule/last-run state for jobs/scheduler.py (one row per job, cluster-wide)."""
+
+    __tablename__ = "scheduled_jobs"
+
+    job_name = Column(Text, primary_key=True)
+    schedule = Column(Text, nullable=True)
+    last_run_at = Column(DateTime(timezone=True), nullable=True)
+    next_run_at = Column(DateTime(timezone=True), nullable=True)
+    last_duration_ms = Column(Integer, nullable=True)
+    last_status = Column(String(20), nullable=True)
+    last_error = Column(Text, nullable=True)
+    last_run_by = Column(Text, nullable=True)
+    run_count = Column(BigInteger, nullable=False, server_default=text("0"))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class GCalSyncCursor(Base):
+    """Per-professional Google Calendar sync token (services/gcal_sync.py)."""
+
+    __tablename__ = "gcal_sync_cursors"
+
+    tenant_id = Column(
+        Integer, ForeignKey("tenants.id", ondelete="CASCADE"), primary_key=True
+    )
+    professional_id = Column(
+        Integer, ForeignKey("professionals.id", ondelete="CASCADE"), primary_key=True
+    )
+    calendar_id = Column(Text, nullable=False)
+    sync_token = Column(Text, nullable=True)
+    last_synced_at = Column(DateTime(timezone=True), nullable=True)
+    last_full_sync_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(Text, nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class BulkSendJob(Base):
+    """Background bulk WhatsApp send (services/bulk_messaging.py), one row per Nova mass action."""
+
+    __tablename__ = "bulk_send_jobs"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    tenant_id = Column(
+        Integer, ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False
+    )
+    action = Column(String(30), nullable=False)
+    params = Column(JSONB, nullable=False, server_default=text("'{}'::jsonb"))
+    status = Column(String(20), nullable=False, server_default="pending")
+    total_count = Column(Integer, nullable=False, server_default=text("0"))
+    sent_count = Column(Integer, nullable=False, server_default=text("0"))
+    failed_count = Column(Integer, nullable=False, server_default=text("0"))
+    created_by = Column(Text, nullable=True)
+    last_error = Column(Text, nullable=True)
+    resume_after = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("idx_bulk_send_jobs_tenant", "tenant_id", "created_at"),
+        Index("idx_bulk_send_jobs_status", "status"),
+    )
+
+
+class BulkSendRecipient(Base):
+    """Per-recipient state/result of a bulk_send_jobs row."""
+
+    __tablename__ = "bulk_send_recipients"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    job_id = Column(
+        BigInteger, ForeignKey("bulk_send_jobs.id", ondelete="CASCADE"), nullable=False
+    )
+    tenant_id = Column(
+        Integer, ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False
+    )
+    patient_id = Column(Integer, nullable=True)
+    phone = Column(Text, nullable=False)
+    patient_name = Column(Text, nullable=True)
+    status = Column(String(20), nullable=False, server_default="pending")
+    attempts = Column(Integer, nullable=False, server_default=text("0"))
+    error = Column(Text, nullable=True)
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("idx_bulk_send_recipients_job_status", "job_id", "status"),
+        Index(
+            "idx_bulk_send_recipients_tenant_sent",
+            "tenant_id",
+            "sent_at",
+            postgresql_where=(status == "sent"),
+        ),
+    )
+
+
+class AnalyticsDailyAppointments(Base):
+    """Daily appointment facts per tenant / professional / treatment (services/analytics_rollup.py)."""
+
+    __tablename__ = "analytics_daily_appointments"
+
+    tenant_id = Column(
+        Integer, ForeignKey("tenants.id", ondelete="CASCADE"), primary_key=True
+    )
+    day = Column(Date, primary_key=True)
+    professional_id = Column(Integer, primary_key=True, server_default=text("0"))
+    treatment_code = Column(String(50), primary_key=True, server_default="")
+    appointments = Column(Integer, nullable=False, server_default=text("0"))
+    completed = Column(Integer, nullable=False, server_default=text("0"))
+    cancelled = Column(Integer, nullable=False, server_default=text("0"))
+    no_show = Column(Integer, nullable=False, server_default=text("0"))
+    active = Column(Integer, nullable=False, server_default=text("0"))
+    billable = Column(Integer, nullable=False, server_default=text("0"))
+    billed_count = Column(Integer, nullable=False, server_default=text("0"))
+    paid_count = Column(Integer, nullable=False, server_default=text("0"))
+    partial_count = Column(Integer, nullable=False, server_default=text("0"))
+    billed_amount = Column(Numeric(14, 2), nullable=False, server_default=text("0"))
+    paid_amount = Column(Numeric(14, 2), nullable=False, server_default=text("0"))
+    pending_amount = Column(Numeric(14, 2), nullable=False, server_default=text("0"))
+    completed_billed_amount = Column(Numeric(14, 2), nullable=False, server_default=text("0"))
+    estimated_revenue = Column(Numeric(14, 2), nullable=False, server_default=text("0"))
+    refreshed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class AnalyticsDailyCash(Base):
+    """Daily treatment plan payments and professional payouts per tenant."""
+
+    __tablename__ = "analytics_daily_cash"
+
+    tenant_id = Column(
+        Integer, ForeignKey("tenants.id", ondelete="CASCADE"), primary_key=True
+    )
+    day = Column(Date, primary_key=True)
+    plan_payments = Column(Numeric(14, 2), nullable=False, server_default=text("0"))
+    plan_cash = Column(Numeric(14, 2), nullable=False, server_default=text("0"))
+    plan_card = Column(Numeric(14, 2), nullable=False, server_default=text("0"))
+    payouts = Column(Numeric(14, 2), nullable=False, server_default=text("0"))
+    refreshed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class AnalyticsDirtyDay(Base):
+    """(tenant, day) queued by triggers for a rebuild of the analytics fact rows."""
+
+    __tablename__ = "analytics_dirty_days"
+
+    tenant_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    marked_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -408,24 +408,39 @@ async def download_backup(
 # --- POST /restore ---
 
 
-@router.post("/restore")
+@router.post("/restore", status_code=202)
 async def restore_backup(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     target_tenant_id: Optional[int] = None,
     user_data=Depends(verify_ceo_token),
     tenant_id: int = Depends(get_resolved_tenant_id),
 ):
-    """Upload a backup ZIP and restore it to the current (or target) tenant.
+    """Upload a backup ZIP and restore it to the current (or target) tenant as a background task.
+    Poll GET /restore/status/{task_id} for progress and the summary.
     Security: CEO-only via verify_ceo_token (JWT + X-Admin-Token + role='ceo')."""
     import tempfile
 
+    from services.relay import get_redis
+
+    r = get_redis()
+    if r is None:
+        raise HTTPException(503, "Redis no disponible")
+
+    target = target_tenant_id or tenant_id
     # Size check (5GB max)
     max_size = 5 * 1024 * 1024 * 1024
     if file.size and file.size > max_size:
         raise HTTPException(413, "El archivo excede el límite de 5GB")
 
+    # Atomic lock (SET NX): two concurrent restores cannot both pass a check-then-set
+    lock_key = f"restore:lock:{target}"
+    if not await r.set(lock_key, "1", nx=True, ex=3600):
+        raise HTTPException(409, "Ya hay una restauración en curso. Esperá a que finalice.")
+
     # Stream upload to temp file (avoid loading entire file into memory)
     tmp_path = os.path.join(tempfile.gettempdir(), f"restore_{uuid.uuid4()}.zip")
+    queued = False
     try:
         total_written = 0
         with open(tmp_path, "wb") as f:
@@ -441,15 +456,27 @@ async def restore_backup(
         if not zipfile.is_zipfile(tmp_path):
             raise HTTPException(422, "El archivo no es un ZIP válido")
 
-        # Run restore
-        from db import db
-        from services.restore_service import restore_from_zip
+        # Task (the task deletes the temp file and releases the lock)
+        task_id = str(uuid.uuid4())
+        progress_key = f"restore:progress:{task_id}"
+        await r.hset(
+            progress_key,
+            mapping={
+                "pct": "0",
+                "message": "Restauración en cola...",
+                "status": "queued",
+                "tenant_id": str(tenant_id),
+            },
+        )
+        await r.expire(progress_key, 3600)
 
-        target = target_tenant_id or tenant_id
-        summary = await restore_from_zip(tmp_path, tenant_id, db.pool, target)
+        from services.restore_service import run_restore_task
 
-        logger.info(f"[backup] Restore completed for tenant {target}: {summary}")
-        return summary
+        background_tasks.add_task(run_restore_task, tmp_path, tenant_id, target, task_id)
+        queued = True
+
+        logger.info(f"[backup] Restore task {task_id} queued for tenant {target}")
+        return {"task_id": task_id}
 
     except HTTPException:
         raise
@@ -457,9 +484,56 @@ async def restore_backup(
         logger.exception(f"[backup] restore failed: {e}")
         raise HTTPException(500, f"Error durante la restauración: {str(e)[:200]}")
     finally:
-        # Cleanup temp file
-        if os.path.exists(tmp_path):
+        # Cleanup temp file and lock unless the background task owns them
+        if not queued:
+            if os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except Exception:
+                    pass
             try:
-                os.remove(tmp_path)
+                await r.delete(lock_key)
             except Exception:
                 pass
+
+
+# --- GET /restore/status/{task_id} ---
+
+
+@router.get("/restore/status/{task_id}")
+async def get_restore_status(
+    task_id: str,
+    user_data=Depends(verify_ceo_token),
+    tenant_id: int = Depends(get_resolved_tenant_id),
+):
+    """Poll restore task progress; the summary (counts, warnings, per-table timings) is included once done."""
+    try:
+        import json
+
+        from services.relay import get_redis
+
+        r = get_redis()
+        if r is None:
+            raise HTTPException(503, "Redis no disponible")
+
+        data = await r.hgetall(f"restore:progress:{task_id}")
+        if not data:
+            raise HTTPException(404, "Tarea de restauración no encontrada")
+
+        # Verify tenant ownership
+        if data.get("tenant_id") and str(data["tenant_id"]) != str(tenant_id):
+            raise HTTPException(404, "Tarea de restauración no encontrada")
+
+        return {
+            "task_id": task_id,
+            "progress_pct": int(data.get("pct", 0)),
+            "message": data.get("message", ""),
+            "status": data.get("status", "unknown"),
+            "error": data.get("error"),
+            "summary": json.loads(data["summary"]) if data.get("summary") else None,
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"[backup] restore status check failed: {e}")
+        raise HTTPException(500, "Error al consultar el estado de la restauración")
@@ -16,6 +16,7 @@ from core.security_utils import generate_signed_url
 from db import get_pool, db
 from services.channels.service import ChannelService
 from services.channels.types import CanonicalMessage, MediaType
+from services.webhook_queue import enqueue as enqueue_webhook, register_handler
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -42,6 +43,14 @@ async def receive_chatwoot_webhook(
     except Exception:
         return {"status": "ignored", "reason": "invalid_json"}
 
+    # Ack inmediato: el procesamiento corre en los workers de la cola (services/webhook_queue.py)
+    if await enqueue_webhook("chatwoot", tenant_id, payload):
+        return {"status": "queued"}
+    return await process_chatwoot_payload(tenant_id, payload, background_tasks)
+
+
+async def process_chatwoot_payload(tenant_id, payload, background_tasks):
+    """Procesa un evento del endpoint unificado (worker de la cola o inline si no hay Redis)."""
     # 1. Detectar Provider (Backward Compatibility)
     provider = "chatwoot"
     # YCloud payloads have "type": "message" or "image", Chatwoot has "event"
@@ -203,6 +212,14 @@ async def receive_ycloud_webhook(
     except Exception:
         return {"status": "ignored", "reason": "invalid_json"}
 
+    # Ack inmediato: el procesamiento corre en los workers de la cola (services/webhook_queue.py)
+    if await enqueue_webhook("ycloud", tenant_id, payload):
+        return {"status": "queued"}
+    return await process_ycloud_payload(tenant_id, payload, background_tasks)
+
+
+async def process_ycloud_payload(tenant_id, payload, background_tasks):
+    """Procesa un evento YCloud: echo, normalización y pipeline canónico (worker de la cola o inline)."""
     # Handle echo events (doctor/staff sent message from WhatsApp Business app)
     # This activates manual mode so the AI stops responding.
     event_type = payload.get("event_type") or payload.get("type", "")
@@ -370,6 +387,8 @@ async def receive_ycloud_webhook(
 async def _process_canonical_messages(messages, tenant_id, provider, background_tasks):
     pool = get_pool()
     saved_ids = []
+    # Messages whose inbound row was released for retry (the queue worker re-delivers them)
+    released = 0
 
     if not messages:
         return {"status": "ignored", "reason": "no_content"}
@@ -1347,6 +1366,7 @@ async def _process_canonical_messages(messages, tenant_id, provider, background_
                             provider,
                             _idem_locked_id,
                         )
+                        released += 1
                         logger.warning(
                             f"🔄 inbound_messages row released for retry: provider={provider} msg_id={_idem_locked_id}"
                         )
@@ -1355,4 +1375,8 @@ async def _process_canonical_messages(messages, tenant_id, provider, background_
                         f"⚠️ inbound_messages cleanup failed (non-blocking): {_idem_cleanup_err}"
                     )
 
-    return {"status": "processed", "count": len(saved_ids)}
+    return {"status": "processed", "count": len(saved_ids), "failed": released}
+
+
+register_handler("chatwoot", process_chatwoot_payload)
+register_handler("ycloud", process_ycloud_payload)
@@ -117,6 +117,8 @@ async def disconnect_meta(
         "DELETE FROM credentials WHERE tenant_id = $1 AND category = 'meta'",
         tenant_id
     )
+    from core.credentials import invalidate_tenant_credential
+    await invalidate_tenant_credential(tenant_id)
 
     # 7. Clean PSIDs in patients
     await pool.execute(
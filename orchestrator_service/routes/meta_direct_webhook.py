@@ -12,6 +12,7 @@ from db import get_pool
 from core.credentials import get_tenant_credential
 from core.rate_limiter import limiter
 from services.channels.service import ChannelService
+from services.webhook_queue import enqueue as enqueue_webhook, register_handler
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -96,6 +97,14 @@ async def receive_meta_direct_webhook(
     payload = await request.json()
     logger.info(f"Meta Direct webhook received: platform={payload.get('platform')}, sender={payload.get('sender_id')}")
 
+    # Ack right away: tenant resolution onwards runs in the webhook queue workers
+    if await enqueue_webhook("meta_direct", None, payload):
+        return {"status": "queued"}
+    return await process_meta_direct_payload(None, payload, background_tasks)
+
+
+async def process_meta_direct_payload(_tenant_id, payload, background_tasks):
+    """Resolve the tenant and run one SimpleEvent through the shared pipeline (queue worker or inline)."""
     # 2. Resolve tenant via business_assets
     pool = get_pool()
     recipient_id = payload.get("recipient_id") or payload.get("tenant_identifier")
@@ -188,3 +197,6 @@ async def receive_meta_direct_webhook(
     # 6. Process through shared pipeline (same as Chatwoot/YCloud)
     from routes.chat_webhooks import _process_canonical_messages
     return await _process_canonical_messages(messages, tenant_id, "meta_direct", background_tasks)
+
+
+register_handler("meta_direct", process_meta_direct_payload)
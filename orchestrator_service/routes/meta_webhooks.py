@@ -22,6 +22,7 @@ from core.auth import verify_admin_token, get_resolved_tenant_id
 from core.rate_limiter import limiter
 from db import get_pool, update_patient_attribution_from_meta_webhook
 from services.meta_ads_service import MetaAdsClient
+from services.webhook_queue import enqueue as enqueue_webhook, register_handler
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -77,6 +78,16 @@ async def receive_meta_webhook(
         logger.error(f"❌ Error parsing Meta webhook JSON: {e}")
         return {"status": "error", "message": "Invalid JSON"}
 
+    resolved_tenant_id = tenant_id or await get_resolved_tenant_id(request)
+
+    # Durable queue first (services/webhook_queue.py); BackgroundTasks if Redis is down
+    if await enqueue_webhook("meta_lead", resolved_tenant_id, body):
+        return {"status": "queued"}
+    return await process_meta_lead_payload(resolved_tenant_id, body, background_tasks)
+
+
+async def process_meta_lead_payload(tenant_id: int, body: Any, background_tasks: BackgroundTasks):
+    """Detect the payload type and schedule its processing (queue worker or inline)."""
     # Detect payload type and process in background
     if isinstance(body, dict) and "entry" in body:
         # Standard Meta webhook format - process as lead form
@@ -84,18 +95,12 @@ async def receive_meta_webhook(
             from services.meta_leads_service import MetaLeadsService
 
             background_tasks.add_task(
-                MetaLeadsService.process_lead_form_webhook,
-                body,
-                tenant_id or await get_resolved_tenant_id(request),
+                MetaLeadsService.process_lead_form_webhook, body, tenant_id
             )
             return {"status": "processing", "type": "meta_standard_lead_form"}
         except ImportError:
             # Fallback to original processing
-            background_tasks.add_task(
-                process_standard_meta_lead,
-                body,
-                tenant_id or await get_resolved_tenant_id(request),
-            )
+            background_tasks.add_task(process_standard_meta_lead, body, tenant_id)
             return {"status": "processing", "type": "meta_standard"}
 
     else:
@@ -124,26 +129,16 @@ async def receive_meta_webhook(
                 from services.meta_leads_service import MetaLeadsService
 
                 background_tasks.add_task(
-                    MetaLeadsService.process_lead_form_webhook,
-                    body,
-                    tenant_id or await get_resolved_tenant_id(request),
+                    MetaLeadsService.process_lead_form_webhook, body, tenant_id
                 )
                 return {"status": "processing", "type": "meta_custom_lead_form"}
             except ImportError:
                 # Fallback to original processing
-                background_tasks.add_task(
-                    process_flattened_lead,
-                    body,
-                    tenant_id or await get_resolved_tenant_id(request),
-                )
+                background_tasks.add_task(process_flattened_lead, body, tenant_id)
                 return {"status": "processing", "type": "meta_custom"}
         else:
             # Original WhatsApp referral processing
-            background_tasks.add_task(
-                process_flattened_lead,
-                body,
-                tenant_id or await get_resolved_tenant_id(request),
-            )
+            background_tasks.add_task(process_flattened_lead, body, tenant_id)
             return {"status": "processing", "type": "meta_custom"}
 
 
@@ -617,3 +612,6 @@ async def get_attribution_stats(
     except Exception as e:
         logger.error(f"❌ Error getting attribution stats: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+register_handler("meta_lead", process_meta_lead_payload)
@@ -15,6 +15,7 @@ from pydantic import BaseModel
 
 from db import db
 from core.auth import verify_admin_token, get_resolved_tenant_id
+from services.tenant_prompt_cache import invalidate_tenant_prompt_context
 
 logger = logging.getLogger(__name__)
 
@@ -619,6 +620,9 @@ ONBOARDING_STEP_ORDER = [
     "consultation_price",
 ]
 
+# Steps that write inputs of the agent's system prompt (tenant row, professionals, treatments, FAQs)
+ONBOARDING_PROMPT_STEPS = {"professionals", "treatment_types", "faqs", "bank_details", "consultation_price"}
+
 ONBOARDING_LABELS = {
     "professionals": "Profesionales",
     "working_hours": "Horarios",
@@ -1185,7 +1189,7 @@ async def complete_onboarding_step(
         elif step == "whatsapp":
             # This typically requires YCloud API key — just validate presence
             if data.get("api_key"):
-                from core.credentials import encrypt_value
+                from core.credentials import encrypt_value, invalidate_tenant_credential
                 encrypted = encrypt_value(data["api_key"])
                 await db.pool.execute(
                     """INSERT INTO credentials (tenant_id, name, category, value, scope, created_at)
@@ -1194,6 +1198,7 @@ async def complete_onboarding_step(
                     tenant_id,
                     encrypted,
                 )
+                await invalidate_tenant_credential(tenant_id, "ycloud_api_key")
 
         elif step == "google_calendar":
             # Google Calendar is typically connected via OAuth — this step is informational
@@ -1238,6 +1243,9 @@ async def complete_onboarding_step(
                     tenant_id,
                 )
 
+        if step in ONBOARDING_PROMPT_STEPS:
+            await invalidate_tenant_prompt_context(tenant_id)
+
         # Return updated status
         return await _get_onboarding_status(tenant_id)
 
@@ -1276,6 +1284,7 @@ async def apply_suggestion(
                     body.answer,
                     existing["id"],
                 )
+                await invalidate_tenant_prompt_context(tenant_id)
                 logger.info(f"nova_apply_suggestion: FAQ updated id={existing['id']} tenant={tenant_id} by {user_data.email}")
                 return {"status": "ok", "action": "faq_updated", "faq_id": existing["id"]}
             else:
@@ -1285,6 +1294,7 @@ async def apply_suggestion(
                     body.question,
                     body.answer,
                 )
+                await invalidate_tenant_prompt_context(tenant_id)
                 logger.info(f"nova_apply_suggestion: FAQ created id={new_id} tenant={tenant_id} by {user_data.email}")
                 return {"status": "ok", "action": "faq_created", "faq_id": new_id}
 
@@ -1493,6 +1503,42 @@ Esto aplica obligatoriamente a: preparar_y_enviar_presupuesto, generar_ficha_dig
     return response_payload
 
 
+# ===================================================================
+# 8b. GET /admin/nova/bulk-jobs/{job_id} + POST .../cancel
+# ===================================================================
+
+@router.get("/bulk-jobs/{job_id}")
+async def get_nova_bulk_job(
+    job_id: int,
+    user_data=Depends(verify_admin_token),
+    tenant_id: int = Depends(get_resolved_tenant_id),
+):
+    """Progress of a bulk send started by accion_masiva (live updates: BULK_SEND_PROGRESS socket event)."""
+    from services.bulk_messaging import get_bulk_job
+
+    job = await get_bulk_job(db.pool, tenant_id, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Envío masivo no encontrado.")
+    return job
+
+
+@router.post("/bulk-jobs/{job_id}/cancel")
+async def cancel_nova_bulk_job(
+    job_id: int,
+    user_data=Depends(verify_admin_token),
+    tenant_id: int = Depends(get_resolved_tenant_id),
+):
+    """Stop a running/paused bulk send; recipients already sent are kept."""
+    if user_data.role not in ("ceo", "secretary"):
+        raise HTTPException(status_code=403, detail="Solo CEO o secretaria pueden cancelar envíos masivos.")
+
+    from services.bulk_messaging import cancel_bulk_job
+
+    if not await cancel_bulk_job(db.pool, tenant_id, job_id):
+        raise HTTPException(status_code=404, detail="Envío masivo no encontrado o ya finalizado.")
+    return {"job_id": job_id, "status": "cancelled"}
+
+
 # ===================================================================
 # 9. GET /admin/telegram/verify-user/{tenant_id}/{chat_id}
 # ===================================================================
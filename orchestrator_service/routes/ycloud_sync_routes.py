@@ -348,6 +348,9 @@ async def update_sync_config(
             config,
             tenant_id,
         )
+        from services.tenant_prompt_cache import invalidate_tenant_prompt_context
+
+        await invalidate_tenant_prompt_context(tenant_id)
 
         return {
             "tenant_id": tenant_id,
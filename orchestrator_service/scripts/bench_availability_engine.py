@@ -0,0 +1,168 @@
+"""
+Benchmark: availability bitmap engine vs. the legacy per-day busy_map loop.
+
+Builds a synthetic clinic (professionals with split working hours, a lunch
+gap, random appointments and calendar blocks) and measures, for the same
+date range, the legacy path (per day: 15-minute HH:MM busy sets + the
+datetime/strftime candidate loop) against services.availability_engine
+(one compile + one vectorized query for the whole range).
+
+Uso CLI:
+    python -m scripts.bench_availability_engine --days 45 --profs 8 --appointments 600
+"""
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+from zoneinfo import ZoneInfo
+
+from services.availability_engine import DAYS_EN, compile_availability
+
+TZ = ZoneInfo("America/Argentina/Buenos_Aires")
+TENANT_WH = {
+    day: {"enabled": day != "sunday", "slots": [{"start": "09:00", "end": "13:00"}, {"start": "14:00", "end": "19:00"}]}
+    for day in DAYS_EN
+}
+
+
+def _synthetic_data(start: date, days: int, n_profs: int, n_appointments: int, seed: int = 7):
+    rng = random.Random(seed)
+    professionals = []
+    for pid in range(1, n_profs + 1):
+        wh = {}
+        for day in DAYS_EN:
+            if day == "sunday" or rng.random() < 0.15:
+                wh[day] = {"enabled": False, "slots": []}
+            else:
+                wh[day] = {"enabled": True, "slots": [{"start": f"{rng.choice([8, 9, 10]):02d}:00", "end": f"{rng.choice([16, 18, 19]):02d}:00"}]}
+        professionals.append({"id": pid, "first_name": f"P{pid}", "working_hours": wh})
+
+    appointments = []
+    for _ in range(n_appointments):
+        day = start + timedelta(days=rng.randrange(days))
+        at = datetime(day.year, day.month, day.day, rng.randrange(8, 19), rng.choice([0, 15, 30, 45]), tzinfo=TZ)
+        appointments.append({"professional_id": rng.randint(1, n_profs), "start": at,
+                             "duration_minutes": rng.choice([15, 30, 45, 60, 90])})
+    blocks = []
+    for _ in range(n_appointments // 10):
+        day = start + timedelta(days=rng.randrange(days))
+        at = datetime(day.year, day.month, day.day, rng.randrange(8, 18), 0, tzinfo=TZ)
+        blocks.append({"professional_id": rng.choice([None, rng.randint(1, n_profs)]), "start": at,
+                       "end": at + timedelta(minutes=rng.choice([60, 120]))})
+    return professionals, appointments, blocks
+
+
+def _legacy_day(day: date, professionals, appointments, blocks, duration: int) -> List[str]:
+    """Faithful copy of the pre-engine _get_slots_for_extra_day busy_map + generate_free_slots loop."""
+    day_en = DAYS_EN[day.weekday()]
+    tenant_day = TENANT_WH[day_en]
+    if not tenant_day["enabled"]:
+        return []
+    busy_map: Dict[int, set] = {p["id"]: set() for p in professionals}
+    for prof in professionals:
+        cfg = prof["working_hours"].get(day_en, {})
+        if cfg.get("enabled") and cfg.get("slots"):
+            check = datetime.combine(day, datetime.min.time()).replace(hour=8)
+            while check.hour < 20:
+                h_m = check.strftime("%H:%M")
+                if not any(s["start"] <= h_m < s["end"] for s in cfg["slots"]):
+                    busy_map[prof["id"]].add(h_m)
+                check += timedelta(minutes=15)
+        elif cfg.get("enabled") is False:
+            check = datetime.combine(day, datetime.min.time()).replace(hour=6)
+            while check.hour < 23:
+                busy_map[prof["id"]].add(check.strftime("%H:%M"))
+                check += timedelta(minutes=15)
+    global_busy = set()
+    for b in blocks:
+        if b["start"].date() != day:
+            continue
+        it = b["start"]
+        while it < b["end"]:
+            if b["professional_id"]:
+                busy_map[b["professional_id"]].add(it.strftime("%H:%M"))
+            else:
+                global_busy.add(it.strftime("%H:%M"))
+            it += timedelta(minutes=15)
+    for appt in appointments:
+        if appt["start"].date() != day:
+            continue
+        it = appt["start"]
+        end_it = it + timedelta(minutes=appt["duration_minutes"])
+        while it < end_it:
+            busy_map[appt["professional_id"]].add(it.strftime("%H:%M"))
+            it += timedelta(minutes=15)
+    for pid in busy_map:
+        busy_map[pid].update(global_busy)
+    for gap in (("13:00", "14:00"),):
+        gh = datetime.combine(day, datetime.min.time()).replace(hour=13)
+        while gh.strftime("%H:%M") < gap[1]:
+            for pid in busy_map:
+                busy_map[pid].add(gh.strftime("%H:%M"))
+            gh += timedelta(minutes=15)
+
+    slots = []
+    current = datetime.combine(day, datetime.min.time()).replace(hour=9)
+    end_limit = datetime.combine(day, datetime.min.time()).replace(hour=19)
+    while current < end_limit:
+        needed = current + timedelta(minutes=duration)
+        if needed <= end_limit:
+            for busy_set in busy_map.values():
+                check = current
+                free = True
+                while check < needed:
+                    if check.strftime("%H:%M") in busy_set:
+                        free = False
+                        break
+                    check += timedelta(minutes=15)
+                if free:
+                    slots.append(current.strftime("%H:%M"))
+                    break
+        if len(slots) >= 50:
+            break
+        current += timedelta(minutes=15)
+    return slots
+
+
+def run(days: int, n_profs: int, n_appointments: int, duration: int, repeat: int) -> Dict[str, float]:
+    start = date.today() + timedelta(days=1)
+    professionals, appointments, blocks = _synthetic_data(start, days, n_profs, n_appointments)
+
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        legacy = {start + timedelta(days=i): _legacy_day(start + timedelta(days=i), professionals, appointments, blocks, duration)
+                  for i in range(days)}
+    legacy_ms = (time.perf_counter() - t0) * 1000 / repeat
+
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        bitmap = compile_availability(start, days, professionals, TENANT_WH, tz=TZ,
+                                      appointments=appointments, calendar_blocks=blocks)
+    compile_ms = (time.perf_counter() - t0) * 1000 / repeat
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        engine = bitmap.free_slots_by_day(duration, step_minutes=15, limit=50)
+    query_ms = (time.perf_counter() - t0) * 1000 / repeat
+
+    same_days = sum(1 for d in legacy if legacy[d] == engine.get(d, []))
+    return {
+        "days": days,
+        "legacy_ms": round(legacy_ms, 2),
+        "engine_compile_ms": round(compile_ms, 2),
+        "engine_query_ms": round(query_ms, 2),
+        "speedup": round(legacy_ms / max(compile_ms + query_ms, 1e-6), 1),
+        "identical_days": same_days,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=45)
+    parser.add_argument("--profs", type=int, default=8)
+    parser.add_argument("--appointments", type=int, default=600)
+    parser.add_argument("--duration", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    for key, value in run(args.days, args.profs, args.appointments, args.duration, args.repeat).items():
+        print(f"{key:>20}: {value}")
@@ -0,0 +1,224 @@
+"""
+Daily analytics fact tables (migration 072).
+
+The finance dashboard (services/financial_dashboard_service.py) and the CEO
+professionals report (analytics_service.get_professionals_summary) read
+pre-aggregated rows instead of scanning appointments and payments:
+
+- analytics_daily_appointments: tenant / UTC day / professional / treatment
+  code -> counters and amounts (billed, paid, pending, estimated revenue...).
+- analytics_daily_cash: tenant / day -> treatment plan payments and
+  professional payouts.
+
+Maintenance is incremental: triggers on appointments,
+treatment_plan_payments and professional_payouts add the (tenant, day) of
+every changed row to analytics_dirty_days, and refresh_dirty_days() rebuilds
+exactly those days from the source rows, set-based, in one transaction per
+batch. A rebuilt day is always exact, so an update that moves an appointment
+to another day/professional needs no delta arithmetic.
+
+- Readers call ensure_fresh() for their tenant and range first, so a
+  dashboard never shows a day that is still queued.
+- jobs/analytics_rollup.py drains the queue every minute and runs the nightly
+  reconcile_recent_days(), which re-queues a window around today. That picks
+  up price changes behind estimated_revenue (treatment/professional/tenant
+  consultation prices) and anything written with the triggers disabled.
+
+Days are UTC calendar days, as the raw queries bucketed them (server time).
+"""
+
+import logging
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+REFRESH_BATCH_DAYS = 500
+RECONCILE_PAST_DAYS = 45
+RECONCILE_FUTURE_DAYS = 90
+
+_CLAIM_SQL = """
+    DELETE FROM analytics_dirty_days d
+    USING (
+        SELECT tenant_id, day FROM analytics_dirty_days
+        WHERE ($1::int IS NULL OR tenant_id = $1)
+          AND ($2::date IS NULL OR day >= $2)
+          AND ($3::date IS NULL OR day <= $3)
+        ORDER BY tenant_id, day
+        LIMIT $4
+        FOR UPDATE SKIP LOCKED
+    ) claimed
+    WHERE d.tenant_id = claimed.tenant_id AND d.day = claimed.day
+    RETURNING d.tenant_id, d.day
+"""
+
+_DELETE_APPOINTMENT_FACTS_SQL = """
+    DELETE FROM analytics_daily_appointments f
+    USING unnest($1::int[], $2::date[]) AS d(tenant_id, day)
+    WHERE f.tenant_id = d.tenant_id AND f.day = d.day
+"""
+
+# Same filters as the raw dashboard queries, one column per measure.
+_INSERT_APPOINTMENT_FACTS_SQL = """
+    INSERT INTO analytics_daily_appointments (
+        tenant_id, day, professional_id, treatment_code,
+        appointments, completed, cancelled, no_show, active, billable,
+        billed_count, paid_count, partial_count,
+        billed_amount, paid_amount, pending_amount, completed_billed_amount, estimated_revenue,
+        refreshed_at
+    )
+    SELECT
+        d.tenant_id,
+        d.day,
+        COALESCE(a.professional_id, 0),
+        COALESCE(a.appointment_type, ''),
+        COUNT(*),
+        COUNT(*) FILTER (WHERE a.status = 'completed'),
+        COUNT(*) FILTER (WHERE a.status = 'cancelled'),
+        COUNT(*) FILTER (WHERE a.status = 'no_show'),
+        COUNT(*) FILTER (WHERE a.status IN ('completed', 'confirmed', 'scheduled')),
+        COUNT(*) FILTER (WHERE a.status NOT IN ('cancelled', 'deleted')),
+        COUNT(a.billing_amount) FILTER (WHERE a.status NOT IN ('cancelled', 'deleted')),
+        COUNT(*) FILTER (WHERE a.status IN ('completed', 'confirmed', 'scheduled') AND a.payment_status = 'paid'),
+        COUNT(*) FILTER (WHERE a.status IN ('completed', 'confirmed', 'scheduled') AND a.payment_status = 'partial'),
+        COALESCE(SUM(a.billing_amount) FILTER (WHERE a.status NOT IN ('cancelled', 'deleted')), 0),
+        COALESCE(SUM(a.billing_amount) FILTER (
+            WHERE a.status NOT IN ('cancelled', 'deleted') AND a.payment_status = 'paid'
+        ), 0),
+        COALESCE(SUM(a.billing_amount) FILTER (
+            WHERE a.status NOT IN ('cancelled', 'deleted')
+              AND a.payment_status IN ('pending', 'partial')
+              AND a.billing_amount > 0
+        ), 0),
+        COALESCE(SUM(a.billing_amount) FILTER (WHERE a.status IN ('completed', 'attended')), 0),
+        -- billing_amount > treatment base_price > professional price > tenant price
+        COALESCE(SUM(
+            CASE
+                WHEN a.billing_amount IS NOT NULL AND a.billing_amount > 0 THEN a.billing_amount
+                WHEN tt.base_price IS NOT NULL AND tt.base_price > 0 THEN tt.base_price
+                WHEN p.consultation_price IS NOT NULL AND p.consultation_price > 0 THEN p.consultation_price
+                WHEN te.consultation_price IS NOT NULL AND te.consultation_price > 0 THEN te.consultation_price
+                ELSE 0
+            END
+        ) FILTER (WHERE a.status IN ('completed', 'confirmed', 'scheduled')), 0),
+        NOW()
+    FROM unnest($1::int[], $2::date[]) AS d(tenant_id, day)
+    JOIN appointments a
+      ON a.tenant_id = d.tenant_id
+     AND a.appointment_datetime >= (d.day::timestamp AT TIME ZONE 'UTC')
+     AND a.appointment_datetime < ((d.day + 1)::timestamp AT TIME ZONE 'UTC')
+    LEFT JOIN treatment_types tt ON tt.code = a.appointment_type AND tt.tenant_id = a.tenant_id
+    LEFT JOIN professionals p ON p.id = a.professional_id
+    LEFT JOIN tenants te ON te.id = a.tenant_id
+    GROUP BY d.tenant_id, d.day, COALESCE(a.professional_id, 0), COALESCE(a.appointment_type, '')
+"""
+
+_DELETE_CASH_FACTS_SQL = """
+    DELETE FROM analytics_daily_cash f
+    USING unnest($1::int[], $2::date[]) AS d(tenant_id, day)
+    WHERE f.tenant_id = d.tenant_id AND f.day = d.day
+"""
+
+_INSERT_CASH_FACTS_SQL = """
+    INSERT INTO analytics_daily_cash (tenant_id, day, plan_payments, plan_cash, plan_card, payouts, refreshed_at)
+    SELECT d.tenant_id, d.day,
+           COALESCE(pp.total, 0), COALESCE(pp.cash, 0), COALESCE(pp.card, 0), COALESCE(po.total, 0),
+           NOW()
+    FROM unnest($1::int[], $2::date[]) AS d(tenant_id, day)
+    LEFT JOIN LATERAL (
+        SELECT SUM(amount) AS total,
+               SUM(amount) FILTER (WHERE payment_method = 'cash') AS cash,
+               SUM(amount) FILTER (WHERE payment_method IN ('card', 'credit_card', 'debit_card')) AS card
+        FROM treatment_plan_payments
+        WHERE tenant_id = d.tenant_id
+          -- payment_date is TIMESTAMPTZ (migration 019)
+          AND payment_date >= (d.day::timestamp AT TIME ZONE 'UTC')
+          AND payment_date < ((d.day + 1)::timestamp AT TIME ZONE 'UTC')
+    ) pp ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT SUM(amount) AS total
+        FROM professional_payouts
+        WHERE tenant_id = d.tenant_id AND payment_date = d.day
+    ) po ON TRUE
+    WHERE pp.total IS NOT NULL OR po.total IS NOT NULL
+"""
+
+_MARK_RANGE_SQL = """
+    INSERT INTO analytics_dirty_days (tenant_id, day)
+    SELECT t.id, g::date
+    FROM tenants t
+    CROSS JOIN generate_series($1::date, $2::date, INTERVAL '1 day') AS g
+    WHERE ($3::int IS NULL OR t.id = $3)
+    ON CONFLICT DO NOTHING
+"""
+
+
+async def rebuild_days(conn, days: List[Tuple[int, date]]) -> None:
+    """Recompute the fact rows of the given (tenant_id, day) pairs. Run inside a transaction."""
+    if not days:
+        return
+    tenant_ids = [tenant_id for tenant_id, _ in days]
+    day_values = [day for _, day in days]
+    await conn.execute(_DELETE_APPOINTMENT_FACTS_SQL, tenant_ids, day_values)
+    await conn.execute(_INSERT_APPOINTMENT_FACTS_SQL, tenant_ids, day_values)
+    await conn.execute(_DELETE_CASH_FACTS_SQL, tenant_ids, day_values)
+    await conn.execute(_INSERT_CASH_FACTS_SQL, tenant_ids, day_values)
+
+
+async def refresh_dirty_days(
+    pool,
+    tenant_id: Optional[int] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    batch_days: int = REFRESH_BATCH_DAYS,
+) -> int:
+    """
+    Rebuild queued days (optionally only one tenant / range), batch by batch.
+
+    Claiming and rebuilding share a transaction: a write committed meanwhile
+    re-queues its day, and a failed batch rolls back with its claim.
+    Returns how many days were rebuilt.
+    """
+    total = 0
+    while True:
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                rows = await conn.fetch(_CLAIM_SQL, tenant_id, start, end, batch_days)
+                days = [(r["tenant_id"], r["day"]) for r in rows]
+                await rebuild_days(conn, days)
+        total += len(days)
+        if len(days) < batch_days:
+            return total
+
+
+async def ensure_fresh(pool, tenant_id: int, start: date, end: date) -> None:
+    """Rebuild queued days of this tenant/range before a dashboard reads the facts."""
+    try:
+        rebuilt = await refresh_dirty_days(pool, tenant_id, start, end)
+        if rebuilt:
+            logger.debug(f"analytics rollup: rebuilt {rebuilt} day(s) for tenant {tenant_id} on read")
+    except Exception as e:
+        # Facts may be a few minutes stale; the job retries the queued days
+        logger.warning(f"analytics rollup: on-read refresh failed for tenant {tenant_id}: {e}")
+
+
+async def mark_range_dirty(pool, start: date, end: date, tenant_id: Optional[int] = None) -> None:
+    """Queue every day of [start, end] (all tenants unless tenant_id) for a rebuild."""
+    await pool.execute(_MARK_RANGE_SQL, start, end, tenant_id)
+
+
+async def reconcile_recent_days(
+    pool,
+    today: Optional[date] = None,
+    past_days: int = RECONCILE_PAST_DAYS,
+    future_days: int = RECONCILE_FUTURE_DAYS,
+) -> int:
+    """Nightly: re-queue the window around today and rebuild it."""
+    today = today or date.today()
+    await mark_range_dirty(pool, today - timedelta(days=past_days), today + timedelta(days=future_days))
+    return await refresh_dirty_days(pool)
+
+
+def to_day(value) -> date:
+    """Dashboard bounds arrive as date or datetime; the facts are keyed by date."""
+    return value.date() if isinstance(value, datetime) else value
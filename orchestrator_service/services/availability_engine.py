@@ -0,0 +1,348 @@
+"""
+Availability engine: per-professional minute bitmaps for slot search.
+
+The legacy path (main.generate_free_slots fed by per-day busy_map sets) walks
+every candidate time × professional × 15-minute block doing strftime lookups
+into string sets, and check_availability repeats that day by day for up to
+~50 days of range search + expansion.
+
+Here a date range is compiled once into a boolean array
+    busy[day, professional, minute_of_day]
+from working hours, clinic hours / gaps, holidays, professional blocks,
+appointments and calendar blocks. A free-slot query for any duration is then
+a cumulative-sum window test over the whole range at once:
+    window_busy = cumsum[start + duration] - cumsum[start]
+and a slot is offered when at least one professional has window_busy == 0.
+Conflicts are exact to the minute (an appointment at 10:10 blocks 10:00 for a
+30-minute treatment), which the 15-minute string sampling could only
+approximate.
+
+This module is pure computation (no DB); main.py resolves the inputs.
+scripts/bench_availability_engine.py compares it against the legacy loop.
+"""
+
+from datetime import date, datetime, timedelta, tzinfo
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+MINUTES_PER_DAY = 1440
+DEFAULT_STEP_MINUTES = 15
+AFTERNOON_START_MINUTE = 13 * 60
+EVENING_START_MINUTE = 19 * 60
+DAYS_EN = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+
+def hhmm_to_minute(value: Optional[str]) -> Optional[int]:
+    """'HH:MM' → minute of day; None on malformed input."""
+    if not value:
+        return None
+    try:
+        h, m = map(int, str(value).strip().split(":")[:2])
+    except (ValueError, IndexError):
+        return None
+    return h * 60 + m
+
+
+def minute_to_hhmm(minute: int) -> str:
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def _candidate_filter(starts: np.ndarray, time_preference: Optional[str],
+                      min_time: Optional[str], max_time: Optional[str]) -> np.ndarray:
+    """Same filters as generate_free_slots, on start minutes."""
+    keep = np.ones(starts.shape, dtype=bool)
+    if time_preference == "mañana":
+        keep &= starts < AFTERNOON_START_MINUTE
+    elif time_preference == "tarde":
+        keep &= starts >= AFTERNOON_START_MINUTE
+    elif time_preference == "noche":
+        keep &= starts >= EVENING_START_MINUTE
+    min_m = hhmm_to_minute(min_time)
+    if min_m is not None:
+        keep &= starts >= min_m
+    max_m = hhmm_to_minute(max_time)
+    if max_m is not None:
+        keep &= starts <= max_m
+    return keep
+
+
+def free_slots_from_busy_sets(
+    busy_intervals_by_prof: Dict[int, set],
+    start_minute: int,
+    end_minute: int,
+    duration_minutes: int,
+    interval_minutes: int = 30,
+    limit: int = 20,
+    time_preference: Optional[str] = None,
+    min_time: Optional[str] = None,
+    max_time: Optional[str] = None,
+    not_after_or_at: Optional[int] = None,
+) -> List[str]:
+    """
+    Vectorized equivalent of the legacy generate_free_slots loop.
+
+    Keeps its exact semantics (a candidate is free for a professional when
+    none of the 15-minute sample points inside the duration is in the busy
+    set) so existing callers that build busy_map sets see identical output.
+    not_after_or_at: minute of day at/before which candidates are dropped
+    (used for "today").
+    """
+    if start_minute >= end_minute:
+        return []
+    starts = np.arange(start_minute, end_minute, max(1, interval_minutes))
+    starts = starts[starts + duration_minutes <= end_minute]
+    if not_after_or_at is not None:
+        starts = starts[starts > not_after_or_at]
+    starts = starts[_candidate_filter(starts, time_preference, min_time, max_time)]
+    if starts.size == 0 or not busy_intervals_by_prof:
+        return []
+
+    bits = np.zeros((len(busy_intervals_by_prof), MINUTES_PER_DAY + 1), dtype=bool)
+    for row, busy_set in enumerate(busy_intervals_by_prof.values()):
+        minutes = [m for m in (hhmm_to_minute(s) for s in busy_set) if m is not None and 0 <= m < MINUTES_PER_DAY]
+        if minutes:
+            bits[row, minutes] = True
+
+    offsets = np.arange(0, max(duration_minutes, 1), DEFAULT_STEP_MINUTES)
+    samples = np.minimum(starts[:, None] + offsets[None, :], MINUTES_PER_DAY)
+    busy_at = bits[:, samples].any(axis=2)  # (profs, candidates)
+    free = ~busy_at.all(axis=0)
+    return [minute_to_hhmm(int(m)) for m in starts[free][:limit]]
+
+
+class AvailabilityBitmap:
+    """busy[day, professional, minute] over a date range plus each day's open window."""
+
+    def __init__(self, start_date: date, n_days: int, prof_ids: Sequence[int]):
+        self.start_date = start_date
+        self.n_days = n_days
+        self.prof_ids = list(prof_ids)
+        self._prof_index = {pid: i for i, pid in enumerate(self.prof_ids)}
+        self.busy = np.zeros((n_days, len(self.prof_ids), MINUTES_PER_DAY), dtype=bool)
+        self.window_start = np.zeros(n_days, dtype=np.int32)
+        self.window_end = np.zeros(n_days, dtype=np.int32)  # start == end → closed
+
+    @property
+    def dates(self) -> List[date]:
+        return [self.start_date + timedelta(days=i) for i in range(self.n_days)]
+
+    def day_index(self, day: date) -> Optional[int]:
+        idx = (day - self.start_date).days
+        return idx if 0 <= idx < self.n_days else None
+
+    def set_window(self, day_idx: int, start_minute: int, end_minute: int) -> None:
+        self.window_start[day_idx] = start_minute
+        self.window_end[day_idx] = max(start_minute, end_minute)
+
+    def mark_busy(self, day_idx: int, start_minute: int, end_minute: int,
+                  prof_id: Optional[int] = None) -> None:
+        """Mark [start, end) busy for one professional, or for all when prof_id is None."""
+        start_minute = max(0, start_minute)
+        end_minute = min(MINUTES_PER_DAY, end_minute)
+        if start_minute >= end_minute:
+            return
+        if prof_id is None:
+            self.busy[day_idx, :, start_minute:end_minute] = True
+        elif prof_id in self._prof_index:
+            self.busy[day_idx, self._prof_index[prof_id], start_minute:end_minute] = True
+
+    def mark_outside(self, day_idx: int, prof_id: int, intervals: Iterable[Tuple[int, int]]) -> None:
+        """Mark everything outside the given working intervals busy for one professional."""
+        if prof_id not in self._prof_index:
+            return
+        row = self.busy[day_idx, self._prof_index[prof_id]]
+        working = np.zeros(MINUTES_PER_DAY, dtype=bool)
+        for start_minute, end_minute in intervals:
+            working[max(0, start_minute):min(MINUTES_PER_DAY, end_minute)] = True
+        row |= ~working
+
+    def mark_interval(self, start: datetime, end: datetime, tz: tzinfo,
+                      prof_id: Optional[int] = None) -> None:
+        """Mark an absolute [start, end) interval, split across the days it touches."""
+        local_start = start.astimezone(tz)
+        local_end = end.astimezone(tz)
+        day = local_start.date()
+        while day <= local_end.date():
+            idx = self.day_index(day)
+            if idx is not None:
+                s = local_start.hour * 60 + local_start.minute if day == local_start.date() else 0
+                if day == local_end.date():
+                    e = local_end.hour * 60 + local_end.minute + (1 if local_end.second or local_end.microsecond else 0)
+                else:
+                    e = MINUTES_PER_DAY
+                self.mark_busy(idx, s, e, prof_id)
+            day += timedelta(days=1)
+
+    def free_slots_by_day(
+        self,
+        duration_minutes: int,
+        step_minutes: int = DEFAULT_STEP_MINUTES,
+        limit: int = 50,
+        time_preference: Optional[str] = None,
+        min_time: Optional[str] = None,
+        max_time: Optional[str] = None,
+        now: Optional[datetime] = None,
+        days: Optional[Sequence[date]] = None,
+    ) -> Dict[date, List[str]]:
+        """
+        Free 'HH:MM' starts per day: candidates every step_minutes from the
+        day's window start, fully inside the window, where at least one
+        professional has no busy minute in [start, start + duration).
+        Computed for all requested days in one set of array operations.
+        """
+        day_idx = np.arange(self.n_days) if days is None else np.array(
+            [i for i in (self.day_index(d) for d in days) if i is not None], dtype=np.int64
+        )
+        if day_idx.size == 0 or not self.prof_ids:
+            return {self.start_date + timedelta(days=int(i)): [] for i in day_idx}
+
+        busy = self.busy[day_idx]
+        cs = np.zeros((busy.shape[0], busy.shape[1], MINUTES_PER_DAY + 1), dtype=np.int32)
+        np.cumsum(busy, axis=2, out=cs[:, :, 1:])
+
+        step = max(1, step_minutes)
+        k = np.arange(MINUTES_PER_DAY // step + 1)
+        starts = self.window_start[day_idx][:, None] + step * k[None, :]  # (D, K)
+        ends = starts + duration_minutes
+        valid = ends <= self.window_end[day_idx][:, None]
+        valid &= _candidate_filter(starts, time_preference, min_time, max_time)
+
+        if now is not None:
+            # Same rule as generate_free_slots: today's starts at/before now are gone.
+            today = now.date()
+            now_minute = now.hour * 60 + now.minute
+            for row, i in enumerate(day_idx):
+                d = self.start_date + timedelta(days=int(i))
+                if d < today:
+                    valid[row] = False
+                elif d == today:
+                    valid[row] &= starts[row] > now_minute
+
+        s_idx = np.clip(starts, 0, MINUTES_PER_DAY)
+        e_idx = np.clip(ends, 0, MINUTES_PER_DAY)
+        n_prof = busy.shape[1]
+        at_start = np.take_along_axis(cs, np.repeat(s_idx[:, None, :], n_prof, axis=1), axis=2)
+        at_end = np.take_along_axis(cs, np.repeat(e_idx[:, None, :], n_prof, axis=1), axis=2)
+        free = ((at_end - at_start) == 0).any(axis=1) & valid  # (D, K)
+
+        result: Dict[date, List[str]] = {}
+        for row, i in enumerate(day_idx):
+            picked = starts[row][free[row]][:limit]
+            result[self.start_date + timedelta(days=int(i))] = [minute_to_hhmm(int(m)) for m in picked]
+        return result
+
+    def free_slots(self, day: date, duration_minutes: int, **kwargs) -> List[str]:
+        if self.day_index(day) is None:
+            return []
+        return self.free_slots_by_day(duration_minutes, days=[day], **kwargs).get(day, [])
+
+
+def _parse_working_hours(value: Any) -> Dict[str, Any]:
+    if isinstance(value, str):
+        try:
+            import json
+            value = json.loads(value) if value else {}
+        except Exception:
+            value = {}
+    return value if isinstance(value, dict) else {}
+
+
+def _slot_intervals(slots: Iterable[Dict[str, str]]) -> List[Tuple[int, int]]:
+    intervals = []
+    for slot in slots or []:
+        s, e = hhmm_to_minute(slot.get("start")), hhmm_to_minute(slot.get("end"))
+        if s is not None and e is not None:
+            intervals.append((s, e))
+    return sorted(intervals)
+
+
+def compile_availability(
+    start_date: date,
+    n_days: int,
+    professionals: Sequence[Dict[str, Any]],
+    tenant_wh: Dict[str, Any],
+    tz: tzinfo,
+    default_hours: Tuple[str, str] = ("09:00", "18:00"),
+    holidays: Optional[Dict[date, Tuple[bool, Optional[Dict[str, str]]]]] = None,
+    blocked_professionals: Optional[Dict[date, Set[int]]] = None,
+    appointments: Iterable[Dict[str, Any]] = (),
+    calendar_blocks: Iterable[Dict[str, Any]] = (),
+    open_days: Optional[Set[date]] = None,
+) -> AvailabilityBitmap:
+    """
+    Compile everything that makes a minute busy into an AvailabilityBitmap.
+
+    Day rules mirror _get_slots_for_extra_day: a day is closed when the
+    tenant disabled it, when it is an unconfigured Sunday, or when it is a
+    holiday without custom hours; otherwise its window is the span of the
+    tenant's slots (gaps between slots busy for everyone), the clinic
+    default, or the holiday's custom hours.
+
+    holidays: date → (is_holiday, custom_hours) for the global context.
+    blocked_professionals: date → professionals closed that day.
+    appointments: records with professional_id, start, duration_minutes.
+    calendar_blocks: records with professional_id (None = everyone), start, end.
+    open_days: when given, only these dates are compiled (others stay closed).
+    """
+    holidays = holidays or {}
+    blocked_professionals = blocked_professionals or {}
+    bitmap = AvailabilityBitmap(start_date, n_days, [p["id"] for p in professionals])
+    prof_hours = [(p["id"], _parse_working_hours(p.get("working_hours"))) for p in professionals]
+    default_start = hhmm_to_minute(default_hours[0]) or 9 * 60
+    default_end = hhmm_to_minute(default_hours[1]) or 18 * 60
+
+    for idx, day in enumerate(bitmap.dates):
+        if open_days is not None and day not in open_days:
+            continue
+        day_en = DAYS_EN[day.weekday()]
+        tenant_day = tenant_wh.get(day_en, {}) or {}
+        if tenant_day and not tenant_day.get("enabled", True):
+            continue
+        if not tenant_day and day.weekday() == 6:
+            continue
+        is_hol, custom_hours = holidays.get(day, (False, None))
+        if is_hol and not custom_hours:
+            continue
+
+        tenant_slots = _slot_intervals(tenant_day.get("slots", [])) if tenant_day.get("enabled") else []
+        if custom_hours:
+            w_start = hhmm_to_minute(custom_hours.get("start"))
+            w_end = hhmm_to_minute(custom_hours.get("end"))
+        elif tenant_slots:
+            w_start = tenant_slots[0][0]
+            w_end = max(e for _, e in tenant_slots)
+        else:
+            w_start, w_end = default_start, default_end
+        bitmap.set_window(idx, w_start if w_start is not None else default_start,
+                          w_end if w_end is not None else default_end)
+
+        # Gaps between the tenant's slots (e.g. lunch) are closed for everyone.
+        if tenant_slots and not custom_hours:
+            for (_, gap_start), (gap_end, _) in zip(tenant_slots, tenant_slots[1:]):
+                bitmap.mark_busy(idx, gap_start, gap_end)
+
+        for prof_id, wh in prof_hours:
+            day_config = wh.get(day_en, {}) or {}
+            if day_config.get("enabled") and day_config.get("slots"):
+                bitmap.mark_outside(idx, prof_id, _slot_intervals(day_config["slots"]))
+            elif day_config.get("enabled") is False:
+                bitmap.mark_busy(idx, 0, MINUTES_PER_DAY, prof_id)
+
+        for prof_id in blocked_professionals.get(day, ()):
+            bitmap.mark_busy(idx, 0, MINUTES_PER_DAY, prof_id)
+
+    for block in calendar_blocks:
+        bitmap.mark_interval(block["start"], block["end"], tz, block.get("professional_id"))
+
+    for appt in appointments:
+        pid = appt.get("professional_id")
+        if pid is None:
+            continue
+        appt_duration = appt.get("duration_minutes")
+        appt_duration = 60 if appt_duration is None else appt_duration
+        if appt_duration <= 0:
+            appt_duration = 30
+        bitmap.mark_interval(appt["start"], appt["start"] + timedelta(minutes=appt_duration), tz, pid)
+
+    return bitmap
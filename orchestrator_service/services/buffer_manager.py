@@ -134,6 +134,8 @@ class BufferManager:
         # 2. Reiniciar timer (debounce)
         debounce_seconds = await cls.get_config(db_pool, provider, channel, tenant_id, "debounce_seconds", 10)
         await redis_client.setex(timer_key, debounce_seconds, "1")
+        from services.debounce_scheduler import get_debounce_scheduler
+        await get_debounce_scheduler().schedule(redis_client, timer_key, debounce_seconds)
 
         # 3. Adquisición ATÓMICA del lock — solo el ganador spawnea la task
         acquired = await redis_client.set(lock_key, "1", nx=True, ex=300)
@@ -163,16 +165,15 @@ class BufferManager:
         buffer_key = cls.get_buffer_key(provider, tenant_id, external_user_id)
         timer_key = cls.get_timer_key(provider, tenant_id, external_user_id)
         lock_key = cls.get_lock_key(provider, tenant_id, external_user_id)
+        from services.debounce_scheduler import get_debounce_scheduler
+        scheduler = get_debounce_scheduler()
         
         try:
             # Graceful Interruption Loop
             while True:
-                # 1. FASE DEBOUNCE: Esperar hasta que timer expire
-                while True:
-                    await asyncio.sleep(1)
-                    ttl = await redis_client.ttl(timer_key)
-                    if ttl <= 0:  # Timer expiró, el usuario terminó de escribir la ráfaga
-                        break
+                # 1. FASE DEBOUNCE: dormir hasta que venza el timer (sin polling;
+                # el scheduler despierta cuando el usuario terminó la ráfaga)
+                await scheduler.wait_until_due(redis_client, timer_key)
                 
                 # 2. FETCH ATÓMICO: Obtener todos los mensajes encolados de manera segura
                 parsed_items, message_count = await AtomicRedisProcessor.atomic_buffer_fetch(redis_client, buffer_key)
@@ -275,6 +276,7 @@ class BufferManager:
                 if await redis_client.llen(buffer_key) > 0:
                     debounce_seconds = await cls.get_config(db_pool, provider, channel, tenant_id, "debounce_seconds", 10)
                     await redis_client.setex(timer_key, debounce_seconds, "1")
+                    await scheduler.schedule(redis_client, timer_key, debounce_seconds)
                     # Reiniciamos el ciclo para el nuevo lote encolado
                 else:
                     break # Terminamos todo y no hay nada nuevo en la cola
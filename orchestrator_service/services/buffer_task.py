@@ -759,7 +759,6 @@ async def process_buffer_task(
             get_agent_executable_for_tenant,
             build_system_prompt,
             get_now_arg,
-            normalize_phone_digits,
             CLINIC_NAME,
             CLINIC_HOURS_START,
             CLINIC_HOURS_END,
@@ -781,15 +780,24 @@ async def process_buffer_task(
         current_tenant_id.set(tenant_id)
         current_source_channel.set(channel or "whatsapp")
 
+        # ── Patient snapshot: linked patient, phone match, appointments, plan,
+        # minors and family members in one concurrent round-trip ──
+        from services.patient_context import load_patient_snapshot
+
+        linked_patient_id = row.get("linked_patient_id")
+        family_ids_raw = row.get("family_patient_ids")
+        patient_snapshot = await load_patient_snapshot(
+            pool,
+            tenant_id,
+            external_user_id,
+            linked_patient_id=linked_patient_id,
+            family_patient_ids=list(family_ids_raw) if family_ids_raw else None,
+        )
+
         # ── Patient resolution: linked_patient_id or phone fallback ──
         resolved_patient_phone = None
-        linked_patient_id = row.get("linked_patient_id")
         if linked_patient_id:
-            linked_patient_row = await pool.fetchrow(
-                "SELECT id, phone_number FROM patients WHERE id = $1 AND tenant_id = $2",
-                linked_patient_id,
-                tenant_id,
-            )
+            linked_patient_row = patient_snapshot.linked_patient
             if linked_patient_row:
                 current_patient_id.set(linked_patient_row["id"])
                 resolved_patient_phone = linked_patient_row["phone_number"]
@@ -797,11 +805,7 @@ async def process_buffer_task(
                     f"🔗 Patient resolved via linked_patient_id={linked_patient_id} phone={resolved_patient_phone}"
                 )
         if current_patient_id.get() is None:
-            patient_by_phone = await pool.fetchrow(
-                "SELECT id, phone_number FROM patients WHERE tenant_id = $1 AND phone_number = $2",
-                tenant_id,
-                external_user_id,
-            )
+            patient_by_phone = patient_snapshot.phone_match
             if patient_by_phone:
                 current_patient_id.set(patient_by_phone["id"])
                 resolved_patient_phone = patient_by_phone["phone_number"]
@@ -846,7 +850,6 @@ async def process_buffer_task(
                 logger.debug(f"T9 2-of-3 resolution skipped: {_t9_err}")
 
         # ── Family resolution: load family_patient_ids ──
-        family_ids_raw = row.get("family_patient_ids")
         if family_ids_raw:
             # Convert asyncpg ARRAY to Python list
             family_ids_list = list(family_ids_raw)
@@ -870,24 +873,13 @@ async def process_buffer_task(
                 f"tz_resolver: failed for tenant {tenant_id}, falling back to ARG_TZ: {_tz_err}"
             )
 
-        tenant_row = await pool.fetchrow(
-            """SELECT clinic_name, address, google_maps_url, working_hours,
-                      consultation_price, bank_cbu, bank_alias, bank_holder_name,
-                      system_prompt_template, bot_name,
-                      payment_methods, financing_available, max_installments,
-                      installments_interest_free, financing_provider, financing_notes,
-                      cash_discount_percent, accepts_crypto,
-                      accepts_pregnant_patients, pregnancy_restricted_treatments,
-                      pregnancy_notes, accepts_pediatric, min_pediatric_age_years,
-                      pediatric_notes, high_risk_protocols, requires_anamnesis_before_booking,
-                      complaint_escalation_email, complaint_escalation_phone,
-                      expected_wait_time_minutes, revision_policy, review_platforms,
-                      complaint_handling_protocol, auto_send_review_link_after_followup,
-                      social_ig_active, social_landings, instagram_handle, facebook_page_id,
-                      bot_phone_number, config
-               FROM tenants WHERE id = $1""",
-            tenant_id,
-        )
+        # Tenant-level prompt inputs (tenant row, FAQs, insurance, treatments,
+        # derivation/operational rules, lead professional) barely change between
+        # turns — served from the versioned tenant prompt cache.
+        from services.tenant_prompt_cache import get_tenant_prompt_context
+
+        tenant_prompt_ctx = await get_tenant_prompt_context(pool, tenant_id)
+        tenant_row = tenant_prompt_ctx.tenant_row
         clinic_name = (
             (tenant_row["clinic_name"] or CLINIC_NAME) if tenant_row else CLINIC_NAME
         )
@@ -932,199 +924,22 @@ async def process_buffer_task(
             cash_discount_percent = None
         accepts_crypto = bool(tenant_row.get("accepts_crypto") if tenant_row else False)
 
-        # --- Clinic special conditions (migración 036) ---
-        # Computamos el bloque pre-formateado acá para que build_system_prompt
-        # sólo reciba un string (wiring simple, testeable y non-fatal).
-        special_conditions_block = ""
-        try:
-            if tenant_row:
-                # Resolver treatment_name_map para mostrar nombres amigables
-                treatment_name_map: dict = {}
-                try:
-                    _tt_rows = await pool.fetch(
-                        "SELECT code, COALESCE(patient_display_name, name) AS display_name "
-                        "FROM treatment_types WHERE tenant_id = $1 AND is_active = true",
-                        tenant_id,
-                    )
-                    treatment_name_map = {
-                        r["code"]: r["display_name"] for r in _tt_rows
-                    }
-                except Exception:
-                    treatment_name_map = {}
-
-                from main import _format_special_conditions
-
-                special_conditions_block = _format_special_conditions(
-                    dict(tenant_row),
-                    treatment_name_map=treatment_name_map,
-                )
-        except Exception as _sc_err:
-            logger.debug(f"_format_special_conditions skipped (non-fatal): {_sc_err}")
-            special_conditions_block = ""
-
-        # --- Clinic support / complaints / review config (migration 039) ---
-        support_policy_block = ""
-        try:
-            if tenant_row:
-                from main import _format_support_policy
-
-                support_policy_block = _format_support_policy(dict(tenant_row))
-        except Exception as _sp_err:
-            logger.debug(f"_format_support_policy skipped (non-fatal): {_sp_err}")
-            support_policy_block = ""
-
-        system_prompt_template = (
-            (tenant_row.get("system_prompt_template") or "") if tenant_row else ""
-        )
-        # Normalize whitespace in the tenant-configured greeting/specialty pitch.
-        # The UI textarea may save it with hard line-breaks and leading spaces
-        # (Python triple-quoted style), which then leak into the WhatsApp/IG/FB
-        # message as visible indented broken lines. We collapse single newlines
-        # into spaces, preserve intentional double-newlines as paragraph breaks,
-        # and strip per-line leading/trailing whitespace.
-        if system_prompt_template:
-            import re as _re
-
-            _paragraphs = _re.split(r"\n\s*\n", system_prompt_template)
-            _clean_paragraphs = []
-            for _p in _paragraphs:
-                # Join wrapped lines into a single line, collapse repeated spaces
-                _flat = " ".join(
-                    line.strip() for line in _p.splitlines() if line.strip()
-                )
-                _flat = _re.sub(r"[ \t]{2,}", " ", _flat).strip()
-                if _flat:
-                    _clean_paragraphs.append(_flat)
-            system_prompt_template = "\n\n".join(_clean_paragraphs)
+        special_conditions_block = tenant_prompt_ctx.special_conditions_block
+        support_policy_block = tenant_prompt_ctx.support_policy_block
+        system_prompt_template = tenant_prompt_ctx.system_prompt_template
         clinic_working_hours = None
         if tenant_row and tenant_row.get("working_hours"):
             wh = tenant_row["working_hours"]
             clinic_working_hours = json.loads(wh) if isinstance(wh, str) else wh
 
-        # Resolve lead professional name for prompt positioning
-        lead_professional_name = ""
-        try:
-            prof_row = await pool.fetchrow(
-                "SELECT first_name, last_name FROM professionals WHERE tenant_id = $1 AND is_active = true ORDER BY id ASC LIMIT 1",
-                tenant_id,
-            )
-            if prof_row:
-                lead_professional_name = f"{prof_row['first_name']} {prof_row.get('last_name', '') or ''}".strip()
-        except Exception:
-            pass
-
-        # Fetch FAQs for this tenant (no limit — RAG will select relevant ones)
-        faq_rows = await pool.fetch(
-            "SELECT category, question, answer FROM clinic_faqs WHERE tenant_id = $1 ORDER BY sort_order ASC, id ASC",
-            tenant_id,
-        )
-        faqs = [dict(r) for r in faq_rows] if faq_rows else []
-
-        # Fetch insurance providers for this tenant (migration 034 shape)
-        insurance_providers = []
-        try:
-            ins_rows = await pool.fetch(
-                """
-                SELECT id, provider_name, status, coverage_by_treatment, is_prepaid,
-                       employee_discount_percent, default_copay_percent, external_target,
-                       requires_copay, copay_notes, ai_response_template,
-                       scheduling_mode, scheduling_delay_days
-                FROM tenant_insurance_providers
-                WHERE tenant_id = $1 AND is_active = true
-                ORDER BY sort_order, provider_name
-                """,
-                tenant_id,
-            )
-            insurance_providers = []
-            for r in ins_rows or []:
-                d = dict(r)
-                # asyncpg may return JSONB as a string in some versions
-                if isinstance(d.get("coverage_by_treatment"), str):
-                    try:
-                        import json as _json_cov
-
-                        d["coverage_by_treatment"] = _json_cov.loads(
-                            d["coverage_by_treatment"]
-                        )
-                    except (ValueError, TypeError):
-                        d["coverage_by_treatment"] = {}
-                insurance_providers.append(d)
-        except Exception as ins_err:
-            logger.debug(f"Insurance providers fetch (non-fatal): {ins_err}")
-
-        # Fetch active treatment types for treatment_display_map in the prompt
-        # (used by _format_insurance_providers to render human-readable names).
-        treatment_types_list = []
-        try:
-            tt_rows = await pool.fetch(
-                """
-                SELECT code, name, patient_display_name, consultation_requirements
-                FROM treatment_types
-                WHERE tenant_id = $1 AND is_active = true
-                ORDER BY name
-                """,
-                tenant_id,
-            )
-            treatment_types_list = [dict(r) for r in tt_rows] if tt_rows else []
-        except Exception as tt_err:
-            logger.debug(f"Treatment types fetch (non-fatal): {tt_err}")
-
-        # Fetch derivation rules for this tenant (migration 038: includes
-        # escalation fallback fields and enriches with fallback_professional_name
-        # via a second LEFT JOIN so the prompt formatter can render the
-        # full escalation block).
-        derivation_rules = []
-        try:
-            der_rows = await pool.fetch(
-                """
-                SELECT dr.id, dr.rule_name, dr.patient_condition, dr.treatment_categories,
-                       dr.target_type, dr.target_professional_id, dr.priority_order,
-                       dr.enable_escalation, dr.fallback_professional_id,
-                       dr.fallback_team_mode, dr.max_wait_days_before_escalation,
-                       dr.escalation_message_template,
-                       p.first_name AS target_professional_name,
-                       fp.first_name AS fallback_professional_name
-                FROM professional_derivation_rules dr
-                LEFT JOIN professionals p ON dr.target_professional_id = p.id
-                LEFT JOIN professionals fp ON dr.fallback_professional_id = fp.id
-                WHERE dr.tenant_id = $1 AND dr.is_active = true
-                ORDER BY dr.priority_order ASC, dr.id ASC
-                """,
-                tenant_id,
-            )
-            derivation_rules = [dict(r) for r in der_rows] if der_rows else []
-        except Exception as der_err:
-            logger.debug(f"Derivation rules fetch (non-fatal): {der_err}")
+        lead_professional_name = tenant_prompt_ctx.lead_professional_name
+        faqs = tenant_prompt_ctx.faqs
+        insurance_providers = tenant_prompt_ctx.insurance_providers
+        treatment_types_list = tenant_prompt_ctx.treatment_types_list
+        derivation_rules = tenant_prompt_ctx.derivation_rules
 
         # --- OPERATIONAL RULES (temporary/strategic) ---
-        operational_rules_block = ""
-        try:
-            op_rows = await pool.fetch(
-                """SELECT rule_name, rule_type, prompt_injection, valid_until
-                   FROM clinic_operational_rules
-                   WHERE tenant_id = $1 AND is_active = true
-                     AND (valid_from IS NULL OR valid_from <= NOW())
-                     AND (valid_until IS NULL OR valid_until >= NOW())
-                     AND ('all' = ANY(applies_to) OR 'tora' = ANY(applies_to))
-                   ORDER BY priority_order ASC, id ASC""",
-                tenant_id,
-            )
-            if op_rows:
-                parts = ["⚠️ REGLAS OPERATIVAS VIGENTES (deben aplicarse SIEMPRE):"]
-                for opr in op_rows:
-                    until = (
-                        f" (vigente hasta {opr['valid_until'].strftime('%d/%m/%Y')})"
-                        if opr.get("valid_until")
-                        else ""
-                    )
-                    parts.append(
-                        f"[{opr['rule_type'].upper()}] {opr['rule_name']}{until}:"
-                    )
-                    parts.append(opr["prompt_injection"])
-                    parts.append("")
-                operational_rules_block = "\n".join(parts)
-        except Exception as op_err:
-            logger.debug(f"Operational rules fetch (non-fatal): {op_err}")
+        operational_rules_block = tenant_prompt_ctx.render_operational_rules_block()
 
         # --- PATIENT MEMORY SYSTEM: Ensure table exists (first call only) ---
         try:
@@ -1139,26 +954,9 @@ async def process_buffer_task(
             logger.warning(f"⚠️ Patient memory init (non-fatal): {mem_init_err}")
 
         # Spec 24 / Spec 06 / v7.6: Patient Identity & Appointment Context
-        # Fetch patient data — search by phone (WhatsApp) or PSID (Instagram/Facebook)
-        # or by external_ids JSONB (for IG/FB patients linked post-creation)
-        phone_digits = normalize_phone_digits(external_user_id)
-        patient_row = await pool.fetchrow(
-            """SELECT id, first_name, last_name, dni, email, phone_number, birth_date, acquisition_source, anamnesis_token, medical_history, assigned_professional_id, insurance_provider FROM patients
-               WHERE tenant_id = $1 AND (
-                   REGEXP_REPLACE(phone_number, '[^0-9]', '', 'g') = $2
-                   OR phone_number = $3
-                   OR instagram_psid = $3
-                   OR facebook_psid = $3
-                   OR external_ids->>'instagram' = $3
-                   OR external_ids->>'facebook' = $3
-                   OR external_ids->>'chatwoot' = $3
-               )
-               ORDER BY updated_at DESC NULLS LAST
-               LIMIT 1""",
-            tenant_id,
-            phone_digits,
-            external_user_id,
-        )
+        # Patient matched by phone (WhatsApp), PSID (Instagram/Facebook) or
+        # external_ids JSONB (for IG/FB patients linked post-creation)
+        patient_row = patient_snapshot.patient
 
         patient_context = ""
         ad_context = ""
@@ -1208,25 +1006,16 @@ async def process_buffer_task(
                 identity_lines.append(f"• Obra Social registrada: {p_insurance}")
 
             # Assigned Professional (persistent patient→professional relationship)
-            assigned_prof_id = patient_row.get("assigned_professional_id")
-            if assigned_prof_id:
-                try:
-                    assigned_prof = await pool.fetchrow(
-                        "SELECT first_name, last_name FROM professionals WHERE id = $1 AND tenant_id = $2 AND is_active = true",
-                        assigned_prof_id,
-                        tenant_id,
-                    )
-                    if assigned_prof:
-                        assigned_name = f"{assigned_prof['first_name']} {assigned_prof.get('last_name', '') or ''}".strip()
-                        identity_lines.append(
-                            f"• PROFESIONAL ASIGNADO: Dr/a. {assigned_name} — Este paciente es paciente habitual de este profesional. "
-                            f"PRIORIDAD ALTA por ser paciente propio (independientemente de la complejidad del tratamiento). "
-                            f"Si menciona DOLOR → prioridad inmediata/urgencia. Sin dolor → prioridad media. "
-                            f"SIEMPRE ofrecer turnos con este profesional primero. Si no hay disponibilidad, "
-                            f"mencionar que es su profesional habitual y ofrecer la próxima fecha disponible."
-                        )
-                except Exception:
-                    pass
+            assigned_prof = patient_snapshot.assigned_professional
+            if assigned_prof:
+                assigned_name = f"{assigned_prof['first_name']} {assigned_prof.get('last_name', '') or ''}".strip()
+                identity_lines.append(
+                    f"• PROFESIONAL ASIGNADO: Dr/a. {assigned_name} — Este paciente es paciente habitual de este profesional. "
+                    f"PRIORIDAD ALTA por ser paciente propio (independientemente de la complejidad del tratamiento). "
+                    f"Si menciona DOLOR → prioridad inmediata/urgencia. Sin dolor → prioridad media. "
+                    f"SIEMPRE ofrecer turnos con este profesional primero. Si no hay disponibilidad, "
+                    f"mencionar que es su profesional habitual y ofrecer la próxima fecha disponible."
+                )
 
             # 2. Building Ad Context (Spec 06)
             meta_headline = ""  # Already in patient_row if we joined or updated, checking current db state
@@ -1236,23 +1025,8 @@ async def process_buffer_task(
             # Quick check for meta headline if not in main row (some schemas store it differently)
             # For simplicity, we assume attributes might have it or use what's in 'patients'
 
-            # 3. Fetching Next Appointment Context
-            next_apt = await pool.fetchrow(
-                """
-                SELECT a.appointment_datetime, tt.name as treatment_name, 
-                       prof.first_name as professional_name
-                FROM appointments a
-                LEFT JOIN treatment_types tt ON a.appointment_type = tt.code
-                LEFT JOIN professionals prof ON a.professional_id = prof.id
-                WHERE a.tenant_id = $1 AND a.patient_id = $2 
-                AND a.appointment_datetime >= NOW()
-                AND a.status IN ('scheduled', 'confirmed')
-                ORDER BY a.appointment_datetime ASC
-                LIMIT 1
-            """,
-                tenant_id,
-                p_id,
-            )
+            # 3. Next Appointment Context
+            next_apt = patient_snapshot.next_appointment
 
             if next_apt:
                 dt = next_apt["appointment_datetime"]
@@ -1299,41 +1073,14 @@ async def process_buffer_task(
                 )
                 # Si tiene MÁS de un turno futuro, avisar al agente: el contexto solo
                 # muestra el más próximo, y ante cancelar/reprogramar debe confirmar CUÁL.
-                try:
-                    _future_count = await pool.fetchval(
-                        """
-                        SELECT COUNT(*) FROM appointments
-                        WHERE tenant_id = $1 AND patient_id = $2
-                        AND appointment_datetime >= NOW()
-                        AND status IN ('scheduled', 'confirmed')
-                        """,
-                        tenant_id,
-                        p_id,
+                _future_count = patient_snapshot.future_appointment_count
+                if _future_count > 1:
+                    identity_lines.append(
+                        f"• OJO: el paciente tiene {_future_count} turnos futuros (arriba solo se muestra el más próximo). Ante cancelar/reprogramar, llamá list_my_appointments y confirmá CUÁL de los turnos es."
                     )
-                    if _future_count and int(_future_count) > 1:
-                        identity_lines.append(
-                            f"• OJO: el paciente tiene {_future_count} turnos futuros (arriba solo se muestra el más próximo). Ante cancelar/reprogramar, llamá list_my_appointments y confirmá CUÁL de los turnos es."
-                        )
-                except Exception:
-                    pass
 
-            # 3b. Fetch LAST completed appointment (for post-treatment follow-up)
-            last_apt = await pool.fetchrow(
-                """
-                SELECT a.appointment_datetime, tt.name as treatment_name,
-                       prof.first_name as professional_name, a.status
-                FROM appointments a
-                LEFT JOIN treatment_types tt ON a.appointment_type = tt.code
-                LEFT JOIN professionals prof ON a.professional_id = prof.id
-                WHERE a.tenant_id = $1 AND a.patient_id = $2
-                AND a.appointment_datetime < NOW()
-                AND a.status IN ('completed', 'confirmed', 'scheduled')
-                ORDER BY a.appointment_datetime DESC
-                LIMIT 1
-            """,
-                tenant_id,
-                p_id,
-            )
+            # 3b. LAST completed appointment (for post-treatment follow-up)
+            last_apt = patient_snapshot.last_appointment
 
             if last_apt:
                 ldt = last_apt["appointment_datetime"]
@@ -1365,15 +1112,7 @@ async def process_buffer_task(
                     )
 
             # 3c. Count total visits (recurrent vs first-timer)
-            visit_count = await pool.fetchval(
-                """
-                SELECT COUNT(*) FROM appointments
-                WHERE tenant_id = $1 AND patient_id = $2
-                AND status IN ('completed', 'confirmed', 'scheduled')
-            """,
-                tenant_id,
-                p_id,
-            )
+            visit_count = patient_snapshot.visit_count
             if visit_count and visit_count > 1:
                 identity_lines.append(
                     f"• HISTORIAL: Paciente recurrente ({visit_count} turnos registrados)."
@@ -1451,17 +1190,9 @@ async def process_buffer_task(
                     "• ANAMNESIS: Ya completó su ficha médica (NO enviar link automáticamente al agendar, SOLO si el paciente pide actualizar)."
                 )
 
-            # Load linked minor patients (children) via guardian_phone
-            # Use ANY() to match both chat phone and resolved patient phone when linked
-            # Normalize phone values to strip non-digits for reliable matching
-            _guardian_phones = [re.sub(r'\D', '', p) for p in [external_user_id]]
-            if resolved_patient_phone and re.sub(r'\D', '', resolved_patient_phone) not in _guardian_phones:
-                _guardian_phones.append(re.sub(r'\D', '', resolved_patient_phone))
-            minor_rows = await pool.fetch(
-                "SELECT id, first_name, last_name, dni, phone_number, anamnesis_token FROM patients WHERE tenant_id = $1 AND REGEXP_REPLACE(COALESCE(guardian_phone, ''), '[^0-9]', '', 'g') = ANY(SELECT REGEXP_REPLACE(v, '[^0-9]', '', 'g') FROM unnest($2::text[]) AS v)",
-                tenant_id,
-                _guardian_phones,
-            )
+            # Linked minor patients (children) via guardian_phone — matched against
+            # the chat phone and the linked/matched patient phone (digits only)
+            minor_rows = patient_snapshot.minors
             if minor_rows:
                 identity_lines.append("• HIJOS/MENORES VINCULADOS:")
                 for minor in minor_rows:
@@ -1480,19 +1211,8 @@ async def process_buffer_task(
                     identity_lines.append(
                         f"  - {m_name} (DNI: {minor.get('dni', 'N/A')}, phone_interno: {minor['phone_number']}, link ficha: {m_anamnesis})"
                     )
-                    # Check minor's next appointment
-                    minor_apt = await pool.fetchrow(
-                        """
-                        SELECT a.appointment_datetime, tt.name as treatment_name, prof.first_name as professional_name
-                        FROM appointments a
-                        LEFT JOIN treatment_types tt ON a.appointment_type = tt.code
-                        LEFT JOIN professionals prof ON a.professional_id = prof.id
-                        WHERE a.tenant_id = $1 AND a.patient_id = $2 AND a.appointment_datetime >= NOW() AND a.status IN ('scheduled', 'confirmed')
-                        ORDER BY a.appointment_datetime ASC LIMIT 1
-                    """,
-                        tenant_id,
-                        minor["id"],
-                    )
+                    # Minor's next appointment
+                    minor_apt = minor["next_appointment"]
                     if minor_apt:
                         mdt = minor_apt["appointment_datetime"]
                         if hasattr(mdt, "astimezone"):
@@ -1505,22 +1225,7 @@ async def process_buffer_task(
 
             # --- TREATMENT PLAN / BUDGET CONTEXT ---
             try:
-                plan_row = await pool.fetchrow(
-                    """
-                    SELECT tp.id, tp.name, tp.status, tp.estimated_total, tp.approved_total,
-                           tp.notes,
-                           COALESCE(SUM(tpp.amount), 0) AS total_paid
-                    FROM treatment_plans tp
-                    LEFT JOIN treatment_plan_payments tpp ON tpp.plan_id = tp.id AND tpp.tenant_id = tp.tenant_id
-                    WHERE tp.tenant_id = $1 AND tp.patient_id = $2
-                      AND tp.status IN ('draft', 'approved', 'in_progress')
-                    GROUP BY tp.id
-                    ORDER BY tp.created_at DESC
-                    LIMIT 1
-                    """,
-                    tenant_id,
-                    p_id,
-                )
+                plan_row = patient_snapshot.treatment_plan
                 if plan_row:
                     approved = float(
                         plan_row["approved_total"] or plan_row["estimated_total"] or 0
@@ -1599,32 +1304,14 @@ async def process_buffer_task(
                 _family_ids = current_family_patient_ids.get()
                 if _family_ids:
                     family_lines = []
-                    for _fid in _family_ids:
-                        _frow = await pool.fetchrow(
-                            "SELECT id, first_name, last_name, phone_number FROM patients WHERE id = $1 AND tenant_id = $2",
-                            _fid,
-                            tenant_id,
-                        )
-                        if not _frow:
-                            continue
+                    for _frow in patient_snapshot.family:
                         _fname = f"{_frow['first_name'] or ''} {_frow['last_name'] or ''}".strip()
                         _fphone = _frow.get("phone_number") or ""
                         _fctx = f"• {_fname}" + (f" (tel: {_fphone})" if _fphone else "")
                         family_lines.append(_fctx)
 
-                        # Fetch next appointment for this family member
-                        _f_next = await pool.fetchrow(
-                            """SELECT a.appointment_datetime, tt.name as treatment_name,
-                                      prof.first_name as professional_name
-                               FROM appointments a
-                               LEFT JOIN treatment_types tt ON a.appointment_type = tt.code
-                               LEFT JOIN professionals prof ON a.professional_id = prof.id
-                               WHERE a.tenant_id = $1 AND a.patient_id = $2
-                               AND a.appointment_datetime >= NOW()
-                               AND a.status IN ('scheduled', 'confirmed')
-                               ORDER BY a.appointment_datetime ASC LIMIT 1""",
-                            tenant_id, _fid,
-                        )
+                        # Next appointment for this family member
+                        _f_next = _frow["next_appointment"]
                         if _f_next:
                             _dt = _f_next["appointment_datetime"]
                             if hasattr(_dt, "astimezone"):
@@ -1636,19 +1323,8 @@ async def process_buffer_task(
                                 f"  └ PRÓXIMO TURNO: {_f_next['treatment_name'] or 'Consulta'} con Dr/a. {_f_next['professional_name']} el {_dt_str}."
                             )
 
-                        # Fetch last completed appointment
-                        _f_last = await pool.fetchrow(
-                            """SELECT a.appointment_datetime, tt.name as treatment_name,
-                                      prof.first_name as professional_name, a.status
-                               FROM appointments a
-                               LEFT JOIN treatment_types tt ON a.appointment_type = tt.code
-                               LEFT JOIN professionals prof ON a.professional_id = prof.id
-                               WHERE a.tenant_id = $1 AND a.patient_id = $2
-                               AND a.appointment_datetime < NOW()
-                               AND a.status IN ('completed', 'confirmed', 'scheduled')
-                               ORDER BY a.appointment_datetime DESC LIMIT 1""",
-                            tenant_id, _fid,
-                        )
+                        # Last completed appointment
+                        _f_last = _frow["last_appointment"]
                         if _f_last:
                             _ldt = _f_last["appointment_datetime"]
                             if hasattr(_ldt, "astimezone"):
@@ -1662,25 +1338,15 @@ async def process_buffer_task(
                             )
 
                         # Visit count
-                        _f_visits = await pool.fetchval(
-                            "SELECT COUNT(*) FROM appointments WHERE tenant_id = $1 AND patient_id = $2 AND status IN ('completed','confirmed','scheduled')",
-                            tenant_id, _fid,
-                        )
-                        if _f_visits and _f_visits > 0:
+                        _f_visits = _frow["visit_count"]
+                        if _f_visits > 0:
                             family_lines.append(f"  └ Historial: {_f_visits} turnos registrados.")
 
                         # Latest clinical record
-                        _f_cr = await pool.fetchrow(
-                            """SELECT treatment_plan, diagnosis FROM clinical_records
-                               WHERE tenant_id = $1 AND patient_id = $2
-                               ORDER BY created_at DESC LIMIT 1""",
-                            tenant_id, _fid,
-                        )
-                        if _f_cr:
-                            if _f_cr.get("diagnosis"):
-                                family_lines.append(f"  └ Diagnóstico: {_f_cr['diagnosis']}")
-                            if _f_cr.get("treatment_plan"):
-                                family_lines.append(f"  └ Plan de tratamiento: {_f_cr['treatment_plan']}")
+                        if _frow.get("diagnosis"):
+                            family_lines.append(f"  └ Diagnóstico: {_frow['diagnosis']}")
+                        if _frow.get("treatment_plan"):
+                            family_lines.append(f"  └ Plan de tratamiento: {_frow['treatment_plan']}")
 
                     if family_lines:
                         identity_lines.append("")
@@ -2750,21 +2416,19 @@ Recordá que cada obra social puede tener días de espera adicionales configurad
             _dnis = extract_multi_dni(messages)
             if len(_dnis) > 1:
                 logger.info(f"🔢 T5 multi-dni detected: {len(_dnis)} entities: {_dnis}")
-                from services.conversation_state import _read_payload as _cs_payload, _raw_write as _cs_raw
+                from services.conversation_state import merge_booking_targets as _cs_merge_targets
                 _cs_phone = current_customer_phone.get()
                 if _cs_phone:
-                    _cs_data = await _cs_payload(tenant_id, _cs_phone) or {}
-                    _targets = _cs_data.get("booking_targets", [])
-                    for _e in _dnis:
-                        # Avoid duplicates
-                        if not any(t.get("dni") == _e["dni"] for t in _targets):
-                            _targets.append({
-                                "dni": _e["dni"],
-                                "relationship": _e["relationship"],
-                                "status": "pending",
-                                "type": "self" if _e["relationship"] == "self" else "third_party",
-                            })
-                    await _cs_raw(tenant_id, _cs_phone, _cs_data)
+                    # Server-side merge: targets whose DNI is already queued are skipped
+                    await _cs_merge_targets(tenant_id, _cs_phone, [
+                        {
+                            "dni": _e["dni"],
+                            "relationship": _e["relationship"],
+                            "status": "pending",
+                            "type": "self" if _e["relationship"] == "self" else "third_party",
+                        }
+                        for _e in _dnis
+                    ])
             elif _dnis:
                 # Single DNI — store as current booking dni via convstate
                 from services.conversation_state import set_booking_targets as _cs_set_targets
@@ -2781,12 +2445,10 @@ Recordá que cada obra social puede tener días de espera adicionales configurad
         try:
             if detect_compound_intent(messages):
                 logger.info(f"🔢 T6 compound intent detected")
-                from services.conversation_state import _read_payload as _cs_payload_cpd, _raw_write as _cs_raw_cpd
+                from services.conversation_state import update_fields as _cs_update_cpd
                 _cs_phone_c = current_customer_phone.get()
                 if _cs_phone_c:
-                    _cs_data_cpd = await _cs_payload_cpd(tenant_id, _cs_phone_c) or {}
-                    _cs_data_cpd["compound_intent"] = True
-                    await _cs_raw_cpd(tenant_id, _cs_phone_c, _cs_data_cpd)
+                    await _cs_update_cpd(tenant_id, _cs_phone_c, compound_intent=True)
         except Exception as _t6_err:
             logger.debug(f"T6 compound intent detection skipped: {_t6_err}")
 
@@ -2803,12 +2465,10 @@ Recordá que cada obra social puede tener días de espera adicionales configurad
             )
             if _is_correction:
                 logger.info(f"🔧 T10 correction detected in patient message: {_user_msg[:80]!r}")
-                from services.conversation_state import _read_payload as _cs_payload_t10, _raw_write as _cs_raw_t10
+                from services.conversation_state import update_fields as _cs_update_t10
                 _cs_phone_t10 = current_customer_phone.get()
                 if _cs_phone_t10:
-                    _cs_data_t10 = await _cs_payload_t10(tenant_id, _cs_phone_t10) or {}
-                    _cs_data_t10["has_correction"] = True
-                    await _cs_raw_t10(tenant_id, _cs_phone_t10, _cs_data_t10)
+                    await _cs_update_t10(tenant_id, _cs_phone_t10, has_correction=True)
         except Exception as _t10_err:
             logger.debug(f"T10 correction awareness skipped: {_t10_err}")
 
@@ -3815,13 +3475,8 @@ Recordá que cada obra social puede tener días de espera adicionales configurad
                         timestamp=datetime.now(tz.utc),
                         tenant_id=tenant_id,
                     )
-                    await token_tracker.track_usage(usage)
-                    # Update tenant totals
-                    await pool.execute(
-                        "UPDATE tenants SET total_tokens_used = COALESCE(total_tokens_used, 0) + $1, total_tool_calls = COALESCE(total_tool_calls, 0) + 1 WHERE id = $2",
-                        total_t,
-                        tenant_id,
-                    )
+                    # Buffered: the row and the tenant totals are written by the batch flusher
+                    await token_tracker.track_usage(usage, update_tenant_totals=True)
                     logger.info(
                         f"📊 Tokens tracked: {total_t} | cost: ${usage.cost_usd}"
                     )
@@ -0,0 +1,742 @@
+"""
+Bulk WhatsApp send engine for Nova mass actions (accion_masiva) and playbooks.
+
+accion_masiva used to send inline in the Nova tool call, one recipient at a
+time with a fixed 1 s sleep, re-reading the YCloud credential and
+bot_phone_number and re-fetching the template from YCloud for every
+recipient — a couple of thousand patients meant 40+ minutes and a dead
+Nova session. Now:
+
+- ``create_bulk_job`` writes one ``bulk_send_jobs`` row plus one
+  ``bulk_send_recipients`` row per (deduplicated) phone in a single
+  transaction, and ``start_bulk_job`` runs it in the background; the tool
+  returns right away with the job id.
+- The runner resolves the sender once per job (credential, from-number,
+  approved template language/components, one YCloudClient) and drains the
+  pending recipients with a bounded worker pool (BULK_SEND_WORKERS).
+- Every send takes a token from the tenant's bucket
+  (``tenants.config.bulk_send_rate_per_second``); a 429 pauses the bucket
+  for Retry-After and requeues the recipient. The tenant's Meta messaging
+  tier (``tenants.config.whatsapp_messaging_tier``, unique recipients per
+  rolling 24 h) caps how many recipients a run may take; the rest stay
+  pending and the job is parked as ``paused`` until the window frees up.
+- Per-recipient results are flushed in batches (one UPDATE … FROM unnest)
+  together with the job counters and heartbeat, and BULK_SEND_PROGRESS is
+  emitted on the tenant Socket.IO room.
+- A job only runs under ``job_lease("bulk_send:<id>")``; jobs whose
+  heartbeat went stale (deploy/restart) or whose tier pause expired are
+  picked up again by jobs/bulk_send.py from their still-pending rows.
+
+Token buckets are per process: a job runs on exactly one replica, and
+playbook sends go through ``acquire_send_slot`` on whichever replica runs
+the playbook executor.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BULK_SEND_WORKERS = int(os.getenv("BULK_SEND_WORKERS", "8"))
+BULK_MAX_RECIPIENTS = int(os.getenv("BULK_SEND_MAX_RECIPIENTS", "5000"))
+DEFAULT_RATE_PER_SECOND = float(os.getenv("BULK_SEND_RATE_PER_SECOND", "10"))
+# Meta starts business-initiated conversations at 1K unique users / 24h once
+# the number is verified; tenants on a higher tier set it in tenants.config.
+DEFAULT_MESSAGING_TIER = int(os.getenv("BULK_SEND_DEFAULT_TIER", "1000"))
+MAX_ATTEMPTS = 3
+PROGRESS_INTERVAL_SECONDS = 2.0
+STALE_HEARTBEAT_SECONDS = 120
+TIER_RETRY_SECONDS = 3600
+LIMITS_TTL_SECONDS = 60
+LEASE_TTL_SECONDS = 60
+
+SEND_ACTIONS = ("plantilla", "mensaje_libre", "anamnesis")
+ACTIVE_STATUSES = ("pending", "running", "paused")
+
+TEMPLATES_URL = "https://api.ycloud.com/v2/whatsapp/templates"
+
+
+# ---------------------------------------------------------------------------
+# Rate limiting
+# ---------------------------------------------------------------------------
+
+
+class TokenBucket:
+    """Classic token bucket; ``acquire`` waits for a token, ``pause`` drains it after a 429."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = max(float(rate), 0.1)
+        self.capacity = capacity or max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def set_rate(self, rate: float) -> None:
+        self.rate = max(float(rate), 0.1)
+        self.capacity = max(1.0, self.rate)
+        self.tokens = min(self.tokens, self.capacity)
+
+    async def acquire(self) -> None:
+        # Waiters queue on the lock, so tokens are handed out FIFO.
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + max(seconds, 0))
+        self.tokens = 0
+        self.updated = time.monotonic()
+
+
+_BUCKETS: Dict[int, TokenBucket] = {}
+_LIMITS_CACHE: Dict[int, Tuple[float, float, Optional[int]]] = {}
+
+
+def _parse_tier(value: Any) -> Optional[int]:
+    if value is None or value == "":
+        return DEFAULT_MESSAGING_TIER
+    if str(value).strip().lower() in ("unlimited", "ilimitado"):
+        return None
+    try:
+        return int(str(value).replace("K", "000").replace("k", "000"))
+    except ValueError:
+        return DEFAULT_MESSAGING_TIER
+
+
+async def get_tenant_send_limits(pool, tenant_id: int) -> Tuple[float, Optional[int]]:
+    """(messages per second, unique recipients per 24h or None) from tenants.config, cached briefly."""
+    cached = _LIMITS_CACHE.get(tenant_id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1], cached[2]
+
+    rate, tier = DEFAULT_RATE_PER_SECOND, DEFAULT_MESSAGING_TIER
+    try:
+        row = await pool.fetchrow(
+            """
+            SELECT config->>'bulk_send_rate_per_second' AS rate,
+                   config->>'whatsapp_messaging_tier' AS tier
+            FROM tenants WHERE id = $1
+            """,
+            tenant_id,
+        )
+        if row:
+            if row["rate"]:
+                rate = float(row["rate"])
+            tier = _parse_tier(row["tier"])
+    except Exception as e:
+        logger.warning(f"bulk_send: could not read send limits for tenant {tenant_id}: {e}")
+
+    _LIMITS_CACHE[tenant_id] = (time.monotonic() + LIMITS_TTL_SECONDS, rate, tier)
+    return rate, tier
+
+
+def get_tenant_bucket(tenant_id: int, rate: float) -> TokenBucket:
+    bucket = _BUCKETS.get(tenant_id)
+    if bucket is None:
+        bucket = _BUCKETS[tenant_id] = TokenBucket(rate)
+    elif bucket.rate != max(float(rate), 0.1):
+        bucket.set_rate(rate)
+    return bucket
+
+
+async def acquire_send_slot(pool, tenant_id: int) -> None:
+    """Wait for the tenant's send rate before a single outbound WhatsApp message (playbooks)."""
+    try:
+        rate, _ = await get_tenant_send_limits(pool, tenant_id)
+        await get_tenant_bucket(tenant_id, rate).acquire()
+    except Exception as e:
+        logger.warning(f"bulk_send: rate limiter unavailable for tenant {tenant_id}: {e}")
+
+
+# ---------------------------------------------------------------------------
+# Sender context (resolved once per job)
+# ---------------------------------------------------------------------------
+
+
+async def fetch_approved_template(api_key: str, template_name: str) -> Tuple[Optional[str], Optional[list]]:
+    """(language, components) of the APPROVED YCloud template with that exact name, or (None, None)."""
+    from services.http_clients import get_http_client
+
+    resp = await get_http_client("ycloud").get(
+        TEMPLATES_URL,
+        params={"filter.name": template_name, "limit": 10},
+        headers={"X-API-Key": api_key},
+        timeout=10.0,
+    )
+    if resp.status_code == 200:
+        for tpl in resp.json().get("items", []):
+            if tpl.get("status") == "APPROVED" and tpl.get("name") == template_name:
+                return tpl.get("language"), tpl.get("components", [])
+    return None, None
+
+
+def build_template_components(
+    tpl_components: Optional[list], patient_name: str, custom_vars: Optional[Dict[str, str]] = None
+) -> list:
+    """Fill the template's {{n}} / {{name}} placeholders for one recipient."""
+    vars_dict = custom_vars or {}
+
+    # Positional-to-named mapping for templates using {{1}}, {{2}}, {{3}}
+    # Meta recommends positional format; map numbers to known variable names
+    positional_map = {
+        "1": patient_name,
+        "2": vars_dict.get("dia_semana", vars_dict.get("fecha_turno", "")),
+        "3": vars_dict.get("hora_turno", vars_dict.get("fecha_turno", "")),
+        "4": vars_dict.get("hora_turno", ""),
+    }
+    auto_values = {
+        "nombre_paciente": patient_name,
+        "nombre": patient_name,
+        "first_name": patient_name,
+    }
+    # Merge: positional + named auto-values + custom_vars (highest priority)
+    merged = {**positional_map, **auto_values, **vars_dict}
+
+    send_components = []
+    for comp in tpl_components or []:
+        comp_vars = re.findall(r"\{\{(\w+)\}\}", comp.get("text", ""))
+        if not comp_vars:
+            continue
+        send_components.append(
+            {
+                "type": comp.get("type", "").lower(),
+                "parameters": [{"type": "text", "text": str(merged.get(v, ""))} for v in comp_vars],
+            }
+        )
+    return send_components
+
+
+def _retry_after(http_err) -> float:
+    try:
+        return float(http_err.response.headers.get("Retry-After") or 60)
+    except (TypeError, ValueError):
+        return 60.0
+
+
+class SenderContext:
+    """Credential, from-number, client and template metadata shared by every recipient of a send."""
+
+    def __init__(
+        self,
+        pool,
+        tenant_id: int,
+        api_key: str,
+        business_number: Optional[str],
+        template_name: Optional[str] = None,
+        language: Optional[str] = None,
+        tpl_components: Optional[list] = None,
+        clinic_name: Optional[str] = None,
+    ):
+        from ycloud_client import YCloudClient
+
+        self.pool = pool
+        self.tenant_id = tenant_id
+        self.template_name = template_name
+        self.language = language
+        self.tpl_components = tpl_components
+        self.clinic_name = clinic_name
+        self.client = YCloudClient(api_key=api_key, business_number=business_number)
+
+    async def _send(self, coro) -> Dict[str, Any]:
+        import httpx
+
+        try:
+            await coro
+        except httpx.HTTPStatusError as http_err:
+            if http_err.response.status_code == 429:
+                return {"ok": False, "error": "rate_limited", "retry_after": _retry_after(http_err)}
+            try:
+                err_detail = http_err.response.json()
+            except Exception:
+                err_detail = http_err.response.text
+            return {"ok": False, "error": str(err_detail)[:300]}
+        except httpx.TransportError as e:
+            return {"ok": False, "error": str(e)[:200], "transient": True}
+        return {"ok": True}
+
+    async def send_template(
+        self, phone: str, patient_name: str = "", custom_vars: Optional[Dict[str, str]] = None, source: str = "nova"
+    ) -> Dict[str, Any]:
+        components = build_template_components(self.tpl_components, patient_name, custom_vars)
+        result = await self._send(
+            self.client.send_template(
+                to=phone,
+                template_name=self.template_name,
+                language_code=self.language,
+                components=components or None,
+            )
+        )
+        if result["ok"]:
+            await persist_template_message(self.pool, self.tenant_id, phone, self.template_name, patient_name, source)
+        return result
+
+    async def send_text(self, phone: str, text: str) -> Dict[str, Any]:
+        return await self._send(self.client.send_text_message(to=phone, text=text))
+
+
+async def resolve_sender(
+    pool, tenant_id: int, template_name: Optional[str] = None, with_clinic_name: bool = False
+) -> Tuple[Optional[SenderContext], Optional[str]]:
+    """Resolve everything a send needs once. Returns (context, None) or (None, error)."""
+    from core.credentials import get_tenant_credential, YCLOUD_API_KEY, YCLOUD_WHATSAPP_NUMBER
+
+    api_key = await get_tenant_credential(tenant_id, YCLOUD_API_KEY)
+    if not api_key:
+        return None, "No YCloud API key"
+
+    tenant = await pool.fetchrow("SELECT bot_phone_number, clinic_name FROM tenants WHERE id = $1", tenant_id)
+    business_number = tenant["bot_phone_number"] if tenant else None
+    if not business_number:
+        business_number = await get_tenant_credential(tenant_id, YCLOUD_WHATSAPP_NUMBER)
+
+    language = tpl_components = None
+    if template_name:
+        language, tpl_components = await fetch_approved_template(api_key, template_name)
+        if not language:
+            return None, f"Template '{template_name}' not found or not approved"
+
+    return (
+        SenderContext(
+            pool,
+            tenant_id,
+            api_key,
+            business_number,
+            template_name=template_name,
+            language=language,
+            tpl_components=tpl_components,
+            clinic_name=(tenant["clinic_name"] if tenant and with_clinic_name else None),
+        ),
+        None,
+    )
+
+
+async def persist_template_message(
+    pool, tenant_id: int, phone: str, template_name: str, patient_name: str, source: str
+) -> None:
+    """Record a sent template in chat_conversations + chat_messages (non-blocking)."""
+    try:
+        conv = await pool.fetchrow(
+            "SELECT id FROM chat_conversations WHERE tenant_id = $1 AND external_user_id = $2 AND channel = 'whatsapp' ORDER BY updated_at DESC LIMIT 1",
+            tenant_id,
+            phone,
+        )
+        preview_label = f"[Plantilla: {template_name}]"
+        if conv:
+            conv_id = conv["id"]
+            await pool.execute(
+                "UPDATE chat_conversations SET last_message_preview = $1, updated_at = NOW() WHERE id = $2",
+                preview_label,
+                conv_id,
+            )
+        else:
+            conv_id = uuid.uuid4()
+            await pool.execute(
+                "INSERT INTO chat_conversations (id, tenant_id, channel, provider, external_user_id, display_name, last_message_preview, status, updated_at) VALUES ($1, $2, 'whatsapp', 'ycloud', $3, $4, $5, 'active', NOW())",
+                conv_id,
+                tenant_id,
+                phone,
+                patient_name or None,
+                preview_label,
+            )
+
+        await pool.execute(
+            "INSERT INTO chat_messages (tenant_id, conversation_id, role, content, from_number, platform_metadata) VALUES ($1, $2, 'assistant', $3, $4, $5::jsonb)",
+            tenant_id,
+            conv_id,
+            f"📨 Plantilla '{template_name}' enviada a {patient_name}",
+            phone,
+            json.dumps({"source": source, "template": template_name, "patient_name": patient_name}),
+        )
+    except Exception as persist_err:
+        logger.warning(f"Template message persist failed (non-blocking): {persist_err}")
+
+
+# ---------------------------------------------------------------------------
+# Jobs
+# ---------------------------------------------------------------------------
+
+
+async def create_bulk_job(
+    pool, tenant_id: int, action: str, params: Dict[str, Any], recipients: List[Dict[str, Any]], created_by: str = None
+) -> int:
+    """Persist a job and its recipients ({patient_id, phone, patient_name}); duplicate phones are sent once."""
+    seen = set()
+    patient_ids, phones, names = [], [], []
+    for r in recipients:
+        phone = (r.get("phone") or "").strip()
+        if not phone or phone in seen:
+            continue
+        seen.add(phone)
+        patient_ids.append(r.get("patient_id"))
+        phones.append(phone)
+        names.append(r.get("patient_name") or "")
+
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            job_id = await conn.fetchval(
+                """
+                INSERT INTO bulk_send_jobs (tenant_id, action, params, status, total_count, created_by)
+                VALUES ($1, $2, $3::jsonb, 'pending', $4, $5)
+                RETURNING id
+                """,
+                tenant_id,
+                action,
+                json.dumps(params or {}),
+                len(phones),
+                created_by,
+            )
+            await conn.execute(
+                """
+                INSERT INTO bulk_send_recipients (job_id, tenant_id, patient_id, phone, patient_name)
+                SELECT $1, $2, u.patient_id, u.phone, u.patient_name
+                FROM unnest($3::int[], $4::text[], $5::text[]) AS u(patient_id, phone, patient_name)
+                """,
+                job_id,
+                tenant_id,
+                patient_ids,
+                phones,
+                names,
+            )
+    return job_id
+
+
+_RUNNING_TASKS: set = set()
+
+
+def start_bulk_job(job_id: int) -> asyncio.Task:
+    """Run a job in the background of this process (the lease keeps it single-runner cluster-wide)."""
+    task = asyncio.create_task(run_bulk_job(job_id))
+    _RUNNING_TASKS.add(task)
+    task.add_done_callback(_RUNNING_TASKS.discard)
+    return task
+
+
+async def run_bulk_job(job_id: int) -> Optional[Dict[str, Any]]:
+    """Drain a job's pending recipients. Returns final counters, or None if another runner holds it."""
+    from db import db
+    from jobs.scheduler import job_lease
+
+    try:
+        async with job_lease(f"bulk_send:{job_id}", LEASE_TTL_SECONDS) as acquired:
+            if not acquired:
+                return None
+            return await _run_locked(db.pool, job_id)
+    except Exception as e:
+        logger.error(f"bulk_send job {job_id} crashed: {e}", exc_info=True)
+        try:
+            await db.pool.execute(
+                "UPDATE bulk_send_jobs SET last_error = $2 WHERE id = $1", job_id, str(e)[:500]
+            )
+        except Exception:
+            pass
+        return None
+
+
+def _render_text(action: str, params: Dict[str, Any], recipient, tenant_id: int, clinic_name: Optional[str]) -> str:
+    name = recipient["patient_name"] or ""
+    if action == "mensaje_libre":
+        return (params.get("mensaje") or "").replace("{nombre}", name)
+    # anamnesis
+    token = uuid.uuid4().hex[:12]
+    anamnesis_url = f"https://clinicforge.app/anamnesis/{tenant_id}/{recipient['patient_id']}/{token}"
+    return (
+        f"¡Hola {name}! 👋\n\n{clinic_name} te invita a completar tu historia clínica antes de tu próxima visita.\n\n"
+        f"Completá tu anamnesis aquí: {anamnesis_url}\n\n¡Te esperamos!"
+    )
+
+
+async def _send_to_recipient(sender: SenderContext, action: str, params: Dict[str, Any], recipient) -> Dict[str, Any]:
+    if action == "plantilla":
+        name = recipient["patient_name"] or ""
+        resolved_vars = {
+            k: (v.replace("{nombre}", name) if isinstance(v, str) else v)
+            for k, v in (params.get("variables") or {}).items()
+        }
+        return await sender.send_template(recipient["phone"], name, resolved_vars, source="accion_masiva")
+    if action in ("mensaje_libre", "anamnesis"):
+        text = _render_text(action, params, recipient, sender.tenant_id, sender.clinic_name)
+        return await sender.send_text(recipient["phone"], text)
+    return {"ok": False, "error": "Acción desconocida"}
+
+
+async def _emit_progress(tenant_id: int, payload: Dict[str, Any]) -> None:
+    try:
+        from main import sio, to_json_safe
+
+        await sio.emit("BULK_SEND_PROGRESS", to_json_safe(payload), room=f"tenant:{tenant_id}")
+    except Exception as e:
+        logger.debug(f"bulk_send progress emit failed: {e}")
+
+
+async def _flush_results(pool, job_id: int, results: List[Tuple[int, str, Optional[str], int]]) -> Tuple[int, int]:
+    """Write buffered (recipient_id, status, error, attempts) rows + job counters/heartbeat in one round."""
+    sent = sum(1 for r in results if r[1] == "sent")
+    failed = len(results) - sent
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            if results:
+                await conn.execute(
+                    """
+                    UPDATE bulk_send_recipients r
+                    SET status = u.status,
+                        error = u.error,
+                        attempts = r.attempts + u.attempts,
+                        sent_at = CASE WHEN u.status = 'sent' THEN NOW() ELSE r.sent_at END
+                    FROM unnest($1::bigint[], $2::text[], $3::text[], $4::int[]) AS u(id, status, error, attempts)
+                    WHERE r.id = u.id
+                    """,
+                    [r[0] for r in results],
+                    [r[1] for r in results],
+                    [r[2] for r in results],
+                    [r[3] for r in results],
+                )
+            await conn.execute(
+                """
+                UPDATE bulk_send_jobs
+                SET sent_count = sent_count + $2, failed_count = failed_count + $3, heartbeat_at = NOW()
+                WHERE id = $1
+                """,
+                job_id,
+                sent,
+                failed,
+            )
+    return sent, failed
+
+
+async def _run_locked(pool, job_id: int) -> Optional[Dict[str, Any]]:
+    job = await pool.fetchrow("SELECT * FROM bulk_send_jobs WHERE id = $1", job_id)
+    if not job or job["status"] not in ACTIVE_STATUSES:
+        return None
+
+    tenant_id = job["tenant_id"]
+    action = job["action"]
+    params = job["params"]
+    if isinstance(params, str):
+        params = json.loads(params)
+    params = params or {}
+
+    await pool.execute(
+        """
+        UPDATE bulk_send_jobs
+        SET status = 'running', started_at = COALESCE(started_at, NOW()), heartbeat_at = NOW(), resume_after = NULL
+        WHERE id = $1
+        """,
+        job_id,
+    )
+
+    sender, error = await resolve_sender(
+        pool,
+        tenant_id,
+        template_name=params.get("template_name") if action == "plantilla" else None,
+        with_clinic_name=(action == "anamnesis"),
+    )
+    if error:
+        await pool.execute(
+            "UPDATE bulk_send_jobs SET status = 'failed', last_error = $2, finished_at = NOW() WHERE id = $1",
+            job_id,
+            error,
+        )
+        await _emit_progress(tenant_id, {"job_id": job_id, "status": "failed", "error": error})
+        return {"status": "failed", "error": error}
+
+    rate, tier = await get_tenant_send_limits(pool, tenant_id)
+    bucket = get_tenant_bucket(tenant_id, rate)
+
+    quota = None
+    if tier is not None:
+        used = await pool.fetchval(
+            """
+            SELECT COUNT(DISTINCT phone) FROM bulk_send_recipients
+            WHERE tenant_id = $1 AND status = 'sent' AND sent_at > NOW() - INTERVAL '24 hours'
+            """,
+            tenant_id,
+        )
+        quota = max(int(tier) - int(used or 0), 0)
+
+    pending = await pool.fetch(
+        """
+        SELECT id, patient_id, phone, patient_name FROM bulk_send_recipients
+        WHERE job_id = $1 AND status = 'pending'
+        ORDER BY id
+        LIMIT $2
+        """,
+        job_id,
+        quota,
+    )
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for rec in pending:
+        queue.put_nowait(rec)
+    attempts: Dict[int, int] = {}
+    results: List[Tuple[int, str, Optional[str], int]] = []
+    cancelled = asyncio.Event()
+    totals = {"sent": job["sent_count"] or 0, "failed": job["failed_count"] or 0}
+
+    async def worker():
+        while not cancelled.is_set():
+            try:
+                rec = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await bucket.acquire()
+            try:
+                result = await _send_to_recipient(sender, action, params, rec)
+            except Exception as e:
+                result = {"ok": False, "error": str(e)[:200]}
+            attempts[rec["id"]] = attempts.get(rec["id"], 0) + 1
+
+            retryable = result.get("retry_after") is not None or result.get("transient")
+            if not result.get("ok") and retryable and attempts[rec["id"]] < MAX_ATTEMPTS:
+                if result.get("retry_after") is not None:
+                    bucket.pause(result["retry_after"])
+                queue.put_nowait(rec)
+                continue
+            if result.get("ok"):
+                results.append((rec["id"], "sent", None, attempts[rec["id"]]))
+            else:
+                logger.warning(f"bulk_send {job_id} {action} error for {rec['phone']}: {result.get('error')}")
+                results.append((rec["id"], "failed", str(result.get("error"))[:500], attempts[rec["id"]]))
+
+    async def flush_and_report():
+        batch = results[:]
+        del results[: len(batch)]
+        sent, failed = await _flush_results(pool, job_id, batch)
+        totals["sent"] += sent
+        totals["failed"] += failed
+        await _emit_progress(
+            tenant_id,
+            {
+                "job_id": job_id,
+                "status": "running",
+                "total": job["total_count"],
+                "sent": totals["sent"],
+                "failed": totals["failed"],
+            },
+        )
+
+    async def ticker():
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL_SECONDS)
+            try:
+                await flush_and_report()
+                status = await pool.fetchval("SELECT status FROM bulk_send_jobs WHERE id = $1", job_id)
+                if status == "cancelled":
+                    cancelled.set()
+            except Exception as e:
+                logger.warning(f"bulk_send {job_id} progress flush failed: {e}")
+
+    progress = asyncio.create_task(ticker())
+    try:
+        workers = [asyncio.create_task(worker()) for _ in range(min(BULK_SEND_WORKERS, len(pending)))]
+        await asyncio.gather(*workers)
+    finally:
+        progress.cancel()
+        try:
+            await progress
+        except asyncio.CancelledError:
+            pass
+    await flush_and_report()
+
+    remaining = await pool.fetchval(
+        "SELECT COUNT(*) FROM bulk_send_recipients WHERE job_id = $1 AND status = 'pending'", job_id
+    )
+    if cancelled.is_set():
+        status = "cancelled"
+    elif remaining:
+        status = "paused"
+    else:
+        status = "completed"
+
+    await pool.execute(
+        """
+        UPDATE bulk_send_jobs
+        SET status = $2,
+            resume_after = CASE WHEN $2 = 'paused' THEN NOW() + make_interval(secs => $3) END,
+            last_error = CASE WHEN $2 = 'paused' THEN 'messaging_tier_limit' ELSE last_error END,
+            finished_at = CASE WHEN $2 = 'paused' THEN NULL ELSE NOW() END,
+            heartbeat_at = NOW()
+        WHERE id = $1 AND status = 'running'
+        """,
+        job_id,
+        status,
+        float(TIER_RETRY_SECONDS),
+    )
+    summary = {
+        "job_id": job_id,
+        "status": status,
+        "total": job["total_count"],
+        "sent": totals["sent"],
+        "failed": totals["failed"],
+        "pending": int(remaining or 0),
+    }
+    await _emit_progress(tenant_id, summary)
+    logger.info(
+        f"📨 bulk_send {job_id} ({action}) tenant {tenant_id}: {status} — "
+        f"{totals['sent']} enviados, {totals['failed']} errores, {remaining} pendientes"
+    )
+    return summary
+
+
+async def resume_bulk_jobs(pool) -> int:
+    """Start jobs that lost their runner (stale heartbeat) or whose tier pause expired."""
+    rows = await pool.fetch(
+        """
+        SELECT id FROM bulk_send_jobs
+        WHERE (status IN ('pending', 'running')
+               AND COALESCE(heartbeat_at, created_at) < NOW() - make_interval(secs => $1))
+           OR (status = 'paused' AND resume_after <= NOW())
+        ORDER BY id
+        LIMIT 20
+        """,
+        float(STALE_HEARTBEAT_SECONDS),
+    )
+    for row in rows:
+        start_bulk_job(row["id"])
+    return len(rows)
+
+
+async def get_bulk_job(pool, tenant_id: int, job_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """A job's progress (latest job of the tenant when job_id is None)."""
+    row = await pool.fetchrow(
+        """
+        SELECT id, action, status, total_count, sent_count, failed_count, last_error,
+               created_at, started_at, finished_at, resume_after,
+               total_count - sent_count - failed_count AS pending_count
+        FROM bulk_send_jobs
+        WHERE tenant_id = $1 AND ($2::bigint IS NULL OR id = $2)
+        ORDER BY id DESC
+        LIMIT 1
+        """,
+        tenant_id,
+        job_id,
+    )
+    return dict(row) if row else None
+
+
+async def cancel_bulk_job(pool, tenant_id: int, job_id: int) -> bool:
+    """Stop a job; recipients already sent stay sent, the runner stops at its next progress tick."""
+    result = await pool.execute(
+        """
+        UPDATE bulk_send_jobs SET status = 'cancelled', finished_at = NOW()
+        WHERE id = $1 AND tenant_id = $2 AND status IN ('pending', 'running', 'paused')
+        """,
+        job_id,
+        tenant_id,
+    )
+    return result.endswith(" 1")
@@ -11,6 +11,13 @@ v8.2 — Anti-loop booking extensions:
 - statements_made{}: hash → count for deduplicating agent output
 - booking_attempts: per-conversation counter for escalation guard
 - anchor_date: resolved anchor date propagated through confirm_slot → book_appointment
+
+Storage layout: one Redis hash per conversation. Every hash field holds a JSON
+value; statement counters live in their own `statements_made:<hash>` fields so
+they can be bumped with a plain HINCRBY. Mutators run as Lua scripts (one
+round-trip, atomic on the server) so concurrent tool calls never lose updates,
+and get_state reads the whole conversation with a single HGETALL.
+Keys written by the previous JSON-string layout are migrated on first touch.
 """
 
 import json
@@ -33,6 +40,39 @@ VALID_STATES = [
 CONVSTATE_TTL = 1800      # 30 minutes (default for IDLE, OFFERED_SLOTS, SLOT_LOCKED)
 BOOKED_TTL = 86400         # 24 hours (BOOKED / PAYMENT_PENDING — DLD-89/92: no expirar durante la conversación)
 REDIS_KEY_PREFIX = "convstate"
+ERROR_HISTORY_CAP = 5
+STATEMENT_FIELD_PREFIX = "statements_made:"
+# Per-turn flags buffer_task sets through update_fields; every state change
+# drops them so a correction or compound intent is only reported once.
+TURN_SCOPED_FIELDS = ("has_correction", "compound_intent")
+
+DEFAULT_BOOKING_TARGETS = [{"type": "self", "name": "", "dni": "", "status": "pending", "relationship": ""}]
+
+# Values get_state fills in for fields that were never written (same defaults
+# set_state used to copy into every payload).
+_FIELD_DEFAULTS: Dict[str, Any] = {
+    "last_offered_slots": None,
+    "last_locked_slot": None,
+    "last_booked_appointment_id": None,
+    "offered_treatment": None,
+    "failed_slots": [],
+    "excluded_days": [],
+    "excluded_dates": [],
+    "statements_made": {},
+    "booking_attempts": 0,
+    "availability_attempts": 0,
+    "anchor_date": None,
+    "insurance_asked": False,
+    # v8.3: resolve-13-booking-errors fields (T2)
+    "booking_targets": DEFAULT_BOOKING_TARGETS,
+    "current_booking_target_index": 0,
+    "frustration_count": 0,
+    "frustration_mode": False,
+    "error_history": [],
+    "turn_count": 0,
+    # v8.4: scheduling constraints
+    "scheduling_constraints": {},
+}
 
 
 class ConversationState(Enum):
@@ -63,9 +103,305 @@ def _normalize_phone_for_key(phone: str) -> str:
     return re.sub(r"\D", "", phone)
 
 
+def _key_for(tenant_id: int, phone_number: str) -> str:
+    return _get_redis_key(tenant_id, _normalize_phone_for_key(phone_number))
+
+
+def _now() -> str:
+    return _dt.now().isoformat()
+
+
+# ── Hash encoding ──────────────────────────────────────────────────
+
+
+def _encode(value: Any) -> str:
+    return json.dumps(value, default=str, ensure_ascii=False)
+
+
+def _as_text(value: Any) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+
+def _encode_payload(payload: Dict[str, Any]) -> Dict[str, str]:
+    """Flatten a state dict into hash fields (statements_made → one field per hash)."""
+    fields: Dict[str, str] = {}
+    for name, value in payload.items():
+        if name == "statements_made" and isinstance(value, dict):
+            for stmt_hash, count in value.items():
+                fields[f"{STATEMENT_FIELD_PREFIX}{stmt_hash}"] = str(int(count or 0))
+        else:
+            fields[name] = _encode(value)
+    return fields
+
+
+def _decode_hash(data: Dict[Any, Any]) -> Dict[str, Any]:
+    """Inverse of _encode_payload, with defaults for fields never written."""
+    payload: Dict[str, Any] = {}
+    statements: Dict[str, int] = {}
+    for raw_name, raw_value in data.items():
+        name = _as_text(raw_name)
+        text = _as_text(raw_value)
+        try:
+            value = json.loads(text)
+        except ValueError:
+            value = text
+        if name.startswith(STATEMENT_FIELD_PREFIX):
+            statements[name[len(STATEMENT_FIELD_PREFIX):]] = int(value or 0)
+        else:
+            payload[name] = value
+    payload.setdefault("state", "IDLE")
+    for name, default in _FIELD_DEFAULTS.items():
+        if name not in payload:
+            payload[name] = json.loads(json.dumps(default))
+    payload["statements_made"] = statements
+    return payload
+
+
+def _is_wrongtype(err: Exception) -> bool:
+    return "WRONGTYPE" in str(err)
+
+
+async def _migrate_legacy(r, key: str) -> None:
+    """Convert a pre-hash JSON string key into the hash layout, keeping its TTL."""
+    raw = await r.get(key)
+    ttl = await r.ttl(key)
+    try:
+        payload = json.loads(raw) if raw else {}
+    except ValueError:
+        payload = {}
+    pipe = r.pipeline(transaction=True)
+    pipe.delete(key)
+    if payload:
+        pipe.hset(key, mapping=_encode_payload(payload))
+        pipe.expire(key, ttl if ttl and ttl > 0 else CONVSTATE_TTL)
+    await pipe.execute()
+    logger.info(f"[conversation_state] migrated legacy JSON state to hash for {key}")
+
+
+# ── Server-side field operations ───────────────────────────────────
+#
+# Every script takes KEYS[1] = convstate key, ARGV[1] = TTL, ARGV[2] = updated_at
+# (JSON string). The TTL is only ever extended by a mutator, never shortened:
+# a BOOKED conversation keeps its 24h window while counters move.
+
+_LUA_PRELUDE = """
+local key = KEYS[1]
+local function touch()
+    redis.call('HSET', key, 'updated_at', ARGV[2])
+    if redis.call('TTL', key) < tonumber(ARGV[1]) then
+        redis.call('EXPIRE', key, ARGV[1])
+    end
+end
+local function jget(field, default_json)
+    local raw = redis.call('HGET', key, field)
+    if raw then
+        local ok, value = pcall(cjson.decode, raw)
+        if ok and type(value) == 'table' then
+            return value
+        end
+    end
+    return cjson.decode(default_json)
+end
+"""
+
+# ARGV[3..]: field, value JSON pairs.
+_LUA_SET_FIELDS = _LUA_PRELUDE + """
+for i = 3, #ARGV, 2 do
+    redis.call('HSET', key, ARGV[i], ARGV[i + 1])
+end
+touch()
+return 1
+"""
+
+# ARGV[3] field, ARGV[4] delta, ARGV[5] floor ('' = none). Returns the new value.
+_LUA_INCR = _LUA_PRELUDE + """
+local value = (tonumber(redis.call('HGET', key, ARGV[3])) or 0) + tonumber(ARGV[4])
+if ARGV[5] ~= '' and value < tonumber(ARGV[5]) then
+    value = tonumber(ARGV[5])
+end
+redis.call('HSET', key, ARGV[3], string.format('%d', value))
+touch()
+return value
+"""
+
+# ARGV[3] field, ARGV[4] JSON array of items, ARGV[5] dedupe mode
+# ('' = none, '=' = scalar equality, 'a,b' = compare those object keys),
+# ARGV[6] default list JSON, ARGV[7] cap (0 = unbounded, keeps the newest).
+# Returns how many items were appended.
+_LUA_APPEND = _LUA_PRELUDE + """
+local list = jget(ARGV[3], ARGV[6])
+local added = 0
+for _, item in ipairs(cjson.decode(ARGV[4])) do
+    local dup = false
+    if ARGV[5] ~= '' then
+        for _, existing in ipairs(list) do
+            local same = true
+            if ARGV[5] == '=' then
+                same = existing == item
+            else
+                for k in string.gmatch(ARGV[5], '[^,]+') do
+                    if type(existing) ~= 'table' or existing[k] ~= item[k] then
+                        same = false
+                        break
+                    end
+                end
+            end
+            if same then
+                dup = true
+                break
+            end
+        end
+    end
+    if not dup then
+        table.insert(list, item)
+        added = added + 1
+    end
+end
+local cap = tonumber(ARGV[7])
+if cap > 0 then
+    while #list > cap do
+        table.remove(list, 1)
+    end
+end
+if #list > 0 then
+    redis.call('HSET', key, ARGV[3], cjson.encode(list))
+end
+touch()
+return added
+"""
+
+# ARGV[3] field, ARGV[4] 0-based index, ARGV[5] JSON object merged into the item,
+# ARGV[6] default list JSON. Returns 1 if the index existed.
+_LUA_PATCH_ITEM = _LUA_PRELUDE + """
+local list = jget(ARGV[3], ARGV[6])
+local item = list[tonumber(ARGV[4]) + 1]
+if type(item) ~= 'table' then
+    return 0
+end
+for k, v in pairs(cjson.decode(ARGV[5])) do
+    item[k] = v
+end
+redis.call('HSET', key, ARGV[3], cjson.encode(list))
+touch()
+return 1
+"""
+
+# ARGV[3] field, ARGV[4] JSON object of keys to set, ARGV[5] JSON object of
+# key → list to union into the existing list. Returns the merged object JSON.
+_LUA_MERGE_OBJECT = _LUA_PRELUDE + """
+local obj = jget(ARGV[3], '{}')
+for k, v in pairs(cjson.decode(ARGV[4])) do
+    obj[k] = v
+end
+for k, values in pairs(cjson.decode(ARGV[5])) do
+    local current = obj[k]
+    if type(current) ~= 'table' then
+        current = {}
+    end
+    for _, v in ipairs(values) do
+        local found = false
+        for _, e in ipairs(current) do
+            if e == v then
+                found = true
+                break
+            end
+        end
+        if not found then
+            table.insert(current, v)
+        end
+    end
+    obj[k] = current
+end
+local encoded = cjson.encode(obj)
+redis.call('HSET', key, ARGV[3], encoded)
+touch()
+return encoded
+"""
+
+# Check-and-set: ARGV[3] expected state, ARGV[4..] field/value pairs.
+# Unlike the mutators, the TTL is set exactly (transitions choose it).
+_LUA_TRANSITION = """
+local key = KEYS[1]
+local raw = redis.call('HGET', key, 'state')
+local current = 'IDLE'
+if raw then
+    current = cjson.decode(raw)
+end
+if current ~= ARGV[3] then
+    return 0
+end
+redis.call('HDEL', key, %s)
+redis.call('HSET', key, 'updated_at', ARGV[2])
+for i = 4, #ARGV, 2 do
+    redis.call('HSET', key, ARGV[i], ARGV[i + 1])
+end
+redis.call('EXPIRE', key, ARGV[1])
+return 1
+""" % ", ".join(f"'{f}'" for f in TURN_SCOPED_FIELDS)
+
+
+async def _run_script(
+    tenant_id: int, phone_number: str, script: str, args: List[Any], ttl: int = CONVSTATE_TTL
+) -> Any:
+    """Run a convstate Lua script (EVALSHA with EVAL fallback). None if Redis is unavailable."""
+    from services.relay import get_redis
+
+    r = get_redis()
+    if r is None:
+        return None
+    key = _key_for(tenant_id, phone_number)
+    argv = [ttl, _encode(_now())] + list(args)
+    runner = r.register_script(script)
+    try:
+        return await runner(keys=[key], args=argv)
+    except Exception as e:
+        if not _is_wrongtype(e):
+            raise
+        await _migrate_legacy(r, key)
+        return await runner(keys=[key], args=argv)
+
+
+async def _set_fields(
+    tenant_id: int, phone_number: str, fields: Dict[str, Any], ttl: int = CONVSTATE_TTL
+) -> None:
+    args: List[Any] = []
+    for name, value in fields.items():
+        args += [name, _encode(value)]
+    await _run_script(tenant_id, phone_number, _LUA_SET_FIELDS, args, ttl)
+
+
+async def _append(
+    tenant_id: int,
+    phone_number: str,
+    field: str,
+    items: List[Any],
+    dedupe: str = "",
+    default: Optional[List[Any]] = None,
+    cap: int = 0,
+    ttl: int = CONVSTATE_TTL,
+) -> int:
+    added = await _run_script(
+        tenant_id,
+        phone_number,
+        _LUA_APPEND,
+        [field, _encode(items), dedupe, _encode(default or []), cap],
+        ttl,
+    )
+    return int(added or 0)
+
+
+async def _incr(
+    tenant_id: int, phone_number: str, field: str, delta: int = 1, floor: Optional[int] = None
+) -> int:
+    value = await _run_script(
+        tenant_id, phone_number, _LUA_INCR, [field, delta, "" if floor is None else floor]
+    )
+    return int(value or 0)
+
+
 async def get_state(tenant_id: int, phone_number: str) -> Dict[str, Any]:
     """
-    Get conversation state from Redis.
+    Get conversation state from Redis (single HGETALL).
 
     Returns:
         Dict with 'state' key (defaults to 'IDLE' if not found or Redis fails).
@@ -79,19 +415,48 @@ async def get_state(tenant_id: int, phone_number: str) -> Dict[str, Any]:
             return {"state": "IDLE"}
 
         # r is an async redis client
-        phone_normalized = _normalize_phone_for_key(phone_number)
-        key = _get_redis_key(tenant_id, phone_normalized)
-
-        data = await r.get(key)
-        if data is None:
+        key = _key_for(tenant_id, phone_number)
+        try:
+            data = await r.hgetall(key)
+        except Exception as e:
+            if not _is_wrongtype(e):
+                raise
+            await _migrate_legacy(r, key)
+            data = await r.hgetall(key)
+
+        if not data:
             return {"state": "IDLE"}
 
-        return json.loads(data)
+        return _decode_hash(data)
     except Exception as e:
         logger.warning(f"[conversation_state] get_state failed: {e}")
         return {"state": "IDLE"}
 
 
+def _transition_fields(
+    state: str,
+    last_offered_slots: Optional[List[Dict]] = None,
+    last_locked_slot: Optional[Dict] = None,
+    last_booked_appointment_id: Optional[int] = None,
+    offered_treatment: Optional[str] = None,
+) -> Dict[str, Any]:
+    if state not in VALID_STATES:
+        raise ValueError(f"Invalid state: {state}. Must be one of {VALID_STATES}")
+    # Anti-loop fields are separate hash fields, so a transition never touches them.
+    return {
+        "state": state,
+        "last_offered_slots": last_offered_slots,
+        "last_locked_slot": last_locked_slot,
+        "last_booked_appointment_id": last_booked_appointment_id,
+        "offered_treatment": offered_treatment,
+    }
+
+
+def _state_ttl(state: str) -> int:
+    # DLD-89/92: BOOKED y PAYMENT_PENDING usan TTL de 24h para no expirar durante la conversación
+    return BOOKED_TTL if state in ("BOOKED", "PAYMENT_PENDING") else CONVSTATE_TTL
+
+
 async def set_state(
     tenant_id: int,
     phone_number: str,
@@ -113,8 +478,9 @@ async def set_state(
         last_booked_appointment_id: ID of booked appointment
         offered_treatment: Treatment name from check_availability (for OFFERED_SLOTS state)
     """
-    if state not in VALID_STATES:
-        raise ValueError(f"Invalid state: {state}. Must be one of {VALID_STATES}")
+    fields = _transition_fields(
+        state, last_offered_slots, last_locked_slot, last_booked_appointment_id, offered_treatment
+    )
 
     try:
         from services.relay import get_redis
@@ -126,51 +492,24 @@ async def set_state(
             )
             return
 
-        phone_normalized = _normalize_phone_for_key(phone_number)
-        key = _get_redis_key(tenant_id, phone_normalized)
+        key = _key_for(tenant_id, phone_number)
+        fields["updated_at"] = _now()
+        _ttl = _state_ttl(state)
+
+        async def _write():
+            pipe = r.pipeline(transaction=True)
+            pipe.hdel(key, *TURN_SCOPED_FIELDS)
+            pipe.hset(key, mapping=_encode_payload(fields))
+            pipe.expire(key, _ttl)
+            await pipe.execute()
 
-        # Preserve anti-loop fields across state transitions (v8.2)
-        _existing = None
         try:
-            _raw = await r.get(key)
-            if _raw:
-                _existing = json.loads(_raw)
-        except Exception:
-            _existing = None
-
-        state_data = {
-            "state": state,
-            "last_offered_slots": last_offered_slots,
-            "last_locked_slot": last_locked_slot,
-            "last_booked_appointment_id": last_booked_appointment_id,
-            "offered_treatment": offered_treatment,
-            # Anti-loop fields — preserve existing or default to empty/null
-            "failed_slots": (_existing or {}).get("failed_slots", []),
-            "excluded_days": (_existing or {}).get("excluded_days", []),
-            "excluded_dates": (_existing or {}).get("excluded_dates", []),
-            "statements_made": (_existing or {}).get("statements_made", {}),
-            "booking_attempts": (_existing or {}).get("booking_attempts", 0),
-            "availability_attempts": (_existing or {}).get("availability_attempts", 0),
-            "anchor_date": (_existing or {}).get("anchor_date"),
-            "insurance_asked": (_existing or {}).get("insurance_asked", False),
-            # v8.3: resolve-13-booking-errors fields (T2) — all backward-compatible
-            "booking_targets": (_existing or {}).get(
-                "booking_targets",
-                [{"type": "self", "name": "", "dni": "", "status": "pending", "relationship": ""}]
-            ),
-            "current_booking_target_index": (_existing or {}).get("current_booking_target_index", 0),
-            "frustration_count": (_existing or {}).get("frustration_count", 0),
-            "frustration_mode": (_existing or {}).get("frustration_mode", False),
-            "error_history": (_existing or {}).get("error_history", []),
-            "turn_count": (_existing or {}).get("turn_count", 0),
-            # v8.4: scheduling constraints — preserved across all state transitions
-            "scheduling_constraints": (_existing or {}).get("scheduling_constraints", {}),
-            "updated_at": _dt.now().isoformat(),
-        }
-
-        # DLD-89/92: BOOKED y PAYMENT_PENDING usan TTL de 24h para no expirar durante la conversación
-        _ttl = BOOKED_TTL if state in ("BOOKED", "PAYMENT_PENDING") else CONVSTATE_TTL
-        await r.setex(key, _ttl, json.dumps(state_data))
+            await _write()
+        except Exception as e:
+            if not _is_wrongtype(e):
+                raise
+            await _migrate_legacy(r, key)
+            await _write()
         logger.info(f"[conversation_state] State set to {state} for {key} (TTL={_ttl}s)")
 
     except Exception as e:
@@ -182,18 +521,18 @@ async def transition(
     tenant_id: int, phone_number: str, expected_from: str, to: str, **fields
 ) -> bool:
     """
-    Atomic check-and-set transition.
+    Atomic check-and-set transition (evaluated server-side).
 
     Returns:
         True if transition succeeded, False if current state != expected_from
     """
     try:
-        current = await get_state(tenant_id, phone_number)
-        if current.get("state") != expected_from:
-            return False
-
-        await set_state(tenant_id, phone_number, to, **fields)
-        return True
+        values = _transition_fields(to, **fields)
+        args: List[Any] = [expected_from]
+        for name, value in values.items():
+            args += [name, _encode(value)]
+        done = await _run_script(tenant_id, phone_number, _LUA_TRANSITION, args, _state_ttl(to))
+        return bool(done)
     except Exception as e:
         logger.warning(f"[conversation_state] transition failed: {e}")
         return False
@@ -211,8 +550,7 @@ async def reset(tenant_id: int, phone_number: str) -> None:
             logger.warning("[conversation_state] Redis not available, skipping reset")
             return
 
-        phone_normalized = _normalize_phone_for_key(phone_number)
-        key = _get_redis_key(tenant_id, phone_normalized)
+        key = _key_for(tenant_id, phone_number)
 
         await r.delete(key)
         logger.info(f"[conversation_state] State reset for {key}")
@@ -224,24 +562,24 @@ async def reset(tenant_id: int, phone_number: str) -> None:
 
 # ── Anti-loop Booking Helpers (v8.2) ──────────────────────────────
 #
-# Each helper reads the current convstate payload via get_state(), mutates the
-# relevant anti-loop field, and writes the whole payload back atomically.
-# All payload writes use a _raw_write() helper that merges anti-loop fields
-# with the existing payload so state transitions done concurrently (via set_state)
-# don't wipe out fields that other code just mutated.
+# Each helper is a single server-side operation on its own hash field, so
+# concurrent tool calls and state transitions never overwrite each other.
 
 
 async def _raw_write(tenant_id: int, phone_number: str, payload: Dict[str, Any], ttl: int = CONVSTATE_TTL) -> None:
-    """Write a raw payload dict directly to the convstate Redis key."""
+    """Replace the whole convstate hash with `payload` (prefer the field helpers)."""
     try:
         from services.relay import get_redis
 
         r = get_redis()
         if r is None:
             return
-        phone_normalized = _normalize_phone_for_key(phone_number)
-        key = _get_redis_key(tenant_id, phone_normalized)
-        await r.setex(key, ttl, json.dumps(payload))
+        key = _key_for(tenant_id, phone_number)
+        pipe = r.pipeline(transaction=True)
+        pipe.delete(key)
+        pipe.hset(key, mapping=_encode_payload(payload))
+        pipe.expire(key, ttl)
+        await pipe.execute()
     except Exception as e:
         logger.warning(f"[conversation_state] _raw_write failed: {e}")
 
@@ -254,6 +592,14 @@ async def _read_payload(tenant_id: int, phone_number: str) -> Dict[str, Any]:
     return state
 
 
+async def update_fields(tenant_id: int, phone_number: str, **fields: Any) -> None:
+    """Set arbitrary top-level convstate fields (e.g. compound_intent=True) in one call."""
+    try:
+        await _set_fields(tenant_id, phone_number, fields)
+    except Exception as e:
+        logger.warning(f"[conversation_state] update_fields failed: {e}")
+
+
 async def append_failed_slot(tenant_id: int, phone_number: str, slot: Dict[str, Any]) -> None:
     """
     Record a failed booking slot so it is never re-offered in this conversation.
@@ -262,20 +608,9 @@ async def append_failed_slot(tenant_id: int, phone_number: str, slot: Dict[str,
     Timestamp 'at' is auto-added.
     """
     try:
-        payload = await _read_payload(tenant_id, phone_number)
-        slot["at"] = _dt.now().isoformat()
-        failed = list(payload.get("failed_slots") or [])
+        slot["at"] = _now()
         # Deduplicate: same date+time+code → skip
-        if not any(
-            s.get("date") == slot.get("date")
-            and s.get("time") == slot.get("time")
-            and s.get("code") == slot.get("code")
-            for s in failed
-        ):
-            failed.append(slot)
-        payload["failed_slots"] = failed
-        payload["updated_at"] = _dt.now().isoformat()
-        await _raw_write(tenant_id, phone_number, payload)
+        await _append(tenant_id, phone_number, "failed_slots", [slot], dedupe="date,time,code")
         logger.info(
             f"[conversation_state] append_failed_slot: {slot.get('date')} {slot.get('time')} "
             f"code={slot.get('code')} for {phone_number}"
@@ -293,25 +628,16 @@ async def add_exclusion(tenant_id: int, phone_number: str, exclusion: Dict[str,
       - "dates": [list of YYYY-MM-DD] → appended to excluded_dates
     """
     try:
-        payload = await _read_payload(tenant_id, phone_number)
-
         if exclusion.get("days"):
-            existing_days = set(payload.get("excluded_days") or [])
-            for d in exclusion["days"]:
-                existing_days.add(d.lower().strip())
-            payload["excluded_days"] = list(existing_days)
+            days = [d.lower().strip() for d in exclusion["days"]]
+            await _append(tenant_id, phone_number, "excluded_days", days, dedupe="=")
 
         if exclusion.get("dates"):
-            existing_dates = set(payload.get("excluded_dates") or [])
-            for d in exclusion["dates"]:
-                existing_dates.add(d)
-            payload["excluded_dates"] = list(existing_dates)
+            await _append(tenant_id, phone_number, "excluded_dates", list(exclusion["dates"]), dedupe="=")
 
-        payload["updated_at"] = _dt.now().isoformat()
-        await _raw_write(tenant_id, phone_number, payload)
         logger.info(
-            f"[conversation_state] add_exclusion: days={payload.get('excluded_days')} "
-            f"dates={payload.get('excluded_dates')} for {phone_number}"
+            f"[conversation_state] add_exclusion: days={exclusion.get('days')} "
+            f"dates={exclusion.get('dates')} for {phone_number}"
         )
     except Exception as e:
         logger.warning(f"[conversation_state] add_exclusion failed: {e}")
@@ -325,17 +651,11 @@ async def track_statement(tenant_id: int, phone_number: str, statement_hash: str
     caller should suppress the message.
     """
     try:
-        payload = await _read_payload(tenant_id, phone_number)
-        statements = dict(payload.get("statements_made") or {})
-        count = statements.get(statement_hash, 0) + 1
-        statements[statement_hash] = count
-        payload["statements_made"] = statements
-        payload["updated_at"] = _dt.now().isoformat()
-        await _raw_write(tenant_id, phone_number, payload)
+        count = await _incr(tenant_id, phone_number, f"{STATEMENT_FIELD_PREFIX}{statement_hash}")
         logger.debug(
             f"[conversation_state] track_statement: hash={statement_hash} count={count} for {phone_number}"
         )
-        return count
+        return count or 1
     except Exception as e:
         logger.warning(f"[conversation_state] track_statement failed: {e}")
         return 1  # Fail-open: don't block the message
@@ -347,11 +667,7 @@ async def increment_booking_attempts(tenant_id: int, phone_number: str) -> int:
     Returns the new count after increment.
     """
     try:
-        payload = await _read_payload(tenant_id, phone_number)
-        current = int(payload.get("booking_attempts") or 0) + 1
-        payload["booking_attempts"] = current
-        payload["updated_at"] = _dt.now().isoformat()
-        await _raw_write(tenant_id, phone_number, payload)
+        current = await _incr(tenant_id, phone_number, "booking_attempts")
         logger.info(
             f"[conversation_state] booking_attempts: {current} for {phone_number}"
         )
@@ -364,11 +680,7 @@ async def increment_booking_attempts(tenant_id: int, phone_number: str) -> int:
 async def increment_availability_attempts(tenant_id: int, phone_number: str) -> int:
     """Increment check_availability attempt counter. Returns the new count (0 on error)."""
     try:
-        payload = await _read_payload(tenant_id, phone_number)
-        current = int(payload.get("availability_attempts") or 0) + 1
-        payload["availability_attempts"] = current
-        payload["updated_at"] = _dt.now().isoformat()
-        await _raw_write(tenant_id, phone_number, payload)
+        current = await _incr(tenant_id, phone_number, "availability_attempts")
         logger.info(
             f"[conversation_state] availability_attempts: {current} for {phone_number}"
         )
@@ -381,10 +693,7 @@ async def increment_availability_attempts(tenant_id: int, phone_number: str) ->
 async def reset_availability_attempts(tenant_id: int, phone_number: str) -> None:
     """Reset availability_attempts counter to 0 (called on successful confirm_slot)."""
     try:
-        payload = await _read_payload(tenant_id, phone_number)
-        payload["availability_attempts"] = 0
-        payload["updated_at"] = _dt.now().isoformat()
-        await _raw_write(tenant_id, phone_number, payload)
+        await _set_fields(tenant_id, phone_number, {"availability_attempts": 0})
         logger.info(
             f"[conversation_state] availability_attempts reset to 0 for {phone_number}"
         )
@@ -395,10 +704,7 @@ async def reset_availability_attempts(tenant_id: int, phone_number: str) -> None
 async def reset_booking_attempts(tenant_id: int, phone_number: str) -> None:
     """Reset booking_attempts counter to 0 (called on successful booking)."""
     try:
-        payload = await _read_payload(tenant_id, phone_number)
-        payload["booking_attempts"] = 0
-        payload["updated_at"] = _dt.now().isoformat()
-        await _raw_write(tenant_id, phone_number, payload)
+        await _set_fields(tenant_id, phone_number, {"booking_attempts": 0})
         logger.info(
             f"[conversation_state] booking_attempts reset to 0 for {phone_number}"
         )
@@ -411,14 +717,9 @@ async def decrement_booking_attempts(tenant_id: int, phone_number: str) -> None:
     al paciente (slot ocupado / race / conflicto de agenda): ese intento no debe contar
     para la derivacion por max_attempts."""
     try:
-        payload = await _read_payload(tenant_id, phone_number)
-        current = int(payload.get("booking_attempts") or 0)
-        new_val = max(0, current - 1)
-        payload["booking_attempts"] = new_val
-        payload["updated_at"] = _dt.now().isoformat()
-        await _raw_write(tenant_id, phone_number, payload)
+        new_val = await _incr(tenant_id, phone_number, "booking_attempts", delta=-1, floor=0)
         logger.info(
-            f"[conversation_state] booking_attempts decrement: {current} -> {new_val} for {phone_number}"
+            f"[conversation_state] booking_attempts decrement -> {new_val} for {phone_number}"
         )
     except Exception as e:
         logger.warning(f"[conversation_state] decrement_booking_attempts failed: {e}")
@@ -427,10 +728,7 @@ async def decrement_booking_attempts(tenant_id: int, phone_number: str) -> None:
 async def set_anchor_date(tenant_id: int, phone_number: str, anchor_date: str) -> None:
     """Store the resolved anchor date so downstream tools use it, never recalculate."""
     try:
-        payload = await _read_payload(tenant_id, phone_number)
-        payload["anchor_date"] = anchor_date
-        payload["updated_at"] = _dt.now().isoformat()
-        await _raw_write(tenant_id, phone_number, payload)
+        await _set_fields(tenant_id, phone_number, {"anchor_date": anchor_date})
         logger.info(
             f"[conversation_state] anchor_date set to {anchor_date} for {phone_number}"
         )
@@ -444,10 +742,7 @@ async def set_anchor_date(tenant_id: int, phone_number: str, anchor_date: str) -
 async def set_booking_targets(tenant_id: int, phone_number: str, targets: list[dict]) -> None:
     """Replace all booking targets in convstate."""
     try:
-        payload = await _read_payload(tenant_id, phone_number)
-        payload["booking_targets"] = targets
-        payload["updated_at"] = _dt.now().isoformat()
-        await _raw_write(tenant_id, phone_number, payload)
+        await _set_fields(tenant_id, phone_number, {"booking_targets": targets})
     except Exception as e:
         logger.warning(f"[conversation_state] set_booking_targets failed: {e}")
 
@@ -455,26 +750,34 @@ async def set_booking_targets(tenant_id: int, phone_number: str, targets: list[d
 async def append_booking_target(tenant_id: int, phone_number: str, target: dict) -> None:
     """Append one booking target to the existing list."""
     try:
-        payload = await _read_payload(tenant_id, phone_number)
-        targets = list(payload.get("booking_targets") or [{"type": "self"}])
-        targets.append(target)
-        payload["booking_targets"] = targets
-        payload["updated_at"] = _dt.now().isoformat()
-        await _raw_write(tenant_id, phone_number, payload)
+        await _append(tenant_id, phone_number, "booking_targets", [target], default=[{"type": "self"}])
     except Exception as e:
         logger.warning(f"[conversation_state] append_booking_target failed: {e}")
 
 
+async def merge_booking_targets(tenant_id: int, phone_number: str, targets: list[dict]) -> int:
+    """Append targets whose DNI is not already queued. Returns how many were added."""
+    try:
+        return await _append(
+            tenant_id, phone_number, "booking_targets", targets,
+            dedupe="dni", default=DEFAULT_BOOKING_TARGETS,
+        )
+    except Exception as e:
+        logger.warning(f"[conversation_state] merge_booking_targets failed: {e}")
+        return 0
+
+
 async def mark_target_booked(tenant_id: int, phone_number: str, index: int) -> None:
     """Set status='booked' for the target at given index."""
     try:
-        payload = await _read_payload(tenant_id, phone_number)
-        targets = list(payload.get("booking_targets") or [{"type": "self"}])
-        if 0 <= index < len(targets):
-            targets[index]["status"] = "booked"
-            payload["booking_targets"] = targets
-            payload["updated_at"] = _dt.now().isoformat()
-            await _raw_write(tenant_id, phone_number, payload)
+        if index < 0:
+            return
+        await _run_script(
+            tenant_id,
+            phone_number,
+            _LUA_PATCH_ITEM,
+            ["booking_targets", index, _encode({"status": "booked"}), _encode([{"type": "self"}])],
+        )
     except Exception as e:
         logger.warning(f"[conversation_state] mark_target_booked failed: {e}")
 
@@ -482,11 +785,7 @@ async def mark_target_booked(tenant_id: int, phone_number: str, index: int) -> N
 async def increment_frustration(tenant_id: int, phone_number: str) -> int:
     """Increment frustration_count and return the new count."""
     try:
-        payload = await _read_payload(tenant_id, phone_number)
-        current = int(payload.get("frustration_count") or 0) + 1
-        payload["frustration_count"] = current
-        payload["updated_at"] = _dt.now().isoformat()
-        await _raw_write(tenant_id, phone_number, payload)
+        current = await _incr(tenant_id, phone_number, "frustration_count")
         logger.info(
             f"[conversation_state] frustration_count: {current} for {phone_number}"
         )
@@ -499,10 +798,7 @@ async def increment_frustration(tenant_id: int, phone_number: str) -> int:
 async def set_frustration_mode(tenant_id: int, phone_number: str, mode: bool) -> None:
     """Set the frustration_mode flag."""
     try:
-        payload = await _read_payload(tenant_id, phone_number)
-        payload["frustration_mode"] = mode
-        payload["updated_at"] = _dt.now().isoformat()
-        await _raw_write(tenant_id, phone_number, payload)
+        await _set_fields(tenant_id, phone_number, {"frustration_mode": mode})
     except Exception as e:
         logger.warning(f"[conversation_state] set_frustration_mode failed: {e}")
 
@@ -510,15 +806,7 @@ async def set_frustration_mode(tenant_id: int, phone_number: str, mode: bool) ->
 async def append_error_history(tenant_id: int, phone_number: str, entry: dict) -> None:
     """Append an error entry to error_history. Caps at 5 — evicts oldest."""
     try:
-        payload = await _read_payload(tenant_id, phone_number)
-        history = list(payload.get("error_history") or [])
-        history.append(entry)
-        # Keep max 5 — evict oldest (FIFO)
-        if len(history) > 5:
-            history = history[-5:]
-        payload["error_history"] = history
-        payload["updated_at"] = _dt.now().isoformat()
-        await _raw_write(tenant_id, phone_number, payload)
+        await _append(tenant_id, phone_number, "error_history", [entry], cap=ERROR_HISTORY_CAP)
     except Exception as e:
         logger.warning(f"[conversation_state] append_error_history failed: {e}")
 
@@ -526,10 +814,7 @@ async def append_error_history(tenant_id: int, phone_number: str, entry: dict) -
 async def clear_error_history(tenant_id: int, phone_number: str) -> None:
     """Clear all entries from error_history."""
     try:
-        payload = await _read_payload(tenant_id, phone_number)
-        payload["error_history"] = []
-        payload["updated_at"] = _dt.now().isoformat()
-        await _raw_write(tenant_id, phone_number, payload)
+        await _set_fields(tenant_id, phone_number, {"error_history": []})
     except Exception as e:
         logger.warning(f"[conversation_state] clear_error_history failed: {e}")
 
@@ -537,10 +822,7 @@ async def clear_error_history(tenant_id: int, phone_number: str) -> None:
 async def mark_booking_target_index(tenant_id: int, phone_number: str, index: int) -> None:
     """Set the current_booking_target_index."""
     try:
-        payload = await _read_payload(tenant_id, phone_number)
-        payload["current_booking_target_index"] = index
-        payload["updated_at"] = _dt.now().isoformat()
-        await _raw_write(tenant_id, phone_number, payload)
+        await _set_fields(tenant_id, phone_number, {"current_booking_target_index": index})
     except Exception as e:
         logger.warning(f"[conversation_state] mark_booking_target_index failed: {e}")
 
@@ -548,12 +830,7 @@ async def mark_booking_target_index(tenant_id: int, phone_number: str, index: in
 async def increment_turn_count(tenant_id: int, phone_number: str) -> int:
     """Increment turn_count and return the new count."""
     try:
-        payload = await _read_payload(tenant_id, phone_number)
-        current = int(payload.get("turn_count") or 0) + 1
-        payload["turn_count"] = current
-        payload["updated_at"] = _dt.now().isoformat()
-        await _raw_write(tenant_id, phone_number, payload)
-        return current
+        return await _incr(tenant_id, phone_number, "turn_count")
     except Exception as e:
         logger.warning(f"[conversation_state] increment_turn_count failed: {e}")
         return 0
@@ -565,11 +842,7 @@ async def increment_turn_count(tenant_id: int, phone_number: str) -> int:
 async def mark_insurance_asked(tenant_id: int, phone_number: str) -> None:
     """Marca que ya se preguntó sobre cobertura en esta conversación."""
     try:
-        payload = await get_state(tenant_id, phone_number) or {}
-        if not isinstance(payload, dict):
-            payload = {}
-        payload["insurance_asked"] = True
-        await _raw_write(tenant_id, phone_number, payload, ttl=CONVSTATE_TTL)
+        await _set_fields(tenant_id, phone_number, {"insurance_asked": True}, ttl=CONVSTATE_TTL)
     except Exception as e:
         logger.warning(f"[insurance_asked] Error marking insurance_asked: {e}")
 
@@ -615,29 +888,29 @@ async def save_scheduling_constraints(
         exclude_dates: lista de fechas YYYY-MM-DD a excluir
     """
     try:
-        payload = await _read_payload(tenant_id, phone_number)
-        existing = payload.get("scheduling_constraints") or {}
-
+        to_set: Dict[str, Any] = {}
         if time_preference is not None:
-            existing["time_preference"] = time_preference
+            to_set["time_preference"] = time_preference
         if min_time is not None:
-            existing["min_time"] = min_time
+            to_set["min_time"] = min_time
         if max_time is not None:
-            existing["max_time"] = max_time
+            to_set["max_time"] = max_time
+        to_union: Dict[str, List[str]] = {}
         if exclude_days:
-            current_days = existing.get("exclude_days", [])
-            existing["exclude_days"] = list(set(current_days) | set(d.lower() for d in exclude_days))
+            to_union["exclude_days"] = sorted(set(d.lower() for d in exclude_days))
         if exclude_dates:
-            current_dates = existing.get("exclude_dates", [])
-            existing["exclude_dates"] = list(set(current_dates) | set(exclude_dates))
-
-        payload["scheduling_constraints"] = existing
-        payload["updated_at"] = _dt.now().isoformat()
+            to_union["exclude_dates"] = sorted(set(exclude_dates))
 
         # Usar TTL extendido (24h) para que las restricciones sobrevivan horas entre mensajes
-        await _raw_write(tenant_id, phone_number, payload, ttl=BOOKED_TTL)
+        merged = await _run_script(
+            tenant_id,
+            phone_number,
+            _LUA_MERGE_OBJECT,
+            ["scheduling_constraints", _encode(to_set), _encode(to_union)],
+            ttl=BOOKED_TTL,
+        )
         logger.info(
-            f"[conversation_state] scheduling_constraints saved for {phone_number}: {existing}"
+            f"[conversation_state] scheduling_constraints saved for {phone_number}: {merged}"
         )
     except Exception as e:
         logger.warning(f"[conversation_state] save_scheduling_constraints failed: {e}")
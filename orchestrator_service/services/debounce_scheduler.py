@@ -0,0 +1,172 @@
+"""
+Debounce scheduler shared by the message-buffer consumers.
+
+Buffer consumers wait for a burst of messages to go quiet before calling the
+agent. They used to poll `TTL timer:*` in a loop per conversation, so every
+open burst cost Redis calls even while nothing happened.
+
+Due-times now live in one Redis sorted set (`debounce:due`, member = timer key,
+score = due epoch-ms). schedule() is called by the producer on every enqueue
+(ZADD, extend-only so a shorter window never cuts an open one). Consumers
+await wait_until_due(); a single loop per process sleeps until the earliest
+local due-time, re-reads all local scores with one ZMSCORE (another replica may
+have pushed one later) and releases the waiters whose time has come, removing
+them atomically only if nobody extended them in between. With no waiters the
+loop is parked on an asyncio.Event: idle conversations cost zero Redis traffic.
+
+The `timer:*` keys are still written next to the ZADD: recover_orphaned_buffers
+and the sliding-window TTL math read them.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEBOUNCE_ZSET_KEY = "debounce:due"
+# Members left behind by a crashed process are swept after this long.
+STALE_MEMBER_SECONDS = 3600
+# Upper bound on one sleep, so a lost wake-up can never strand a waiter.
+MAX_SLEEP_SECONDS = 30.0
+
+# Remove each due member only if its score is still <= now (not extended by
+# another replica since we read it). Returns the members actually popped.
+_POP_DUE_LUA = """
+local popped = {}
+for i, member in ipairs(ARGV) do
+    if i > 1 then
+        local score = redis.call('ZSCORE', KEYS[1], member)
+        if (not score) or tonumber(score) <= tonumber(ARGV[1]) then
+            redis.call('ZREM', KEYS[1], member)
+            table.insert(popped, member)
+        end
+    end
+end
+return popped
+"""
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class DebounceScheduler:
+    """Per-process waiter registry + single drain loop over the due-time ZSET."""
+
+    def __init__(self):
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._redis = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def schedule(self, r, member: str, delay_seconds: float) -> None:
+        """Make `member` due no earlier than now + delay_seconds (never shortens)."""
+        due = _now_ms() + int(delay_seconds * 1000)
+        try:
+            # GT still inserts missing members; it only refuses to lower a score.
+            await r.zadd(DEBOUNCE_ZSET_KEY, {member: due}, gt=True)
+        except Exception as e:
+            # Waiters fall back to the timer key's own TTL for unknown members.
+            logger.warning(f"debounce scheduler: ZADD failed for {member}: {e}")
+            return
+        if self._wakeup is not None and member in self._waiters:
+            self._wakeup.set()
+
+    async def wait_until_due(self, r, member: str) -> None:
+        """Block until `member` is due (or no longer scheduled)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # New event loop (tests, reload): drop state bound to the old one.
+            self._waiters = {}
+            self._task = None
+            self._wakeup = asyncio.Event()
+            self._loop = loop
+        future = loop.create_future()
+        self._waiters.setdefault(member, []).append(future)
+        self._redis = r
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._drain_loop(), name="debounce-scheduler")
+        try:
+            await future
+        except Exception as e:
+            logger.warning(f"debounce scheduler unavailable, polling {member}: {e}")
+            while await r.ttl(member) > 0:
+                await asyncio.sleep(1)
+        finally:
+            waiters = self._waiters.get(member)
+            if waiters and future in waiters:
+                waiters.remove(future)
+                if not waiters:
+                    self._waiters.pop(member, None)
+
+    async def _drain_loop(self) -> None:
+        while self._waiters:
+            self._wakeup.clear()
+            try:
+                sleep_for = await self._drain_once()
+            except Exception as e:
+                # Hand every waiter back to its caller's TTL-polling fallback.
+                waiters, self._waiters = self._waiters, {}
+                for futures in waiters.values():
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(e)
+                break
+            if not self._waiters:
+                break
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=sleep_for)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _drain_once(self) -> float:
+        """Release due waiters; return seconds until the next local due-time."""
+        r = self._redis
+        members = list(self._waiters)
+        if not members:
+            return MAX_SLEEP_SECONDS
+        scores = await r.zmscore(DEBOUNCE_ZSET_KEY, members)
+        now = _now_ms()
+        due, pending = [], []
+        for member, score in zip(members, scores):
+            if score is None:
+                # Never scheduled (producer predates the ZSET or its ZADD
+                # failed): honour the timer key itself.
+                remaining = await r.pttl(member)
+                score = now + remaining if remaining and remaining > 0 else now
+            if float(score) <= now:
+                due.append(member)
+            else:
+                pending.append(float(score))
+
+        if due:
+            popped = await r.eval(_POP_DUE_LUA, 1, DEBOUNCE_ZSET_KEY, now, *due)
+            released = {p.decode() if isinstance(p, bytes) else p for p in popped or []}
+            for member in due:
+                if member not in released:
+                    continue  # extended by another replica in the meantime
+                for future in self._waiters.pop(member, []):
+                    if not future.done():
+                        future.set_result(None)
+            if len(released) < len(due):
+                return 0.05
+            # Opportunistic sweep of members orphaned by crashed processes.
+            await r.zremrangebyscore(DEBOUNCE_ZSET_KEY, "-inf", now - STALE_MEMBER_SECONDS * 1000)
+
+        if not pending:
+            return MAX_SLEEP_SECONDS
+        return min(MAX_SLEEP_SECONDS, max(0.0, (min(pending) - now) / 1000.0))
+
+
+_scheduler: Optional[DebounceScheduler] = None
+
+
+def get_debounce_scheduler() -> DebounceScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = DebounceScheduler()
+    return _scheduler
@@ -6,9 +6,12 @@ Uses OpenAI text-embedding-3-small (1536 dimensions).
 
 import os
 import json
+import time
+import hashlib
 import logging
 import asyncio
-from typing import List, Dict, Any, Optional
+from collections import Counter, OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
 
 from db import db
 
@@ -21,8 +24,28 @@ DEFAULT_TOP_K = 5
 # "cuesta" vs "sale"). text-embedding-3-small needs lower threshold for Spanish synonyms.
 DEFAULT_SIMILARITY_THRESHOLD = 0.55
 
+# Batch client: inputs per API request (OpenAI accepts up to 2048) and
+# concurrent requests per generate_embeddings() call.
+EMBEDDING_BATCH_SIZE = 100
+EMBEDDING_MAX_CONCURRENCY = 4
+
+# Embedding cache keyed by sha256(model + text): in-process LRU + Redis, both with TTL.
+EMBEDDING_CACHE_TTL_SECONDS = 86400  # 24h — embeddings are deterministic per model
+EMBEDDING_LOCAL_CACHE_SIZE = 256     # ~12 KB per 1536-dim vector as Python floats
+REDIS_EMBEDDING_PREFIX = "emb_cache"
+
 _pgvector_available: Optional[bool] = None
 
+# sha256 key -> (expires_at_monotonic, embedding)
+_EMBEDDING_CACHE: "OrderedDict[str, Tuple[float, List[float]]]" = OrderedDict()
+_openai_client: Optional[Tuple[str, Any]] = None  # (api_key, AsyncOpenAI)
+
+# JSON fallback (no pgvector): per-tenant pre-normalized float32 FAQ matrix.
+# Invalidated locally by upsert/delete; TTL bounds staleness on other replicas.
+FAQ_MATRIX_TTL_SECONDS = 300
+# tenant_id -> (expires_at_monotonic, [faq metadata], matrix of shape (n_faqs, dim))
+_FAQ_MATRIX_CACHE: Dict[int, Tuple[float, List[Dict[str, Any]], Any]] = {}
+
 
 async def check_pgvector_available() -> bool:
     """Check if pgvector extension is available in the database."""
@@ -56,21 +79,87 @@ async def _get_config(key: str, default: str) -> str:
         return default
 
 
-async def generate_embedding(text: str) -> Optional[List[float]]:
-    """Generate embedding vector for a text string using OpenAI API."""
+def _embedding_cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\n{text}".encode("utf-8")).hexdigest()
+
+
+def _get_redis():
     try:
+        from services.relay import get_redis
+
+        return get_redis()
+    except Exception:
+        return None
+
+
+def _get_openai_client(api_key: str):
+    """Reuse one AsyncOpenAI client (and its connection pool) per API key."""
+    global _openai_client
+    if _openai_client is None or _openai_client[0] != api_key:
         import openai
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            logger.warning("OPENAI_API_KEY not set — cannot generate embeddings")
-            return None
-
-        model = await _get_config("MODEL_EMBEDDINGS", DEFAULT_EMBEDDING_MODEL)
-        client = openai.AsyncOpenAI(api_key=api_key)
-        response = await client.embeddings.create(
-            input=text,
-            model=model
-        )
+        _openai_client = (api_key, openai.AsyncOpenAI(api_key=api_key))
+    return _openai_client[1]
+
+
+async def _cache_get_many(keys: List[str]) -> Dict[str, List[float]]:
+    """Look up embeddings in the local LRU, then Redis for the rest."""
+    now = time.monotonic()
+    found: Dict[str, List[float]] = {}
+    for key in keys:
+        entry = _EMBEDDING_CACHE.get(key)
+        if entry is None:
+            continue
+        if entry[0] < now:
+            _EMBEDDING_CACHE.pop(key, None)
+            continue
+        _EMBEDDING_CACHE.move_to_end(key)
+        found[key] = entry[1]
+
+    remote_keys = [k for k in dict.fromkeys(keys) if k not in found]
+    r = _get_redis() if remote_keys else None
+    if r is not None:
+        try:
+            raw_values = await r.mget([f"{REDIS_EMBEDDING_PREFIX}:{k}" for k in remote_keys])
+            hits = {k: json.loads(v) for k, v in zip(remote_keys, raw_values) if v}
+            _cache_put_local(hits)
+            found.update(hits)
+        except Exception as e:
+            logger.debug(f"Embedding cache read failed: {e}")
+    return found
+
+
+def _cache_put_local(entries: Dict[str, List[float]]) -> None:
+    expires = time.monotonic() + EMBEDDING_CACHE_TTL_SECONDS
+    for key, embedding in entries.items():
+        _EMBEDDING_CACHE[key] = (expires, embedding)
+        _EMBEDDING_CACHE.move_to_end(key)
+    while len(_EMBEDDING_CACHE) > EMBEDDING_LOCAL_CACHE_SIZE:
+        _EMBEDDING_CACHE.popitem(last=False)
+
+
+async def _cache_set_many(entries: Dict[str, List[float]]) -> None:
+    _cache_put_local(entries)
+    r = _get_redis()
+    if r is None or not entries:
+        return
+    try:
+        pipe = r.pipeline()
+        for key, embedding in entries.items():
+            pipe.setex(f"{REDIS_EMBEDDING_PREFIX}:{key}", EMBEDDING_CACHE_TTL_SECONDS, json.dumps(embedding))
+        await pipe.execute()
+    except Exception as e:
+        logger.debug(f"Embedding cache write failed: {e}")
+
+
+def clear_embedding_cache() -> None:
+    """Drop the in-process embedding cache (tests / model switch)."""
+    _EMBEDDING_CACHE.clear()
+
+
+async def _embed_batch(client, model: str, texts: List[str]) -> Optional[List[List[float]]]:
+    """One embeddings API request for up to EMBEDDING_BATCH_SIZE inputs."""
+    try:
+        response = await client.embeddings.create(input=texts, model=model)
 
         # Track embedding usage
         try:
@@ -82,12 +171,71 @@ async def generate_embedding(text: str) -> Optional[List[float]]:
         except Exception:
             pass
 
-        return response.data[0].embedding
+        return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
     except Exception as e:
-        logger.error(f"Error generating embedding: {e}")
+        logger.error(f"Error generating embeddings (batch of {len(texts)}): {e}")
         return None
 
 
+async def generate_embeddings(texts: List[str], use_cache: bool = True) -> List[Optional[List[float]]]:
+    """
+    Generate embeddings for many texts using OpenAI API.
+    Duplicates are embedded once, cache hits skip the network, and misses are sent
+    EMBEDDING_BATCH_SIZE inputs per request with at most EMBEDDING_MAX_CONCURRENCY
+    requests in flight. Returns one entry per input (None for blank texts or failures).
+    """
+    results: List[Optional[List[float]]] = [None] * len(texts)
+    if not any(t and t.strip() for t in texts):
+        return results
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        logger.warning("OPENAI_API_KEY not set — cannot generate embeddings")
+        return results
+
+    model = await _get_config("MODEL_EMBEDDINGS", DEFAULT_EMBEDDING_MODEL)
+    keys = [_embedding_cache_key(model, t) if t and t.strip() else None for t in texts]
+    found = await _cache_get_many([k for k in keys if k]) if use_cache else {}
+
+    missing: Dict[str, str] = {}
+    for key, text in zip(keys, texts):
+        if key and key not in found and key not in missing:
+            missing[key] = text
+
+    if missing:
+        try:
+            client = _get_openai_client(api_key)
+        except Exception as e:
+            logger.error(f"Error generating embedding: {e}")
+            client = None
+        if client is not None:
+            items = list(missing.items())
+            batches = [items[i:i + EMBEDDING_BATCH_SIZE] for i in range(0, len(items), EMBEDDING_BATCH_SIZE)]
+            semaphore = asyncio.Semaphore(EMBEDDING_MAX_CONCURRENCY)
+
+            async def _run(batch):
+                async with semaphore:
+                    return batch, await _embed_batch(client, model, [text for _, text in batch])
+
+            fresh: Dict[str, List[float]] = {}
+            for batch, vectors in await asyncio.gather(*[_run(b) for b in batches]):
+                if vectors:
+                    fresh.update({key: vec for (key, _), vec in zip(batch, vectors)})
+            found.update(fresh)
+            if use_cache and fresh:
+                await _cache_set_many(fresh)
+
+    for i, key in enumerate(keys):
+        if key:
+            results[i] = found.get(key)
+    return results
+
+
+async def generate_embedding(text: str, use_cache: bool = True) -> Optional[List[float]]:
+    """Generate embedding vector for a text string (cached; see generate_embeddings)."""
+    return (await generate_embeddings([text], use_cache=use_cache))[0]
+
+
 async def _ensure_faq_embeddings_json_table():
     """Create faq_embeddings_json table if it doesn't exist (pgvector-free fallback)."""
     try:
@@ -109,6 +257,93 @@ async def _ensure_faq_embeddings_json_table():
         logger.debug(f"faq_embeddings_json table check: {e}")
 
 
+def invalidate_faq_matrix(tenant_id: Optional[int] = None) -> None:
+    """Drop the cached FAQ matrix for a tenant (or all tenants when None)."""
+    if tenant_id is None:
+        _FAQ_MATRIX_CACHE.clear()
+    else:
+        _FAQ_MATRIX_CACHE.pop(tenant_id, None)
+
+
+async def _get_faq_matrix(tenant_id: int):
+    """Return (faq metadata, normalized float32 matrix) for a tenant's JSON embeddings."""
+    import numpy as np
+
+    now = time.monotonic()
+    cached = _FAQ_MATRIX_CACHE.get(tenant_id)
+    if cached and cached[0] > now:
+        return cached[1], cached[2]
+
+    await _ensure_faq_embeddings_json_table()
+    rows = await db.pool.fetch("""
+        SELECT fej.faq_id, fej.embedding, cf.question, cf.answer, cf.category
+        FROM faq_embeddings_json fej
+        JOIN clinic_faqs cf ON cf.id = fej.faq_id
+        WHERE fej.tenant_id = $1
+        ORDER BY fej.faq_id
+    """, tenant_id)
+
+    meta: List[Dict[str, Any]] = []
+    vectors: List[List[float]] = []
+    for row in rows or []:
+        stored_embedding = row["embedding"]
+        if isinstance(stored_embedding, str):
+            stored_embedding = json.loads(stored_embedding)
+        if not stored_embedding:
+            continue
+        meta.append({
+            "faq_id": row["faq_id"],
+            "question": row["question"],
+            "answer": row["answer"],
+            "category": row["category"],
+        })
+        vectors.append(stored_embedding)
+
+    if vectors:
+        # Rows embedded with a different model (other dimension) can't be scored together
+        dim = Counter(len(v) for v in vectors).most_common(1)[0][0]
+        keep = [i for i, v in enumerate(vectors) if len(v) == dim]
+        meta = [meta[i] for i in keep]
+        matrix = np.asarray([vectors[i] for i in keep], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+    else:
+        matrix = np.zeros((0, 0), dtype=np.float32)
+
+    _FAQ_MATRIX_CACHE[tenant_id] = (now + FAQ_MATRIX_TTL_SECONDS, meta, matrix)
+    return meta, matrix
+
+
+def _top_k_from_matrix(
+    meta: List[Dict[str, Any]], matrix, query_embedding: List[float], top_k: int, threshold: float
+) -> List[Dict[str, Any]]:
+    """Score all FAQs with one matrix-vector product and select top-k with argpartition."""
+    import numpy as np
+
+    if not meta or top_k <= 0:
+        return []
+    query = np.asarray(query_embedding, dtype=np.float32)
+    if query.shape[0] != matrix.shape[1]:
+        logger.warning(
+            f"FAQ embedding dimension mismatch (query={query.shape[0]}, stored={matrix.shape[1]}) — re-sync FAQs"
+        )
+        return []
+    query_norm = np.linalg.norm(query)
+    if query_norm == 0:
+        return []
+
+    similarities = matrix @ (query / query_norm)
+    candidates = np.flatnonzero(similarities >= threshold)
+    if candidates.size > top_k:
+        candidates = candidates[np.argpartition(-similarities[candidates], top_k - 1)[:top_k]]
+    candidates = candidates[np.argsort(-similarities[candidates], kind="stable")]
+    return [
+        {**meta[i], "similarity": round(float(similarities[i]), 4)}
+        for i in candidates
+    ]
+
+
 def _cosine_similarity(a: List[float], b: List[float]) -> float:
     """Compute cosine similarity between two vectors in pure Python."""
     dot = sum(x * y for x, y in zip(a, b))
@@ -122,10 +357,14 @@ def _cosine_similarity(a: List[float], b: List[float]) -> float:
 async def upsert_faq_embedding(tenant_id: int, faq_id: int, question: str, answer: str) -> bool:
     """Generate and store embedding for a FAQ entry. Works with or without pgvector."""
     content = f"{question} {answer}"
-    embedding = await generate_embedding(content)
+    embedding = await generate_embedding(content, use_cache=False)
     if not embedding:
         return False
+    return await _store_faq_embedding(tenant_id, faq_id, content, embedding)
+
 
+async def _store_faq_embedding(tenant_id: int, faq_id: int, content: str, embedding: List[float]) -> bool:
+    """Persist a FAQ embedding (pgvector table, or JSON table as fallback)."""
     # Try pgvector first
     if await check_pgvector_available():
         try:
@@ -161,6 +400,7 @@ async def upsert_faq_embedding(tenant_id: int, faq_id: int, question: str, answe
                 embedding = EXCLUDED.embedding,
                 updated_at = NOW()
         """, tenant_id, faq_id, content, embedding_json)
+        invalidate_faq_matrix(tenant_id)
         logger.debug(f"Upserted FAQ embedding (JSON): tenant={tenant_id} faq={faq_id}")
         return True
     except Exception as e:
@@ -170,6 +410,17 @@ async def upsert_faq_embedding(tenant_id: int, faq_id: int, question: str, answe
 
 async def delete_faq_embedding(faq_id: int, tenant_id: Optional[int] = None) -> bool:
     """Delete embedding when a FAQ is removed. Uses tenant_id for isolation when available."""
+    invalidate_faq_matrix(tenant_id)
+    try:
+        if tenant_id:
+            await db.pool.execute(
+                "DELETE FROM faq_embeddings_json WHERE faq_id = $1 AND tenant_id = $2",
+                faq_id, tenant_id
+            )
+        else:
+            await db.pool.execute("DELETE FROM faq_embeddings_json WHERE faq_id = $1", faq_id)
+    except Exception as e:
+        logger.debug(f"faq_embeddings_json delete skipped: {e}")
     try:
         if tenant_id:
             await db.pool.execute(
@@ -244,8 +495,14 @@ async def search_similar_faqs(
             logger.error(f"Error searching FAQs (pgvector): {e}")
             return []
 
-    # Fallback: JSON table + Python cosine similarity
+    # Fallback: JSON table + cached NumPy matrix (pure Python if NumPy is missing)
     try:
+        try:
+            meta, matrix = await _get_faq_matrix(tenant_id)
+            return _top_k_from_matrix(meta, matrix, query_embedding, top_k, threshold)
+        except ImportError:
+            pass
+
         await _ensure_faq_embeddings_json_table()
         rows = await db.pool.fetch("""
             SELECT fej.faq_id, fej.embedding, cf.question, cf.answer, cf.category
@@ -312,17 +569,18 @@ async def sync_tenant_faq_embeddings(tenant_id: int) -> int:
 
         logger.info(f"📚 sync_tenant_faq_embeddings(tenant={tenant_id}): {len(faqs)} FAQs need embedding")
 
+        # One batched embedding pass for all pending FAQs, then store each row
+        contents = [f"{faq['question']} {faq['answer']}" for faq in faqs]
+        embeddings = await generate_embeddings(contents, use_cache=False)
+
         count = 0
         failures = 0
-        for faq in faqs:
-            ok = await upsert_faq_embedding(tenant_id, faq["id"], faq["question"], faq["answer"])
+        for faq, content, embedding in zip(faqs, contents, embeddings):
+            ok = bool(embedding) and await _store_faq_embedding(tenant_id, faq["id"], content, embedding)
             if ok:
                 count += 1
             else:
                 failures += 1
-            # Small delay to avoid rate limiting
-            if count % 10 == 0 and count > 0:
-                await asyncio.sleep(0.5)
 
         logger.info(
             f"📚 sync_tenant_faq_embeddings(tenant={tenant_id}): "
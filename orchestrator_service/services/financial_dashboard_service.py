@@ -12,6 +12,11 @@ Provides:
 
 All queries are filtered by tenant_id (soberanía de datos).
 Uses asyncpg pool passed as first argument.
+
+Revenue, billing, payouts, breakdowns and cash flow are read from the daily
+fact tables of services/analytics_rollup.py (analytics_daily_appointments /
+analytics_daily_cash), refreshed for the requested range before reading.
+Pending collections and liquidation counts still query their source tables.
 """
 
 import logging
@@ -19,8 +24,52 @@ from datetime import datetime, timedelta
 from decimal import Decimal
 from typing import Any, Dict, List, Optional
 
+from services.analytics_rollup import ensure_fresh, to_day
+
 logger = logging.getLogger(__name__)
 
+_PERIOD_TOTALS_SQL = """
+    SELECT f.paid_amount, f.completed_billed_amount, f.pending_amount, c.plan_payments, c.payouts
+    FROM (
+        SELECT COALESCE(SUM(paid_amount), 0) AS paid_amount,
+               COALESCE(SUM(completed_billed_amount), 0) AS completed_billed_amount,
+               COALESCE(SUM(pending_amount), 0) AS pending_amount
+        FROM analytics_daily_appointments
+        WHERE tenant_id = $1 AND day >= $2 AND day <= $3
+    ) f,
+    (
+        SELECT COALESCE(SUM(plan_payments), 0) AS plan_payments,
+               COALESCE(SUM(payouts), 0) AS payouts
+        FROM analytics_daily_cash
+        WHERE tenant_id = $1 AND day >= $2 AND day <= $3
+    ) c
+"""
+
+# Per-treatment totals, shared by the revenue breakdown and the top treatments list.
+_TREATMENT_TOTALS_SQL = """
+    SELECT
+        COALESCE(tt.code, NULLIF(f.treatment_code, ''), 'unknown') AS treatment_code,
+        COALESCE(tt.name, NULLIF(f.treatment_code, ''), 'Sin tratamiento') AS treatment_name,
+        f.total_billed,
+        f.total_paid,
+        f.appointment_count,
+        f.total_billed / NULLIF(f.billed_count, 0) AS avg_price
+    FROM (
+        SELECT treatment_code,
+               SUM(billed_amount) AS total_billed,
+               SUM(paid_amount) AS total_paid,
+               SUM(billable) AS appointment_count,
+               SUM(billed_count) AS billed_count
+        FROM analytics_daily_appointments
+        WHERE tenant_id = $1 AND day >= $2 AND day <= $3
+        GROUP BY treatment_code
+        HAVING SUM(billable) > 0
+    ) f
+    LEFT JOIN treatment_types tt ON tt.code = f.treatment_code AND tt.tenant_id = $1
+    ORDER BY f.total_billed DESC
+    LIMIT $4
+"""
+
 
 # ---------------------------------------------------------------------------
 # Helpers
@@ -49,6 +98,16 @@ def _shift_period(
     return prev_start, prev_end
 
 
+async def _period_totals(pool, tenant_id: int, period_start, period_end) -> Dict[str, float]:
+    """Appointment and cash totals of [period_start, period_end] from the fact tables."""
+    start, end = to_day(period_start), to_day(period_end)
+    await ensure_fresh(pool, tenant_id, start, end)
+    row = await pool.fetchrow(_PERIOD_TOTALS_SQL, tenant_id, start, end)
+    return {key: _to_float(row[key]) if row else 0.0 for key in (
+        "paid_amount", "completed_billed_amount", "pending_amount", "plan_payments", "payouts"
+    )}
+
+
 # ---------------------------------------------------------------------------
 # FinancialDashboardService
 # ---------------------------------------------------------------------------
@@ -82,81 +141,7 @@ class FinancialDashboardService:
           - liquidations_paid: count with status = 'paid'
         """
         try:
-            # Revenue from completed/paid appointments
-            appt_revenue = await pool.fetchval(
-                """
-                SELECT COALESCE(SUM(billing_amount), 0)
-                FROM appointments
-                WHERE tenant_id = $1
-                  AND appointment_datetime >= $2
-                  AND appointment_datetime < ($3::date + INTERVAL '1 day')
-                  AND payment_status = 'paid'
-                  AND status NOT IN ('cancelled', 'deleted')
-                """,
-                tenant_id,
-                period_start,
-                period_end,
-            )
-
-            # Revenue from treatment plan payments
-            plan_revenue = await pool.fetchval(
-                """
-                SELECT COALESCE(SUM(amount), 0)
-                FROM treatment_plan_payments
-                WHERE tenant_id = $1
-                  AND payment_date >= $2
-                  AND payment_date < ($3::date + INTERVAL '1 day')
-                """,
-                tenant_id,
-                period_start,
-                period_end,
-            )
-
-            # Professional payouts
-            total_payouts = await pool.fetchval(
-                """
-                SELECT COALESCE(SUM(amount), 0)
-                FROM professional_payouts
-                WHERE tenant_id = $1
-                  AND payment_date >= $2
-                  AND payment_date < ($3::date + INTERVAL '1 day')
-                """,
-                tenant_id,
-                period_start,
-                period_end,
-            )
-
-            # Total billed (all completed appointments regardless of payment)
-            total_billed = await pool.fetchval(
-                """
-                SELECT COALESCE(SUM(billing_amount), 0)
-                FROM appointments
-                WHERE tenant_id = $1
-                  AND appointment_datetime >= $2
-                  AND appointment_datetime < ($3::date + INTERVAL '1 day')
-                  AND status IN ('completed', 'attended')
-                """,
-                tenant_id,
-                period_start,
-                period_end,
-            )
-
-            # Total pending (billed but not fully paid)
-            total_pending = await pool.fetchval(
-                """
-                SELECT COALESCE(SUM(billing_amount), 0)
-                FROM appointments
-                WHERE tenant_id = $1
-                  AND appointment_datetime >= $2
-                  AND appointment_datetime < ($3::date + INTERVAL '1 day')
-                  AND payment_status IN ('pending', 'partial')
-                  AND status NOT IN ('cancelled', 'deleted')
-                  AND billing_amount > 0
-                """,
-                tenant_id,
-                period_start,
-                period_end,
-            )
+            totals = await _period_totals(pool, tenant_id, period_start, period_end)
 
             # Liquidation counts
             liquidations_row = await pool.fetchrow(
@@ -175,15 +160,15 @@ class FinancialDashboardService:
                 period_end,
             )
 
-            revenue = _to_float(appt_revenue) + _to_float(plan_revenue)
-            payouts = _to_float(total_payouts)
+            revenue = totals["paid_amount"] + totals["plan_payments"]
+            payouts = totals["payouts"]
 
             return {
                 "total_revenue": round(revenue, 2),
                 "total_payouts": round(payouts, 2),
                 "net_profit": round(revenue - payouts, 2),
-                "total_billed": round(_to_float(total_billed), 2),
-                "total_pending": round(_to_float(total_pending), 2),
+                "total_billed": round(totals["completed_billed_amount"], 2),
+                "total_pending": round(totals["pending_amount"], 2),
                 "liquidations_generated": liquidations_row["total"]
                 if liquidations_row
                 else 0,
@@ -236,29 +221,35 @@ class FinancialDashboardService:
             appointment_count, liquidation_count }
         """
         try:
+            start, end = to_day(period_start), to_day(period_end)
+            await ensure_fresh(pool, tenant_id, start, end)
             rows = await pool.fetch(
                 """
                 SELECT
                     p.id AS professional_id,
                     p.first_name || ' ' || COALESCE(p.last_name, '') AS professional_name,
                     p.specialty,
-                    COALESCE(SUM(a.billing_amount), 0) AS total_billed,
-                    COALESCE(SUM(a.billing_amount) FILTER (WHERE a.payment_status = 'paid'), 0) AS total_paid,
-                    COALESCE(SUM(a.billing_amount) FILTER (WHERE a.payment_status IN ('pending', 'partial')), 0) AS total_pending,
-                    COUNT(a.id) AS appointment_count
+                    COALESCE(f.total_billed, 0) AS total_billed,
+                    COALESCE(f.total_paid, 0) AS total_paid,
+                    COALESCE(f.total_pending, 0) AS total_pending,
+                    COALESCE(f.appointment_count, 0) AS appointment_count
                 FROM professionals p
-                LEFT JOIN appointments a ON a.professional_id = p.id
-                    AND a.tenant_id = $1
-                    AND a.appointment_datetime >= $2
-                    AND a.appointment_datetime < ($3::date + INTERVAL '1 day')
-                    AND a.status NOT IN ('cancelled', 'deleted')
+                LEFT JOIN (
+                    SELECT professional_id,
+                           SUM(billed_amount) AS total_billed,
+                           SUM(paid_amount) AS total_paid,
+                           SUM(pending_amount) AS total_pending,
+                           SUM(billable) AS appointment_count
+                    FROM analytics_daily_appointments
+                    WHERE tenant_id = $1 AND day >= $2 AND day <= $3
+                    GROUP BY professional_id
+                ) f ON f.professional_id = p.id
                 WHERE p.tenant_id = $1
-                GROUP BY p.id, p.first_name, p.last_name, p.specialty
                 ORDER BY total_billed DESC
                 """,
                 tenant_id,
-                period_start,
-                period_end,
+                start,
+                end,
             )
 
             # Count liquidations per professional in the period
@@ -318,28 +309,9 @@ class FinancialDashboardService:
             appointment_count, percentage }
         """
         try:
-            rows = await pool.fetch(
-                """
-                SELECT
-                    COALESCE(tt.code, a.appointment_type, 'unknown') AS treatment_code,
-                    COALESCE(tt.name, a.appointment_type, 'Sin tratamiento') AS treatment_name,
-                    COALESCE(SUM(a.billing_amount), 0) AS total_billed,
-                    COALESCE(SUM(a.billing_amount) FILTER (WHERE a.payment_status = 'paid'), 0) AS total_paid,
-                    COUNT(a.id) AS appointment_count
-                FROM appointments a
-                LEFT JOIN treatment_types tt ON tt.code = a.appointment_type AND tt.tenant_id = a.tenant_id
-                WHERE a.tenant_id = $1
-                  AND a.appointment_datetime >= $2
-                  AND a.appointment_datetime < ($3::date + INTERVAL '1 day')
-                  AND a.status NOT IN ('cancelled', 'deleted')
-                GROUP BY tt.code, tt.name, a.appointment_type
-                ORDER BY total_billed DESC
-                LIMIT 10
-                """,
-                tenant_id,
-                period_start,
-                period_end,
-            )
+            start, end = to_day(period_start), to_day(period_end)
+            await ensure_fresh(pool, tenant_id, start, end)
+            rows = await pool.fetch(_TREATMENT_TOTALS_SQL, tenant_id, start, end, 10)
 
             total_all = sum(_to_float(r["total_billed"]) for r in rows)
 
@@ -383,9 +355,13 @@ class FinancialDashboardService:
         Returns array of:
           { date, cash_received, card_received, total, payouts }
 
+        total is paid appointment billing; cash_received / card_received split
+        the treatment plan payments by method (appointments carry no method).
         Uses generate_series to include all days in the range (even days with 0 revenue).
         """
         try:
+            start, end = to_day(period_start), to_day(period_end)
+            await ensure_fresh(pool, tenant_id, start, end)
             rows = await pool.fetch(
                 """
                 WITH date_series AS (
@@ -396,49 +372,25 @@ class FinancialDashboardService:
                     )::date AS d
                 ),
                 daily_revenue AS (
-                    SELECT
-                        DATE(a.appointment_datetime) AS d,
-                        COALESCE(SUM(a.billing_amount) FILTER (
-                            WHERE a.payment_method = 'cash' AND a.payment_status = 'paid'
-                        ), 0) AS cash_received,
-                        COALESCE(SUM(a.billing_amount) FILTER (
-                            WHERE a.payment_method IN ('card', 'credit_card', 'debit_card')
-                            AND a.payment_status = 'paid'
-                        ), 0) AS card_received,
-                        COALESCE(SUM(a.billing_amount) FILTER (
-                            WHERE a.payment_status = 'paid'
-                        ), 0) AS total
-                    FROM appointments a
-                    WHERE a.tenant_id = $1
-                      AND a.appointment_datetime >= $2
-                      AND a.appointment_datetime < ($3::date + INTERVAL '1 day')
-                      AND a.status NOT IN ('cancelled', 'deleted')
-                    GROUP BY DATE(a.appointment_datetime)
-                ),
-                daily_payouts AS (
-                    SELECT
-                        payment_date AS d,
-                        COALESCE(SUM(amount), 0) AS payouts
-                    FROM professional_payouts
-                    WHERE tenant_id = $1
-                      AND payment_date >= $2
-                      AND payment_date < ($3::date + INTERVAL '1 day')
-                    GROUP BY payment_date
+                    SELECT day AS d, SUM(paid_amount) AS total
+                    FROM analytics_daily_appointments
+                    WHERE tenant_id = $1 AND day >= $2 AND day <= $3
+                    GROUP BY day
                 )
                 SELECT
                     ds.d AS date,
-                    COALESCE(dr.cash_received, 0) AS cash_received,
-                    COALESCE(dr.card_received, 0) AS card_received,
+                    COALESCE(c.plan_cash, 0) AS cash_received,
+                    COALESCE(c.plan_card, 0) AS card_received,
                     COALESCE(dr.total, 0) AS total,
-                    COALESCE(dp.payouts, 0) AS payouts
+                    COALESCE(c.payouts, 0) AS payouts
                 FROM date_series ds
                 LEFT JOIN daily_revenue dr ON dr.d = ds.d
-                LEFT JOIN daily_payouts dp ON dp.d = ds.d
+                LEFT JOIN analytics_daily_cash c ON c.tenant_id = $1 AND c.day = ds.d
                 ORDER BY ds.d ASC
                 """,
                 tenant_id,
-                period_start,
-                period_end,
+                start,
+                end,
             )
 
             return [
@@ -483,92 +435,15 @@ class FinancialDashboardService:
             current_payouts, previous_payouts, payout_growth_pct }
         """
         try:
-            # Current period revenue
-            current_appt = await pool.fetchval(
-                """
-                SELECT COALESCE(SUM(billing_amount), 0)
-                FROM appointments
-                WHERE tenant_id = $1
-                  AND appointment_datetime >= $2
-                  AND appointment_datetime < ($3::date + INTERVAL '1 day')
-                  AND payment_status = 'paid'
-                  AND status NOT IN ('cancelled', 'deleted')
-                """,
-                tenant_id,
-                period_start,
-                period_end,
-            )
-            current_plan = await pool.fetchval(
-                """
-                SELECT COALESCE(SUM(amount), 0)
-                FROM treatment_plan_payments
-                WHERE tenant_id = $1
-                  AND payment_date >= $2
-                  AND payment_date < ($3::date + INTERVAL '1 day')
-                """,
-                tenant_id,
-                period_start,
-                period_end,
-            )
-            current_payouts = await pool.fetchval(
-                """
-                SELECT COALESCE(SUM(amount), 0)
-                FROM professional_payouts
-                WHERE tenant_id = $1
-                  AND payment_date >= $2
-                  AND payment_date < ($3::date + INTERVAL '1 day')
-                """,
-                tenant_id,
-                period_start,
-                period_end,
-            )
-
+            current = await _period_totals(pool, tenant_id, period_start, period_end)
             # Previous period (same duration, shifted back)
             prev_start, prev_end = _shift_period(period_start, period_end)
+            previous = await _period_totals(pool, tenant_id, prev_start, prev_end)
 
-            prev_appt = await pool.fetchval(
-                """
-                SELECT COALESCE(SUM(billing_amount), 0)
-                FROM appointments
-                WHERE tenant_id = $1
-                  AND appointment_datetime >= $2
-                  AND appointment_datetime < ($3::date + INTERVAL '1 day')
-                  AND payment_status = 'paid'
-                  AND status NOT IN ('cancelled', 'deleted')
-                """,
-                tenant_id,
-                prev_start,
-                prev_end,
-            )
-            prev_plan = await pool.fetchval(
-                """
-                SELECT COALESCE(SUM(amount), 0)
-                FROM treatment_plan_payments
-                WHERE tenant_id = $1
-                  AND payment_date >= $2
-                  AND payment_date < ($3::date + INTERVAL '1 day')
-                """,
-                tenant_id,
-                prev_start,
-                prev_end,
-            )
-            prev_payouts = await pool.fetchval(
-                """
-                SELECT COALESCE(SUM(amount), 0)
-                FROM professional_payouts
-                WHERE tenant_id = $1
-                  AND payment_date >= $2
-                  AND payment_date < ($3::date + INTERVAL '1 day')
-                """,
-                tenant_id,
-                prev_start,
-                prev_end,
-            )
-
-            current_revenue = _to_float(current_appt) + _to_float(current_plan)
-            previous_revenue = _to_float(prev_appt) + _to_float(prev_plan)
-            current_payouts_val = _to_float(current_payouts)
-            previous_payouts_val = _to_float(prev_payouts)
+            current_revenue = current["paid_amount"] + current["plan_payments"]
+            previous_revenue = previous["paid_amount"] + previous["plan_payments"]
+            current_payouts_val = current["payouts"]
+            previous_payouts_val = previous["payouts"]
 
             # Growth calculations
             if previous_revenue > 0:
@@ -695,39 +570,16 @@ class FinancialDashboardService:
           { treatment_code, treatment_name, total_revenue, count, avg_price }
         """
         try:
-            rows = await pool.fetch(
-                """
-                SELECT
-                    COALESCE(tt.code, a.appointment_type, 'unknown') AS treatment_code,
-                    COALESCE(tt.name, a.appointment_type, 'Sin tratamiento') AS treatment_name,
-                    COALESCE(SUM(a.billing_amount), 0) AS total_revenue,
-                    COUNT(a.id) AS count,
-                    CASE
-                        WHEN COUNT(a.id) > 0 THEN AVG(a.billing_amount)
-                        ELSE 0
-                    END AS avg_price
-                FROM appointments a
-                LEFT JOIN treatment_types tt ON tt.code = a.appointment_type AND tt.tenant_id = a.tenant_id
-                WHERE a.tenant_id = $1
-                  AND a.appointment_datetime >= $2
-                  AND a.appointment_datetime < ($3::date + INTERVAL '1 day')
-                  AND a.status NOT IN ('cancelled', 'deleted')
-                GROUP BY tt.code, tt.name, a.appointment_type
-                ORDER BY total_revenue DESC
-                LIMIT $4
-                """,
-                tenant_id,
-                period_start,
-                period_end,
-                limit,
-            )
+            start, end = to_day(period_start), to_day(period_end)
+            await ensure_fresh(pool, tenant_id, start, end)
+            rows = await pool.fetch(_TREATMENT_TOTALS_SQL, tenant_id, start, end, limit)
 
             return [
                 {
                     "treatment_code": row["treatment_code"],
                     "treatment_name": row["treatment_name"],
-                    "total_revenue": round(_to_float(row["total_revenue"]), 2),
-                    "count": row["count"] or 0,
+                    "total_revenue": round(_to_float(row["total_billed"]), 2),
+                    "count": row["appointment_count"] or 0,
                     "avg_price": round(_to_float(row["avg_price"]), 2),
                 }
                 for row in rows
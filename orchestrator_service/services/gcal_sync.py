@@ -0,0 +1,229 @@
+"""
+Background Google Calendar → google_calendar_blocks sync.
+
+check_availability / book_appointment used to call gcal_service (a blocking
+googleapiclient call) for every professional inside the tool, then delete and
+re-insert that day's blocks one statement at a time. Availability now reads
+only google_calendar_blocks; this module keeps that table fresh from a
+scheduled job (jobs/gcal_sync.py):
+
+- One cursor per professional in `gcal_sync_cursors` holding Google's
+  nextSyncToken, so each run fetches only what changed (usually nothing).
+- Changes are applied in bulk: one unnest() upsert + one DELETE for cancelled
+  events per professional.
+- The blocking Google client runs in a worker thread, one call at a time
+  (the shared googleapiclient service object is not thread-safe).
+- A missing cursor, a changed calendar id, an expired token (HTTP 410) or a
+  full listing older than FULL_RESYNC_INTERVAL_DAYS triggers a full listing
+  of [now - FULL_SYNC_LOOKBACK_DAYS, now + FULL_SYNC_HORIZON_DAYS), after
+  which rows mirroring a Google event that Google no longer returns in that
+  window are removed. The periodic full listing slides the window forward
+  (a sync token keeps the bounds of the listing that issued it).
+
+Rows written here carry sync_status = 'gcal_sync'. The reconciliation also
+covers rows written by the old JIT sync and the admin manual sync (status
+'synced' but with a google_event_id); blocks created by hand have no
+google_event_id and are never deleted by it.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SYNC_STATUS = "gcal_sync"
+FULL_SYNC_LOOKBACK_DAYS = 1
+FULL_SYNC_HORIZON_DAYS = 180
+FULL_RESYNC_INTERVAL_DAYS = 7
+
+
+def _parse_event(event: Dict[str, Any]) -> Optional[Tuple]:
+    """Google event → (google_event_id, title, description, start, end, all_day)."""
+    try:
+        start = event["start"].get("dateTime") or event["start"].get("date")
+        end = event["end"].get("dateTime") or event["end"].get("date")
+        dt_start = datetime.fromisoformat(start.replace("Z", "+00:00"))
+        dt_end = datetime.fromisoformat(end.replace("Z", "+00:00"))
+    except Exception as e:
+        logger.warning(f"gcal_sync: unparseable event {event.get('id')}: {e}")
+        return None
+    return (
+        event["id"],
+        (event.get("summary") or "Ocupado (GCal)")[:255],
+        event.get("description", ""),
+        dt_start,
+        dt_end,
+        "date" in event["start"],
+    )
+
+
+async def apply_changes(pool, tenant_id: int, professional_id: int,
+                        events: List[Dict[str, Any]], appointment_event_ids: set) -> Dict[str, int]:
+    """Bulk-apply a page of Google changes for one professional."""
+    cancelled = [e["id"] for e in events if e.get("status") == "cancelled"]
+    rows = []
+    for event in events:
+        if event.get("status") == "cancelled" or event["id"] in appointment_event_ids:
+            continue  # appointments are already tracked in their own table
+        parsed = _parse_event(event)
+        if parsed:
+            rows.append(parsed)
+
+    if cancelled:
+        await pool.execute(
+            """
+            DELETE FROM google_calendar_blocks
+            WHERE tenant_id = $1 AND professional_id = $2 AND google_event_id = ANY($3::text[])
+            """,
+            tenant_id, professional_id, cancelled,
+        )
+    if rows:
+        ids, titles, descriptions, starts, ends, all_days = (list(col) for col in zip(*rows))
+        await pool.execute(
+            """
+            INSERT INTO google_calendar_blocks (
+                tenant_id, professional_id, google_event_id, title, description,
+                start_datetime, end_datetime, all_day, sync_status, last_sync_at
+            )
+            SELECT $1, $2, e.id, e.title, e.description, e.start_dt, e.end_dt, e.all_day, $9, NOW()
+            FROM unnest($3::text[], $4::text[], $5::text[], $6::timestamptz[], $7::timestamptz[], $8::bool[])
+                AS e(id, title, description, start_dt, end_dt, all_day)
+            ON CONFLICT (google_event_id) DO UPDATE SET
+                title = EXCLUDED.title,
+                description = EXCLUDED.description,
+                start_datetime = EXCLUDED.start_datetime,
+                end_datetime = EXCLUDED.end_datetime,
+                all_day = EXCLUDED.all_day,
+                professional_id = EXCLUDED.professional_id,
+                sync_status = EXCLUDED.sync_status,
+                last_sync_at = NOW(),
+                updated_at = NOW()
+            WHERE google_calendar_blocks.tenant_id = EXCLUDED.tenant_id
+            """,
+            tenant_id, professional_id, ids, titles, descriptions, starts, ends, all_days, SYNC_STATUS,
+        )
+    return {"upserted": len(rows), "deleted": len(cancelled)}
+
+
+async def sync_professional(pool, tenant_id: int, professional_id: int, calendar_id: str,
+                            appointment_event_ids: set) -> Dict[str, int]:
+    """Incremental sync of one professional's calendar; full resync when needed."""
+    from gcal_service import SyncTokenExpired, gcal_service
+
+    cursor = await pool.fetchrow(
+        """
+        SELECT calendar_id, sync_token, last_full_sync_at FROM gcal_sync_cursors
+        WHERE tenant_id = $1 AND professional_id = $2
+        """,
+        tenant_id, professional_id,
+    )
+    now = datetime.now(timezone.utc)
+    sync_token = cursor["sync_token"] if cursor and cursor["calendar_id"] == calendar_id else None
+    last_full = cursor.get("last_full_sync_at") if cursor else None
+    if sync_token and (last_full is None or now - last_full > timedelta(days=FULL_RESYNC_INTERVAL_DAYS)):
+        sync_token = None  # slide the listing window forward
+    full_since = now - timedelta(days=FULL_SYNC_LOOKBACK_DAYS)
+    full_until = now + timedelta(days=FULL_SYNC_HORIZON_DAYS)
+    time_min = full_since.isoformat().replace("+00:00", "Z")
+    time_max = full_until.isoformat().replace("+00:00", "Z")
+
+    try:
+        events, next_token = await asyncio.to_thread(
+            gcal_service.sync_events, calendar_id, sync_token, time_min, time_max
+        )
+    except SyncTokenExpired:
+        logger.info(f"gcal_sync: sync token expired for prof {professional_id}, full resync")
+        sync_token = None
+        events, next_token = await asyncio.to_thread(
+            gcal_service.sync_events, calendar_id, None, time_min, time_max
+        )
+
+    stats = await apply_changes(pool, tenant_id, professional_id, events, appointment_event_ids)
+
+    if sync_token is None:
+        # Full listing: drop mirrored events of the window that Google no longer
+        # returns, including legacy 'synced' rows from the JIT / admin syncs.
+        live_ids = [e["id"] for e in events if e.get("status") != "cancelled"]
+        removed = await pool.execute(
+            """
+            DELETE FROM google_calendar_blocks
+            WHERE tenant_id = $1 AND professional_id = $2 AND google_event_id IS NOT NULL
+              AND end_datetime > $3 AND start_datetime < $4
+              AND NOT (google_event_id = ANY($5::text[]))
+            """,
+            tenant_id, professional_id, full_since, full_until, live_ids,
+        )
+        try:
+            stats["deleted"] += int(str(removed).split()[-1])
+        except (ValueError, IndexError):
+            pass
+
+    await pool.execute(
+        """
+        INSERT INTO gcal_sync_cursors (tenant_id, professional_id, calendar_id, sync_token,
+                                       last_synced_at, last_full_sync_at, last_error, updated_at)
+        VALUES ($1, $2, $3, $4, NOW(), CASE WHEN $5 THEN NOW() END, NULL, NOW())
+        ON CONFLICT (tenant_id, professional_id) DO UPDATE SET
+            calendar_id = EXCLUDED.calendar_id,
+            sync_token = EXCLUDED.sync_token,
+            last_synced_at = NOW(),
+            last_full_sync_at = COALESCE(EXCLUDED.last_full_sync_at, gcal_sync_cursors.last_full_sync_at),
+            last_error = NULL,
+            updated_at = NOW()
+        """,
+        tenant_id, professional_id, calendar_id, next_token, sync_token is None,
+    )
+    return stats
+
+
+async def _record_error(pool, tenant_id: int, professional_id: int, calendar_id: str, error: str):
+    try:
+        await pool.execute(
+            """
+            INSERT INTO gcal_sync_cursors (tenant_id, professional_id, calendar_id, last_error, updated_at)
+            VALUES ($1, $2, $3, $4, NOW())
+            ON CONFLICT (tenant_id, professional_id) DO UPDATE SET
+                last_error = EXCLUDED.last_error, updated_at = NOW()
+            """,
+            tenant_id, professional_id, calendar_id, error[:500],
+        )
+    except Exception:
+        pass
+
+
+async def sync_all_google_calendars(pool) -> Dict[str, int]:
+    """Sync every active professional with a calendar id in tenants on the google provider."""
+    professionals = await pool.fetch(
+        """
+        SELECT p.tenant_id, p.id, p.google_calendar_id
+        FROM professionals p
+        JOIN tenants t ON t.id = p.tenant_id
+        WHERE p.is_active = true AND p.google_calendar_id IS NOT NULL AND p.google_calendar_id <> ''
+          AND LOWER(COALESCE(t.config->>'calendar_provider', 'local')) = 'google'
+        ORDER BY p.tenant_id, p.id
+        """
+    )
+    totals = {"professionals": 0, "upserted": 0, "deleted": 0, "errors": 0}
+    apt_ids_by_tenant: Dict[int, set] = {}
+    for prof in professionals:
+        tenant_id = prof["tenant_id"]
+        if tenant_id not in apt_ids_by_tenant:
+            rows = await pool.fetch(
+                "SELECT google_calendar_event_id FROM appointments WHERE tenant_id = $1 AND google_calendar_event_id IS NOT NULL",
+                tenant_id,
+            )
+            apt_ids_by_tenant[tenant_id] = {r["google_calendar_event_id"] for r in rows}
+        try:
+            stats = await sync_professional(
+                pool, tenant_id, prof["id"], prof["google_calendar_id"], apt_ids_by_tenant[tenant_id]
+            )
+            totals["upserted"] += stats["upserted"]
+            totals["deleted"] += stats["deleted"]
+            totals["professionals"] += 1
+        except Exception as e:
+            totals["errors"] += 1
+            logger.error(f"gcal_sync: prof {prof['id']} (tenant {tenant_id}) failed: {e}")
+            await _record_error(pool, tenant_id, prof["id"], prof["google_calendar_id"], str(e))
+    return totals
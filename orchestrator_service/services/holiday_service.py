@@ -16,9 +16,11 @@ Return type of is_holiday():
   - (True, name, {"start": "HH:MM", "end": "HH:MM"})  → override_open WITH custom hours
 """
 
+import asyncio
 import logging
+import time
 from datetime import date, timedelta
-from typing import Optional, Tuple, List, Dict, Any
+from typing import Optional, Tuple, List, Dict, Any, Iterable
 
 try:
     import holidays as holidays_lib
@@ -128,6 +130,52 @@ def _get_country_holidays(country_code: str, year: int, language: Optional[str]
     return instance
 
 
+def _apply_priority_chain(
+    custom_rows: Iterable[Any],
+    country_code: str,
+    language: str,
+    check_date: date,
+    professional_id: Optional[int],
+) -> Tuple[bool, Optional[str], Optional[Dict[str, str]]]:
+    """
+    Resolve one date from its already-matched tenant_holidays rows.
+
+    Shared by is_holiday (rows filtered in SQL) and the range resolver
+    (rows filtered from the cached tenant calendar) so both give identical answers.
+    """
+    custom_rows = list(custom_rows)
+    # Priority 1: override_open takes precedence
+    for row in custom_rows:
+        if row['holiday_type'] == 'override_open':
+            hs = row['custom_hours_start']
+            he = row['custom_hours_end']
+            if hs and he:
+                # Reduced hours on a normally-holiday day
+                custom_hours = {
+                    'start': hs.strftime('%H:%M'),
+                    'end': he.strftime('%H:%M'),
+                }
+                return (True, row['name'], custom_hours)
+            # No custom hours → treat as normal working day
+            return (False, None, None)
+
+    # Priority 2: custom closure
+    for row in custom_rows:
+        if row['holiday_type'] == 'closure':
+            return (True, row['name'], None)
+
+    # Priority 3: library holiday (only for global context)
+    # Professional-specific blocks don't affect library holidays — a prof block
+    # on a national holiday means the prof is simply blocked, clinic may be closed.
+    if professional_id is None:
+        country_hols = _get_country_holidays(country_code, check_date.year, language)
+        if country_hols and check_date in country_hols:
+            return (True, country_hols.get(check_date), None)
+
+    # Priority 4: not a holiday
+    return (False, None, None)
+
+
 async def is_holiday(
     pool,
     tenant_id: int,
@@ -214,36 +262,198 @@ async def is_holiday(
             tenant_id, check_date, check_date.month, check_date.day
         )
 
-    # Priority 1: override_open takes precedence
-    for row in custom_rows:
-        if row['holiday_type'] == 'override_open':
-            hs = row['custom_hours_start']
-            he = row['custom_hours_end']
-            if hs and he:
-                # Reduced hours on a normally-holiday day
-                custom_hours = {
-                    'start': hs.strftime('%H:%M'),
-                    'end': he.strftime('%H:%M'),
-                }
-                return (True, row['name'], custom_hours)
-            # No custom hours → treat as normal working day
-            return (False, None, None)
+    return _apply_priority_chain(custom_rows, country_code, language, check_date, professional_id)
+
+
+# ── Range resolver + per-tenant calendar cache ──────────────────────────────
+# is_holiday costs a tenant lookup + a tenant_holidays query per date (and per
+# professional). Multi-day searches instead load the tenant's whole calendar
+# once (tenant settings + every tenant_holidays row, one query), keep it in
+# process for HOLIDAY_CALENDAR_TTL_SECONDS and resolve any date range from
+# memory with the same priority chain. The /holidays admin routes call
+# invalidate_holiday_calendar(), which also publishes on Redis so the other
+# replicas drop their copy; the TTL bounds staleness if Redis is unavailable.
+HOLIDAY_CALENDAR_TTL_SECONDS = 300
+HOLIDAY_CALENDAR_NEGATIVE_TTL_SECONDS = 30
+HOLIDAY_INVALIDATE_CHANNEL = "holidays:invalidate"
+_LISTENER_RETRY_SECONDS = 60
+
+HolidayResult = Tuple[bool, Optional[str], Optional[Dict[str, str]]]
+
+# tenant_id -> (expires_at, calendar or None when the tenant does not exist)
+_CALENDAR_CACHE: Dict[int, Tuple[float, Optional["TenantHolidayCalendar"]]] = {}
+_calendar_generation = 0
+_listener_task: Optional[asyncio.Task] = None
+_listener_retry_at = 0.0
+
+
+class TenantHolidayCalendar:
+    """A tenant's country/language plus its tenant_holidays rows indexed by date."""
+
+    def __init__(self, country_code: str, language: str, rows: Iterable[Dict[str, Any]]):
+        self.country_code = country_code
+        self.language = language
+        self._by_date: Dict[date, List[Dict[str, Any]]] = {}
+        self._recurring: Dict[Tuple[int, int], List[Dict[str, Any]]] = {}
+        for row in rows:
+            self._by_date.setdefault(row['date'], []).append(row)
+            if row['is_recurring']:
+                self._recurring.setdefault((row['date'].month, row['date'].day), []).append(row)
+
+    def _rows_for(self, check_date: date, professional_id: Optional[int]) -> List[Dict[str, Any]]:
+        """Same row filter as the is_holiday queries."""
+        candidates = list(self._by_date.get(check_date, []))
+        for row in self._recurring.get((check_date.month, check_date.day), []):
+            if row['date'] != check_date:
+                candidates.append(row)
+        if professional_id is not None:
+            return [
+                r for r in candidates
+                if (r['scope'] == 'professional' and r['professional_id'] == professional_id)
+                or (r['scope'] == 'global' and r['professional_id'] is None)
+            ]
+        return [r for r in candidates if r['scope'] == 'global' or r['professional_id'] is None]
+
+    def resolve(self, check_date: date, professional_id: Optional[int] = None) -> HolidayResult:
+        return _apply_priority_chain(
+            self._rows_for(check_date, professional_id),
+            self.country_code, self.language, check_date, professional_id,
+        )
 
-    # Priority 2: custom closure
-    for row in custom_rows:
-        if row['holiday_type'] == 'closure':
-            return (True, row['name'], None)
 
-    # Priority 3: library holiday (only for global context)
-    # Professional-specific blocks don't affect library holidays — a prof block
-    # on a national holiday means the prof is simply blocked, clinic may be closed.
-    if professional_id is None:
-        country_hols = _get_country_holidays(country_code, check_date.year, language)
-        if country_hols and check_date in country_hols:
-            return (True, country_hols.get(check_date), None)
+def _drop_cached_calendars(tenant_id: Optional[int] = None) -> None:
+    global _calendar_generation
+    _calendar_generation += 1
+    if tenant_id is None:
+        _CALENDAR_CACHE.clear()
+    else:
+        _CALENDAR_CACHE.pop(tenant_id, None)
 
-    # Priority 4: not a holiday
-    return (False, None, None)
+
+async def _ensure_invalidation_listener() -> None:
+    """Suscribe (una vez por proceso) al canal Redis de invalidación."""
+    global _listener_task, _listener_retry_at
+    if _listener_task is not None and not _listener_task.done():
+        return
+    if time.monotonic() < _listener_retry_at:
+        return
+    _listener_retry_at = time.monotonic() + _LISTENER_RETRY_SECONDS
+    try:
+        from services.relay import get_redis
+
+        redis = get_redis()
+        if redis is None:
+            return
+        pubsub = redis.pubsub()
+        await pubsub.subscribe(HOLIDAY_INVALIDATE_CHANNEL)
+    except Exception as e:
+        logger.warning(f"Holiday calendar cache: pubsub unavailable, relying on TTL: {e}")
+        return
+
+    async def listen():
+        try:
+            async for msg in pubsub.listen():
+                if msg.get("type") != "message":
+                    continue
+                raw = str(msg.get("data") or "")
+                _drop_cached_calendars(int(raw) if raw.isdigit() else None)
+        except Exception as e:
+            logger.warning(f"Holiday calendar cache: pubsub listener stopped: {e}")
+        finally:
+            _drop_cached_calendars()
+
+    _listener_task = asyncio.create_task(listen(), name="holiday-calendar-invalidation")
+
+
+async def invalidate_holiday_calendar(tenant_id: Optional[int] = None) -> None:
+    """Drop the cached calendar here and on the other replicas.
+
+    Call after any write to tenant_holidays or to the tenant's country / language.
+    """
+    _drop_cached_calendars(tenant_id)
+    try:
+        from services.relay import get_redis
+
+        redis = get_redis()
+        if redis is not None:
+            await redis.publish(HOLIDAY_INVALIDATE_CHANNEL, "*" if tenant_id is None else str(tenant_id))
+    except Exception as e:
+        logger.warning(f"Holiday calendar cache: could not publish invalidation: {e}")
+
+
+async def get_tenant_holiday_calendar(pool, tenant_id: int) -> Optional[TenantHolidayCalendar]:
+    """The tenant's holiday calendar (cached); None if the tenant does not exist."""
+    entry = _CALENDAR_CACHE.get(tenant_id)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+
+    await _ensure_invalidation_listener()
+    generation = _calendar_generation
+    rows = await pool.fetch(
+        """
+        SELECT t.country_code,
+               COALESCE(t.config->>'language', t.config->>'ui_language', 'es') AS language,
+               th.date, th.name, th.holiday_type, th.is_recurring,
+               th.custom_hours_start, th.custom_hours_end, th.professional_id, th.scope
+        FROM tenants t
+        LEFT JOIN tenant_holidays th ON th.tenant_id = t.id
+        WHERE t.id = $1
+        """,
+        tenant_id
+    )
+    calendar = None
+    if rows:
+        calendar = TenantHolidayCalendar(
+            (rows[0]['country_code'] or 'US').upper(),
+            rows[0]['language'] or 'es',
+            [dict(r) for r in rows if r['date'] is not None],
+        )
+    # Si hubo una invalidación durante el SELECT, no cachear un calendario viejo.
+    if generation == _calendar_generation:
+        ttl = HOLIDAY_CALENDAR_TTL_SECONDS if calendar is not None else HOLIDAY_CALENDAR_NEGATIVE_TTL_SECONDS
+        _CALENDAR_CACHE[tenant_id] = (time.monotonic() + ttl, calendar)
+    return calendar
+
+
+def _date_range(start_date: date, end_date: date) -> List[date]:
+    return [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+
+
+async def resolve_holiday_range(
+    pool,
+    tenant_id: int,
+    start_date: date,
+    end_date: date,
+    professional_id: Optional[int] = None,
+) -> Dict[date, HolidayResult]:
+    """
+    is_holiday for every date in [start_date, end_date], from the cached calendar.
+
+    Returns {date: (is_holiday, name, custom_hours)} with exactly the semantics of
+    is_holiday(pool, tenant_id, date, professional_id). At most one query per
+    tenant per cache lifetime.
+    """
+    calendar = await get_tenant_holiday_calendar(pool, tenant_id)
+    days = _date_range(start_date, end_date)
+    if calendar is None:
+        return {d: (False, None, None) for d in days}
+    return {d: calendar.resolve(d, professional_id) for d in days}
+
+
+async def resolve_professional_holiday_range(
+    pool,
+    tenant_id: int,
+    start_date: date,
+    end_date: date,
+    professional_ids: Iterable[int],
+) -> Dict[date, Dict[int, HolidayResult]]:
+    """Per-professional variant: {date: {professional_id: is_holiday(..., professional_id)}}."""
+    calendar = await get_tenant_holiday_calendar(pool, tenant_id)
+    professional_ids = list(professional_ids)
+    days = _date_range(start_date, end_date)
+    if calendar is None:
+        return {d: {pid: (False, None, None) for pid in professional_ids} for d in days}
+    return {d: {pid: calendar.resolve(d, pid) for pid in professional_ids} for d in days}
 
 
 async def get_upcoming_holidays(pool, tenant_id: int, days_ahead: int = 30) -> List[Dict[str, Any]]:
@@ -0,0 +1,241 @@
+"""
+Process-wide pooled HTTP clients for outbound upstreams (YCloud, Meta Graph,
+OpenAI, media downloads).
+
+YCloudClient, response_sender (meta_direct), media_downloader and
+whisper_service used to open a new httpx.AsyncClient per call, so every
+bubble of every reply paid a fresh TCP + TLS handshake. Now each upstream
+has one long-lived client:
+
+- Per-upstream connection limits and keep-alive (UPSTREAMS below); HTTP/2
+  when the optional ``h2`` package is installed.
+- A retrying transport applied uniformly: 429 is retried for every method
+  (the request was not processed; Retry-After is honoured up to
+  MAX_RETRY_AFTER_SECONDS), 5xx and connection errors only for idempotent
+  methods, so a POST that reached the upstream is never sent twice.
+- Per-upstream timing metrics (requests, errors, retries, latency p50/p95)
+  exposed by get_http_stats() and /health/http.
+
+Clients are bound to the event loop that created them; a different loop
+(tests, scripts using asyncio.run) transparently gets its own client.
+close_http_clients() is called from the shutdown hook.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRIES = 2
+BACKOFF_BASE_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 8.0
+# Inline retries serve user-facing requests: longer Retry-After is surfaced to the caller.
+MAX_RETRY_AFTER_SECONDS = 10.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+LATENCY_WINDOW = 512
+
+
+@dataclass(frozen=True)
+class UpstreamConfig:
+    timeout: float = 30.0
+    connect_timeout: float = 10.0
+    max_connections: int = 50
+    max_keepalive: int = 20
+    keepalive_expiry: float = 60.0
+    follow_redirects: bool = False
+    max_retries: int = MAX_RETRIES
+
+
+UPSTREAMS: Dict[str, UpstreamConfig] = {
+    "ycloud": UpstreamConfig(timeout=15.0, max_connections=50, max_keepalive=20),
+    "meta": UpstreamConfig(timeout=10.0, max_connections=50, max_keepalive=20),
+    "openai": UpstreamConfig(timeout=120.0, max_connections=20, max_keepalive=10),
+    # LLM SDK clients (services/llm_client_pool.py): the SDK retries itself.
+    "llm": UpstreamConfig(timeout=120.0, max_connections=100, max_keepalive=20, max_retries=0),
+    "media": UpstreamConfig(timeout=30.0, max_connections=20, max_keepalive=10, follow_redirects=True),
+}
+DEFAULT_UPSTREAM = UpstreamConfig()
+
+# upstream -> (loop, client)
+_CLIENTS: Dict[str, Tuple[Any, Any]] = {}
+
+
+class _UpstreamStats:
+    __slots__ = ("requests", "errors", "retries", "status_classes", "latencies_ms", "max_ms")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.status_classes: Dict[str, int] = {}
+        self.latencies_ms: deque = deque(maxlen=LATENCY_WINDOW)
+        self.max_ms = 0.0
+
+    def record(self, elapsed_ms: float, status: Optional[int]) -> None:
+        self.requests += 1
+        self.latencies_ms.append(elapsed_ms)
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        key = f"{status // 100}xx" if status else "error"
+        self.status_classes[key] = self.status_classes.get(key, 0) + 1
+        if status is None or status >= 500:
+            self.errors += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        ordered = sorted(self.latencies_ms)
+
+        def pct(p: float) -> Optional[float]:
+            if not ordered:
+                return None
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 1)
+
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "status": dict(self.status_classes),
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "max_ms": round(self.max_ms, 1),
+        }
+
+
+_STATS: Dict[str, _UpstreamStats] = {}
+
+
+def _stats(upstream: str) -> _UpstreamStats:
+    stats = _STATS.get(upstream)
+    if stats is None:
+        stats = _STATS[upstream] = _UpstreamStats()
+    return stats
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff(attempt: int) -> float:
+    return min(MAX_BACKOFF_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)) * (0.5 + random.random() / 2)
+
+
+def _make_transport(upstream: str, config: UpstreamConfig, inner=None):
+    import httpx
+
+    class _RetryingTransport(httpx.AsyncBaseTransport):
+        """Wraps the pooled transport with uniform retry/backoff and timing."""
+
+        def __init__(self):
+            self._inner = inner or httpx.AsyncHTTPTransport(
+                http2=_http2_available(),
+                limits=httpx.Limits(
+                    max_connections=config.max_connections,
+                    max_keepalive_connections=config.max_keepalive,
+                    keepalive_expiry=config.keepalive_expiry,
+                ),
+            )
+
+        async def handle_async_request(self, request):
+            stats = _stats(upstream)
+            idempotent = request.method in IDEMPOTENT_METHODS
+            attempt = 0
+            while True:
+                started = time.perf_counter()
+                try:
+                    response = await self._inner.handle_async_request(request)
+                except httpx.TransportError:
+                    stats.record((time.perf_counter() - started) * 1000, None)
+                    if not idempotent or attempt >= config.max_retries:
+                        raise
+                    delay = _backoff(attempt)
+                else:
+                    status = response.status_code
+                    stats.record((time.perf_counter() - started) * 1000, status)
+                    if (
+                        status not in RETRY_STATUSES
+                        or attempt >= config.max_retries
+                        or (status != 429 and not idempotent)
+                    ):
+                        return response
+                    delay = _backoff(attempt)
+                    if status == 429:
+                        retry_after = _retry_after_seconds(response.headers.get("Retry-After"))
+                        if retry_after is not None:
+                            if retry_after > MAX_RETRY_AFTER_SECONDS:
+                                return response
+                            delay = retry_after
+                    await response.aclose()
+
+                attempt += 1
+                stats.retries += 1
+                logger.debug(f"http {upstream}: retry {attempt} for {request.method} {request.url.host} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+        async def aclose(self):
+            await self._inner.aclose()
+
+    return _RetryingTransport()
+
+
+def get_http_client(upstream: str):
+    """Return the pooled AsyncClient for an upstream (created on first use in this event loop)."""
+    import httpx
+
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+
+    entry = _CLIENTS.get(upstream)
+    if entry is not None:
+        client_loop, client = entry
+        if client_loop is loop and not client.is_closed:
+            return client
+
+    # "llm:https://api.deepseek.com" shares the "llm" settings but gets its own pool.
+    config = UPSTREAMS.get(upstream.split(":", 1)[0], DEFAULT_UPSTREAM)
+    client = httpx.AsyncClient(
+        transport=_make_transport(upstream, config),
+        timeout=httpx.Timeout(config.timeout, connect=config.connect_timeout),
+        follow_redirects=config.follow_redirects,
+    )
+    _CLIENTS[upstream] = (loop, client)
+    return client
+
+
+def get_http_stats() -> Dict[str, Dict[str, Any]]:
+    """Per-upstream request/latency counters since process start."""
+    return {name: stats.snapshot() for name, stats in sorted(_STATS.items())}
+
+
+async def close_http_clients(prefix: Optional[str] = None) -> None:
+    """Close pooled connections of every upstream (or those whose name starts with prefix)."""
+    names = [name for name in _CLIENTS if prefix is None or name.startswith(prefix)]
+    for name in names:
+        _, client = _CLIENTS.pop(name)
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.debug(f"http clients: error closing client: {e}")
@@ -8,8 +8,10 @@ All queries include WHERE tenant_id = $X for mandatory tenant isolation.
 Uses raw asyncpg queries (ORM models added separately in T1.2).
 """
 
+import json
 import logging
 import os
+import time
 from datetime import datetime, date
 from decimal import Decimal
 from typing import Optional
@@ -33,6 +35,217 @@ _STATUS_TIMESTAMPS = {
 }
 
 
+# Splits used when a professional has no commission configured at all (source='default_zero').
+_DEFAULT_ZERO_PCT = 40.0
+_DEFAULT_ZERO_CLINIC_PCT = 60.0
+
+
+def _appointment_amounts(row, commission_pct, plan_paid_map: dict) -> tuple:
+    """
+    (billed, paid, commission) of one appointment row for a liquidation.
+
+    Cancelled / no-show appointments count for nothing. Appointments of an
+    approved / in-progress treatment plan are paid in proportion to what the
+    plan has collected; the rest only when payment_status is 'paid'.
+    """
+    if (row["appointment_status"] or "") in ("cancelled", "no_show"):
+        return Decimal("0"), Decimal("0"), Decimal("0")
+
+    billing = Decimal(str(row["billing_amount"] or 0))
+    plan_id = row.get("plan_id")
+    if plan_id and row.get("plan_status") in ("approved", "in_progress"):
+        plan_approved_total = Decimal(str(row.get("plan_approved_total") or 0))
+        if plan_approved_total > 0:
+            ratio = min(plan_paid_map.get(plan_id, Decimal("0")) / plan_approved_total, Decimal("1.0"))
+        else:
+            ratio = Decimal("0")
+        paid = billing * ratio
+    else:
+        paid = billing if (row["payment_status"] or "pending") == "paid" else Decimal("0")
+
+    commission = paid * (Decimal(str(commission_pct)) / Decimal("100"))
+    return billing, paid, commission
+
+
+def _default_zero_splits(treatment_rows) -> dict:
+    """
+    Per-treatment splits used when a professional has no commission config.
+
+    treatment_rows are the tenant's treatment_types matching endo/orto/consult
+    (see _DEFAULT_ZERO_TREATMENTS_SQL); without any, generic codes are used.
+    """
+    overrides = {}
+    if not treatment_rows:
+        overrides["root_canal"] = {"commission_pct": 60.0, "clinic_pct": 40.0}
+        overrides["orthodontics"] = {"commission_pct": 50.0, "clinic_pct": 50.0}
+        overrides["consultation"] = {"commission_pct": 40.0, "clinic_pct": 60.0}
+        return overrides
+
+    for r in treatment_rows:
+        code_lower = (r["code"] or "").lower()
+        name_lower = (r["name"] or "").lower()
+        if "endo" in code_lower or "endo" in name_lower:
+            comm, cl = 60.0, 40.0
+        elif "orto" in code_lower or "orto" in name_lower:
+            comm, cl = 50.0, 50.0
+        elif "consult" in code_lower or "consult" in name_lower:
+            comm, cl = 40.0, 60.0
+        else:
+            continue
+        overrides[r["code"]] = {"commission_pct": comm, "clinic_pct": cl}
+    return overrides
+
+
+def _resolve_commission_pct(row, default_zero_splits: Optional[dict]) -> tuple:
+    """
+    (commission_pct, is_default_zero) of a bulk appointment row.
+
+    Same precedence as get_commission_config_at_date for the appointment's
+    date: treatment override (history, then current config) over the default
+    (history, then current config); with no config at all, the default-zero
+    splits win over everything.
+    """
+    code = row["treatment_code"] or ""
+    if row["history_default_pct"] is not None:
+        default_pct, is_zero = float(row["history_default_pct"]), False
+    elif row["current_default_pct"] is not None:
+        default_pct, is_zero = float(row["current_default_pct"]), False
+    else:
+        default_pct, is_zero = _DEFAULT_ZERO_PCT, True
+
+    if is_zero and default_zero_splits and code in default_zero_splits:
+        return default_zero_splits[code]["commission_pct"], True
+    if row["history_treatment_pct"] is not None:
+        return float(row["history_treatment_pct"]), is_zero
+    if row["current_treatment_pct"] is not None:
+        return float(row["current_treatment_pct"]), is_zero
+    return default_pct, is_zero
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+_DEFAULT_ZERO_TREATMENTS_SQL = """
+    SELECT code, name FROM treatment_types
+    WHERE tenant_id = $1
+      AND (
+         LOWER(code) LIKE '%endo%' OR LOWER(name) LIKE '%endo%' OR
+         LOWER(code) LIKE '%orto%' OR LOWER(name) LIKE '%orto%' OR
+         LOWER(code) LIKE '%consult%' OR LOWER(name) LIKE '%consult%'
+      )
+"""
+
+# All professionals' appointments of the period with the commission in force on
+# each appointment's (UTC) date, resolved by joining commission_history.
+_BULK_APPOINTMENTS_SQL = """
+    SELECT
+        a.professional_id,
+        a.id AS appointment_id,
+        a.appointment_datetime,
+        a.status AS appointment_status,
+        a.payment_status,
+        COALESCE(a.billing_amount, tt.base_price, 0) AS billing_amount,
+        tt.code AS treatment_code,
+        COALESCE(tpi.plan_id, active_tp.id) AS plan_id,
+        COALESCE(tp.approved_total, active_tp.approved_total) AS plan_approved_total,
+        COALESCE(tp.status, active_tp.status) AS plan_status,
+        hist_tr.new_commission_pct AS history_treatment_pct,
+        cur_tr.commission_pct AS current_treatment_pct,
+        hist_def.new_commission_pct AS history_default_pct,
+        cur_def.commission_pct AS current_default_pct
+    FROM appointments a
+    LEFT JOIN treatment_types tt
+        ON tt.code = a.appointment_type AND tt.tenant_id = $1
+    LEFT JOIN treatment_plan_items tpi
+        ON tpi.id = a.plan_item_id AND tpi.tenant_id = $1
+    LEFT JOIN treatment_plans tp
+        ON tp.id = tpi.plan_id AND tp.tenant_id = $1
+    LEFT JOIN LATERAL (
+        SELECT id, approved_total, status
+        FROM treatment_plans
+        WHERE tenant_id = $1
+          AND patient_id = a.patient_id
+          AND status IN ('approved', 'in_progress')
+        ORDER BY created_at DESC
+        LIMIT 1
+    ) active_tp ON tpi.plan_id IS NULL
+    LEFT JOIN LATERAL (
+        SELECT ch.new_commission_pct
+        FROM commission_history ch
+        WHERE ch.tenant_id = $1
+          AND ch.professional_id = a.professional_id
+          AND ch.treatment_code = tt.code
+          AND ch.effective_date <= (a.appointment_datetime AT TIME ZONE 'UTC')::date
+        ORDER BY ch.effective_date DESC, ch.id DESC
+        LIMIT 1
+    ) hist_tr ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT pc.commission_pct
+        FROM professional_commissions pc
+        WHERE pc.tenant_id = $1
+          AND pc.professional_id = a.professional_id
+          AND pc.treatment_code = tt.code
+        LIMIT 1
+    ) cur_tr ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT ch.new_commission_pct
+        FROM commission_history ch
+        WHERE ch.tenant_id = $1
+          AND ch.professional_id = a.professional_id
+          AND ch.treatment_code IS NULL
+          AND ch.effective_date <= (a.appointment_datetime AT TIME ZONE 'UTC')::date
+        ORDER BY ch.effective_date DESC, ch.id DESC
+        LIMIT 1
+    ) hist_def ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT pc.commission_pct
+        FROM professional_commissions pc
+        WHERE pc.tenant_id = $1
+          AND pc.professional_id = a.professional_id
+          AND pc.treatment_code IS NULL
+        LIMIT 1
+    ) cur_def ON TRUE
+    WHERE a.tenant_id = $1
+      AND a.professional_id = ANY($2::int[])
+      AND a.appointment_datetime >= $3
+      AND a.appointment_datetime < ($4::date + INTERVAL '1 day')
+      AND a.status != 'deleted'
+    ORDER BY a.professional_id, a.appointment_datetime
+"""
+
+# One row per professional; approved/paid records are left untouched.
+_BULK_UPSERT_SQL = """
+    INSERT INTO liquidation_records (
+        tenant_id, professional_id, period_start, period_end,
+        total_billed, total_paid, total_pending,
+        commission_pct, commission_amount, payout_amount,
+        status, generated_by, notes
+    )
+    SELECT $1::int, r.professional_id, $2::date, $3::date,
+           r.total_billed, r.total_paid, r.total_pending,
+           r.commission_pct, r.commission_amount, r.payout_amount,
+           'generated', $4, $5::jsonb
+    FROM unnest(
+        $6::int[], $7::numeric[], $8::numeric[], $9::numeric[],
+        $10::numeric[], $11::numeric[], $12::numeric[]
+    ) AS r(professional_id, total_billed, total_paid, total_pending,
+           commission_pct, commission_amount, payout_amount)
+    ON CONFLICT (tenant_id, professional_id, period_start, period_end)
+    DO UPDATE SET
+        total_billed = EXCLUDED.total_billed,
+        total_paid = EXCLUDED.total_paid,
+        total_pending = EXCLUDED.total_pending,
+        commission_pct = EXCLUDED.commission_pct,
+        commission_amount = EXCLUDED.commission_amount,
+        payout_amount = EXCLUDED.payout_amount,
+        generated_by = EXCLUDED.generated_by,
+        notes = EXCLUDED.notes
+    WHERE liquidation_records.status NOT IN ('approved', 'paid')
+    RETURNING id, professional_id, total_billed, status
+"""
+
+
 class LiquidationService:
     """Service for managing professional liquidations with commission tracking."""
 
@@ -244,17 +457,8 @@ class LiquidationService:
         treatments_without_commission = []
 
         for row in appt_rows:
-            billing = Decimal(str(row["billing_amount"] or 0))
             treatment_code = row["treatment_code"] or ""
             appt_date = row["appointment_datetime"].date() if row["appointment_datetime"] else period_start
-            appt_status = row["appointment_status"] or ""
-            pstatus = row["payment_status"] or "pending"
-            plan_id = row.get("plan_id")
-            plan_status = row.get("plan_status")
-            plan_approved_total = row.get("plan_approved_total")
-
-            excluded = appt_status in ("cancelled", "no_show")
-            billing_for_totals = Decimal("0") if excluded else billing
 
             # Point-in-time commission lookup for THIS appointment's date
             config_at_date = await self.get_commission_config_at_date(
@@ -272,28 +476,12 @@ class LiquidationService:
                 if treatment_code not in treatments_without_commission:
                     treatments_without_commission.append(treatment_code)
 
-            total_billed += billing_for_totals
-
-            if not excluded:
-                is_prop_plan = plan_id and plan_status in ("approved", "in_progress")
-                if is_prop_plan:
-                    plan_approved_total_dec = Decimal(str(plan_approved_total or 0))
-                    total_plan_paid = plan_paid_map.get(plan_id, Decimal("0"))
-                    if plan_approved_total_dec > 0:
-                        ratio = total_plan_paid / plan_approved_total_dec
-                        if ratio > Decimal("1.0"):
-                            ratio = Decimal("1.0")
-                    else:
-                        ratio = Decimal("0")
-                    paid_for_appt = billing_for_totals * ratio
-                else:
-                    paid_for_appt = billing_for_totals if pstatus == 'paid' else Decimal("0")
-
-                appt_commission = paid_for_appt * (
-                    Decimal(str(appt_commission_pct)) / Decimal("100")
-                )
-                total_commission += appt_commission
-                total_paid += paid_for_appt
+            billed, paid_for_appt, appt_commission = _appointment_amounts(
+                row, appt_commission_pct, plan_paid_map
+            )
+            total_billed += billed
+            total_paid += paid_for_appt
+            total_commission += appt_commission
 
         total_pending = total_billed - total_paid
         if total_pending < 0:
@@ -364,8 +552,17 @@ class LiquidationService:
     ) -> dict:
         """
         Generates liquidations for ALL active professionals in the period.
-        Returns { generated_count, skipped_count, liquidations: [...] }.
+        Returns { generated_count, skipped_count, liquidations: [...], timings }.
+
+        Set-based: one query loads every professional's appointments with the
+        commission in force on each appointment's date (commission_history
+        joined per row), totals are computed in memory and all records are
+        written in one transaction. Same rules as generate_liquidation:
+        approved/paid records are preserved (skipped), generated/draft ones are
+        recalculated, and professionals without appointments get no record.
         """
+        started = time.perf_counter()
+
         # 1. Get list of active professionals
         professionals = await pool.fetch(
             """
@@ -378,69 +575,214 @@ class LiquidationService:
             """,
             tenant_id,
         )
+        if not professionals:
+            return {
+                "generated_count": 0,
+                "skipped_count": 0,
+                "liquidations": [],
+                "timings": {"load_ms": _elapsed_ms(started), "compute_ms": 0.0, "write_ms": 0.0, "total_ms": _elapsed_ms(started)},
+            }
+        prof_ids = [p["id"] for p in professionals]
 
-        results = []
-        generated_count = 0
-        skipped_count = 0
+        # 2. Existing records of the period and every appointment, in two queries
+        existing_rows = await pool.fetch(
+            """
+            SELECT id, professional_id, status, total_billed
+            FROM liquidation_records
+            WHERE tenant_id = $1
+              AND professional_id = ANY($2::int[])
+              AND period_start = $3
+              AND period_end = $4
+            """,
+            tenant_id,
+            prof_ids,
+            period_start,
+            period_end,
+        )
+        existing = {r["professional_id"]: r for r in existing_rows}
 
-        for prof in professionals:
-            try:
-                record = await self.generate_liquidation(
-                    pool,
-                    tenant_id,
-                    prof["id"],
-                    period_start,
-                    period_end,
-                    generated_by_email,
-                )
+        appt_rows = await pool.fetch(
+            _BULK_APPOINTMENTS_SQL, tenant_id, prof_ids, period_start, period_end
+        )
+        appts_by_prof = {}
+        for row in appt_rows:
+            appts_by_prof.setdefault(row["professional_id"], []).append(row)
 
-                # Check if it was newly created or already existed
-                created_at = record.get("created_at")
-                if created_at and isinstance(created_at, datetime):
-                    # If created_at is very recent (within last minute), it's new
-                    now = datetime.utcnow()
-                    diff = (now - created_at).total_seconds()
-                    is_new = diff < 60
-                else:
-                    is_new = True  # assume new if we can't tell
-
-                # More reliable check: look at audit_trail for 'generated' action
-                # If the record was just created by us, it's new
-                notes = record.get("notes") or {}
-                audit_trail = notes.get("audit_trail", [])
-                # If there's only one audit entry and it's 'generated', it's new
-                is_new = (
-                    len(audit_trail) == 1
-                    and audit_trail[0].get("action") == "generated"
-                )
+        plan_ids = {
+            row["plan_id"]
+            for row in appt_rows
+            if row["plan_id"] and row["plan_status"] in ("approved", "in_progress")
+        }
+        plan_paid_map = {}
+        if plan_ids:
+            plan_payment_rows = await pool.fetch(
+                """
+                SELECT plan_id, COALESCE(SUM(amount), 0) AS total_paid
+                FROM treatment_plan_payments
+                WHERE tenant_id = $1 AND plan_id = ANY($2::uuid[])
+                GROUP BY plan_id
+                """,
+                tenant_id,
+                list(plan_ids),
+            )
+            for r in plan_payment_rows:
+                plan_paid_map[r["plan_id"]] = Decimal(str(r["total_paid"]))
 
-                if is_new:
-                    generated_count += 1
-                else:
-                    skipped_count += 1
+        default_zero_splits = None
+        if any(
+            r["history_default_pct"] is None and r["current_default_pct"] is None
+            for r in appt_rows
+        ):
+            default_zero_splits = _default_zero_splits(
+                await pool.fetch(_DEFAULT_ZERO_TREATMENTS_SQL, tenant_id)
+            )
+        load_ms = _elapsed_ms(started)
 
-                results.append(
-                    {
-                        "id": record["id"],
-                        "professional_id": prof["id"],
-                        "professional_name": f"{prof['first_name']} {prof['last_name']}".strip(),
-                        "total_billed": float(record["total_billed"]),
-                        "status": record["status"],
-                    }
-                )
-            except Exception as e:
-                logger.error(
-                    "generate_bulk_liquidations: error for professional %s: %s",
-                    prof["id"],
-                    e,
-                    exc_info=True,
-                )
-                # Continue with next professional
+        # 3. Totals per professional
+        compute_started = time.perf_counter()
+        names = {
+            p["id"]: f"{p['first_name']} {p['last_name'] or ''}".strip()
+            for p in professionals
+        }
+        compute_ms = {}
+        totals = {}
+        to_delete = []
+        preserved = []
+        for prof_id in prof_ids:
+            prof_started = time.perf_counter()
+            current = existing.get(prof_id)
+            if current and (current["status"] or "generated") in ("approved", "paid"):
+                preserved.append(current)
+                compute_ms[prof_id] = _elapsed_ms(prof_started)
+                continue
+            rows = appts_by_prof.get(prof_id)
+            if not rows:
+                # generate_liquidation refuses (400) and drops a stale draft
+                if current:
+                    to_delete.append(current["id"])
+                compute_ms[prof_id] = _elapsed_ms(prof_started)
+                continue
+
+            total_billed = Decimal("0")
+            total_paid = Decimal("0")
+            total_commission = Decimal("0")
+            for row in rows:
+                pct, _ = _resolve_commission_pct(row, default_zero_splits)
+                billed, paid, commission = _appointment_amounts(row, pct, plan_paid_map)
+                total_billed += billed
+                total_paid += paid
+                total_commission += commission
+
+            totals[prof_id] = (
+                float(total_billed),
+                float(total_paid),
+                float(max(total_billed - total_paid, Decimal("0"))),
+                float(total_commission / total_billed * 100) if total_billed > 0 else 0.0,
+                float(total_commission),
+                float(total_commission),
+            )
+            compute_ms[prof_id] = _elapsed_ms(prof_started)
+        compute_total_ms = _elapsed_ms(compute_started)
+
+        # 4. Single transaction: drop stale drafts, upsert everything else
+        write_started = time.perf_counter()
+        audit_trail = [
+            {
+                "action": "generated",
+                "by": generated_by_email,
+                "at": datetime.utcnow().isoformat(),
+                "detail": "Liquidación generada automáticamente",
+            }
+        ]
+        written = []
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                if to_delete:
+                    await conn.execute(
+                        """
+                        DELETE FROM liquidation_records
+                        WHERE tenant_id = $1 AND id = ANY($2::int[])
+                          AND status NOT IN ('approved', 'paid')
+                        """,
+                        tenant_id,
+                        to_delete,
+                    )
+                if totals:
+                    ids = list(totals)
+                    columns = list(zip(*totals.values()))
+                    written = await conn.fetch(
+                        _BULK_UPSERT_SQL,
+                        tenant_id,
+                        period_start,
+                        period_end,
+                        generated_by_email,
+                        json.dumps({"audit_trail": audit_trail}),
+                        ids,
+                        *[list(c) for c in columns],
+                    )
+                    # Approved/paid meanwhile (ON CONFLICT ... WHERE skipped them)
+                    missing = set(ids) - {r["professional_id"] for r in written}
+                    if missing:
+                        preserved.extend(
+                            await conn.fetch(
+                                """
+                                SELECT id, professional_id, status, total_billed
+                                FROM liquidation_records
+                                WHERE tenant_id = $1
+                                  AND professional_id = ANY($2::int[])
+                                  AND period_start = $3
+                                  AND period_end = $4
+                                """,
+                                tenant_id,
+                                list(missing),
+                                period_start,
+                                period_end,
+                            )
+                        )
+        write_ms = _elapsed_ms(write_started)
+
+        # Recalculated records: cached PDFs are stale
+        for r in written:
+            if r["professional_id"] in existing:
+                await self.invalidate_liquidation_pdf(tenant_id, r["id"])
+
+        results = [
+            {
+                "id": r["id"],
+                "professional_id": r["professional_id"],
+                "professional_name": names.get(r["professional_id"], ""),
+                "total_billed": float(r["total_billed"]),
+                "status": r["status"],
+                "compute_ms": compute_ms.get(r["professional_id"], 0.0),
+            }
+            for r in list(written) + list(preserved)
+        ]
+        results.sort(key=lambda item: item["professional_id"])
+
+        timings = {
+            "load_ms": load_ms,
+            "compute_ms": compute_total_ms,
+            "write_ms": write_ms,
+            "total_ms": _elapsed_ms(started),
+        }
+        logger.info(
+            "generate_bulk_liquidations: tenant %s, period %s-%s: %s generated, %s skipped, "
+            "%s without appointments, %s appointments (%s)",
+            tenant_id,
+            period_start,
+            period_end,
+            len(written),
+            len(preserved),
+            len(prof_ids) - len(written) - len(preserved),
+            len(appt_rows),
+            timings,
+        )
 
         return {
-            "generated_count": generated_count,
-            "skipped_count": skipped_count,
+            "generated_count": len(written),
+            "skipped_count": len(preserved),
             "liquidations": results,
+            "timings": timings,
         }
 
     # ------------------------------------------------------------------
@@ -1689,8 +2031,8 @@ class LiquidationService:
                 source = "current_config"
             else:
                 # Step 3: No config exists — fallback to default splits
-                default_pct = 40.0
-                default_clinic = 60.0
+                default_pct = _DEFAULT_ZERO_PCT
+                default_clinic = _DEFAULT_ZERO_CLINIC_PCT
                 source = "default_zero"
 
         # Step 4: Same for per-treatment overrides (point-in-time)
@@ -1747,41 +2089,8 @@ class LiquidationService:
 
         # Step 5.5: If no current config exists, pre-populate default overrides dynamically
         if source == "default_zero":
-            dynamic_rows = await pool.fetch(
-                """
-                SELECT code, name FROM treatment_types
-                WHERE tenant_id = $1
-                  AND (
-                     LOWER(code) LIKE '%endo%' OR LOWER(name) LIKE '%endo%' OR
-                     LOWER(code) LIKE '%orto%' OR LOWER(name) LIKE '%orto%' OR
-                     LOWER(code) LIKE '%consult%' OR LOWER(name) LIKE '%consult%'
-                  )
-                """,
-                tenant_id,
-            )
-            if dynamic_rows:
-                for r in dynamic_rows:
-                    code_lower = (r["code"] or "").lower()
-                    name_lower = (r["name"] or "").lower()
-                    if "endo" in code_lower or "endo" in name_lower:
-                        comm = 60.0
-                        cl = 40.0
-                    elif "orto" in code_lower or "orto" in name_lower:
-                        comm = 50.0
-                        cl = 50.0
-                    elif "consult" in code_lower or "consult" in name_lower:
-                        comm = 40.0
-                        cl = 60.0
-                    else:
-                        continue
-                    overrides[r["code"]] = {
-                        "commission_pct": comm,
-                        "clinic_pct": cl,
-                    }
-            else:
-                overrides["root_canal"] = {"commission_pct": 60.0, "clinic_pct": 40.0}
-                overrides["orthodontics"] = {"commission_pct": 50.0, "clinic_pct": 50.0}
-                overrides["consultation"] = {"commission_pct": 40.0, "clinic_pct": 60.0}
+            dynamic_rows = await pool.fetch(_DEFAULT_ZERO_TREATMENTS_SQL, tenant_id)
+            overrides.update(_default_zero_splits(dynamic_rows))
 
             logger.warning(
                 "get_commission_config_at_date: no config for professional %s, "
@@ -0,0 +1,108 @@
+"""
+Per-tenant LLM client / AgentExecutor pool.
+
+get_agent_executable_for_tenant used to build a fresh ChatOpenAI, prompt
+template, tools agent and AgentExecutor on every patient turn, each with its
+own HTTP client (new TCP + TLS handshake to the provider every time). The
+executor is stateless between invocations (system prompt, history and input
+are passed to ainvoke), so one instance per (tenant, model, api key) can be
+shared by every turn of that tenant.
+
+Three pieces:
+- Shared httpx.AsyncClient per provider base URL from services.http_clients
+  (keep-alive pool, HTTP/2 when `h2` is installed, per-upstream timing).
+- Bounded LRU of executors keyed by (tenant_id, model, api-key fingerprint).
+  A new model or key produces a new entry and drops the tenant's old ones.
+- Short-TTL cache of the tenant's resolved model (system_config.OPENAI_MODEL),
+  cleared by invalidate_tenant_llm() when the model is saved.
+Failures never block the turn: callers fall back to building a fresh executor.
+"""
+
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_POOL_SIZE = 64
+MODEL_CACHE_TTL_SECONDS = 60
+
+# (tenant_id, model, key fingerprint) -> executor
+_EXECUTORS: "OrderedDict[Tuple[int, str, str], Any]" = OrderedDict()
+# tenant_id -> (expires_at, model)
+_MODEL_CACHE: Dict[int, Tuple[float, str]] = {}
+
+
+def _key_fingerprint(api_key: str) -> str:
+    """Short stable digest so raw keys are never used as dict keys or logged."""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+
+
+def get_shared_http_client(base_url: Optional[str] = None):
+    """Return the process-wide AsyncClient for a provider, or None if httpx is missing."""
+    try:
+        from services.http_clients import get_http_client
+    except ImportError:
+        return None
+    # The OpenAI SDK retries on its own: the "llm" upstream does not.
+    return get_http_client(f"llm:{base_url}" if base_url else "llm")
+
+
+def get_cached_tenant_model(tenant_id: int) -> Optional[str]:
+    entry = _MODEL_CACHE.get(tenant_id)
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+
+def set_cached_tenant_model(tenant_id: int, model: str) -> None:
+    _MODEL_CACHE[tenant_id] = (time.monotonic() + MODEL_CACHE_TTL_SECONDS, model)
+
+
+def get_or_build_executor(
+    tenant_id: int, model: str, api_key: str, build: Callable[[], Any]
+) -> Any:
+    """Return the pooled executor for (tenant, model, key), building it on a miss.
+
+    `build` is only called on a miss. A None result (AgentExecutor unavailable)
+    is returned but never pooled.
+    """
+    pool_key = (tenant_id, model, _key_fingerprint(api_key))
+    executor = _EXECUTORS.get(pool_key)
+    if executor is not None:
+        _EXECUTORS.move_to_end(pool_key)
+        return executor
+
+    executor = build()
+    if executor is None:
+        return None
+
+    # Model or key changed for this tenant: the previous executors are dead weight.
+    for stale in [k for k in _EXECUTORS if k[0] == tenant_id]:
+        del _EXECUTORS[stale]
+    _EXECUTORS[pool_key] = executor
+    while len(_EXECUTORS) > EXECUTOR_POOL_SIZE:
+        _EXECUTORS.popitem(last=False)
+    logger.info(f"🤖 LLM POOL: built executor tenant={tenant_id} model='{model}' (pool={len(_EXECUTORS)})")
+    return executor
+
+
+def invalidate_tenant_llm(tenant_id: Optional[int] = None) -> None:
+    """Drop pooled executors and the cached model for one tenant (or all)."""
+    if tenant_id is None:
+        _EXECUTORS.clear()
+        _MODEL_CACHE.clear()
+        return
+    for stale in [k for k in _EXECUTORS if k[0] == tenant_id]:
+        del _EXECUTORS[stale]
+    _MODEL_CACHE.pop(tenant_id, None)
+
+
+async def close_shared_http_clients() -> None:
+    """Close pooled LLM HTTP connections (shutdown hook)."""
+    from services.http_clients import close_http_clients
+
+    invalidate_tenant_llm()
+    await close_http_clients(prefix="llm")
@@ -29,8 +29,36 @@ logger = logging.getLogger(__name__)
 # =============================================================================
 # Helper: emit Socket.IO events from Nova tools (for real-time UI sync)
 # =============================================================================
+# Events emitted after writing an input of the agent's system prompt
+_PROMPT_CONTEXT_EVENTS = {"FAQ_UPDATED", "CONFIGURATION_UPDATED", "TREATMENT_UPDATED"}
+_PROMPT_CONTEXT_ENTITIES = {"insurance_provider"}
+
+
+async def _invalidate_prompt_context_for(event: str, data: Dict[str, Any]):
+    """Drop the cached tenant prompt context when the write behind `event` feeds the prompt."""
+    tenant_id = data.get("tenant_id")
+    if not tenant_id:
+        return
+    from services.tenant_prompt_cache import PROMPT_SOURCE_TABLES, invalidate_tenant_prompt_context
+
+    if (
+        event in _PROMPT_CONTEXT_EVENTS
+        or data.get("entity") in _PROMPT_CONTEXT_ENTITIES
+        or data.get("table") in PROMPT_SOURCE_TABLES
+    ):
+        await invalidate_tenant_prompt_context(int(tenant_id))
+
+
 async def _nova_emit(event: str, data: Dict[str, Any]):
-    """Emit a Socket.IO event to the tenant room so the frontend updates in real-time + notify Telegram."""
+    """Emit a Socket.IO event to the tenant room so the frontend updates in real-time + notify Telegram.
+
+    Every Nova write emits here, so this is also where the tenant prompt cache is invalidated.
+    """
+    try:
+        await _invalidate_prompt_context_for(event, data)
+    except Exception as e:
+        logger.warning(f"📡 NOVA prompt cache invalidation failed ({event}): {e}")
+
     try:
         from main import sio, to_json_safe
 
@@ -2160,8 +2188,9 @@ IMPORTANTE — REGLAS QUIRÚRGICAS:
                         "listar",
                         "contar",
                         "exportar",
+                        "estado_envio",
                     ],
-                    "description": "Acción a ejecutar sobre los pacientes que matcheen los filtros. plantilla=enviar WhatsApp template, mensaje_libre=enviar texto por WhatsApp, anamnesis=enviar link de anamnesis, listar=devolver lista de pacientes, contar=solo contar cuántos matchean, exportar=generar CSV/texto exportable.",
+                    "description": "Acción a ejecutar sobre los pacientes que matcheen los filtros. plantilla=enviar WhatsApp template, mensaje_libre=enviar texto por WhatsApp, anamnesis=enviar link de anamnesis, listar=devolver lista de pacientes, contar=solo contar cuántos matchean, exportar=generar CSV/texto exportable, estado_envio=progreso del último envío masivo (o del job_id indicado). Los envíos corren en segundo plano.",
                 },
                 "confirmar": {
                     "type": "boolean",
@@ -2181,7 +2210,11 @@ IMPORTANTE — REGLAS QUIRÚRGICAS:
                 },
                 "limite": {
                     "type": "integer",
-                    "description": "Máximo de pacientes a procesar (default 50, max 200).",
+                    "description": "Máximo de pacientes a procesar (default 50; max 200 para listar/exportar, 5000 para envíos).",
+                },
+                "job_id": {
+                    "type": "integer",
+                    "description": "Solo para accion='estado_envio': número de envío masivo a consultar (default: el último).",
                 },
                 # Mismos filtros que enviar_plantilla_masiva
                 "sin_turno_dias": {
@@ -2386,154 +2419,20 @@ async def _resolve_professional_id(user_id: str, tenant_id: int) -> Optional[int
 # --- A. Pacientes ---
 
 
-def _normalize_for_search(text: str) -> str:
-    """Remove accents and normalize for fuzzy search."""
-    import unicodedata
-
-    nfkd = unicodedata.normalize("NFKD", text.lower())
-    return "".join(c for c in nfkd if not unicodedata.combining(c))
-
-
 async def _buscar_paciente(args: Dict, tenant_id: int) -> str:
     q = args.get("query", "").strip()
     if not q:
         return "Necesito un nombre, apellido, DNI o telefono para buscar."
 
-    _TRANSLATE = (
-        "TRANSLATE(LOWER({field}), 'áéíóúüñàèìòùâêîôûäëïöü', 'aeiounaeiouaeiouaeiou')"
-    )
-    like_q = f"%{q}%"
-    words = q.split()
+    # ── Búsqueda indexada y rankeada (nombre sin acentos, fuzzy, teléfono, DNI) ──
+    from services.search_service import search_patients
 
-    # ── NIVEL 1: Búsqueda exacta (nombre completo, campos individuales, sin acentos) ──
-    rows = await db.pool.fetch(
-        f"""
-        SELECT id, first_name, last_name, phone_number, dni,
-               insurance_provider, insurance_id, status
-        FROM patients
-        WHERE tenant_id = $1
-          AND (
-            (first_name || ' ' || COALESCE(last_name, '')) ILIKE $2
-            OR first_name ILIKE $2 OR last_name ILIKE $2
-            OR dni ILIKE $2 OR phone_number ILIKE $2
-            OR REGEXP_REPLACE(phone_number, '[^0-9]', '', 'g') LIKE REGEXP_REPLACE($2, '[^0-9]', '', 'g')
-            OR {_TRANSLATE.format(field="first_name")} LIKE {_TRANSLATE.format(field="$2")}
-            OR {_TRANSLATE.format(field="last_name")} LIKE {_TRANSLATE.format(field="$2")}
-            OR {_TRANSLATE.format(field="first_name || ' ' || COALESCE(last_name, '')")} LIKE {_TRANSLATE.format(field="$2")}
-          )
-        ORDER BY
-          CASE WHEN LOWER(first_name) = LOWER($3) OR LOWER(last_name) = LOWER($3) THEN 0
-               WHEN LOWER(first_name || ' ' || COALESCE(last_name, '')) = LOWER($3) THEN 0
-               ELSE 1 END,
-          last_name, first_name
-        LIMIT 5
-        """,
-        tenant_id,
-        like_q,
-        q,
-    )
-    if rows:
-        return _format_patient_results(rows, q)
-
-    # ── NIVEL 2: Multi-palabra con AND (cada palabra en algún campo) ──
-    if len(words) > 1:
-        conditions = []
-        params: list = [tenant_id]
-        for i, word in enumerate(words):
-            idx = i + 2
-            params.append(f"%{word}%")
-            conditions.append(
-                f"((first_name || ' ' || COALESCE(last_name, '')) ILIKE ${idx} "
-                f"OR {_TRANSLATE.format(field='first_name || chr(32) || COALESCE(last_name, chr(32))')} LIKE {_TRANSLATE.format(field=f'${idx}')})"
-            )
-        where_clause = " AND ".join(conditions)
-        rows = await db.pool.fetch(
-            f"""
-            SELECT id, first_name, last_name, phone_number, dni,
-                   insurance_provider, insurance_id, status
-            FROM patients
-            WHERE tenant_id = $1 AND ({where_clause})
-            ORDER BY last_name, first_name LIMIT 5
-            """,
-            *params,
-        )
-        if rows:
-            return _format_patient_results(rows, q)
-
-    # ── NIVEL 3: Multi-palabra con OR (cualquier palabra matchea algo) ──
-    if len(words) > 1:
-        or_conditions = []
-        params2: list = [tenant_id]
-        for i, word in enumerate(words):
-            idx = i + 2
-            params2.append(f"%{word}%")
-            or_conditions.append(f"(first_name ILIKE ${idx} OR last_name ILIKE ${idx})")
-        or_clause = " OR ".join(or_conditions)
-        rows = await db.pool.fetch(
-            f"""
-            SELECT id, first_name, last_name, phone_number, dni,
-                   insurance_provider, insurance_id, status
-            FROM patients
-            WHERE tenant_id = $1 AND ({or_clause})
-            ORDER BY last_name, first_name LIMIT 5
-            """,
-            *params2,
-        )
-        if rows:
-            return _format_patient_results(rows, q, partial=True)
-
-    # ── NIVEL 4: Prefijo (primeros 3+ caracteres de cada palabra) ──
-    prefix_conditions = []
-    params3: list = [tenant_id]
-    for i, word in enumerate(words):
-        prefix = word[:3] if len(word) >= 3 else word
-        idx = i + 2
-        params3.append(f"{prefix}%")
-        prefix_conditions.append(
-            f"(LOWER(first_name) LIKE LOWER(${idx}) OR LOWER(last_name) LIKE LOWER(${idx}))"
-        )
-    prefix_clause = " OR ".join(prefix_conditions)
-    rows = await db.pool.fetch(
-        f"""
-        SELECT id, first_name, last_name, phone_number, dni,
-               insurance_provider, insurance_id, status
-        FROM patients
-        WHERE tenant_id = $1 AND ({prefix_clause})
-        ORDER BY last_name, first_name LIMIT 5
-        """,
-        *params3,
-    )
+    rows, _ = await search_patients(db.pool, [tenant_id], q, limit=5, include_deleted=True)
     if rows:
-        return _format_patient_results(rows, q, partial=True)
-
-    # ── NIVEL 5: Fonético (letras duplicadas removidas, consonantes similares) ──
-    # "Gamara" → "Gamarra", "Lukas" → "Lucas", "Gonzales" → "González"
-    normalized_q = _normalize_for_search(q)
-    # Remove doubled consonants: "gamarra" → "gamara", "gonzalez" → "gonzalez"
-    import re as _re
+        # rank < 0.8: sólo similitud (typo, palabras sueltas), no coincidencia literal
+        return _format_patient_results(rows, q, partial=rows[0]["rank"] < 0.8)
 
-    simplified_q = _re.sub(r"(.)\1+", r"\1", normalized_q)
-    if simplified_q != normalized_q or len(simplified_q) >= 3:
-        rows = await db.pool.fetch(
-            """
-            SELECT id, first_name, last_name, phone_number, dni,
-                   insurance_provider, insurance_id, status
-            FROM patients
-            WHERE tenant_id = $1
-              AND (
-                REGEXP_REPLACE(TRANSLATE(LOWER(first_name), 'áéíóúüñàèìòùâêîôûäëïöü', 'aeiounaeiouaeiouaeiou'), '(.)\\1+', '\\1', 'g') LIKE '%' || $2 || '%'
-                OR REGEXP_REPLACE(TRANSLATE(LOWER(last_name), 'áéíóúüñàèìòùâêîôûäëïöü', 'aeiounaeiouaeiouaeiou'), '(.)\\1+', '\\1', 'g') LIKE '%' || $2 || '%'
-                OR REGEXP_REPLACE(TRANSLATE(LOWER(first_name || ' ' || COALESCE(last_name, '')), 'áéíóúüñàèìòùâêîôûäëïöü', 'aeiounaeiouaeiouaeiou'), '(.)\\1+', '\\1', 'g') LIKE '%' || $2 || '%'
-              )
-            ORDER BY last_name, first_name LIMIT 5
-            """,
-            tenant_id,
-            simplified_q,
-        )
-        if rows:
-            return _format_patient_results(rows, q, partial=True)
-
-    # ── NIVEL 6: ÚLTIMO RECURSO — mostrar pacientes recientes como sugerencia ──
+    # ── Sin resultados — mostrar pacientes recientes como sugerencia ──
     recent = await db.pool.fetch(
         """
         SELECT id, first_name, last_name, phone_number, dni,
@@ -7217,162 +7116,16 @@ async def _generic_send_template(
     Returns: {"ok": True} or {"ok": False, "error": "..."}
     """
     try:
-        from core.credentials import get_tenant_credential, YCLOUD_API_KEY
-        from ycloud_client import YCloudClient
-        import httpx
-        import re
-
-        api_key = await get_tenant_credential(tenant_id, YCLOUD_API_KEY)
-        if not api_key:
-            return {"ok": False, "error": "No YCloud API key"}
-
-        # Resolve from_number
-        business_number = await db.pool.fetchval(
-            "SELECT bot_phone_number FROM tenants WHERE id = $1", tenant_id
-        )
-        if not business_number:
-            from core.credentials import YCLOUD_WHATSAPP_NUMBER
+        from services.bulk_messaging import resolve_sender
 
-            business_number = await get_tenant_credential(
-                tenant_id, YCLOUD_WHATSAPP_NUMBER
-            )
+        sender, error = await resolve_sender(db.pool, tenant_id, template_name=template_name)
+        if error:
+            return {"ok": False, "error": error}
 
-        # Fetch template from YCloud to get REAL structure
-        real_lang = None
-        tpl_components = None
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.get(
-                "https://api.ycloud.com/v2/whatsapp/templates",
-                params={"filter.name": template_name, "limit": 10},
-                headers={"X-API-Key": api_key},
-            )
-            if resp.status_code == 200:
-                items = resp.json().get("items", [])
-                for tpl in items:
-                    if (
-                        tpl.get("status") == "APPROVED"
-                        and tpl.get("name") == template_name
-                    ):
-                        real_lang = tpl.get("language")
-                        tpl_components = tpl.get("components", [])
-                        break
-
-        if not real_lang:
-            return {
-                "ok": False,
-                "error": f"Template '{template_name}' not found or not approved",
-            }
-
-        # Build variable values: custom_vars override, then auto-fill
-        vars_dict = custom_vars or {}
-
-        # Positional-to-named mapping for templates using {{1}}, {{2}}, {{3}}
-        # Meta recommends positional format; map numbers to known variable names
-        positional_map = {
-            "1": patient_name,
-            "2": vars_dict.get("dia_semana", vars_dict.get("fecha_turno", "")),
-            "3": vars_dict.get("hora_turno", vars_dict.get("fecha_turno", "")),
-            "4": vars_dict.get("hora_turno", ""),
-        }
-        auto_values = {
-            "nombre_paciente": patient_name,
-            "nombre": patient_name,
-            "first_name": patient_name,
-        }
-        # Merge: positional + named auto-values + custom_vars (highest priority)
-        merged = {**positional_map, **auto_values, **vars_dict}
-
-        # Build send components matching template structure
-        send_components = []
-        for comp in tpl_components or []:
-            comp_type = comp.get("type", "").upper()
-            text = comp.get("text", "")
-            comp_vars = re.findall(r"\{\{(\w+)\}\}", text)
-            if not comp_vars:
-                continue
-
-            parameters = []
-            for var_name in comp_vars:
-                value = merged.get(var_name, "")
-                parameters.append(
-                    {
-                        "type": "text",
-                        "text": str(value),
-                    }
-                )
-
-            send_components.append(
-                {
-                    "type": comp_type.lower(),
-                    "parameters": parameters,
-                }
-            )
-
-        # Send
-        yc = YCloudClient(api_key=api_key, business_number=business_number)
-        try:
-            await yc.send_template(
-                to=phone,
-                template_name=template_name,
-                language_code=real_lang,
-                components=send_components if send_components else None,
-            )
-        except httpx.HTTPStatusError as http_err:
-            try:
-                err_detail = http_err.response.json()
-            except Exception:
-                err_detail = http_err.response.text
-            return {"ok": False, "error": str(err_detail)[:300]}
-
-        # Persist in chat_conversations + chat_messages
-        try:
-            import uuid as _uuid
-            import json as _json
-
-            conv = await db.pool.fetchrow(
-                "SELECT id FROM chat_conversations WHERE tenant_id = $1 AND external_user_id = $2 AND channel = 'whatsapp' ORDER BY updated_at DESC LIMIT 1",
-                tenant_id,
-                phone,
-            )
-            preview_label = f"[Plantilla: {template_name}]"
-            if conv:
-                conv_id = conv["id"]
-                await db.pool.execute(
-                    "UPDATE chat_conversations SET last_message_preview = $1, updated_at = NOW() WHERE id = $2",
-                    preview_label,
-                    conv_id,
-                )
-            else:
-                conv_id = _uuid.uuid4()
-                await db.pool.execute(
-                    "INSERT INTO chat_conversations (id, tenant_id, channel, provider, external_user_id, display_name, last_message_preview, status, updated_at) VALUES ($1, $2, 'whatsapp', 'ycloud', $3, $4, $5, 'active', NOW())",
-                    conv_id,
-                    tenant_id,
-                    phone,
-                    patient_name or None,
-                    preview_label,
-                )
-
-            await db.pool.execute(
-                "INSERT INTO chat_messages (tenant_id, conversation_id, role, content, from_number, platform_metadata) VALUES ($1, $2, 'assistant', $3, $4, $5::jsonb)",
-                tenant_id,
-                conv_id,
-                f"📨 Plantilla '{template_name}' enviada a {patient_name}",
-                phone,
-                _json.dumps(
-                    {
-                        "source": source,
-                        "template": template_name,
-                        "patient_name": patient_name,
-                    }
-                ),
-            )
-        except Exception as persist_err:
-            logger.warning(
-                f"Template message persist failed (non-blocking): {persist_err}"
-            )
-
-        return {"ok": True}
+        result = await sender.send_template(phone, patient_name, custom_vars, source=source)
+        result.pop("retry_after", None)
+        result.pop("transient", None)
+        return result
 
     except Exception as e:
         logger.error(f"_generic_send_template error: {e}", exc_info=True)
@@ -7566,12 +7319,34 @@ async def _accion_masiva(args: Dict, tenant_id: int, user_role: str) -> str:
     if user_role not in ("ceo", "secretary"):
         return "Solo CEO o secretaria pueden usar acción masiva."
 
+    from services.bulk_messaging import (
+        BULK_MAX_RECIPIENTS,
+        SEND_ACTIONS,
+        create_bulk_job,
+        get_bulk_job,
+        get_tenant_send_limits,
+        start_bulk_job,
+    )
+
     accion = args.get("accion", "")
     confirmar = args.get("confirmar", False)
-    limite = min(int(args.get("limite", 50)), 200)
+    # Los envíos corren como job en background: el tope ya no lo pone la sesión de Nova.
+    limite = min(int(args.get("limite", 50)), BULK_MAX_RECIPIENTS if accion in SEND_ACTIONS else 200)
 
     if not accion:
-        return "Necesito saber qué acción hacer. Opciones: plantilla, mensaje_libre, anamnesis, listar, contar, exportar"
+        return "Necesito saber qué acción hacer. Opciones: plantilla, mensaje_libre, anamnesis, listar, contar, exportar, estado_envio"
+
+    if accion == "estado_envio":
+        job = await get_bulk_job(db.pool, tenant_id, args.get("job_id"))
+        if not job:
+            return "No hay envíos masivos registrados."
+        return (
+            f"📨 Envío masivo #{job['id']} ({job['action']}): {job['status']}\n"
+            f"• Enviados: {job['sent_count']} de {job['total_count']}\n"
+            f"• Errores: {job['failed_count']}\n"
+            f"• Pendientes: {job['pending_count']}"
+            + (f"\n• Nota: {job['last_error']}" if job.get("last_error") else "")
+        )
 
     try:
         # Build filter query
@@ -7642,122 +7417,42 @@ async def _accion_masiva(args: Dict, tenant_id: int, user_role: str) -> str:
 
         else:
             # Actions that send messages: plantilla, mensaje_libre, anamnesis
-            sent = 0
-            errors = 0
-            template_name = args.get("template_name", "")
-            mensaje = args.get("mensaje", "")
-            variables = args.get("variables", {})
-
-            for pat in patients:
-                pat_name = f"{pat['first_name']} {pat.get('last_name', '')}".strip()
-                phone = pat["phone_number"]
-
-                try:
-                    if accion == "plantilla":
-                        # Resolve template vars
-                        resolved_vars = {}
-                        for k, v in variables.items():
-                            resolved_vars[k] = (
-                                str(v).replace("{nombre}", pat_name)
-                                if isinstance(v, str)
-                                else v
-                            )
-                        result = await _generic_send_template(
-                            tenant_id=tenant_id,
-                            phone=phone,
-                            template_name=template_name,
-                            patient_name=pat_name,
-                            custom_vars=resolved_vars,
-                            source="accion_masiva",
-                        )
-
-                    elif accion == "mensaje_libre":
-                        # Send free-text WhatsApp message
-                        from ycloud_client import YCloudClient
-                        from core.credentials import (
-                            get_tenant_credential,
-                            YCLOUD_API_KEY,
-                            YCLOUD_WHATSAPP_NUMBER,
-                        )
-
-                        api_key = await get_tenant_credential(tenant_id, YCLOUD_API_KEY)
-                        business_number = await db.pool.fetchval(
-                            "SELECT bot_phone_number FROM tenants WHERE id = $1",
-                            tenant_id,
-                        )
-                        if not business_number:
-                            business_number = await get_tenant_credential(
-                                tenant_id, YCLOUD_WHATSAPP_NUMBER
-                            )
-
-                        msg_text = mensaje.replace("{nombre}", pat_name)
-                        yc = YCloudClient(
-                            api_key=api_key, business_number=business_number
-                        )
-                        await yc.send_message(to=phone, message=msg_text)
-                        result = {"ok": True}
-
-                    elif accion == "anamnesis":
-                        # Generate and send anamnesis link
-                        from core.credentials import (
-                            get_tenant_credential,
-                            YCLOUD_API_KEY,
-                            YCLOUD_WHATSAPP_NUMBER,
-                        )
-                        import uuid
-
-                        # Get clinic name
-                        clinic_name = await db.pool.fetchval(
-                            "SELECT clinic_name FROM tenants WHERE id = $1", tenant_id
-                        )
-
-                        # Generate unique token
-                        token = uuid.uuid4().hex[:12]
-                        anamnesis_url = f"https://clinicforge.app/anamnesis/{tenant_id}/{pat['id']}/{token}"
-
-                        # Send via YCloud
-                        api_key = await get_tenant_credential(tenant_id, YCLOUD_API_KEY)
-                        business_number = await db.pool.fetchval(
-                            "SELECT bot_phone_number FROM tenants WHERE id = $1",
-                            tenant_id,
-                        )
-                        if not business_number:
-                            business_number = await get_tenant_credential(
-                                tenant_id, YCLOUD_WHATSAPP_NUMBER
-                            )
-
-                        msg_text = f"¡Hola {pat_name}! 👋\n\n{clinic_name} te invita a completar tu historia clínica antes de tu próxima visita.\n\nCompletá tu anamnesis aquí: {anamnesis_url}\n\n¡Te esperamos!"
-                        yc = YCloudClient(
-                            api_key=api_key, business_number=business_number
-                        )
-                        await yc.send_message(to=phone, message=msg_text)
-                        result = {"ok": True}
-
-                    else:
-                        result = {"ok": False, "error": "Acción desconocida"}
-
-                    if result.get("ok"):
-                        sent += 1
-                    else:
-                        errors += 1
-                        logger.warning(
-                            f"accion_masiva {accion} error for {phone}: {result.get('error')}"
-                        )
-
-                except Exception as e:
-                    errors += 1
-                    logger.warning(f"accion_masiva error for {phone}: {e}")
-
-                # Rate limit
-                import asyncio
-
-                await asyncio.sleep(1.0)
+            if accion not in SEND_ACTIONS:
+                return f"Acción desconocida: {accion}"
+            if accion == "plantilla" and not args.get("template_name"):
+                return "Necesito el nombre de la plantilla (template_name)."
+            if accion == "mensaje_libre" and not args.get("mensaje"):
+                return "Necesito el texto del mensaje."
+
+            recipients = [
+                {
+                    "patient_id": pat["id"],
+                    "phone": pat["phone_number"],
+                    "patient_name": f"{pat['first_name']} {pat.get('last_name', '')}".strip(),
+                }
+                for pat in patients
+            ]
+            job_id = await create_bulk_job(
+                db.pool,
+                tenant_id,
+                accion,
+                {
+                    "template_name": args.get("template_name", ""),
+                    "mensaje": args.get("mensaje", ""),
+                    "variables": args.get("variables") or {},
+                },
+                recipients,
+                created_by=user_role,
+            )
+            start_bulk_job(job_id)
 
+            rate, _ = await get_tenant_send_limits(db.pool, tenant_id)
+            eta_min = max(1, round(len(recipients) / max(rate, 0.1) / 60))
             return (
-                f"✅ Acción '{accion}' completada:\n"
-                f"• Enviados: {sent}\n"
-                f"• Errores: {errors}\n"
-                f"• Total procesados: {sent + errors} de {total}"
+                f"🚀 Envío masivo #{job_id} en curso ({accion}):\n"
+                f"• Destinatarios: {len(recipients)} de {total}\n"
+                f"• Tiempo estimado: ~{eta_min} min\n"
+                f"El progreso se ve en pantalla; preguntame por el estado del envío cuando quieras."
             )
 
     except Exception as e:
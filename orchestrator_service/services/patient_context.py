@@ -1,7 +1,8 @@
 """PatientContext service — minimal multi-layer context for multi-agent core (C3 F3).
 
 Layers (MVP):
-- Profile: from `patients` + `medical_history` + recent appointments (read on each turn)
+- Profile: from `patients` + appointments/plan/minors/family via load_patient_snapshot()
+  (one concurrent round-trip, shared with the solo buffer_task path; read on each turn)
 - Working: Redis hash `patient_ctx_working:{tenant_id}:{phone}` TTL 1800s
 
 CRITICAL: All SQL MUST filter by tenant_id.
@@ -53,6 +54,388 @@ class PatientProfile:
     urgency_level: Optional[str] = None
 
 
+# ============================================================================
+# Patient snapshot loader (shared by buffer_task solo path and PatientContext)
+# ============================================================================
+
+# Patient matched by chat identity: phone digits, raw id, PSIDs or external_ids.
+_MATCH_PATIENT_CTE = """
+    ctx AS (
+        SELECT id, first_name, last_name, dni, email, phone_number, birth_date,
+               acquisition_source, anamnesis_token, medical_history,
+               assigned_professional_id, insurance_provider,
+               human_override_until, urgency_level
+        FROM patients
+        WHERE tenant_id = $1 AND (
+            REGEXP_REPLACE(phone_number, '[^0-9]', '', 'g') = $2
+            OR phone_number = $3
+            OR instagram_psid = $3
+            OR facebook_psid = $3
+            OR external_ids->>'instagram' = $3
+            OR external_ids->>'facebook' = $3
+            OR external_ids->>'chatwoot' = $3
+        )
+        ORDER BY updated_at DESC NULLS LAST
+        LIMIT 1
+    )
+"""
+
+_NEXT_APPOINTMENT_LATERAL = """
+    LEFT JOIN LATERAL (
+        SELECT a.appointment_datetime, tt.name AS treatment_name,
+               prof.first_name AS professional_name,
+               prof.last_name AS professional_last_name
+        FROM appointments a
+        LEFT JOIN treatment_types tt ON a.appointment_type = tt.code AND tt.tenant_id = a.tenant_id
+        LEFT JOIN professionals prof ON a.professional_id = prof.id
+        WHERE a.tenant_id = $1 AND a.patient_id = {pid}
+          AND a.appointment_datetime >= NOW()
+          AND a.status IN ('scheduled', 'confirmed')
+        ORDER BY a.appointment_datetime ASC
+        LIMIT 1
+    ) {alias} ON true
+"""
+
+_LAST_APPOINTMENT_LATERAL = """
+    LEFT JOIN LATERAL (
+        SELECT a.appointment_datetime, tt.name AS treatment_name,
+               prof.first_name AS professional_name,
+               prof.last_name AS professional_last_name, a.status
+        FROM appointments a
+        LEFT JOIN treatment_types tt ON a.appointment_type = tt.code AND tt.tenant_id = a.tenant_id
+        LEFT JOIN professionals prof ON a.professional_id = prof.id
+        WHERE a.tenant_id = $1 AND a.patient_id = {pid}
+          AND a.appointment_datetime < NOW()
+          AND a.status IN ('completed', 'confirmed', 'scheduled')
+        ORDER BY a.appointment_datetime DESC
+        LIMIT 1
+    ) {alias} ON true
+"""
+
+_APPOINTMENT_COUNTS_LATERAL = """
+    LEFT JOIN LATERAL (
+        SELECT COUNT(*) FILTER (
+                   WHERE appointment_datetime >= NOW() AND status IN ('scheduled', 'confirmed')
+               ) AS future_count,
+               COUNT(*) FILTER (
+                   WHERE status IN ('completed', 'confirmed', 'scheduled')
+               ) AS visit_count
+        FROM appointments
+        WHERE tenant_id = $1 AND patient_id = {pid}
+    ) {alias} ON true
+"""
+
+_SNAPSHOT_IDENTITY_CTES = """,
+    linked AS (
+        SELECT id, phone_number FROM patients WHERE tenant_id = $1 AND id = $4::int
+    ),
+    by_phone AS (
+        SELECT id, phone_number FROM patients WHERE tenant_id = $1 AND phone_number = $3 LIMIT 1
+    )
+"""
+
+_SNAPSHOT_IDENTITY_COLUMNS = """
+        l.id AS linked_id, l.phone_number AS linked_phone_number,
+        bp.id AS phone_match_id, bp.phone_number AS phone_match_phone_number,
+        c.id, c.first_name, c.last_name, c.dni, c.email, c.phone_number, c.birth_date,
+        c.acquisition_source, c.anamnesis_token, c.medical_history,
+        c.assigned_professional_id, c.insurance_provider,
+        c.human_override_until, c.urgency_level,
+        ap.first_name AS assigned_first_name, ap.last_name AS assigned_last_name
+"""
+
+_SNAPSHOT_IDENTITY_JOINS = """
+    FROM (SELECT 1) AS anchor
+    LEFT JOIN linked l ON true
+    LEFT JOIN by_phone bp ON true
+    LEFT JOIN ctx c ON true
+    LEFT JOIN professionals ap
+           ON ap.id = c.assigned_professional_id AND ap.tenant_id = $1 AND ap.is_active = true
+"""
+
+_SNAPSHOT_APPOINTMENT_COLUMNS = """
+        na.appointment_datetime AS next_datetime, na.treatment_name AS next_treatment_name,
+        na.professional_name AS next_professional_name,
+        na.professional_last_name AS next_professional_last_name,
+        la.appointment_datetime AS last_datetime, la.treatment_name AS last_treatment_name,
+        la.professional_name AS last_professional_name,
+        la.professional_last_name AS last_professional_last_name, la.status AS last_status,
+        cnt.future_count, cnt.visit_count
+"""
+
+_SNAPSHOT_APPOINTMENT_JOINS = (
+    _NEXT_APPOINTMENT_LATERAL.format(pid="c.id", alias="na")
+    + _LAST_APPOINTMENT_LATERAL.format(pid="c.id", alias="la")
+    + _APPOINTMENT_COUNTS_LATERAL.format(pid="c.id", alias="cnt")
+)
+
+_SNAPSHOT_PLAN_COLUMNS = """
+        tp.id AS plan_id, tp.name AS plan_name, tp.status AS plan_status,
+        tp.estimated_total AS plan_estimated_total, tp.approved_total AS plan_approved_total,
+        tp.notes AS plan_notes, tp.total_paid AS plan_total_paid
+"""
+
+_SNAPSHOT_PLAN_JOIN = """
+    LEFT JOIN LATERAL (
+        SELECT tp.id, tp.name, tp.status, tp.estimated_total, tp.approved_total, tp.notes,
+               COALESCE(SUM(tpp.amount), 0) AS total_paid
+        FROM treatment_plans tp
+        LEFT JOIN treatment_plan_payments tpp ON tpp.plan_id = tp.id AND tpp.tenant_id = tp.tenant_id
+        WHERE tp.tenant_id = $1 AND tp.patient_id = c.id
+          AND tp.status IN ('draft', 'approved', 'in_progress')
+        GROUP BY tp.id
+        ORDER BY tp.created_at DESC
+        LIMIT 1
+    ) tp ON true
+"""
+
+# One statement: identity + assigned professional + appointments + active plan.
+_SNAPSHOT_MAIN_SQL = (
+    "WITH " + _MATCH_PATIENT_CTE + _SNAPSHOT_IDENTITY_CTES
+    + "    SELECT" + _SNAPSHOT_IDENTITY_COLUMNS + "," + _SNAPSHOT_APPOINTMENT_COLUMNS + "," + _SNAPSHOT_PLAN_COLUMNS
+    + _SNAPSHOT_IDENTITY_JOINS + _SNAPSHOT_APPOINTMENT_JOINS + _SNAPSHOT_PLAN_JOIN
+)
+
+# Fallback when the main statement fails: the same sections as separate
+# statements, so one broken section (e.g. a missing optional table) only
+# empties itself. The appointment/plan ones take $1-$3 only.
+_SNAPSHOT_IDENTITY_SQL = (
+    "WITH " + _MATCH_PATIENT_CTE + _SNAPSHOT_IDENTITY_CTES
+    + "    SELECT" + _SNAPSHOT_IDENTITY_COLUMNS + _SNAPSHOT_IDENTITY_JOINS
+)
+_SNAPSHOT_APPOINTMENTS_SQL = (
+    "WITH " + _MATCH_PATIENT_CTE
+    + "    SELECT" + _SNAPSHOT_APPOINTMENT_COLUMNS + "    FROM ctx c" + _SNAPSHOT_APPOINTMENT_JOINS
+)
+_SNAPSHOT_PLAN_SQL = (
+    "WITH " + _MATCH_PATIENT_CTE
+    + "    SELECT" + _SNAPSHOT_PLAN_COLUMNS + "    FROM ctx c" + _SNAPSHOT_PLAN_JOIN
+)
+
+# Minors linked through guardian_phone to the chat phone, the linked patient's
+# phone or the matched patient's phone (digits only, empty values ignored).
+_SNAPSHOT_MINORS_SQL = (
+    "WITH "
+    + _MATCH_PATIENT_CTE
+    + """,
+    guardians AS (
+        SELECT $2::text AS digits
+        UNION
+        SELECT REGEXP_REPLACE(phone_number, '[^0-9]', '', 'g') FROM ctx
+        UNION
+        SELECT REGEXP_REPLACE(phone_number, '[^0-9]', '', 'g')
+        FROM patients WHERE tenant_id = $1 AND id = $4::int
+    )
+    SELECT m.id, m.first_name, m.last_name, m.dni, m.phone_number, m.anamnesis_token,
+           na.appointment_datetime AS next_datetime, na.treatment_name AS next_treatment_name,
+           na.professional_name AS next_professional_name
+    FROM patients m
+    """
+    + _NEXT_APPOINTMENT_LATERAL.format(pid="m.id", alias="na")
+    + """
+    WHERE m.tenant_id = $1
+      AND REGEXP_REPLACE(COALESCE(m.guardian_phone, ''), '[^0-9]', '', 'g') IN (
+          SELECT digits FROM guardians WHERE digits IS NOT NULL AND digits <> ''
+      )
+    ORDER BY m.id
+    """
+)
+
+_SNAPSHOT_FAMILY_SQL = (
+    """
+    SELECT f.id, f.first_name, f.last_name, f.phone_number,
+           na.appointment_datetime AS next_datetime, na.treatment_name AS next_treatment_name,
+           na.professional_name AS next_professional_name,
+           na.professional_last_name AS next_professional_last_name,
+           la.appointment_datetime AS last_datetime, la.treatment_name AS last_treatment_name,
+           la.status AS last_status,
+           cnt.visit_count,
+           cr.diagnosis, cr.treatment_plan
+    FROM patients f
+    """
+    + _NEXT_APPOINTMENT_LATERAL.format(pid="f.id", alias="na")
+    + _LAST_APPOINTMENT_LATERAL.format(pid="f.id", alias="la")
+    + _APPOINTMENT_COUNTS_LATERAL.format(pid="f.id", alias="cnt")
+    + """
+    LEFT JOIN LATERAL (
+        SELECT diagnosis, treatment_plan FROM clinical_records
+        WHERE tenant_id = $1 AND patient_id = f.id
+        ORDER BY created_at DESC
+        LIMIT 1
+    ) cr ON true
+    WHERE f.tenant_id = $1 AND f.id = ANY($2::int[])
+    ORDER BY array_position($2::int[], f.id)
+    """
+)
+
+
+@dataclass
+class PatientSnapshot:
+    """Everything the agent turn needs to know about the chat's patient(s).
+
+    Loaded by load_patient_snapshot() in one round-trip of three concurrent
+    queries. Appointment entries are dicts with `appointment_datetime`,
+    `treatment_name`, `professional_name` (and `status` for the last one).
+    """
+
+    linked_patient: Optional[dict] = None        # {id, phone_number} from chat_conversations.linked_patient_id
+    phone_match: Optional[dict] = None           # {id, phone_number} where phone_number == chat id
+    patient: Optional[dict] = None               # patient row matched by phone / PSID / external_ids
+    assigned_professional: Optional[dict] = None  # {id, first_name, last_name}
+    next_appointment: Optional[dict] = None
+    last_appointment: Optional[dict] = None
+    future_appointment_count: int = 0
+    visit_count: int = 0
+    treatment_plan: Optional[dict] = None        # {id, name, status, estimated_total, approved_total, notes, total_paid}
+    minors: list[dict] = field(default_factory=list)   # + next_appointment
+    family: list[dict] = field(default_factory=list)   # + next/last_appointment, visit_count, diagnosis, treatment_plan
+
+    @property
+    def patient_id(self) -> Optional[int]:
+        return self.patient["id"] if self.patient else None
+
+
+def _appointment_from(row: Any, prefix: str, with_status: bool = False) -> Optional[dict]:
+    """Collapse `<prefix>_*` columns of a joined row into an appointment dict."""
+    dt = row.get(f"{prefix}_datetime")
+    if dt is None:
+        return None
+    apt = {
+        "appointment_datetime": dt,
+        "treatment_name": row.get(f"{prefix}_treatment_name"),
+        "professional_name": row.get(f"{prefix}_professional_name"),
+        "professional_last_name": row.get(f"{prefix}_professional_last_name"),
+    }
+    if with_status:
+        apt["status"] = row.get(f"{prefix}_status")
+    return apt
+
+
+async def _load_main_by_section(
+    pool, tenant_id: int, phone_digits: str, external_user_id: str, linked_patient_id: Optional[int]
+) -> Optional[dict]:
+    """Main snapshot row rebuilt from per-section queries; a failing section stays empty."""
+    identity, appointments, plan = await asyncio.gather(
+        pool.fetchrow(_SNAPSHOT_IDENTITY_SQL, tenant_id, phone_digits, external_user_id, linked_patient_id),
+        pool.fetchrow(_SNAPSHOT_APPOINTMENTS_SQL, tenant_id, phone_digits, external_user_id),
+        pool.fetchrow(_SNAPSHOT_PLAN_SQL, tenant_id, phone_digits, external_user_id),
+        return_exceptions=True,
+    )
+    if isinstance(identity, Exception):
+        logger.warning(f"patient snapshot identity failed (non-fatal, tenant={tenant_id}): {identity}")
+        return None
+    if identity is None:
+        return None
+    row = dict(identity)
+    for name, section in (("appointments", appointments), ("treatment plan", plan)):
+        if isinstance(section, Exception):
+            logger.warning(f"patient snapshot {name} failed (non-fatal, tenant={tenant_id}): {section}")
+        elif section is not None:
+            row.update(dict(section))
+    return row
+
+
+async def load_patient_snapshot(
+    pool,
+    tenant_id: int,
+    external_user_id: str,
+    *,
+    linked_patient_id: Optional[int] = None,
+    family_patient_ids: Optional[list[int]] = None,
+) -> PatientSnapshot:
+    """Load the patient snapshot for a chat with three concurrent queries.
+
+    1. Main: linked patient, exact phone match, matched patient row, assigned
+       professional, next/last appointment, appointment counts and active
+       treatment plan — one statement built from LATERAL joins.
+    2. Minors linked via guardian_phone, each with its next appointment.
+    3. Family members (chat_conversations.family_patient_ids) with next/last
+       appointment, visit count and latest clinical record.
+
+    Each pool call checks out its own connection, so the three run in parallel.
+    A failing query never fails the turn: minors/family fall back to empty
+    lists, and a failing main statement is retried section by section
+    (identity, appointments, treatment plan) so only the broken one is empty.
+    All SQL filters by tenant_id.
+    """
+    phone_digits = re.sub(r"\D", "", external_user_id or "")
+    family_ids = [int(fid) for fid in (family_patient_ids or [])]
+
+    async def _family():
+        if not family_ids:
+            return []
+        return await pool.fetch(_SNAPSHOT_FAMILY_SQL, tenant_id, family_ids)
+
+    main_row, minor_rows, family_rows = await asyncio.gather(
+        pool.fetchrow(_SNAPSHOT_MAIN_SQL, tenant_id, phone_digits, external_user_id, linked_patient_id),
+        pool.fetch(_SNAPSHOT_MINORS_SQL, tenant_id, phone_digits, external_user_id, linked_patient_id),
+        _family(),
+        return_exceptions=True,
+    )
+    if isinstance(main_row, Exception):
+        logger.warning(f"patient snapshot main query failed (tenant={tenant_id}), loading by section: {main_row}")
+        main_row = await _load_main_by_section(
+            pool, tenant_id, phone_digits, external_user_id, linked_patient_id
+        )
+    if isinstance(minor_rows, Exception):
+        logger.warning(f"patient snapshot minors failed (non-fatal, tenant={tenant_id}): {minor_rows}")
+        minor_rows = []
+    if isinstance(family_rows, Exception):
+        logger.warning(f"patient snapshot family failed (non-fatal, tenant={tenant_id}): {family_rows}")
+        family_rows = []
+
+    snapshot = PatientSnapshot()
+    if main_row:
+        if main_row.get("linked_id") is not None:
+            snapshot.linked_patient = {"id": main_row["linked_id"], "phone_number": main_row["linked_phone_number"]}
+        if main_row.get("phone_match_id") is not None:
+            snapshot.phone_match = {"id": main_row["phone_match_id"], "phone_number": main_row["phone_match_phone_number"]}
+        if main_row.get("id") is not None:
+            snapshot.patient = {
+                k: main_row.get(k)
+                for k in (
+                    "id", "first_name", "last_name", "dni", "email", "phone_number", "birth_date",
+                    "acquisition_source", "anamnesis_token", "medical_history",
+                    "assigned_professional_id", "insurance_provider",
+                    "human_override_until", "urgency_level",
+                )
+            }
+            if main_row.get("assigned_first_name") is not None:
+                snapshot.assigned_professional = {
+                    "id": main_row["assigned_professional_id"],
+                    "first_name": main_row["assigned_first_name"],
+                    "last_name": main_row.get("assigned_last_name"),
+                }
+            snapshot.next_appointment = _appointment_from(main_row, "next")
+            snapshot.last_appointment = _appointment_from(main_row, "last", with_status=True)
+            snapshot.future_appointment_count = int(main_row.get("future_count") or 0)
+            snapshot.visit_count = int(main_row.get("visit_count") or 0)
+            if main_row.get("plan_id") is not None:
+                snapshot.treatment_plan = {
+                    "id": main_row["plan_id"],
+                    "name": main_row.get("plan_name"),
+                    "status": main_row.get("plan_status"),
+                    "estimated_total": main_row.get("plan_estimated_total"),
+                    "approved_total": main_row.get("plan_approved_total"),
+                    "notes": main_row.get("plan_notes"),
+                    "total_paid": main_row.get("plan_total_paid"),
+                }
+
+    for m in minor_rows or []:
+        minor = {k: m.get(k) for k in ("id", "first_name", "last_name", "dni", "phone_number", "anamnesis_token")}
+        minor["next_appointment"] = _appointment_from(m, "next")
+        snapshot.minors.append(minor)
+
+    for f in family_rows or []:
+        member = {k: f.get(k) for k in ("id", "first_name", "last_name", "phone_number", "diagnosis", "treatment_plan")}
+        member["next_appointment"] = _appointment_from(f, "next")
+        member["last_appointment"] = _appointment_from(f, "last", with_status=True)
+        member["visit_count"] = int(f.get("visit_count") or 0)
+        snapshot.family.append(member)
+
+    return snapshot
+
+
 def _working_key(tenant_id: int, phone_number: str) -> str:
     return f"patient_ctx_working:{tenant_id}:{phone_number}"
 
@@ -83,33 +466,15 @@ class PatientContext:
                 logger.warning("PatientContext.load: db.pool is None")
                 return cls(tenant_id, phone_number, profile)
 
-            # Patient profile (tenant-scoped) — all phone variants matched via $2
-            row = await pool.fetchrow(
-                """
-                SELECT id, first_name, last_name, dni, email, human_override_until,
-                       phone_number, assigned_professional_id, birth_date, anamnesis_token,
-                       medical_history, insurance_provider, urgency_level
-                FROM patients
-                WHERE tenant_id = $1 AND (
-                    phone_number = $2
-                    OR REGEXP_REPLACE(phone_number, '[^0-9]', '', 'g') = REGEXP_REPLACE($2, '[^0-9]', '', 'g')
-                    OR instagram_psid = $2
-                    OR facebook_psid = $2
-                    OR external_ids->>'instagram' = $2
-                    OR external_ids->>'facebook' = $2
-                    OR external_ids->>'chatwoot' = $2
-                )
-                ORDER BY updated_at DESC NULLS LAST
-                LIMIT 1
-                """,
-                tenant_id, phone_number,
+            # Patient, appointments, plan, minors and family in one round-trip
+            snapshot = await load_patient_snapshot(
+                pool, tenant_id, phone_number, family_patient_ids=family_patient_ids,
             )
-
-            if not row:
+            row_dict = snapshot.patient
+            if not row_dict:
                 return cls(tenant_id, phone_number, profile)
 
             profile.is_new_lead = False
-            row_dict = dict(row)
             fn = (row_dict.get("first_name") or "")
             ln = (row_dict.get("last_name") or "")
             profile.name = (fn + " " + ln).strip() or None
@@ -132,303 +497,174 @@ class PatientContext:
             profile.insurance_provider = row_dict.get("insurance_provider")
             profile.urgency_level = row_dict.get("urgency_level")
 
-            # Medical history (from medical_history TABLE)
-            try:
-                mh = await pool.fetchrow(
-                    "SELECT * FROM medical_history WHERE tenant_id = $1 AND patient_id = $2 LIMIT 1",
-                    tenant_id, patient_id,
-                )
-                if mh:
-                    mh_dict = dict(mh)
-                    profile.medical_history = {k: v for k, v in mh_dict.items()
-                                               if k not in ("id", "tenant_id", "patient_id")}
-            except Exception as e:
-                logger.debug(f"medical_history load failed: {e}")
-
-            # Future appointments (legacy list — kept for agents that reference it)
-            try:
-                appts = await pool.fetch(
-                    """
-                    SELECT id, date_time, treatment_type, status, professional_id
-                    FROM appointments
-                    WHERE tenant_id = $1 AND patient_id = $2
-                      AND date_time >= NOW()
-                    ORDER BY date_time ASC
-                    LIMIT 5
-                    """,
-                    tenant_id, patient_id,
-                )
-                profile.future_appointments = [
-                    {
-                        "id": a["id"],
-                        "date_time": a["date_time"].isoformat() if a["date_time"] else None,
-                        "treatment_type": a.get("treatment_type"),
-                        "status": a.get("status"),
-                        "professional_id": a.get("professional_id"),
-                    }
-                    for a in (appts or [])
-                ]
-            except Exception as e:
-                logger.debug(f"future_appointments load failed: {e}")
-
-            # Recent chat turns
-            try:
-                turns = await pool.fetch(
-                    """
-                    SELECT role, content
-                    FROM chat_messages
-                    WHERE tenant_id = $1 AND phone_number = $2
-                    ORDER BY created_at DESC
-                    LIMIT 10
-                    """,
-                    tenant_id, phone_number,
-                )
-                profile.recent_turns = list(reversed([
-                    {"role": t["role"], "content": t["content"]} for t in (turns or [])
-                ]))
-            except Exception as e:
-                logger.debug(f"recent_turns load failed: {e}")
-
-            # ============= New parallel queries (all independent) =============
-            from services.patient_memory import format_memories_for_prompt
-
-            async def _load_assigned_prof():
-                """CE2 — Resolve assigned professional name."""
-                if row_dict.get("assigned_professional_id"):
-                    try:
-                        prof = await pool.fetchrow(
-                            "SELECT id, first_name, last_name FROM professionals WHERE id = $1 AND tenant_id = $2 AND is_active = true",
-                            row_dict["assigned_professional_id"], tenant_id,
-                        )
-                        if prof:
-                            pname = f"{prof['first_name']} {prof.get('last_name') or ''}".strip()
-                            profile.assigned_professional = {"id": prof["id"], "name": pname}
-                    except Exception as e:
-                        logger.debug(f"assigned_professional load failed: {e}")
-
-            async def _load_appointments():
-                """CE3 — Next appointment with resolved names."""
-                try:
-                    next_a = await pool.fetchrow("""
-                        SELECT a.date_time, tt.name as treatment_name,
-                               prof.first_name as prof_first_name, prof.last_name as prof_last_name
-                        FROM appointments a
-                        LEFT JOIN treatment_types tt ON a.treatment_type = tt.code
-                        LEFT JOIN professionals prof ON a.professional_id = prof.id
-                        WHERE a.tenant_id = $1 AND a.patient_id = $2
-                          AND a.date_time >= NOW() AND a.status IN ('scheduled','confirmed')
-                        ORDER BY a.date_time ASC LIMIT 1
-                    """, tenant_id, patient_id)
-                    if next_a:
-                        dt = next_a["date_time"]
-                        profile.next_appointment = {
-                            "treatment_name": next_a.get("treatment_name") or "Consulta",
-                            "professional_name": f"{next_a.get('prof_first_name') or ''} {next_a.get('prof_last_name') or ''}".strip(),
-                            "date_time": dt.isoformat() if dt else None,
-                        }
-                except Exception as e:
-                    logger.debug(f"next_appointment load failed: {e}")
-
-                """CE4 — Last appointment + days_since."""
+            # Medical history (patients.medical_history JSONB)
+            mh_jsonb = row_dict.get("medical_history")
+            if isinstance(mh_jsonb, str):
                 try:
-                    last_a = await pool.fetchrow("""
-                        SELECT a.date_time, tt.name as treatment_name,
-                               prof.first_name as prof_first_name, prof.last_name as prof_last_name, a.status
-                        FROM appointments a
-                        LEFT JOIN treatment_types tt ON a.treatment_type = tt.code
-                        LEFT JOIN professionals prof ON a.professional_id = prof.id
-                        WHERE a.tenant_id = $1 AND a.patient_id = $2
-                          AND a.date_time < NOW() AND a.status IN ('completed','confirmed','scheduled')
-                        ORDER BY a.date_time DESC LIMIT 1
-                    """, tenant_id, patient_id)
-                    if last_a:
-                        ldt = last_a["date_time"]
-                        days_since = (datetime.now(timezone.utc) - ldt).days if ldt else None
-                        profile.last_appointment = {
-                            "treatment_name": last_a.get("treatment_name") or "Consulta",
-                            "professional_name": f"{last_a.get('prof_first_name') or ''} {last_a.get('prof_last_name') or ''}".strip(),
-                            "date_time": ldt.isoformat() if ldt else None,
-                            "days_since": days_since,
-                            "status": last_a.get("status"),
-                        }
-                except Exception as e:
-                    logger.debug(f"last_appointment load failed: {e}")
+                    mh_jsonb = json.loads(mh_jsonb) if mh_jsonb else {}
+                except Exception:
+                    mh_jsonb = {}
+            if isinstance(mh_jsonb, dict):
+                profile.medical_history = mh_jsonb
+
+            frontend_url = os.getenv("FRONTEND_URL", "http://localhost:4173").split(",")[0].strip().rstrip("/")
+
+            # CE2 — Assigned professional
+            if snapshot.assigned_professional:
+                prof = snapshot.assigned_professional
+                pname = f"{prof['first_name']} {prof.get('last_name') or ''}".strip()
+                profile.assigned_professional = {"id": prof["id"], "name": pname}
+
+            # CE3 — Next appointment with resolved names
+            if snapshot.next_appointment:
+                next_a = snapshot.next_appointment
+                dt = next_a["appointment_datetime"]
+                profile.next_appointment = {
+                    "treatment_name": next_a.get("treatment_name") or "Consulta",
+                    "professional_name": f"{next_a.get('professional_name') or ''} {next_a.get('professional_last_name') or ''}".strip(),
+                    "date_time": dt.isoformat() if dt else None,
+                }
+
+            # CE4 — Last appointment + days_since
+            if snapshot.last_appointment:
+                last_a = snapshot.last_appointment
+                ldt = last_a["appointment_datetime"]
+                days_since = (datetime.now(timezone.utc) - ldt).days if ldt else None
+                profile.last_appointment = {
+                    "treatment_name": last_a.get("treatment_name") or "Consulta",
+                    "professional_name": f"{last_a.get('professional_name') or ''} {last_a.get('professional_last_name') or ''}".strip(),
+                    "date_time": ldt.isoformat() if ldt else None,
+                    "days_since": days_since,
+                    "status": last_a.get("status"),
+                }
+
+            # CE8 — Visit count
+            profile.visit_count = snapshot.visit_count
+
+            # CE5 — Active treatment plan with payments
+            if snapshot.treatment_plan:
+                plan_row = snapshot.treatment_plan
+                approved = float(plan_row.get("approved_total") or plan_row.get("estimated_total") or 0)
+                paid = float(plan_row["total_paid"] or 0)
+                pending = round(approved - paid, 2)
+                notes = {}
+                if plan_row.get("notes"):
+                    try:
+                        notes = json.loads(plan_row["notes"]) if isinstance(plan_row["notes"], str) else plan_row["notes"]
+                    except Exception:
+                        pass
+                installments = int(notes.get("installments") or 1)
+                profile.treatment_plan = {
+                    "id": plan_row["id"],
+                    "name": plan_row["name"],
+                    "status": plan_row["status"],
+                    "approved_total": approved,
+                    "paid": paid,
+                    "pending": pending,
+                    "installments": installments,
+                    "per_installment": round(pending / installments, 2) if installments > 0 and pending > 0 else 0,
+                    "discount_pct": float(notes.get("discount_pct") or 0),
+                    "discount_amount": float(notes.get("discount_amount") or 0),
+                    "conditions": notes.get("payment_conditions"),
+                }
+
+            # CE7 — Children/dependents via guardian_phone matching
+            children = []
+            for m in snapshot.minors:
+                m_name = f"{m['first_name'] or ''} {m.get('last_name') or ''}".strip()
+                m_token = m.get("anamnesis_token") or str(uuid.uuid4())
+                m_next = m.get("next_appointment")
+                children.append({
+                    "name": m_name,
+                    "dni": m.get("dni"),
+                    "phone": m["phone_number"],
+                    "anamnesis_url": f"{frontend_url}/anamnesis/{tenant_id}/{m_token}",
+                    "next_appointment": m_next["appointment_datetime"].isoformat() if m_next else None,
+                })
+            profile.children_dependents = children
+
+            # CE9 — Anamnesis status from patients.medical_history JSONB
+            anamnesis_completed = bool(mh_jsonb and isinstance(mh_jsonb, dict) and mh_jsonb.get("anamnesis_completed_at"))
+            anamnesis_token = row_dict.get("anamnesis_token") or str(uuid.uuid4())
+            profile.anamnesis_status = {
+                "completed": anamnesis_completed,
+                "url": f"{frontend_url}/anamnesis/{tenant_id}/{anamnesis_token}",
+            }
+
+            # CE6 — Family members from family_patient_ids parameter
+            fmembers = []
+            for f in snapshot.family:
+                fname = f"{f['first_name'] or ''} {f.get('last_name') or ''}".strip()
+                next_apt_str = None
+                fn_apt = f.get("next_appointment")
+                if fn_apt:
+                    fndt = fn_apt["appointment_datetime"]
+                    next_apt_str = f"{fn_apt.get('treatment_name') or 'Consulta'} con Dr/a. {fn_apt.get('professional_name') or ''} {fn_apt.get('professional_last_name') or ''} el {fndt.isoformat() if hasattr(fndt, 'isoformat') else str(fndt)}"
+                last_apt_str = None
+                fl_apt = f.get("last_appointment")
+                if fl_apt:
+                    fldt = fl_apt["appointment_datetime"]
+                    fldays = (datetime.now(timezone.utc) - fldt).days if hasattr(fldt, 'isoformat') else None
+                    last_apt_str = f"{fl_apt.get('treatment_name') or 'Consulta'} el {fldt.isoformat() if hasattr(fldt, 'isoformat') else str(fldt)} (hace {fldays} días). Estado: {fl_apt.get('status')}"
+                fmembers.append({
+                    "name": fname,
+                    "phone": f.get("phone_number") or "",
+                    "next_appointment_str": next_apt_str,
+                    "last_appointment_str": last_apt_str,
+                    "visits": f.get("visit_count") or 0,
+                    "diagnosis": f.get("diagnosis") or None,
+                    "treatment_plan_text": f.get("treatment_plan") or None,
+                })
+            profile.family_members = fmembers
+
+            # ============= Remaining independent queries (parallel) =============
+            from services.patient_memory import format_memories_for_prompt
 
-                """CE8 — Visit count."""
+            async def _load_future_appointments():
+                """Future appointments (legacy list — kept for agents that reference it)."""
                 try:
-                    vc = await pool.fetchval("""
-                        SELECT COUNT(*) FROM appointments
+                    appts = await pool.fetch(
+                        """
+                        SELECT id, appointment_datetime, appointment_type, status, professional_id
+                        FROM appointments
                         WHERE tenant_id = $1 AND patient_id = $2
-                          AND status IN ('completed','confirmed','scheduled')
-                    """, tenant_id, patient_id)
-                    profile.visit_count = vc or 0
-                except Exception as e:
-                    logger.debug(f"visit_count load failed: {e}")
-
-            async def _load_treatment_plan():
-                """CE5 — Active treatment plan with payments."""
-                try:
-                    plan_row = await pool.fetchrow("""
-                        SELECT tp.id, tp.name, tp.status, tp.approved_total, tp.estimated_total, tp.notes,
-                               COALESCE(SUM(tpp.amount), 0) AS total_paid
-                        FROM treatment_plans tp
-                        LEFT JOIN treatment_plan_payments tpp ON tpp.plan_id = tp.id AND tpp.tenant_id = tp.tenant_id
-                        WHERE tp.tenant_id = $1 AND tp.patient_id = $2
-                          AND tp.status IN ('draft','approved','in_progress')
-                        GROUP BY tp.id ORDER BY tp.created_at DESC LIMIT 1
-                    """, tenant_id, patient_id)
-                    if plan_row:
-                        approved = float(plan_row.get("approved_total") or plan_row.get("estimated_total") or 0)
-                        paid = float(plan_row["total_paid"] or 0)
-                        pending = round(approved - paid, 2)
-                        notes = {}
-                        if plan_row.get("notes"):
-                            try:
-                                notes = json.loads(plan_row["notes"]) if isinstance(plan_row["notes"], str) else plan_row["notes"]
-                            except Exception:
-                                pass
-                        installments = int(notes.get("installments") or 1)
-                        profile.treatment_plan = {
-                            "id": plan_row["id"],
-                            "name": plan_row["name"],
-                            "status": plan_row["status"],
-                            "approved_total": approved,
-                            "paid": paid,
-                            "pending": pending,
-                            "installments": installments,
-                            "per_installment": round(pending / installments, 2) if installments > 0 and pending > 0 else 0,
-                            "discount_pct": float(notes.get("discount_pct") or 0),
-                            "discount_amount": float(notes.get("discount_amount") or 0),
-                            "conditions": notes.get("payment_conditions"),
+                          AND appointment_datetime >= NOW()
+                        ORDER BY appointment_datetime ASC
+                        LIMIT 5
+                        """,
+                        tenant_id, patient_id,
+                    )
+                    profile.future_appointments = [
+                        {
+                            "id": a["id"],
+                            "date_time": a["appointment_datetime"].isoformat() if a["appointment_datetime"] else None,
+                            "treatment_type": a.get("appointment_type"),
+                            "status": a.get("status"),
+                            "professional_id": a.get("professional_id"),
                         }
+                        for a in (appts or [])
+                    ]
                 except Exception as e:
-                    logger.debug(f"treatment_plan load failed: {e}")
-
-            async def _load_children():
-                """CE7 — Children/dependents via guardian_phone matching."""
-                try:
-                    chat_phone_clean = re.sub(r'\D', '', phone_number) if phone_number else ""
-                    patient_phone_clean = re.sub(r'\D', '', row_dict.get("phone_number") or "") if row_dict else ""
-                    guardian_phones = list(set(filter(None, [chat_phone_clean, patient_phone_clean])))
-                    if guardian_phones:
-                        minor_rows = await pool.fetch("""
-                            SELECT id, first_name, last_name, dni, phone_number, anamnesis_token
-                            FROM patients WHERE tenant_id = $1
-                            AND REGEXP_REPLACE(COALESCE(guardian_phone, ''), '[^0-9]', '', 'g') = ANY($2::text[])
-                        """, tenant_id, guardian_phones)
-                        if minor_rows:
-                            children = []
-                            frontend_url = os.getenv("FRONTEND_URL", "http://localhost:4173").split(",")[0].strip().rstrip("/")
-                            for m in minor_rows:
-                                m_name = f"{m['first_name'] or ''} {m.get('last_name') or ''}".strip()
-                                m_token = m.get("anamnesis_token") or str(uuid.uuid4())
-                                m_url = f"{frontend_url}/anamnesis/{tenant_id}/{m_token}"
-                                # Child's next appointment
-                                m_next = await pool.fetchrow("""
-                                    SELECT a.date_time FROM appointments a
-                                    WHERE a.tenant_id = $1 AND a.patient_id = $2
-                                      AND a.date_time >= NOW() AND a.status IN ('scheduled','confirmed')
-                                    ORDER BY a.date_time ASC LIMIT 1
-                                """, tenant_id, m["id"])
-                                children.append({
-                                    "name": m_name,
-                                    "dni": m.get("dni"),
-                                    "phone": m["phone_number"],
-                                    "anamnesis_url": m_url,
-                                    "next_appointment": m_next["date_time"].isoformat() if (m_next and m_next.get("date_time")) else None,
-                                })
-                            profile.children_dependents = children
-                except Exception as e:
-                    logger.debug(f"children load failed: {e}")
+                    logger.debug(f"future_appointments load failed: {e}")
 
-            async def _load_anamnesis():
-                """CE9 — Anamnesis status from patients.medical_history JSONB."""
+            async def _load_recent_turns():
+                """Recent chat turns."""
                 try:
-                    mh_jsonb = row_dict.get("medical_history")
-                    if isinstance(mh_jsonb, str):
-                        mh_jsonb = json.loads(mh_jsonb) if mh_jsonb else {}
-                    anamnesis_completed = bool(mh_jsonb and isinstance(mh_jsonb, dict) and mh_jsonb.get("anamnesis_completed_at"))
-                    anamnesis_token = row_dict.get("anamnesis_token")
-                    if not anamnesis_token:
-                        anamnesis_token = str(uuid.uuid4())
-                    frontend_url = os.getenv("FRONTEND_URL", "http://localhost:4173").split(",")[0].strip().rstrip("/")
-                    profile.anamnesis_status = {
-                        "completed": anamnesis_completed,
-                        "url": f"{frontend_url}/anamnesis/{tenant_id}/{anamnesis_token}",
-                    }
+                    turns = await pool.fetch(
+                        """
+                        SELECT role, content
+                        FROM chat_messages
+                        WHERE tenant_id = $1 AND phone_number = $2
+                        ORDER BY created_at DESC
+                        LIMIT 10
+                        """,
+                        tenant_id, phone_number,
+                    )
+                    profile.recent_turns = list(reversed([
+                        {"role": t["role"], "content": t["content"]} for t in (turns or [])
+                    ]))
                 except Exception as e:
-                    logger.debug(f"anamnesis status load failed: {e}")
-
-            async def _load_family_members():
-                """CE6 — Family members from family_patient_ids parameter."""
-                if family_patient_ids:
-                    fmembers = []
-                    for fid in family_patient_ids:
-                        try:
-                            frow = await pool.fetchrow(
-                                "SELECT id, first_name, last_name, phone_number FROM patients WHERE id = $1 AND tenant_id = $2",
-                                fid, tenant_id,
-                            )
-                            if frow:
-                                fname = f"{frow['first_name'] or ''} {frow.get('last_name') or ''}".strip()
-                                fphone = frow.get("phone_number") or ""
-                                # Next appointment
-                                fn = await pool.fetchrow("""
-                                    SELECT a.date_time, tt.name as treatment_name,
-                                           prof.first_name as prof_fn, prof.last_name as prof_ln
-                                    FROM appointments a
-                                    LEFT JOIN treatment_types tt ON a.treatment_type = tt.code
-                                    LEFT JOIN professionals prof ON a.professional_id = prof.id
-                                    WHERE a.tenant_id = $1 AND a.patient_id = $2
-                                      AND a.date_time >= NOW() AND a.status IN ('scheduled','confirmed')
-                                    ORDER BY a.date_time ASC LIMIT 1
-                                """, tenant_id, fid)
-                                # Last appointment
-                                fl = await pool.fetchrow("""
-                                    SELECT a.date_time, tt.name as treatment_name, a.status
-                                    FROM appointments a
-                                    LEFT JOIN treatment_types tt ON a.treatment_type = tt.code
-                                    WHERE a.tenant_id = $1 AND a.patient_id = $2
-                                      AND a.date_time < NOW() AND a.status IN ('completed','confirmed','scheduled')
-                                    ORDER BY a.date_time DESC LIMIT 1
-                                """, tenant_id, fid)
-                                # Visit count
-                                fv = await pool.fetchval("""
-                                    SELECT COUNT(*) FROM appointments
-                                    WHERE tenant_id = $1 AND patient_id = $2
-                                      AND status IN ('completed','confirmed','scheduled')
-                                """, tenant_id, fid)
-                                # Latest clinical record
-                                fdiag = await pool.fetchrow("""
-                                    SELECT diagnosis, treatment_plan
-                                    FROM clinical_records
-                                    WHERE tenant_id = $1 AND patient_id = $2
-                                    ORDER BY created_at DESC LIMIT 1
-                                """, tenant_id, fid)
-
-                                next_apt_str = None
-                                if fn and fn.get("date_time"):
-                                    fndt = fn["date_time"]
-                                    next_apt_str = f"{fn.get('treatment_name') or 'Consulta'} con Dr/a. {fn.get('prof_fn') or ''} {fn.get('prof_ln') or ''} el {fndt.isoformat() if hasattr(fndt, 'isoformat') else str(fndt)}"
-
-                                last_apt_str = None
-                                if fl and fl.get("date_time"):
-                                    fldt = fl["date_time"]
-                                    fldays = (datetime.now(timezone.utc) - fldt).days if hasattr(fldt, 'isoformat') else None
-                                    last_apt_str = f"{fl.get('treatment_name') or 'Consulta'} el {fldt.isoformat() if hasattr(fldt, 'isoformat') else str(fldt)} (hace {fldays} días). Estado: {fl.get('status')}"
-
-                                fmembers.append({
-                                    "name": fname,
-                                    "phone": fphone,
-                                    "next_appointment_str": next_apt_str,
-                                    "last_appointment_str": last_apt_str,
-                                    "visits": fv or 0,
-                                    "diagnosis": fdiag["diagnosis"] if (fdiag and fdiag.get("diagnosis")) else None,
-                                    "treatment_plan_text": fdiag["treatment_plan"] if (fdiag and fdiag.get("treatment_plan")) else None,
-                                })
-                        except Exception as e:
-                            logger.debug(f"family member {fid} load failed: {e}")
-                    profile.family_members = fmembers
+                    logger.debug(f"recent_turns load failed: {e}")
 
             async def _load_patient_memories():
                 """CE6 — RAG memories from format_memories_for_prompt."""
@@ -439,14 +675,9 @@ class PatientContext:
                 except Exception as e:
                     logger.debug(f"patient_memories load failed: {e}")
 
-            # Run all independent queries in parallel
             await asyncio.gather(
-                _load_assigned_prof(),
-                _load_appointments(),
-                _load_treatment_plan(),
-                _load_children(),
-                _load_anamnesis(),
-                _load_family_members(),
+                _load_future_appointments(),
+                _load_recent_turns(),
                 _load_patient_memories(),
                 return_exceptions=True,
             )
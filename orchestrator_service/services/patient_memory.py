@@ -24,8 +24,14 @@ logger = logging.getLogger(__name__)
 # Schema
 # ─────────────────────────────────────────────────────────────
 
+_memory_schema_ready = False
+
+
 async def ensure_memory_table(pool):
-    """Create/upgrade patient_memories table. Idempotent, called on startup."""
+    """Create/upgrade patient_memories table. Idempotent; runs the DDL once per process."""
+    global _memory_schema_ready
+    if _memory_schema_ready:
+        return
     await pool.execute("""
         CREATE TABLE IF NOT EXISTS patient_memories (
             id SERIAL PRIMARY KEY,
@@ -52,7 +58,86 @@ async def ensure_memory_table(pool):
         """)
     except Exception:
         pass  # Column already exists or DB doesn't support IF NOT EXISTS on ALTER
-    logger.info("patient_memories table ensured (v2)")
+    # Stored embeddings (v3): vector(1536) when pgvector is installed, JSONB otherwise
+    try:
+        if await _pgvector_enabled():
+            await pool.execute("""
+                ALTER TABLE patient_memories ADD COLUMN IF NOT EXISTS embedding vector(1536)
+            """)
+        else:
+            await pool.execute("""
+                ALTER TABLE patient_memories ADD COLUMN IF NOT EXISTS embedding_json JSONB
+            """)
+    except Exception as e:
+        logger.debug(f"patient_memories embedding column check: {e}")
+    _memory_schema_ready = True
+    logger.info("patient_memories table ensured (v3)")
+
+
+# ─────────────────────────────────────────────────────────────
+# Embeddings — computed once on write, reused on every read
+# ─────────────────────────────────────────────────────────────
+
+# Blend for ranking: 70% semantic relevance + 30% importance (normalized to 0-1)
+SEMANTIC_WEIGHT = 0.7
+IMPORTANCE_WEIGHT = 0.3
+
+
+async def _pgvector_enabled() -> bool:
+    try:
+        from services.embedding_service import check_pgvector_available
+        return await check_pgvector_available()
+    except Exception:
+        return False
+
+
+async def _embed(text: str) -> Optional[List[float]]:
+    try:
+        from services.embedding_service import generate_embedding
+        return await generate_embedding(text)
+    except Exception as e:
+        logger.debug(f"Memory embedding failed: {e}")
+        return None
+
+
+async def _save_embedding(pool, memory_id: int, embedding: List[float], use_pgvector: bool) -> None:
+    """Persist a memory's embedding in whichever column this DB supports."""
+    if use_pgvector:
+        # pgvector codec is registered in db.py:_init_connection
+        try:
+            import numpy as np
+            embedding_param = np.array(embedding, dtype=np.float32)
+        except ImportError:
+            embedding_param = embedding
+        await pool.execute(
+            "UPDATE patient_memories SET embedding = $1 WHERE id = $2",
+            embedding_param, memory_id,
+        )
+    else:
+        await pool.execute(
+            "UPDATE patient_memories SET embedding_json = $1::jsonb WHERE id = $2",
+            json.dumps(embedding), memory_id,
+        )
+
+
+async def _insert_memory(
+    pool, tenant_id: int, patient_phone: str, memory: str, category: str, source: str, importance: int
+) -> Optional[int]:
+    """Insert a memory and store its embedding. Embedding failures never block the write."""
+    memory_id = await pool.fetchval("""
+        INSERT INTO patient_memories (tenant_id, patient_phone, memory, category, source, importance)
+        VALUES ($1, $2, $3, $4, $5, $6)
+        RETURNING id
+    """, tenant_id, patient_phone, memory, category, source, importance)
+    if memory_id is None:
+        return None
+    embedding = await _embed(memory)
+    if embedding:
+        try:
+            await _save_embedding(pool, memory_id, embedding, await _pgvector_enabled())
+        except Exception as e:
+            logger.warning(f"⚠️ Memory embedding store failed (non-fatal): {e}")
+    return memory_id
 
 
 # ─────────────────────────────────────────────────────────────
@@ -90,45 +175,104 @@ async def get_relevant_memories(
 ) -> List[dict]:
     """
     Retrieve the most relevant memories for a patient based on semantic similarity to the query.
+    Memory embeddings are stored on write, so only the query is embedded here and
+    ranking is a single top-k query (pgvector) or one pass over the stored JSON vectors.
     Falls back to importance-based retrieval if embedding fails.
     """
-    all_memories = await get_memories(pool, patient_phone, tenant_id, limit=30)
+    all_memories = await get_memories(pool, patient_phone, tenant_id, limit=top_k + 1)
     if not all_memories or not query or len(all_memories) <= top_k:
         return all_memories[:top_k] if all_memories else []
 
     try:
-        from services.embedding_service import generate_embedding
-
         # Generate embedding for the patient's current message
-        query_embedding = await generate_embedding(query)
+        query_embedding = await _embed(query)
         if not query_embedding:
             return all_memories[:top_k]
 
-        # Generate embeddings for each memory and compute similarity
-        scored = []
-        for mem in all_memories:
-            mem_embedding = await generate_embedding(mem["memory"])
-            if mem_embedding:
-                # Cosine similarity
-                dot = sum(a * b for a, b in zip(query_embedding, mem_embedding))
-                norm_q = sum(a * a for a in query_embedding) ** 0.5
-                norm_m = sum(a * a for a in mem_embedding) ** 0.5
-                similarity = dot / (norm_q * norm_m) if norm_q and norm_m else 0
-                # Blend: 70% semantic relevance + 30% importance (normalized to 0-1)
-                importance_score = mem.get("importance", 5) / 10.0
-                final_score = 0.7 * similarity + 0.3 * importance_score
-                scored.append((mem, final_score))
-            else:
-                scored.append((mem, mem.get("importance", 5) / 10.0))
-
-        scored.sort(key=lambda x: x[1], reverse=True)
-        return [m for m, _ in scored[:top_k]]
+        if await _pgvector_enabled():
+            rows = await pool.fetch("""
+                SELECT memory, category, COALESCE(importance, 5) AS importance
+                FROM patient_memories
+                WHERE patient_phone = $1 AND tenant_id = $2 AND is_active = TRUE
+                ORDER BY CASE
+                    WHEN embedding IS NULL THEN COALESCE(importance, 5) / 10.0
+                    ELSE $4::float8 * (1 - (embedding <=> $3)) + $5::float8 * COALESCE(importance, 5) / 10.0
+                END DESC, updated_at DESC
+                LIMIT $6
+            """, patient_phone, tenant_id, query_embedding,
+                SEMANTIC_WEIGHT, IMPORTANCE_WEIGHT, top_k)
+            return [dict(r) for r in rows]
+
+        rows = await pool.fetch("""
+            SELECT memory, category, COALESCE(importance, 5) AS importance, embedding_json
+            FROM patient_memories
+            WHERE patient_phone = $1 AND tenant_id = $2 AND is_active = TRUE
+            ORDER BY updated_at DESC
+        """, patient_phone, tenant_id)
+        return _rank_by_json_embeddings([dict(r) for r in rows], query_embedding, top_k)
 
     except Exception as e:
         logger.warning(f"Memory RAG fallback (non-fatal): {e}")
         return all_memories[:top_k]
 
 
+def _rank_by_json_embeddings(rows: List[dict], query_embedding: List[float], top_k: int) -> List[dict]:
+    """Rank memories with stored JSONB embeddings against the query (pgvector-free path)."""
+    from services.embedding_service import _cosine_similarity
+
+    scored = []
+    for row in rows:
+        stored = row.pop("embedding_json", None)
+        if isinstance(stored, str):
+            stored = json.loads(stored)
+        importance_score = row.get("importance", 5) / 10.0
+        if stored:
+            similarity = _cosine_similarity(query_embedding, stored)
+            scored.append((row, SEMANTIC_WEIGHT * similarity + IMPORTANCE_WEIGHT * importance_score))
+        else:
+            scored.append((row, importance_score))
+
+    scored.sort(key=lambda x: x[1], reverse=True)
+    return [m for m, _ in scored[:top_k]]
+
+
+async def backfill_memory_embeddings(pool, tenant_id: int, batch_size: int = 200) -> int:
+    """Embed active memories stored before embeddings existed. Returns count embedded."""
+    use_pgvector = await _pgvector_enabled()
+    column = "embedding" if use_pgvector else "embedding_json"
+    count = 0
+    last_id = 0
+    while True:
+        rows = await pool.fetch(f"""
+            SELECT id, memory FROM patient_memories
+            WHERE tenant_id = $1 AND is_active = TRUE AND {column} IS NULL AND id > $2
+            ORDER BY id
+            LIMIT $3
+        """, tenant_id, last_id, batch_size)
+        if not rows:
+            break
+        try:
+            from services.embedding_service import generate_embeddings
+            embeddings = await generate_embeddings([r["memory"] for r in rows], use_cache=False)
+        except Exception as e:
+            logger.warning(f"⚠️ Memory embedding backfill batch failed: {e}")
+            break
+        for r, embedding in zip(rows, embeddings):
+            if not embedding:
+                continue
+            try:
+                await _save_embedding(pool, r["id"], embedding, use_pgvector)
+                count += 1
+            except Exception as e:
+                logger.warning(f"⚠️ Memory embedding backfill failed for id={r['id']}: {e}")
+        last_id = rows[-1]["id"]
+        if len(rows) < batch_size:
+            break
+    if count:
+        logger.info(f"🧠 Backfilled {count} memory embeddings for tenant {tenant_id}")
+    return count
+
+
 async def format_memories_for_prompt(pool, patient_phone: str, tenant_id: int, query: str = "") -> str:
     """Get memories formatted for injection into system prompt.
     If query is provided, uses semantic search to select the most relevant memories.
@@ -330,10 +474,9 @@ Solo JSON, sin markdown ni explicaciones."""
                     """, patient_phone, tenant_id, f"%{signature}%", f"%{text[:20]}%")
 
                     if not similar or similar == 0:
-                        await pool.execute("""
-                            INSERT INTO patient_memories (tenant_id, patient_phone, memory, category, source, importance)
-                            VALUES ($1, $2, $3, $4, 'ai_extraction', $5)
-                        """, tenant_id, patient_phone, text, category, importance)
+                        await _insert_memory(
+                            pool, tenant_id, patient_phone, text, category, "ai_extraction", importance
+                        )
                         stored_count += 1
                         logger.info(f"🧠 Memory stored [{category}/{importance}] for {patient_phone}: {text[:60]}")
 
@@ -356,10 +499,9 @@ Solo JSON, sin markdown ni explicaciones."""
                             UPDATE patient_memories SET is_active = FALSE, updated_at = NOW()
                             WHERE id = $1
                         """, old_row["id"])
-                        await pool.execute("""
-                            INSERT INTO patient_memories (tenant_id, patient_phone, memory, category, source, importance)
-                            VALUES ($1, $2, $3, $4, 'ai_update', 7)
-                        """, tenant_id, patient_phone, new_text, category)
+                        await _insert_memory(
+                            pool, tenant_id, patient_phone, new_text, category, "ai_update", 7
+                        )
                         logger.info(f"🧠 Memory UPDATED for {patient_phone}: '{old_fragment[:30]}' → '{new_text[:60]}'")
 
             if stored_count > 0:
@@ -481,10 +623,9 @@ Solo JSON."""
                                 int(mid), tenant_id
                             )
                         # Insert merged
-                        await pool.execute("""
-                            INSERT INTO patient_memories (tenant_id, patient_phone, memory, category, source, importance)
-                            VALUES ($1, $2, $3, $4, 'compaction', $5)
-                        """, tenant_id, patient_phone, new_text, cat, importance)
+                        await _insert_memory(
+                            pool, tenant_id, patient_phone, new_text, cat, "compaction", importance
+                        )
 
                 logger.info(f"🧠 Compacted {cat} memories for {patient_phone}: {len(mems)} → kept/merged")
 
@@ -498,10 +639,7 @@ Solo JSON."""
 
 async def add_manual_memory(pool, patient_phone: str, tenant_id: int, memory: str, category: str = "general", importance: int = 7):
     """Manually add a memory (e.g., from clinical notes or admin input)."""
-    await pool.execute("""
-        INSERT INTO patient_memories (tenant_id, patient_phone, memory, category, source, importance)
-        VALUES ($1, $2, $3, $4, 'manual', $5)
-    """, tenant_id, patient_phone, memory, category, importance)
+    await _insert_memory(pool, tenant_id, patient_phone, memory, category, "manual", importance)
     logger.info(f"🧠 Manual memory added for {patient_phone}: [{category}] {memory[:60]}")
 
 
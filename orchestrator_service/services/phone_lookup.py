@@ -0,0 +1,67 @@
+"""
+Phone → conversation / patient resolver.
+
+Conversations and patients carry a generated ``phone_key`` column
+(migration 071): the last PHONE_KEY_DIGITS digits of the number, i.e. the
+national form. Every format we see for one Argentine mobile —
++5492996114843 (YCloud), +542996114843 (manual entry), 542996114843,
+02996114843 — has the key 2996114843, so a lookup is one index seek on
+(tenant_id, phone_key) instead of ILIKE '%digits%' or an IN list of
+Python-built variants.
+
+When several rows share a key (legacy duplicates in different formats) the
+row whose stored number is exactly the given one wins.
+"""
+
+import logging
+import re
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+PHONE_KEY_DIGITS = 10
+# Fewer digits than this is not a phone number (platform ids, typos).
+MIN_KEY_DIGITS = 6
+
+
+def phone_key(phone: Optional[str]) -> Optional[str]:
+    """Python mirror of the phone_key column; None when the value is not a usable phone."""
+    digits = re.sub(r"\D", "", str(phone or ""))
+    if len(digits) < MIN_KEY_DIGITS:
+        return None
+    return digits[-PHONE_KEY_DIGITS:]
+
+
+async def find_patient_id(conn, tenant_id: int, phone: Optional[str], *, include_deleted: bool = False) -> Optional[int]:
+    """Patient id for a phone in this tenant (conn may be a pool or a connection)."""
+    key = phone_key(phone)
+    if key is None:
+        return None
+    return await conn.fetchval(
+        f"""
+        SELECT id FROM patients
+        WHERE tenant_id = $1 AND phone_key = $2
+          {"" if include_deleted else "AND status != 'deleted'"}
+        ORDER BY (phone_number = $3) DESC, id
+        LIMIT 1
+        """,
+        tenant_id, key, phone,
+    )
+
+
+async def find_conversation(conn, tenant_id: int, phone: Optional[str], *, channel: Optional[str] = "whatsapp",
+                            columns: str = "id"):
+    """Most recent conversation for a phone (optionally any channel). columns is trusted SQL."""
+    key = phone_key(phone)
+    if key is None:
+        return None
+    return await conn.fetchrow(
+        f"""
+        SELECT {columns} FROM chat_conversations
+        WHERE tenant_id = $1 AND phone_key = $2
+          AND ($4::text IS NULL OR channel = $4)
+        ORDER BY (external_user_id = $3) DESC, updated_at DESC NULLS LAST
+        LIMIT 1
+        """,
+        tenant_id, key, phone, channel,
+    )
@@ -82,6 +82,8 @@ async def enqueue_buffer_and_schedule_task(tenant_id: int, conversation_id: str,
     else:
         final_ttl = max(current_ttl, req_ttl)
     await r.setex(timer_key, final_ttl, "1")
+    from services.debounce_scheduler import get_debounce_scheduler
+    await get_debounce_scheduler().schedule(r, timer_key, final_ttl)
     
     # 3. Ensure Consumer Task is running
     if not await r.get(lock_key):
@@ -105,18 +107,9 @@ async def _delayed_process_buffer_task(
         return
     
     try:
-        # Loop Check (Debounce)
-        while True:
-            # Check remaining time
-            rem_ttl = await r.ttl(timer_key)
-            
-            if rem_ttl > 0:
-                # Still waiting for silence...
-                # logger.debug(f"⏳ Debouncing... sleeping {rem_ttl}s")
-                await asyncio.sleep(rem_ttl)
-            else:
-                # Timer expired (or deleted). Silence detected.
-                break
+        # Debounce: sleep until the sliding window closes (silence detected)
+        from services.debounce_scheduler import get_debounce_scheduler
+        await get_debounce_scheduler().wait_until_due(r, timer_key)
         
         # Process Buffer
         messages = await r.lrange(buffer_key, 0, -1)
@@ -3,21 +3,27 @@ Full Platform Restore Service.
 
 Restores a tenant from a backup ZIP snapshot:
 - Validates manifest (version, schema, checksums)
-- Inserts data in FK-safe order (idempotent: ON CONFLICT DO NOTHING)
+- Streams each table file from the ZIP, COPYs it into a TEXT staging table,
+  remaps tenant ids / nulls excluded FKs with set-based UPDATEs and merges
+  with one INSERT ... SELECT ... ON CONFLICT DO NOTHING per table
+- Cleanup and all tables run in a single transaction (constraints deferred,
+  merged in FK-safe order); the summary carries per-table COPY/merge timings
 - Restores files to UPLOADS_DIR
 - Supports tenant ID remapping for cross-deployment restore
 """
 
 import hashlib
+import itertools
 import json
 import logging
 import os
 import re
+import shutil
+import time
 import zipfile
 from datetime import datetime
-from decimal import Decimal
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -28,13 +34,12 @@ FK_COLUMNS_TO_NULL = {
     "professionals": {"user_id"},
 }
 
-# Tables where ON CONFLICT by unique constraint is unreliable (no guaranteed constraint)
-# Use plain INSERT with try/except instead
-TABLES_NO_CONFLICT = {
-    "treatment_type_professionals",
-    "automation_steps",
-    "automation_events",
-}
+# Rows per COPY batch into the staging table
+COPY_BATCH_ROWS = 5000
+# Chunk size when extracting files from the ZIP
+WRITE_CHUNK_BYTES = 1024 * 1024
+# Column names read from the ZIP are interpolated into SQL: only plain identifiers pass
+_SAFE_COL = re.compile(r"^[a-z_][a-z0-9_]*$")
 
 # FK-safe insertion order (same as export)
 INSERT_ORDER = [
@@ -75,64 +80,6 @@ INSERT_ORDER = [
     "patient_attribution_history",
 ]
 
-# Columns that need type coercion reversal on restore
-DECIMAL_COLUMNS = {
-    "base_price",
-    "consultation_price",
-    "billing_amount",
-    "amount",
-    "estimated_total",
-    "approved_total",
-    "financed_total",
-    "commission_pct",
-    "copay_percent",
-    "cost_micros",
-    "total_revenue",
-    "total_expenses",
-    "total_paid",
-    "sena_amount",
-    "sena_paid",
-}
-
-
-def _decoerce_value(val: Any, col_name: str = "") -> Any:
-    """Reverse type coercion markers back to Python types for asyncpg."""
-    if val is None:
-        return None
-    if isinstance(val, str):
-        if val.startswith("Decimal:"):
-            return Decimal(val[8:])
-        if val.startswith("b64:"):
-            import base64
-
-            return base64.b64decode(val[4:])
-        if val.startswith("td:"):
-            from datetime import timedelta
-
-            return timedelta(seconds=float(val[3:]))
-        # Auto-detect datetime ISO strings
-        if re.match(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:", val):
-            try:
-                return datetime.fromisoformat(val)
-            except ValueError:
-                pass
-        # Auto-detect date strings
-        if re.match(r"^\d{4}-\d{2}-\d{2}$", val):
-            try:
-                from datetime import date
-
-                return date.fromisoformat(val)
-            except ValueError:
-                pass
-        # Known decimal columns without marker (backward compat)
-        if col_name in DECIMAL_COLUMNS:
-            try:
-                return Decimal(val)
-            except Exception:
-                pass
-    return val
-
-
 def validate_manifest(manifest: Dict) -> Tuple[bool, str]:
     """
     Validate backup manifest.
@@ -185,152 +132,222 @@ def verify_checksums(
     for rel_path, expected_hash in checksums.items():
         full_path = f"{prefix}/{rel_path}"
         try:
-            content = zip_ref.read(full_path)
-            actual_hash = hashlib.sha256(content).hexdigest()
-            if actual_hash != expected_hash:
+            digest = hashlib.sha256()
+            with zip_ref.open(full_path) as fh:
+                for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            if digest.hexdigest() != expected_hash:
                 mismatches.append(rel_path)
         except KeyError:
             mismatches.append(f"{rel_path} (not found)")
     return mismatches
 
 
-def _remap_tenant_id(rows: List[Dict], source_tid: int, target_tid: int) -> List[Dict]:
-    """Replace tenant_id in all rows for cross-tenant restore."""
-    if source_tid == target_tid:
-        return rows
-    remapped = []
-    for row in rows:
-        row_copy = dict(row)
-        if "tenant_id" in row_copy:
-            row_copy["tenant_id"] = target_tid
-        # For tenants table, remap the 'id' itself
-        if "id" in row_copy and row_copy.get("tenant_id") is None:
-            # This might be the tenants table where id IS the tenant_id
-            pass
-        remapped.append(row_copy)
-    return remapped
+def _data_entry(zip_ref: zipfile.ZipFile, prefix: str, table_name: str) -> Optional[str]:
+    """ZIP entry holding a table's rows: data/<table>.ndjson (current) or data/<table>.json (older backups)."""
+    for ext in ("ndjson", "json"):
+        name = f"{prefix}/data/{table_name}.{ext}"
+        try:
+            zip_ref.getinfo(name)
+            return name
+        except KeyError:
+            continue
+    return None
 
 
-async def _get_table_columns(pool, table_name: str) -> set:
-    """Get the set of actual column names for a table in the target DB."""
-    rows = await pool.fetch(
+def _iter_table_rows(zip_ref: zipfile.ZipFile, entry: str) -> Iterator[Dict]:
+    """Rows of one data entry; NDJSON is read line by line, legacy .json arrays are loaded whole."""
+    if entry.endswith(".ndjson"):
+        with zip_ref.open(entry) as fh:
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
+        return
+    yield from json.loads(zip_ref.read(entry))
+
+
+async def _column_types(conn, table_name: str) -> Dict[str, Tuple[str, str]]:
+    """Writable columns of a table (generated ones excluded): name -> (SQL type, copy kind)."""
+    rows = await conn.fetch(
         """
-        SELECT column_name FROM information_schema.columns
-        WHERE table_name = $1 AND table_schema = 'public'
+        SELECT a.attname AS name, format_type(a.atttypid, a.atttypmod) AS sql_type,
+               t.typname AS type_name, t.typcategory AS category
+        FROM pg_attribute a
+        JOIN pg_type t ON t.oid = a.atttypid
+        WHERE a.attrelid = to_regclass('public.' || $1)
+          AND a.attnum > 0 AND NOT a.attisdropped AND a.attgenerated = ''
+        ORDER BY a.attnum
         """,
         table_name,
     )
-    return {r["column_name"] for r in rows}
-
+    types = {}
+    for r in rows:
+        if r["category"] == "A":
+            kind = "array"
+        elif r["type_name"] in ("json", "jsonb"):
+            kind = "json"
+        elif r["type_name"] in ("vector", "bytea", "interval", "bool"):
+            kind = r["type_name"]
+        else:
+            kind = "text"
+        types[r["name"]] = (r["sql_type"], kind)
+    return types
+
+
+def _array_literal(items: list) -> str:
+    parts = []
+    for item in items:
+        if item is None:
+            parts.append("NULL")
+        elif isinstance(item, list):
+            parts.append(_array_literal(item))
+        elif isinstance(item, bool):
+            parts.append("true" if item else "false")
+        else:
+            text = json.dumps(item, ensure_ascii=False) if isinstance(item, dict) else str(item)
+            parts.append('"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _copy_text(val: Any, kind: str) -> Optional[str]:
+    """Backup JSON value → PostgreSQL text input for the column kind (cast to the real type on merge)."""
+    if val is None:
+        return None
+    if kind == "json":
+        # asyncpg returns json/jsonb as their JSON text, so strings are already serialized
+        return val if isinstance(val, str) else json.dumps(val, ensure_ascii=False)
+    if kind == "array" and isinstance(val, list):
+        return _array_literal(val)
+    if kind == "vector" and isinstance(val, list):
+        return "[" + ",".join(str(v) for v in val) + "]"
+    if isinstance(val, bool):
+        return "true" if val else "false"
+    if isinstance(val, (dict, list)):
+        return json.dumps(val, ensure_ascii=False)
+    if isinstance(val, str):
+        if val.startswith("Decimal:"):
+            return val[8:]
+        if kind == "bytea" and val.startswith("b64:"):
+            import base64
 
-async def _insert_table(
-    pool, table_name: str, rows: List[Dict], target_tenant_id: int
-) -> Tuple[int, int, List[str]]:
-    """
-    Insert rows into a table.
+            return "\\x" + base64.b64decode(val[4:]).hex()
+        if kind == "interval" and val.startswith("td:"):
+            return f"{val[3:]} seconds"
+        return val
+    return str(val)
 
-    - tenants: UPSERT (update all fields on conflict) so restored config overwrites shell tenant
-    - Other tables with id: ON CONFLICT (id) DO NOTHING
-    - Columns that don't exist in target DB are silently filtered out
 
-    Returns (inserted_count, skipped_count, warnings).
+async def _stage_rows(conn, rows: Iterator[Dict], columns: List[str], kinds: List[str]) -> int:
+    """COPY rows (as text) into _restore_stage in batches. Returns the staged row count."""
+    staged = 0
+    batch: List[tuple] = []
+    for row in rows:
+        batch.append(tuple(_copy_text(row.get(c), k) for c, k in zip(columns, kinds)))
+        if len(batch) >= COPY_BATCH_ROWS:
+            await conn.copy_records_to_table("_restore_stage", records=batch, columns=columns)
+            staged += len(batch)
+            batch = []
+    if batch:
+        await conn.copy_records_to_table("_restore_stage", records=batch, columns=columns)
+        staged += len(batch)
+    return staged
+
+
+async def _restore_table(
+    conn, zip_ref: zipfile.ZipFile, entry: str, table_name: str, source_tid: int, target_tid: int
+) -> Dict[str, Any]:
     """
-    if not rows:
-        return 0, 0, []
-
-    inserted = 0
-    skipped = 0
-    warnings = []
-
-    # Validate table name against whitelist (prevent SQL injection)
-    if table_name not in set(INSERT_ORDER):
-        warnings.append(f"Table {table_name} not in whitelist — skipped")
-        return 0, len(rows), warnings
-
-    # Column name whitelist regex (prevent SQL injection via crafted ZIP)
-    _SAFE_COL = re.compile(r"^[a-z_][a-z0-9_]*$")
-
-    # Get actual columns in target DB to filter out columns that don't exist
-    try:
-        db_columns = await _get_table_columns(pool, table_name)
-    except Exception as e:
-        warnings.append(f"{table_name}: could not read schema — {str(e)[:80]}")
-        return 0, len(rows), warnings
+    Load one table: COPY into a text staging table, remap tenant ids and
+    null excluded FKs with set-based UPDATEs, then merge into the real table
+    with one INSERT ... SELECT (casting every column to its type).
+    Returns {"rows", "inserted", "skipped", "copy_ms", "merge_ms", "warnings"}.
+    """
+    report: Dict[str, Any] = {"rows": 0, "inserted": 0, "skipped": 0, "copy_ms": 0, "merge_ms": 0, "warnings": []}
+    rows = _iter_table_rows(zip_ref, entry)
+    first = next(rows, None)
+    if first is None:
+        return report
 
+    db_columns = await _column_types(conn, table_name)
     if not db_columns:
-        warnings.append(f"{table_name}: table not found in target DB — skipped")
-        return 0, len(rows), warnings
-
-    filtered_cols_logged = False
+        report["warnings"].append(f"{table_name}: table not found in target DB — skipped")
+        return report
+
+    # Column names come from the ZIP: whitelist them and keep only writable target columns
+    safe_keys = [k for k in first if _SAFE_COL.match(k)]
+    if len(safe_keys) != len(first):
+        report["warnings"].append(f"{table_name}: unsafe column names filtered")
+    columns = [k for k in safe_keys if k in db_columns]
+    dropped = set(safe_keys) - set(columns)
+    if dropped:
+        logger.info(f"[restore] {table_name}: filtered out non-existent columns: {dropped}")
+    if not columns:
+        return report
+    kinds = [db_columns[c][1] for c in columns]
+
+    started = time.perf_counter()
+    await conn.execute("DROP TABLE IF EXISTS _restore_stage")
+    await conn.execute(
+        f"CREATE TEMP TABLE _restore_stage ({', '.join(f'{c} TEXT' for c in columns)}) ON COMMIT DROP"
+    )
+    report["rows"] = await _stage_rows(conn, itertools.chain([first], rows), columns, kinds)
+    report["copy_ms"] = round((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    if target_tid != source_tid:
+        if table_name == "tenants" and "id" in columns:
+            await conn.execute("UPDATE _restore_stage SET id = $1", str(target_tid))
+        elif "tenant_id" in columns:
+            await conn.execute("UPDATE _restore_stage SET tenant_id = $1", str(target_tid))
+    null_cols = [c for c in FK_COLUMNS_TO_NULL.get(table_name, set()) if c in columns]
+    if null_cols:
+        await conn.execute(f"UPDATE _restore_stage SET {', '.join(f'{c} = NULL' for c in null_cols)}")
+
+    if table_name == "tenants" and "id" in columns:
+        # UPSERT: overwrite existing tenant with backup data
+        update_cols = [c for c in columns if c != "id"]
+        conflict = (
+            f"ON CONFLICT (id) DO UPDATE SET {', '.join(f'{c} = EXCLUDED.{c}' for c in update_cols)}"
+            if update_cols else "ON CONFLICT (id) DO NOTHING"
+        )
+    else:
+        # Any unique violation (id or natural keys) skips the row instead of aborting the table
+        conflict = "ON CONFLICT DO NOTHING"
 
-    for row in rows:
-        try:
-            # Decoerce all values
-            clean_row = {k: _decoerce_value(v, k) for k, v in row.items()}
-
-            # Null out FK columns that reference excluded tables (e.g. users)
-            null_cols = FK_COLUMNS_TO_NULL.get(table_name, set())
-            for col in null_cols:
-                if col in clean_row:
-                    clean_row[col] = None
-
-            # Validate column names (SQL injection prevention)
-            safe_row = {k: v for k, v in clean_row.items() if _SAFE_COL.match(k)}
-            if len(safe_row) != len(clean_row):
-                warnings.append(f"{table_name}: unsafe column names filtered")
-
-            # Filter to only columns that exist in the target DB
-            original_count = len(safe_row)
-            safe_row = {k: v for k, v in safe_row.items() if k in db_columns}
-            if len(safe_row) < original_count and not filtered_cols_logged:
-                dropped = set(clean_row.keys()) - db_columns
-                logger.info(
-                    f"[restore] {table_name}: filtered out non-existent columns: {dropped}"
-                )
-                filtered_cols_logged = True
-
-            if not safe_row:
-                skipped += 1
-                continue
-
-            columns = list(safe_row.keys())
-            values = [safe_row[c] for c in columns]
-            placeholders = [f"${i + 1}" for i in range(len(columns))]
-            col_str = ", ".join(columns)
-            val_str = ", ".join(placeholders)
-
-            # Determine conflict strategy
-            if table_name == "tenants" and "id" in columns:
-                # UPSERT: overwrite existing tenant with backup data
-                update_cols = [c for c in columns if c != "id"]
-                if update_cols:
-                    set_clause = ", ".join(
-                        f"{c} = EXCLUDED.{c}" for c in update_cols
-                    )
-                    conflict = f"ON CONFLICT (id) DO UPDATE SET {set_clause}"
-                else:
-                    conflict = "ON CONFLICT (id) DO NOTHING"
-            elif table_name in TABLES_NO_CONFLICT:
-                # No reliable unique constraint — plain INSERT
-                conflict = ""
-            elif "id" in columns:
-                conflict = "ON CONFLICT (id) DO NOTHING"
-            else:
-                conflict = ""
-
-            sql = f"INSERT INTO {table_name} ({col_str}) VALUES ({val_str}) {conflict}"
-
-            result = await pool.execute(sql, *values)
-            if "INSERT 0 1" in result or "UPDATE" in result:
-                inserted += 1
-            else:
-                skipped += 1
-        except Exception as e:
-            skipped += 1
-            warnings.append(f"{table_name} row {row.get('id', '?')}: {str(e)[:100]}")
-            logger.warning(f"[restore] Insert failed {table_name}: {e}")
+    select_list = ", ".join(f"{c}::{db_columns[c][0]}" for c in columns)
+    result = await conn.execute(
+        f"INSERT INTO {table_name} ({', '.join(columns)}) SELECT {select_list} FROM _restore_stage {conflict}"
+    )
+    await conn.execute("DROP TABLE _restore_stage")
+    report["merge_ms"] = round((time.perf_counter() - started) * 1000)
 
-    return inserted, skipped, warnings
+    try:
+        report["inserted"] = int(str(result).split()[-1])
+    except (ValueError, IndexError):
+        report["inserted"] = report["rows"]
+    report["skipped"] = report["rows"] - report["inserted"]
+    return report
+
+
+async def _clean_target_tenant(conn, tables: List[str], target_tid: int) -> None:
+    """Delete the target tenant's rows of every restored table (reverse FK order) so re-restores don't duplicate."""
+    for table_name in reversed(tables):
+        # Don't delete tenant record itself (UPSERT handles it)
+        if table_name == "tenants":
+            continue
+        if table_name == "treatment_type_professionals":
+            # Junction table: delete via JOIN
+            await conn.execute(
+                """DELETE FROM treatment_type_professionals
+                   WHERE treatment_type_id IN (
+                       SELECT id FROM treatment_types WHERE tenant_id = $1
+                   )""",
+                target_tid,
+            )
+            logger.info(f"[restore] Cleaned {table_name} via join")
+        elif "tenant_id" in await _column_types(conn, table_name):
+            deleted = await conn.execute(f"DELETE FROM {table_name} WHERE tenant_id = $1", target_tid)
+            logger.info(f"[restore] Cleaned {table_name}: {deleted}")
 
 
 async def _restore_files(
@@ -394,9 +411,8 @@ async def _restore_files(
             continue
 
         try:
-            content = zip_ref.read(entry)
-            with open(target_path, "wb") as f:
-                f.write(content)
+            with zip_ref.open(entry) as src, open(target_path, "wb") as f:
+                shutil.copyfileobj(src, f, WRITE_CHUNK_BYTES)
             file_count += 1
         except Exception as e:
             logger.warning(f"[restore] File extraction failed {entry}: {e}")
@@ -404,11 +420,34 @@ async def _restore_files(
     return file_count
 
 
+async def _update_progress(task_id: Optional[str], pct: int, message: str, **extra: str) -> None:
+    """Update restore task progress in Redis (same shape as backup:progress)."""
+    if not task_id:
+        return
+    try:
+        from services.relay import get_redis
+        r = get_redis()
+        if r is None:
+            return
+        key = f"restore:progress:{task_id}"
+        await r.hset(key, mapping={
+            "pct": str(pct),
+            "message": message,
+            "status": "restoring",
+            "updated_at": datetime.now().isoformat(),
+            **extra,
+        })
+        await r.expire(key, 3600)
+    except Exception as e:
+        logger.warning(f"[restore] Progress update failed: {e}")
+
+
 async def restore_from_zip(
     zip_path: str,
     tenant_id: int,
     pool,
     target_tenant_id: Optional[int] = None,
+    task_id: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     Main restore entry point.
@@ -418,8 +457,10 @@ async def restore_from_zip(
         tenant_id: Source tenant_id from the backup
         pool: asyncpg pool
         target_tenant_id: If provided, remap all data to this tenant
+        task_id: Background task id; progress is published to restore:progress:<task_id>
 
-    Returns summary dict with counts and warnings.
+    Returns summary dict with counts, warnings and per-table timings
+    ({table: {"rows", "copy_ms", "merge_ms"}}).
     """
     target_tid = target_tenant_id or tenant_id
     summary = {
@@ -428,7 +469,10 @@ async def restore_from_zip(
         "rows_skipped": 0,
         "files_restored": 0,
         "warnings": [],
+        "timings": {},
+        "duration_ms": 0,
     }
+    started = time.perf_counter()
 
     try:
         with zipfile.ZipFile(zip_path, "r") as zf:
@@ -457,6 +501,7 @@ async def restore_from_zip(
                 summary["warnings"].append(schema_warn)
 
             # Verify checksums
+            await _update_progress(task_id, 5, "Verificando integridad...")
             mismatches = verify_checksums(zf, manifest, prefix)
             if mismatches:
                 summary["warnings"].append(
@@ -464,84 +509,61 @@ async def restore_from_zip(
                 )
 
             source_tid = manifest.get("tenant_id", tenant_id)
-
-            # --- CLEAN existing data for the target tenant (reverse FK order) ---
-            # This ensures re-restores work cleanly without duplicates
-            cleanup_order = list(reversed(INSERT_ORDER))
-            for table_name in cleanup_order:
-                # Only clean tables that are in the backup
-                data_path = f"{prefix}/data/{table_name}.json"
-                try:
-                    zf.getinfo(data_path)
-                except KeyError:
-                    continue  # Not in backup, don't clean
-
-                # Don't delete tenant record itself (UPSERT handles it)
-                if table_name == "tenants":
-                    continue
-
-                try:
-                    # Check if table has tenant_id
-                    has_tid = await pool.fetchval(
-                        """SELECT EXISTS (
-                            SELECT 1 FROM information_schema.columns
-                            WHERE table_name = $1 AND column_name = 'tenant_id'
-                        )""",
-                        table_name,
-                    )
-                    if has_tid:
-                        deleted = await pool.execute(
-                            f"DELETE FROM {table_name} WHERE tenant_id = $1",
-                            target_tid,
+            tables = [t for t in INSERT_ORDER if _data_entry(zf, prefix, t) is not None]
+
+            # Cleanup + every table in ONE transaction: a failed restore leaves the
+            # tenant as it was instead of half-deleted. Deferrable FKs are checked
+            # at commit; the rest are satisfied by merging in INSERT_ORDER.
+            async with pool.acquire() as conn:
+                async with conn.transaction():
+                    await conn.execute("SET CONSTRAINTS ALL DEFERRED")
+                    await _clean_target_tenant(conn, tables, target_tid)
+
+                    for i, table_name in enumerate(tables):
+                        await _update_progress(
+                            task_id, 10 + int(80 * i / len(tables)), f"Restaurando {table_name}..."
                         )
-                        logger.info(f"[restore] Cleaned {table_name}: {deleted}")
-                    elif table_name == "treatment_type_professionals":
-                        # Junction table: delete via JOIN
-                        await pool.execute(
-                            """DELETE FROM treatment_type_professionals
-                               WHERE treatment_type_id IN (
-                                   SELECT id FROM treatment_types WHERE tenant_id = $1
-                               )""",
-                            target_tid,
+                        try:
+                            # Savepoint: a broken table is reported and skipped, not fatal
+                            async with conn.transaction():
+                                report = await _restore_table(
+                                    conn, zf, _data_entry(zf, prefix, table_name),
+                                    table_name, source_tid, target_tid,
+                                )
+                        except json.JSONDecodeError as e:
+                            summary["warnings"].append(f"{table_name}: datos ilegibles — {str(e)[:80]}")
+                            continue
+                        except Exception as e:
+                            summary["warnings"].append(f"{table_name}: {str(e)[:150]}")
+                            logger.warning(f"[restore] {table_name} failed: {e}")
+                            continue
+
+                        summary["warnings"].extend(report["warnings"])
+                        if not report["rows"]:
+                            continue
+                        summary["tables_restored"][table_name] = report["inserted"]
+                        summary["rows_inserted"] += report["inserted"]
+                        summary["rows_skipped"] += report["skipped"]
+                        summary["timings"][table_name] = {
+                            "rows": report["rows"],
+                            "copy_ms": report["copy_ms"],
+                            "merge_ms": report["merge_ms"],
+                        }
+                        logger.info(
+                            f"[restore] {table_name}: {report['inserted']} inserted, {report['skipped']} skipped "
+                            f"(copy {report['copy_ms']}ms, merge {report['merge_ms']}ms)"
                         )
-                        logger.info(f"[restore] Cleaned {table_name} via join")
-                except Exception as clean_err:
-                    logger.warning(f"[restore] Cleanup {table_name} failed: {clean_err}")
-
-            # Insert tables in FK-safe order
-            for table_name in INSERT_ORDER:
-                data_path = f"{prefix}/data/{table_name}.json"
-                try:
-                    raw = zf.read(data_path)
-                    rows = json.loads(raw)
-                except (KeyError, json.JSONDecodeError):
-                    continue  # Table not in backup — skip
-
-                if not rows:
-                    continue
-
-                # Remap tenant_id if needed
-                if target_tid != source_tid:
-                    if table_name == "tenants":
-                        # Special: remap the tenant record itself
-                        for row in rows:
-                            row["id"] = target_tid
-                    else:
-                        rows = _remap_tenant_id(rows, source_tid, target_tid)
-
-                inserted, skipped, warnings = await _insert_table(
-                    pool, table_name, rows, target_tid
-                )
-                summary["tables_restored"][table_name] = inserted
-                summary["rows_inserted"] += inserted
-                summary["rows_skipped"] += skipped
-                summary["warnings"].extend(warnings)
 
-                logger.info(
-                    f"[restore] {table_name}: {inserted} inserted, {skipped} skipped"
-                )
+            # tenant_holidays and the prompt source tables were replaced: drop the
+            # cached calendar and agent prompt context on every replica
+            from services.holiday_service import invalidate_holiday_calendar
+            from services.tenant_prompt_cache import invalidate_tenant_prompt_context
 
-            # Restore files
+            await invalidate_holiday_calendar(target_tid)
+            await invalidate_tenant_prompt_context(target_tid)
+
+            # Restore files (after commit: files never point at rolled-back rows)
+            await _update_progress(task_id, 92, "Restaurando archivos...")
             file_count = await _restore_files(zf, prefix, target_tid, source_tid)
             summary["files_restored"] = file_count
 
@@ -551,9 +573,40 @@ async def restore_from_zip(
         logger.exception(f"[restore] Restore failed: {e}")
         summary["warnings"].append(f"Error durante la restauración: {str(e)[:200]}")
 
+    summary["duration_ms"] = round((time.perf_counter() - started) * 1000)
     logger.info(
-        f"[restore] Complete: {summary['tables_restored']} tables, "
+        f"[restore] Complete: {len(summary['tables_restored'])} tables, "
         f"{summary['rows_inserted']} inserted, {summary['rows_skipped']} skipped, "
-        f"{summary['files_restored']} files"
+        f"{summary['files_restored']} files in {summary['duration_ms']}ms"
     )
     return summary
+
+
+async def run_restore_task(zip_path: str, tenant_id: int, target_tenant_id: int, task_id: str) -> None:
+    """Background task entry point: restore, publish the summary, drop the upload and the lock."""
+    from services.relay import get_redis
+
+    try:
+        from db import db
+
+        await _update_progress(task_id, 0, "Iniciando restauración...")
+        summary = await restore_from_zip(zip_path, tenant_id, db.pool, target_tenant_id, task_id=task_id)
+        await _update_progress(
+            task_id, 100, "Restauración completada",
+            status="done", summary=json.dumps(summary, default=str),
+        )
+        logger.info(f"[restore] Restore completed for tenant {target_tenant_id}: {summary}")
+    except Exception as e:
+        logger.exception(f"[restore] Restore task failed: {e}")
+        await _update_progress(task_id, 0, f"Error: {str(e)[:200]}", status="error", error=str(e)[:200])
+    finally:
+        try:
+            os.remove(zip_path)
+        except OSError:
+            pass
+        try:
+            r = get_redis()
+            if r:
+                await r.delete(f"restore:lock:{target_tenant_id}")
+        except Exception:
+            pass
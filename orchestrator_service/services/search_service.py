@@ -0,0 +1,222 @@
+"""
+Patient and chat-history search.
+
+Single search path for the admin patient list, /admin/patients/search,
+the symptom search over chat history, Nova's _buscar_paciente and the
+agent's find_patient. Instead of ILIKE '%term%' over raw columns (a
+sequential scan per query, growing with tenant size) it targets the
+indexed keys added by migration 070:
+
+- patients.search_name: lower-cased, accent-free "first last" (GIN trigram),
+  matched by an ordered word pattern (LIKE '%juan%perez%') or by trigram
+  word similarity (typos, swapped words: "Gamara" → "Gamarra").
+- patients.phone_digits / dni_digits: digits only (GIN trigram), so
+  "+54 9 11 5555-1234", "1155551234" and "5555 1234" all match.
+- chat_messages: full-text index on to_tsvector('spanish', content) for
+  patient messages.
+
+Results are ranked (0..1, rounded so it is stable as a keyset) and paged
+with an opaque cursor over (rank, id).
+"""
+
+import base64
+import logging
+import re
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Must match the search_name expression of migration 070.
+ACCENTS = "áéíóúüñàèìòùâêîôûäëïöü"
+PLAIN = "aeiouunaeiouaeiouaeiou"
+_ACCENT_TABLE = str.maketrans(ACCENTS, PLAIN)
+
+TS_CONFIG = "spanish"
+MIN_DIGITS = 3  # trigram minimum; shorter digit runs only match names
+MAX_LIMIT = 100
+
+PATIENT_COLUMNS = (
+    "id", "tenant_id", "first_name", "last_name", "phone_number", "email", "dni",
+    "insurance_provider", "insurance_id", "status", "created_at",
+)
+
+
+def normalize_text(value: Optional[str]) -> str:
+    """Lower-case, accent-free, single-spaced — the same transform as patients.search_name."""
+    return " ".join((value or "").lower().translate(_ACCENT_TABLE).split())
+
+
+def digits_only(value: Optional[str]) -> str:
+    return re.sub(r"\D", "", value or "")
+
+
+def encode_cursor(rank: Any, row_id: Any) -> str:
+    return base64.urlsafe_b64encode(f"{rank}:{row_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[Decimal, int]]:
+    """Parse a cursor from encode_cursor. Raises ValueError when it is malformed."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        rank, row_id = raw.split(":", 1)
+        return Decimal(rank), int(row_id)
+    except (ValueError, InvalidOperation, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid search cursor: {cursor!r}") from e
+
+
+def patient_match_sql(query: str, alias: str = "p", first_param: int = 1) -> Optional[Tuple[str, str, List[Any]]]:
+    """
+    Build the indexed match for a free-text patient query.
+
+    Returns (where_sql, rank_sql, params) with placeholders numbered from
+    first_param, or None when the query has nothing searchable. Callers
+    embed both fragments in their own SELECT (tenant and status filters
+    stay with the caller).
+    """
+    text = normalize_text(query)
+    digits = digits_only(query)
+    words = [w for w in re.split(r"[^a-z0-9]+", text) if w]
+    has_letters = any(not w.isdigit() for w in words)
+
+    params: List[Any] = []
+    conditions: List[str] = []
+    ranks: List[str] = []
+
+    def param(value: Any) -> str:
+        params.append(value)
+        return f"${first_param + len(params) - 1}"
+
+    if has_letters:
+        name_words = [w for w in words if not w.isdigit()]
+        t = param(" ".join(name_words))
+        pattern = param("%" + "%".join(name_words) + "%")
+        conditions.append(f"{alias}.search_name LIKE {pattern}")
+        conditions.append(f"{t} <% {alias}.search_name")
+        ranks.append(
+            f"CASE WHEN {alias}.search_name = {t} THEN 1.0"
+            f" WHEN {alias}.search_name LIKE {t} || '%' THEN 0.9"
+            f" WHEN {alias}.search_name LIKE {pattern} THEN 0.8"
+            f" ELSE word_similarity({t}, {alias}.search_name) * 0.7 END"
+        )
+
+    if len(digits) >= MIN_DIGITS:
+        d = param(digits)
+        contains = param(f"%{digits}%")
+        conditions.append(f"{alias}.phone_digits LIKE {contains}")
+        conditions.append(f"{alias}.dni_digits LIKE {contains}")
+        ranks.append(
+            f"CASE WHEN {alias}.dni_digits = {d} OR {alias}.phone_digits = {d} THEN 1.0"
+            f" WHEN {alias}.phone_digits LIKE '%' || {d} THEN 0.95"
+            f" ELSE 0.6 END"
+        )
+
+    if not conditions:
+        return None
+
+    rank_sql = ranks[0] if len(ranks) == 1 else f"GREATEST({', '.join(ranks)})"
+    return f"({' OR '.join(conditions)})", f"ROUND(({rank_sql})::numeric, 4)", params
+
+
+def _patient_columns(alias: str) -> str:
+    return ", ".join(f"{alias}.{c}" for c in PATIENT_COLUMNS)
+
+
+def _page(rows: Sequence, limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    items = [dict(r) for r in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit and items:
+        last = items[-1]
+        next_cursor = encode_cursor(last["rank"], last["id"])
+    return items, next_cursor
+
+
+async def search_patients(
+    pool,
+    tenant_ids: Sequence[int],
+    query: str,
+    *,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    include_deleted: bool = False,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Ranked patient search by name, phone or DNI. Returns (items, next_cursor)."""
+    limit = max(1, min(limit, MAX_LIMIT))
+    match = patient_match_sql(query, alias="p", first_param=2)
+    if match is None:
+        return [], None
+    where_sql, rank_sql, params = match
+
+    after = decode_cursor(cursor)
+    k = len(params) + 2
+    sql = f"""
+        SELECT * FROM (
+            SELECT {_patient_columns("p")}, {rank_sql} AS rank
+            FROM patients p
+            WHERE p.tenant_id = ANY($1::int[])
+              {"" if include_deleted else "AND p.status IS DISTINCT FROM 'deleted'"}
+              AND {where_sql}
+        ) s
+        WHERE (${k}::numeric IS NULL OR (s.rank, s.id) < (${k}::numeric, ${k + 1}::int))
+        ORDER BY s.rank DESC, s.id DESC
+        LIMIT ${k + 2}
+    """
+    rows = await pool.fetch(
+        sql, list(tenant_ids), *params,
+        after[0] if after else None, after[1] if after else None, limit + 1,
+    )
+    return _page(rows, limit)
+
+
+async def search_patients_by_messages(
+    pool,
+    tenant_ids: Sequence[int],
+    query: str,
+    *,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Active patients whose own chat messages match query (full text with
+    Spanish stemming: "muela" also finds "muelas"), ranked by their
+    best-matching message. Returns (items, next_cursor).
+    """
+    limit = max(1, min(limit, MAX_LIMIT))
+    query = (query or "").strip()
+    if not query or not tenant_ids:
+        return [], None
+
+    after = decode_cursor(cursor)
+    rows = await pool.fetch(
+        f"""
+        WITH q AS (SELECT websearch_to_tsquery('{TS_CONFIG}', $2) AS tsq),
+        hits AS (
+            SELECT cm.tenant_id, cm.conversation_id, cm.from_number,
+                   MAX(ts_rank(to_tsvector('{TS_CONFIG}', cm.content), q.tsq)) AS score
+            FROM chat_messages cm, q
+            WHERE cm.tenant_id = ANY($1::int[])
+              AND cm.role = 'user'
+              AND to_tsvector('{TS_CONFIG}', cm.content) @@ q.tsq
+            GROUP BY cm.tenant_id, cm.conversation_id, cm.from_number
+        ),
+        matched AS (
+            SELECT p.id, ROUND(LEAST(MAX(h.score), 1)::numeric, 4) AS rank
+            FROM hits h
+            LEFT JOIN chat_conversations c ON c.id = h.conversation_id
+            JOIN patients p ON p.tenant_id = h.tenant_id
+                           AND (p.id = c.linked_patient_id OR p.phone_number = h.from_number)
+            WHERE p.status = 'active'
+            GROUP BY p.id
+        )
+        SELECT {_patient_columns("p")}, m.rank
+        FROM matched m JOIN patients p ON p.id = m.id
+        WHERE ($3::numeric IS NULL OR (m.rank, m.id) < ($3::numeric, $4::int))
+        ORDER BY m.rank DESC, m.id DESC
+        LIMIT $5
+        """,
+        list(tenant_ids), query,
+        after[0] if after else None, after[1] if after else None, limit + 1,
+    )
+    return _page(rows, limit)
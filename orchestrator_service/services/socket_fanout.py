@@ -0,0 +1,230 @@
+"""
+Cluster-wide Socket.IO fan-out with per-room coalescing.
+
+main.sio used to be a plain AsyncServer: an emit only reached browsers
+connected to the emitting process, so with several replicas behind the load
+balancer the inbox missed NEW_MESSAGE / HUMAN_OVERRIDE_CHANGED / appointment
+events raised on another replica. FanoutServer is a drop-in AsyncServer
+(every existing `sio.emit(..., room=...)` call site is unchanged) that adds:
+
+- A Redis client manager (socketio.AsyncRedisManager) when
+  SOCKETIO_REDIS_URL / REDIS_URL is set: emits are published once and every
+  replica delivers them to its own sockets.
+- Room presence: each replica publishes its local subscriber count per room
+  to `sio:room:<room>` (hash instance -> count, refreshed by a heartbeat and
+  immediately on the first join). An emit to a room nobody in the cluster is
+  subscribed to is skipped before serialising or publishing. Redis errors
+  and stale entries of dead replicas err on the side of emitting.
+- Coalescing: room emits are buffered for SOCKETIO_COALESCE_MS and flushed
+  as one message. Repeated *_UPDATED / *_CHANGED events for the same entity
+  inside the window are merged (later fields win) into one diff; everything
+  else (NEW_MESSAGE, NEW_APPOINTMENT, ...) is kept, in order. A flush with a
+  single event is emitted as that event; several go out as one EVENT_BATCH
+  ({"events": [[name, payload], ...]}) which services/socket.ts on the
+  client unpacks into the usual per-event listeners.
+
+Emits to sid targets or non-tenant rooms, with skip_sid, callbacks or
+non-default namespaces bypass both layers.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import socketio
+
+logger = logging.getLogger(__name__)
+
+BATCH_EVENT = "EVENT_BATCH"
+COALESCE_SECONDS = int(os.getenv("SOCKETIO_COALESCE_MS", "100")) / 1000
+PRESENCE_KEY_PREFIX = "sio:room:"
+PRESENCE_REFRESH_SECONDS = 20.0
+PRESENCE_TTL_SECONDS = int(PRESENCE_REFRESH_SECONDS * 3)
+# How long a cluster-wide "room is empty/occupied" answer is reused.
+PRESENCE_CACHE_SECONDS = 1.0
+# Payload fields that identify the entity of a mergeable event, by priority.
+ENTITY_KEYS = ("id", "appointment_id", "patient_id", "conversation_id", "phone_number")
+MERGEABLE_SUFFIXES = ("_UPDATED", "_CHANGED")
+# Rooms joined through enter_room (tenant rooms); sid targets are emitted directly.
+FANOUT_ROOM_PREFIXES = ("tenant:",)
+
+_INSTANCE = f"{socket.gethostname()}-{os.getpid()}"
+
+
+def redis_url() -> Optional[str]:
+    return os.getenv("SOCKETIO_REDIS_URL") or os.getenv("REDIS_URL")
+
+
+def coalesce_key(event: str, data: Any, seq: int) -> Tuple:
+    """Buffer key: same key = same entity, merged; unique keys keep every event."""
+    if isinstance(data, dict) and event.endswith(MERGEABLE_SUFFIXES):
+        for field in ENTITY_KEYS:
+            if data.get(field) is not None:
+                return (event, field, str(data[field]))
+    return (event, seq)
+
+
+class FanoutServer(socketio.AsyncServer):
+    """AsyncServer with cluster presence checks and coalesced room emits."""
+
+    def __init__(self, *args, coalesce_seconds: float = COALESCE_SECONDS, redis_client=None, **kwargs):
+        url = redis_url()
+        manager_cls = getattr(socketio, "AsyncRedisManager", None)
+        self._clustered = bool(url) and manager_cls is not None and "client_manager" not in kwargs
+        if self._clustered:
+            kwargs["client_manager"] = manager_cls(url)
+        super().__init__(*args, **kwargs)
+        self.coalesce_seconds = coalesce_seconds
+        self._redis = redis_client
+        self._pending: Dict[str, "OrderedDict[Tuple, Tuple[str, Any]]"] = {}
+        self._flush_tasks: Dict[str, asyncio.Task] = {}
+        self._presence_cache: Dict[str, Tuple[float, bool]] = {}
+        self._published_rooms: set = set()
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._seq = 0
+        self.stats = {"emitted": 0, "coalesced": 0, "batches": 0, "skipped_empty": 0}
+
+    # ----- presence -------------------------------------------------------
+
+    def _get_redis(self):
+        if self._redis is None:
+            from services.relay import get_redis
+
+            self._redis = get_redis()
+        return self._redis
+
+    def local_count(self, room: str, namespace: str = "/") -> int:
+        return len(self.manager.rooms.get(namespace, {}).get(room, {}))
+
+    async def _publish_presence(self, room: str) -> None:
+        r = self._get_redis()
+        if r is None:
+            return
+        count = self.local_count(room)
+        key = PRESENCE_KEY_PREFIX + room
+        if count:
+            await r.hset(key, _INSTANCE, count)
+            await r.expire(key, PRESENCE_TTL_SECONDS)
+            self._published_rooms.add(room)
+        else:
+            await r.hdel(key, _INSTANCE)
+            self._published_rooms.discard(room)
+        self._presence_cache.pop(room, None)
+
+    async def _presence_loop(self) -> None:
+        while True:
+            await asyncio.sleep(PRESENCE_REFRESH_SECONDS)
+            rooms = {
+                room for room in self.manager.rooms.get("/", {})
+                if isinstance(room, str) and room.startswith(FANOUT_ROOM_PREFIXES) and self.local_count(room)
+            }
+            for room in rooms | self._published_rooms:
+                try:
+                    await self._publish_presence(room)
+                except Exception as e:
+                    logger.debug(f"socket fanout: presence refresh failed for {room}: {e}")
+
+    async def enter_room(self, sid, room, namespace=None):
+        first = not self.local_count(room, namespace or "/")
+        await super().enter_room(sid, room, namespace=namespace)
+        if self._clustered and room.startswith(FANOUT_ROOM_PREFIXES):
+            if self._heartbeat is None:
+                self._heartbeat = asyncio.create_task(self._presence_loop(), name="socketio-presence")
+            if first:
+                try:
+                    await self._publish_presence(room)
+                except Exception as e:
+                    logger.debug(f"socket fanout: presence publish failed for {room}: {e}")
+
+    async def has_subscribers(self, room: str) -> bool:
+        """True when some socket in the cluster is in room (errs towards True)."""
+        if self.local_count(room):
+            return True
+        if not self._clustered:
+            return False
+        cached = self._presence_cache.get(room)
+        now = time.monotonic()
+        if cached and now - cached[0] < PRESENCE_CACHE_SECONDS:
+            return cached[1]
+        try:
+            counts = await self._get_redis().hvals(PRESENCE_KEY_PREFIX + room)
+            occupied = any(int(c) > 0 for c in counts)
+        except Exception:
+            return True
+        self._presence_cache[room] = (now, occupied)
+        return occupied
+
+    # ----- coalesced emits ------------------------------------------------
+
+    async def emit(self, event, data=None, to=None, room=None, skip_sid=None, namespace=None,
+                   callback=None, ignore_queue=False):
+        target = to or room
+        if (
+            not isinstance(target, str)
+            or skip_sid is not None
+            or callback is not None
+            or ignore_queue
+            or namespace not in (None, "/")
+            or not target.startswith(FANOUT_ROOM_PREFIXES)
+        ):
+            return await super().emit(event, data, to=to, room=room, skip_sid=skip_sid, namespace=namespace,
+                                      callback=callback, ignore_queue=ignore_queue)
+
+        if self.coalesce_seconds <= 0:
+            await self._emit_now(target, [(event, data)])
+            return
+
+        self._seq += 1
+        buffer = self._pending.setdefault(target, OrderedDict())
+        key = coalesce_key(event, data, self._seq)
+        previous = buffer.pop(key, None)
+        if previous is not None:
+            self.stats["coalesced"] += 1
+            if isinstance(previous[1], dict) and isinstance(data, dict):
+                data = {**previous[1], **data}
+        # Re-inserted at the end: the merged event keeps its latest position
+        buffer[key] = (event, data)
+        if target not in self._flush_tasks:
+            self._flush_tasks[target] = asyncio.create_task(self._flush_later(target), name="socketio-flush")
+
+    async def _flush_later(self, room: str) -> None:
+        await asyncio.sleep(self.coalesce_seconds)
+        self._flush_tasks.pop(room, None)
+        await self._flush(room)
+
+    async def _flush(self, room: str) -> None:
+        events = list(self._pending.pop(room, {}).values())
+        if events:
+            try:
+                await self._emit_now(room, events)
+            except Exception as e:
+                logger.error(f"socket fanout: flush to {room} failed: {e}")
+
+    async def _emit_now(self, room: str, events) -> None:
+        if not await self.has_subscribers(room):
+            self.stats["skipped_empty"] += len(events)
+            return
+        self.stats["emitted"] += len(events)
+        if len(events) == 1:
+            event, data = events[0]
+            await super().emit(event, data, room=room)
+        else:
+            self.stats["batches"] += 1
+            await super().emit(BATCH_EVENT, {"events": [[event, data] for event, data in events]}, room=room)
+
+    async def flush_all(self) -> None:
+        """Emit everything still buffered (shutdown)."""
+        tasks = list(self._flush_tasks.values())
+        self._flush_tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for room in list(self._pending):
+            await self._flush(room)
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
@@ -611,6 +611,8 @@ async def _enqueue_to_buffer(
         current_ttl = await r.ttl(timer_key)
         if current_ttl < MIN_REMAINING_TTL or current_ttl < ttl:
             await r.setex(timer_key, ttl, "1")
+            from services.debounce_scheduler import get_debounce_scheduler
+            await get_debounce_scheduler().schedule(r, timer_key, ttl)
 
         lock_set = await r.set(lock_key, "1", ex=60, nx=True)
         if lock_set:
@@ -643,11 +645,8 @@ async def _telegram_buffer_consumer(
 
     try:
         # Debounce: wait until timer expires (silence window)
-        while True:
-            ttl = await r.ttl(timer_key)
-            if ttl <= 0:
-                break
-            await asyncio.sleep(min(ttl, 2))
+        from services.debounce_scheduler import get_debounce_scheduler
+        await get_debounce_scheduler().wait_until_due(r, timer_key)
 
         # Drain buffer
         messages = await r.lrange(buffer_key, 0, -1)
@@ -0,0 +1,422 @@
+"""
+Tenant prompt-context cache.
+
+Every patient turn in process_buffer_task needs the same tenant-level data to
+build the system prompt: the tenant row, FAQs, insurance providers, treatment
+types, derivation rules, operational rules and the lead professional. That data
+only changes when an admin edits it, so it is loaded once and shared.
+
+Two layers:
+- L1: in-process dict tenant_id -> (version, expires_at, TenantPromptContext)
+- L2: Redis JSON payload `tenant_prompt_ctx:{tenant_id}:{version}` (TTL 15 min)
+
+The version lives in Redis at `tenant_prompt_ctx_ver:{tenant_id}` and is bumped
+by invalidate_tenant_prompt_context() from the admin write routes. A read costs
+one Redis GET when L1 is warm; a version bump makes every process reload.
+Fallback: if Redis is unavailable, L1 is used with its local TTL and misses go
+straight to Postgres. Failures never block the turn.
+"""
+
+import json
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "tenant_prompt_ctx"
+REDIS_VERSION_PREFIX = "tenant_prompt_ctx_ver"
+REDIS_TTL_SECONDS = 900  # 15 minutes — version bumps make stale payloads unreachable
+LOCAL_TTL_SECONDS = 300  # 5 minutes — backstop for writes outside the admin routes
+_MAX_TENANTS = 500
+
+# Tables the context is built from; writers of these call invalidate_tenant_prompt_context().
+PROMPT_SOURCE_TABLES = frozenset({
+    "tenants",
+    "professionals",
+    "clinic_faqs",
+    "tenant_insurance_providers",
+    "treatment_types",
+    "professional_derivation_rules",
+    "clinic_operational_rules",
+})
+
+# tenant_id -> (version, expires_at_monotonic, context)
+_CACHE: Dict[int, Tuple[int, float, "TenantPromptContext"]] = {}
+
+
+@dataclass(frozen=True)
+class TenantPromptContext:
+    """Tenant-level inputs for build_system_prompt. Shared across turns: read-only."""
+
+    tenant_row: Optional[Dict[str, Any]]
+    system_prompt_template: str = ""
+    special_conditions_block: str = ""
+    support_policy_block: str = ""
+    lead_professional_name: str = ""
+    faqs: List[Dict[str, Any]] = field(default_factory=list)
+    insurance_providers: List[Dict[str, Any]] = field(default_factory=list)
+    treatment_types_list: List[Dict[str, Any]] = field(default_factory=list)
+    derivation_rules: List[Dict[str, Any]] = field(default_factory=list)
+    operational_rules: List[Dict[str, Any]] = field(default_factory=list)
+
+    def render_operational_rules_block(self, now: Optional[datetime] = None) -> str:
+        """Render the operational rules that are in force at `now`.
+
+        The validity window is evaluated here (not in SQL) so a cached context
+        never serves a rule that expired after it was loaded.
+        """
+        now = now or datetime.now(timezone.utc)
+        active = [
+            r
+            for r in self.operational_rules
+            if (r.get("valid_from") is None or r["valid_from"] <= now)
+            and (r.get("valid_until") is None or r["valid_until"] >= now)
+        ]
+        if not active:
+            return ""
+        parts = ["⚠️ REGLAS OPERATIVAS VIGENTES (deben aplicarse SIEMPRE):"]
+        for opr in active:
+            until = (
+                f" (vigente hasta {opr['valid_until'].strftime('%d/%m/%Y')})"
+                if opr.get("valid_until")
+                else ""
+            )
+            parts.append(f"[{opr['rule_type'].upper()}] {opr['rule_name']}{until}:")
+            parts.append(opr["prompt_injection"])
+            parts.append("")
+        return "\n".join(parts)
+
+
+# ---------------------------------------------------------------------------
+# Serialization (lossless for the types asyncpg returns here)
+# ---------------------------------------------------------------------------
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return {"__decimal__": str(value)}
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _json_object_hook(obj: Dict[str, Any]) -> Any:
+    if len(obj) == 1:
+        if "__decimal__" in obj:
+            return Decimal(obj["__decimal__"])
+        if "__datetime__" in obj:
+            return datetime.fromisoformat(obj["__datetime__"])
+        if "__date__" in obj:
+            return date.fromisoformat(obj["__date__"])
+    return obj
+
+
+def _dumps(ctx: TenantPromptContext) -> str:
+    return json.dumps(ctx.__dict__, default=_json_default, ensure_ascii=False)
+
+
+def _loads(raw: str) -> TenantPromptContext:
+    return TenantPromptContext(**json.loads(raw, object_hook=_json_object_hook))
+
+
+# ---------------------------------------------------------------------------
+# DB loader
+# ---------------------------------------------------------------------------
+
+
+def _normalize_specialty_pitch(template: str) -> str:
+    """Collapse hard-wrapped lines of the tenant greeting/specialty pitch.
+
+    The UI textarea may save it with hard line-breaks and leading spaces, which
+    then leak into the WhatsApp/IG/FB message as visible indented broken lines.
+    Single newlines become spaces; double newlines stay as paragraph breaks.
+    """
+    if not template:
+        return ""
+    _clean_paragraphs = []
+    for _p in re.split(r"\n\s*\n", template):
+        _flat = " ".join(line.strip() for line in _p.splitlines() if line.strip())
+        _flat = re.sub(r"[ \t]{2,}", " ", _flat).strip()
+        if _flat:
+            _clean_paragraphs.append(_flat)
+    return "\n\n".join(_clean_paragraphs)
+
+
+async def load_tenant_prompt_context(pool, tenant_id: int) -> TenantPromptContext:
+    """Load the tenant prompt context straight from Postgres (no cache)."""
+    row = await pool.fetchrow(
+        """SELECT clinic_name, address, google_maps_url, working_hours,
+                  consultation_price, bank_cbu, bank_alias, bank_holder_name,
+                  system_prompt_template, bot_name,
+                  payment_methods, financing_available, max_installments,
+                  installments_interest_free, financing_provider, financing_notes,
+                  cash_discount_percent, accepts_crypto,
+                  accepts_pregnant_patients, pregnancy_restricted_treatments,
+                  pregnancy_notes, accepts_pediatric, min_pediatric_age_years,
+                  pediatric_notes, high_risk_protocols, requires_anamnesis_before_booking,
+                  complaint_escalation_email, complaint_escalation_phone,
+                  expected_wait_time_minutes, revision_policy, review_platforms,
+                  complaint_handling_protocol, auto_send_review_link_after_followup,
+                  social_ig_active, social_landings, instagram_handle, facebook_page_id,
+                  bot_phone_number, config
+           FROM tenants WHERE id = $1""",
+        tenant_id,
+    )
+    tenant_row = dict(row) if row else None
+
+    # Active treatment types: treatment_display_map for _format_insurance_providers
+    # and the friendly-name map for _format_special_conditions (one query for both).
+    treatment_types_list = []
+    try:
+        tt_rows = await pool.fetch(
+            """
+            SELECT code, name, patient_display_name, consultation_requirements
+            FROM treatment_types
+            WHERE tenant_id = $1 AND is_active = true
+            ORDER BY name
+            """,
+            tenant_id,
+        )
+        treatment_types_list = [dict(r) for r in tt_rows] if tt_rows else []
+    except Exception as tt_err:
+        logger.debug(f"Treatment types fetch (non-fatal): {tt_err}")
+
+    # --- Clinic special conditions (migración 036) ---
+    special_conditions_block = ""
+    try:
+        if tenant_row:
+            treatment_name_map = {
+                r["code"]: (
+                    r["patient_display_name"]
+                    if r.get("patient_display_name") is not None
+                    else r["name"]
+                )
+                for r in treatment_types_list
+            }
+
+            from main import _format_special_conditions
+
+            special_conditions_block = _format_special_conditions(
+                dict(tenant_row),
+                treatment_name_map=treatment_name_map,
+            )
+    except Exception as _sc_err:
+        logger.debug(f"_format_special_conditions skipped (non-fatal): {_sc_err}")
+        special_conditions_block = ""
+
+    # --- Clinic support / complaints / review config (migration 039) ---
+    support_policy_block = ""
+    try:
+        if tenant_row:
+            from main import _format_support_policy
+
+            support_policy_block = _format_support_policy(dict(tenant_row))
+    except Exception as _sp_err:
+        logger.debug(f"_format_support_policy skipped (non-fatal): {_sp_err}")
+        support_policy_block = ""
+
+    system_prompt_template = _normalize_specialty_pitch(
+        (tenant_row.get("system_prompt_template") or "") if tenant_row else ""
+    )
+
+    # Resolve lead professional name for prompt positioning
+    lead_professional_name = ""
+    try:
+        prof_row = await pool.fetchrow(
+            "SELECT first_name, last_name FROM professionals WHERE tenant_id = $1 AND is_active = true ORDER BY id ASC LIMIT 1",
+            tenant_id,
+        )
+        if prof_row:
+            lead_professional_name = f"{prof_row['first_name']} {prof_row.get('last_name', '') or ''}".strip()
+    except Exception:
+        pass
+
+    # Fetch FAQs for this tenant (no limit — RAG will select relevant ones)
+    faq_rows = await pool.fetch(
+        "SELECT category, question, answer FROM clinic_faqs WHERE tenant_id = $1 ORDER BY sort_order ASC, id ASC",
+        tenant_id,
+    )
+    faqs = [dict(r) for r in faq_rows] if faq_rows else []
+
+    # Fetch insurance providers for this tenant (migration 034 shape)
+    insurance_providers = []
+    try:
+        ins_rows = await pool.fetch(
+            """
+            SELECT id, provider_name, status, coverage_by_treatment, is_prepaid,
+                   employee_discount_percent, default_copay_percent, external_target,
+                   requires_copay, copay_notes, ai_response_template,
+                   scheduling_mode, scheduling_delay_days
+            FROM tenant_insurance_providers
+            WHERE tenant_id = $1 AND is_active = true
+            ORDER BY sort_order, provider_name
+            """,
+            tenant_id,
+        )
+        for r in ins_rows or []:
+            d = dict(r)
+            # asyncpg may return JSONB as a string in some versions
+            if isinstance(d.get("coverage_by_treatment"), str):
+                try:
+                    d["coverage_by_treatment"] = json.loads(d["coverage_by_treatment"])
+                except (ValueError, TypeError):
+                    d["coverage_by_treatment"] = {}
+            insurance_providers.append(d)
+    except Exception as ins_err:
+        logger.debug(f"Insurance providers fetch (non-fatal): {ins_err}")
+
+    # Derivation rules (migration 038: includes escalation fallback fields and
+    # fallback_professional_name so the formatter can render the full block).
+    derivation_rules = []
+    try:
+        der_rows = await pool.fetch(
+            """
+            SELECT dr.id, dr.rule_name, dr.patient_condition, dr.treatment_categories,
+                   dr.target_type, dr.target_professional_id, dr.priority_order,
+                   dr.enable_escalation, dr.fallback_professional_id,
+                   dr.fallback_team_mode, dr.max_wait_days_before_escalation,
+                   dr.escalation_message_template,
+                   p.first_name AS target_professional_name,
+                   fp.first_name AS fallback_professional_name
+            FROM professional_derivation_rules dr
+            LEFT JOIN professionals p ON dr.target_professional_id = p.id
+            LEFT JOIN professionals fp ON dr.fallback_professional_id = fp.id
+            WHERE dr.tenant_id = $1 AND dr.is_active = true
+            ORDER BY dr.priority_order ASC, dr.id ASC
+            """,
+            tenant_id,
+        )
+        derivation_rules = [dict(r) for r in der_rows] if der_rows else []
+    except Exception as der_err:
+        logger.debug(f"Derivation rules fetch (non-fatal): {der_err}")
+
+    # Operational rules (temporary/strategic). The validity window is applied at
+    # render time, so rules that start or expire later are loaded too.
+    operational_rules = []
+    try:
+        op_rows = await pool.fetch(
+            """SELECT rule_name, rule_type, prompt_injection, valid_from, valid_until
+               FROM clinic_operational_rules
+               WHERE tenant_id = $1 AND is_active = true
+                 AND (valid_until IS NULL OR valid_until >= NOW())
+                 AND ('all' = ANY(applies_to) OR 'tora' = ANY(applies_to))
+               ORDER BY priority_order ASC, id ASC""",
+            tenant_id,
+        )
+        operational_rules = [dict(r) for r in op_rows] if op_rows else []
+    except Exception as op_err:
+        logger.debug(f"Operational rules fetch (non-fatal): {op_err}")
+
+    return TenantPromptContext(
+        tenant_row=tenant_row,
+        system_prompt_template=system_prompt_template,
+        special_conditions_block=special_conditions_block,
+        support_policy_block=support_policy_block,
+        lead_professional_name=lead_professional_name,
+        faqs=faqs,
+        insurance_providers=insurance_providers,
+        treatment_types_list=treatment_types_list,
+        derivation_rules=derivation_rules,
+        operational_rules=operational_rules,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Cache API
+# ---------------------------------------------------------------------------
+
+
+def _get_redis():
+    try:
+        from services.relay import get_redis
+
+        return get_redis()
+    except Exception:
+        return None
+
+
+def _evict_stale() -> None:
+    now = time.monotonic()
+    for tid in [tid for tid, (_, exp, _) in _CACHE.items() if exp < now]:
+        _CACHE.pop(tid, None)
+    while len(_CACHE) >= _MAX_TENANTS:
+        _CACHE.pop(next(iter(_CACHE)), None)
+
+
+async def get_tenant_prompt_context(pool, tenant_id: int) -> TenantPromptContext:
+    """Return the tenant prompt context, from L1, L2 (Redis) or Postgres."""
+    now = time.monotonic()
+    cached = _CACHE.get(tenant_id)
+
+    r = _get_redis()
+    version: Optional[int] = None
+    if r is not None:
+        try:
+            raw_version = await r.get(f"{REDIS_VERSION_PREFIX}:{tenant_id}")
+            version = int(raw_version) if raw_version else 0
+        except Exception as e:
+            logger.debug(f"[tenant_prompt_cache] version read failed: {e}")
+
+    if cached and cached[1] > now and (version is None or cached[0] == version):
+        return cached[2]
+
+    ctx: Optional[TenantPromptContext] = None
+    if version is not None:
+        try:
+            raw = await r.get(f"{REDIS_KEY_PREFIX}:{tenant_id}:{version}")
+            if raw:
+                ctx = _loads(raw)
+        except Exception as e:
+            logger.debug(f"[tenant_prompt_cache] payload read failed: {e}")
+
+    if ctx is None:
+        ctx = await load_tenant_prompt_context(pool, tenant_id)
+        if ctx.tenant_row is None:
+            # Unknown tenant — don't pin the miss in any cache layer.
+            return ctx
+        if version is not None:
+            try:
+                await r.setex(
+                    f"{REDIS_KEY_PREFIX}:{tenant_id}:{version}",
+                    REDIS_TTL_SECONDS,
+                    _dumps(ctx),
+                )
+            except Exception as e:
+                logger.debug(f"[tenant_prompt_cache] payload write failed: {e}")
+
+    if tenant_id not in _CACHE and len(_CACHE) >= _MAX_TENANTS:
+        _evict_stale()
+    _CACHE[tenant_id] = (version or 0, now + LOCAL_TTL_SECONDS, ctx)
+    return ctx
+
+
+async def invalidate_tenant_prompt_context(tenant_id: int) -> None:
+    """Drop the cached context for a tenant in this and every other process.
+
+    Called by the admin routes, the Nova tools (via _nova_emit), the Nova
+    onboarding routes, the profile update in auth_routes and backup restore
+    after writing FAQs, treatments, insurance, derivation/operational rules,
+    professionals or tenant settings.
+    """
+    _CACHE.pop(tenant_id, None)
+    r = _get_redis()
+    if r is None:
+        return
+    try:
+        await r.incr(f"{REDIS_VERSION_PREFIX}:{tenant_id}")
+    except Exception as e:
+        logger.warning(f"[tenant_prompt_cache] invalidation failed for tenant {tenant_id}: {e}")
+
+
+def clear_tenant_prompt_cache() -> None:
+    """Clear the in-process layer (tests / admin tooling)."""
+    _CACHE.clear()
@@ -0,0 +1,298 @@
+"""
+Durable inbound webhook queue (Redis Stream + consumer group).
+
+The YCloud, Chatwoot and Meta webhooks used to do tenant resolution, dedupe
+inserts, conversation upserts, patient linking, Socket.IO emits and media
+downloads before answering the provider. Under load the ack got slow, the
+provider retried and every retry added more of the same work.
+
+Now a webhook authenticates, parses the JSON, calls enqueue() (one XADD to
+`webhooks:inbound`) and answers. Every orchestrator process runs
+WEBHOOK_WORKERS consumers in the `webhook-workers` group; a consumer reads
+an entry, runs the handler registered for its kind (the same code the route
+ran inline, e.g. chat_webhooks.process_ycloud_payload) and XACKs it.
+
+- A failed entry is not acked: it stays pending and the reclaim loop
+  re-delivers it (XCLAIM) once it has been idle for CLAIM_IDLE_MS, so the
+  idle time doubles as retry backoff and entries of a crashed process are
+  picked up by the others.
+- After MAX_DELIVERIES attempts the entry is copied to `webhooks:dead`
+  with the last error and acked.
+- Handlers must tolerate re-delivery; inbound messages already dedupe on
+  the provider message id (db.try_insert_inbound). A handler result with
+  "failed" > 0 (messages whose dedupe row the pipeline released) counts
+  as a failure, taking over the retry the provider used to do.
+- Entries of the same conversation may be handled by different consumers;
+  the message buffer downstream serialises the agent per conversation.
+
+When Redis is unavailable enqueue() returns None and the route processes the
+payload inline as before. get_webhook_queue_stats() (and /health/webhooks)
+reports the group lag, pending and dead-letter counts and the
+enqueue-to-done latency.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = "webhooks:inbound"
+DEAD_LETTER_KEY = "webhooks:dead"
+GROUP = "webhook-workers"
+# Approximate cap (XADD MAXLEN ~): acked entries are only kept for inspection.
+STREAM_MAXLEN = 100_000
+DEAD_LETTER_MAXLEN = 10_000
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+QUEUE_ENABLED = os.getenv("WEBHOOK_QUEUE_ENABLED", "true").lower() != "false"
+READ_COUNT = 10
+BLOCK_MS = 5000
+MAX_DELIVERIES = 5
+CLAIM_IDLE_MS = 30_000
+CLAIM_INTERVAL_SECONDS = 10.0
+CLAIM_BATCH = 50
+LATENCY_WINDOW = 512
+
+# kind -> async handler(tenant_id, payload, background_tasks)
+Handler = Callable[[Optional[int], Any, Any], Awaitable[Any]]
+_HANDLERS: Dict[str, Handler] = {}
+
+_tasks: List[asyncio.Task] = []
+_started = False
+_consumer_prefix = f"{socket.gethostname()}-{os.getpid()}"
+_stats: Dict[str, int] = {"enqueued": 0, "processed": 0, "failed": 0, "reclaimed": 0, "dead_lettered": 0}
+_latencies_ms: deque = deque(maxlen=LATENCY_WINDOW)
+
+
+def register_handler(kind: str, handler: Handler) -> None:
+    """Register the coroutine that processes entries of `kind` (called by the route modules)."""
+    _HANDLERS[kind] = handler
+
+
+def _redis():
+    from services.relay import get_redis
+
+    return get_redis()
+
+
+async def enqueue(kind: str, tenant_id: Optional[int], payload: Any) -> Optional[str]:
+    """Append a webhook payload to the stream. Returns the entry id, or None if the caller must process inline."""
+    if not QUEUE_ENABLED or not _started:
+        # Queue not started in this process (tests, scripts).
+        return None
+    r = _redis()
+    if r is None:
+        return None
+    try:
+        entry_id = await r.xadd(
+            STREAM_KEY,
+            {
+                "kind": kind,
+                "tenant_id": "" if tenant_id is None else str(tenant_id),
+                "payload": json.dumps(payload, default=str),
+                "received_at": str(int(time.time() * 1000)),
+            },
+            maxlen=STREAM_MAXLEN,
+            approximate=True,
+        )
+    except Exception as e:
+        logger.warning(f"webhook queue: XADD failed, processing {kind} inline: {e}")
+        return None
+    _stats["enqueued"] += 1
+    return entry_id
+
+
+async def _ensure_group(r) -> None:
+    try:
+        await r.xgroup_create(STREAM_KEY, GROUP, id="0", mkstream=True)
+    except Exception as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+async def _handle(r, entry_id: str, fields: Dict[str, str]) -> bool:
+    """Run the handler for one entry and XACK it on success. Returns False when it must be retried."""
+    from starlette.background import BackgroundTasks
+
+    kind = fields.get("kind", "")
+    handler = _HANDLERS.get(kind)
+    if handler is None:
+        logger.error(f"webhook queue: no handler for kind={kind!r}, entry {entry_id} dead-lettered")
+        await _dead_letter(r, entry_id, fields, "no handler")
+        return True
+
+    tenant_id = int(fields["tenant_id"]) if fields.get("tenant_id") else None
+    try:
+        payload = json.loads(fields.get("payload") or "null")
+        tasks = BackgroundTasks()
+        result = await handler(tenant_id, payload, tasks)
+        # Same post-response tasks the route would have run (buffer enqueue, media, ...)
+        await tasks()
+        # The pipeline swallows per-message errors but releases their dedupe row:
+        # re-deliver so those messages are retried (the others dedupe as done).
+        if isinstance(result, dict) and result.get("failed"):
+            raise RuntimeError(f"{result['failed']} message(s) failed")
+    except Exception as e:
+        _stats["failed"] += 1
+        logger.warning(f"webhook queue: {kind} entry {entry_id} failed (will retry): {e}", exc_info=True)
+        try:
+            await r.hset(f"{DEAD_LETTER_KEY}:errors", entry_id, str(e)[:500])
+            await r.expire(f"{DEAD_LETTER_KEY}:errors", 86400)
+        except Exception:
+            pass
+        return False
+
+    await r.xack(STREAM_KEY, GROUP, entry_id)
+    _stats["processed"] += 1
+    try:
+        _latencies_ms.append(time.time() * 1000 - int(fields.get("received_at") or 0))
+    except ValueError:
+        pass
+    return True
+
+
+async def _dead_letter(r, entry_id: str, fields: Dict[str, str], error: str) -> None:
+    await r.xadd(
+        DEAD_LETTER_KEY,
+        {**fields, "source_id": entry_id, "error": error[:500], "dead_at": str(int(time.time() * 1000))},
+        maxlen=DEAD_LETTER_MAXLEN,
+        approximate=True,
+    )
+    await r.xack(STREAM_KEY, GROUP, entry_id)
+    await r.hdel(f"{DEAD_LETTER_KEY}:errors", entry_id)
+    _stats["dead_lettered"] += 1
+
+
+async def _consume(consumer: str) -> None:
+    """One consumer: read new entries for this group and handle them in order."""
+    r = _redis()
+    while True:
+        try:
+            response = await r.xreadgroup(GROUP, consumer, {STREAM_KEY: ">"}, count=READ_COUNT, block=BLOCK_MS)
+            for _stream, entries in response or []:
+                for entry_id, fields in entries:
+                    await _handle(r, entry_id, fields)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if "NOGROUP" in str(e):
+                await _ensure_group(r)
+                continue
+            logger.error(f"webhook queue: consumer {consumer} error: {e}")
+            await asyncio.sleep(1.0)
+
+
+async def _reclaim_once(r, consumer: str) -> int:
+    """One reclaim pass. Returns how many entries were re-delivered or dead-lettered."""
+    pending = await r.xpending_range(STREAM_KEY, GROUP, min="-", max="+", count=CLAIM_BATCH, idle=CLAIM_IDLE_MS)
+    if not pending:
+        return 0
+
+    retry_ids = []
+    for p in pending:
+        entry_id = p["message_id"]
+        if p["times_delivered"] < MAX_DELIVERIES:
+            retry_ids.append(entry_id)
+            continue
+        rows = await r.xrange(STREAM_KEY, min=entry_id, max=entry_id)
+        error = await r.hget(f"{DEAD_LETTER_KEY}:errors", entry_id) or "max deliveries"
+        if rows:
+            await _dead_letter(r, entry_id, rows[0][1], error)
+        else:
+            await r.xack(STREAM_KEY, GROUP, entry_id)  # trimmed away
+        logger.error(f"webhook queue: entry {entry_id} dead-lettered after {p['times_delivered']} attempts: {error}")
+
+    if retry_ids:
+        # XCLAIM re-checks the idle time, so two replicas never claim the same entry
+        claimed = await r.xclaim(STREAM_KEY, GROUP, consumer, CLAIM_IDLE_MS, retry_ids)
+        for entry_id, fields in claimed:
+            if fields is None:
+                continue
+            _stats["reclaimed"] += 1
+            await _handle(r, entry_id, fields)
+    return len(pending)
+
+
+async def _reclaim(consumer: str) -> None:
+    """Re-deliver entries left pending (failed or owned by a dead consumer); dead-letter exhausted ones."""
+    r = _redis()
+    while True:
+        try:
+            await asyncio.sleep(CLAIM_INTERVAL_SECONDS)
+            await _reclaim_once(r, consumer)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"webhook queue: reclaim error: {e}")
+
+
+async def start_webhook_workers(workers: int = WEBHOOK_WORKERS) -> int:
+    """
+    Create the consumer group and start this process's consumers; from then
+    on the webhooks enqueue. workers=0 makes an ingest-only replica (other
+    replicas consume). Returns how many consumers were started.
+    """
+    global _started
+    if not QUEUE_ENABLED or _started:
+        return max(len(_tasks) - 1, 0)
+    r = _redis()
+    if r is None:
+        return 0
+    await _ensure_group(r)
+    _started = True
+    if workers <= 0:
+        logger.info("webhook queue: ingest only (WEBHOOK_WORKERS=0)")
+        return 0
+    for i in range(workers):
+        consumer = f"{_consumer_prefix}-{i}"
+        _tasks.append(asyncio.create_task(_consume(consumer), name=f"webhook-consumer-{i}"))
+    _tasks.append(asyncio.create_task(_reclaim(f"{_consumer_prefix}-reclaim"), name="webhook-reclaim"))
+    logger.info(f"webhook queue: {workers} consumers started ({_consumer_prefix})")
+    return workers
+
+
+async def stop_webhook_workers() -> None:
+    """Cancel this process's consumers. In-flight entries stay pending and are reclaimed elsewhere."""
+    global _started
+    _started = False
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+
+
+async def get_webhook_queue_stats() -> Dict[str, Any]:
+    """Group lag/pending, dead-letter size and this process's counters and latency."""
+    ordered = sorted(_latencies_ms)
+
+    def pct(p: float) -> Optional[float]:
+        if not ordered:
+            return None
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 1)
+
+    stats: Dict[str, Any] = {
+        "enabled": QUEUE_ENABLED and _started,
+        "consumers_local": max(len(_tasks) - 1, 0),
+        **_stats,
+        "latency_p50_ms": pct(0.50),
+        "latency_p95_ms": pct(0.95),
+    }
+    r = _redis()
+    if r is None:
+        return stats
+    try:
+        for group in await r.xinfo_groups(STREAM_KEY):
+            if group.get("name") == GROUP:
+                stats["lag"] = group.get("lag")
+                stats["pending"] = group.get("pending")
+                stats["consumers"] = group.get("consumers")
+        stats["stream_length"] = await r.xlen(STREAM_KEY)
+        stats["dead_letter_length"] = await r.xlen(DEAD_LETTER_KEY)
+    except Exception as e:
+        stats["error"] = str(e)[:200]
+    return stats
@@ -1,10 +1,11 @@
 import os
-import httpx
 import logging
 from typing import Optional
 from db import db
 import json
 
+from services.http_clients import get_http_client
+
 logger = logging.getLogger(__name__)
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -52,12 +53,12 @@ async def transcribe_audio_url(url: str, tenant_id: int, conversation_id: str, e
             ycloud_key = os.getenv("YCLOUD_API_KEY")
             if ycloud_key and "ycloud" in url.lower():
                 headers["X-API-Key"] = ycloud_key
-            async with httpx.AsyncClient(timeout=30.0, headers=headers) as client:
-                resp = await client.get(url)
-                if resp.status_code != 200:
-                    logger.error(f"❌ Failed to download audio from {url}: {resp.status_code}")
-                    return
-                audio_data = resp.content
+            client = get_http_client("media")
+            resp = await client.get(url, headers=headers, timeout=30.0)
+            if resp.status_code != 200:
+                logger.error(f"❌ Failed to download audio from {url}: {resp.status_code}")
+                return
+            audio_data = resp.content
 
         if not audio_data or len(audio_data) == 0:
             logger.warning(f"⚠️ Audio data is empty for {url}")
@@ -71,22 +72,23 @@ async def transcribe_audio_url(url: str, tenant_id: int, conversation_id: str, e
         files = {"file": (filename, audio_data)}
         headers = {"Authorization": f"Bearer {OPENAI_API_KEY}"}
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            whisper_resp = await client.post(
-                "https://api.openai.com/v1/audio/transcriptions",
-                headers=headers,
-                data={"model": "whisper-1"},
-                files=files
-            )
-
-            if whisper_resp.status_code != 200:
-                logger.error(f"❌ Whisper API error: {whisper_resp.text}")
-                return
+        client = get_http_client("openai")
+        whisper_resp = await client.post(
+            "https://api.openai.com/v1/audio/transcriptions",
+            headers=headers,
+            data={"model": "whisper-1"},
+            files=files,
+            timeout=60.0,
+        )
+
+        if whisper_resp.status_code != 200:
+            logger.error(f"❌ Whisper API error: {whisper_resp.text}")
+            return
 
-            transcription = whisper_resp.json().get("text", "")
-            if not transcription:
-                logger.warning("⚠️ Transcription resulted in empty string.")
-                return
+        transcription = whisper_resp.json().get("text", "")
+        if not transcription:
+            logger.warning("⚠️ Transcription resulted in empty string.")
+            return
 
         logger.info(f"🎙️ Transcription successful: '{transcription[:80]}...'")
 
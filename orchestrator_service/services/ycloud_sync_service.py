@@ -2,12 +2,22 @@
 YCloud Full Message Sync Service.
 
 Implements background sync of WhatsApp messages from YCloud API:
-- Cursor-based pagination (100 msgs/page, max 10k)
+- Cursor-based pagination (100 msgs/page), weekly date ranges backwards
 - Rate limiting with exponential backoff
 - Redis progress tracking
-- Media download to filesystem
 - Messages stored in whatsapp_messages table
 - Also creates chat_conversations + chat_messages for UI display
+
+Staged pipeline (initial imports of years of history used to take hours
+with one INSERT + conversation upsert + inline media download per message):
+1. Fetch: the next FETCH_AHEAD_WEEKS weeks are fetched concurrently while
+   the current one is persisted.
+2. Persist: each page is COPY'd into a temp stage table and merged
+   set-based (whatsapp_messages, new conversations, chat_messages and one
+   conversation refresh per phone); contact names are resolved once per
+   page.
+3. Media: downloads go to a bounded queue drained by MEDIA_WORKERS; the
+   resulting media_url values are written back in batches.
 """
 
 import asyncio
@@ -16,9 +26,10 @@ import logging
 import os
 import time
 import uuid
-from datetime import datetime, timezone
+from collections import deque
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from ycloud_client import YCloudClient, RateLimitError, MediaSizeError
 
@@ -32,6 +43,10 @@ INITIAL_BACKOFF = 1
 MAX_BACKOFF = 60
 LOCK_TTL_SECONDS = 1800  # 30 min
 PROGRESS_TTL_SECONDS = 35 * 60  # 35 min
+FETCH_AHEAD_WEEKS = 3
+MEDIA_WORKERS = 4
+MEDIA_QUEUE_SIZE = 200
+CONTACT_LOOKUP_CONCURRENCY = 5
 
 
 # ── Phone normalization ──────────────────────────────────────────────────
@@ -152,15 +167,16 @@ def _get_media_path(tenant_id: int, message_id: str, extension: str) -> Path:
 
 async def _download_and_save_media(
     client: YCloudClient, tenant_id: int, message: dict, message_db_id: int
-) -> bool:
+) -> Optional[Path]:
+    """Download one media file; returns the saved path (its extension follows the MIME type) or None."""
     media_id = message.get("mediaId") or message.get("media_id")
     if not media_id:
-        return False
+        return None
     try:
         media_info = await client.get_media_url(media_id)
         url = media_info.get("url")
         if not url:
-            return False
+            return None
         mime_type = media_info.get("mime_type", "application/octet-stream")
         ext_map = {
             "image/jpeg": "jpg", "image/png": "png", "image/webp": "webp",
@@ -172,13 +188,13 @@ async def _download_and_save_media(
         media_path = _get_media_path(tenant_id, str(message_db_id), extension)
         media_path.write_bytes(content)
         logger.info(f"Downloaded media for message {message_db_id}: {media_path.name}")
-        return True
+        return media_path
     except MediaSizeError as e:
         logger.warning(f"Media too large for message {message_db_id}: {e}")
-        return False
+        return None
     except Exception as e:
         logger.error(f"Failed to download media for message {message_db_id}: {e}")
-        return False
+        return None
 
 
 # ── Parse YCloud message ─────────────────────────────────────────────────
@@ -315,17 +331,21 @@ async def start_sync(
 
 
 async def _run_sync(pool, client: YCloudClient, tenant_id: int, task_id: str, business_number: str = "") -> None:
-    """Run the actual sync process using asyncpg pool."""
-    cursor = None
+    """Run the sync pipeline: weeks fetched ahead → one COPY + merge per page → media worker queue."""
     total_fetched = 0
     total_saved = 0
-    total_media = 0
+    media = {"downloaded": 0}
     errors = []
     seen_ids: set = set()  # Track message IDs to detect pagination loops
     seen_phones: set = set()  # Track unique conversation phones
     week_log: list = []  # Visual log for UI
     started_at = datetime.now(timezone.utc)
 
+    media_queue: asyncio.Queue = asyncio.Queue(maxsize=MEDIA_QUEUE_SIZE)
+    media_results: List[tuple] = []
+    media_workers: List[asyncio.Task] = []
+    week_tasks: deque = deque()
+
     try:
         logger.info(f"[ycloud_sync] Starting sync {task_id} for tenant {tenant_id}, configured biz={business_number}")
 
@@ -352,49 +372,32 @@ async def _run_sync(pool, client: YCloudClient, tenant_id: int, task_id: str, bu
 
         # Cache for WhatsApp profile names (phone → name)
         # Avoids calling get_contact_profile for the same number multiple times
-        contact_names_cache: dict[str, str] = {}
-
-        async def _get_wa_name(phone: str) -> str:
-            """Get WhatsApp profile name, cached."""
-            if phone in contact_names_cache:
-                return contact_names_cache[phone]
-            # First check DB patients
-            patient_row = await pool.fetchrow(
-                "SELECT first_name, last_name FROM patients WHERE tenant_id = $1 AND phone_number = $2 LIMIT 1",
-                tenant_id, phone,
-            )
-            if patient_row:
-                name = f"{patient_row['first_name'] or ''} {patient_row['last_name'] or ''}".strip()
-                if name:
-                    contact_names_cache[phone] = name
-                    return name
-            # Then try YCloud contact API
-            try:
-                wa_name = await client.get_contact_profile(phone.lstrip("+"))
-                if wa_name:
-                    logger.info(f"[ycloud_sync] Got WA name for {phone}: {wa_name}")
-                    contact_names_cache[phone] = wa_name
-                    return wa_name
-                else:
-                    # Log first failure to diagnose
-                    if len(contact_names_cache) < 3:
-                        logger.info(f"[ycloud_sync] No WA name from API for {phone}")
-            except Exception as e:
-                if len(contact_names_cache) < 3:
-                    logger.warning(f"[ycloud_sync] WA name API failed for {phone}: {e}")
-            contact_names_cache[phone] = ""
-            return ""
-
-        # Iterate by week ranges BACKWARDS (today → past) to get ALL messages
-        from datetime import timedelta as _td
-        week_end = datetime.now(timezone.utc) + _td(days=1)  # Tomorrow
-        oldest_date = datetime(2023, 1, 1, tzinfo=timezone.utc)  # Absolute minimum
-        week_number = 0
+        contact_names_cache: Dict[str, str] = {}
+
+        for _ in range(MEDIA_WORKERS):
+            media_workers.append(asyncio.create_task(
+                _media_worker(media_queue, client, tenant_id, media_results, media)
+            ))
+
+        # Iterate by week ranges BACKWARDS (today → past) to get ALL messages.
+        # Weeks are independent date ranges, so the next FETCH_AHEAD_WEEKS are
+        # fetched while the current one is being persisted.
+        weeks = _week_ranges(datetime.now(timezone.utc) + timedelta(days=1), datetime(2023, 1, 1, tzinfo=timezone.utc))
         empty_weeks_streak = 0  # Stop after 4 consecutive empty weeks
         MAX_EMPTY_WEEKS = 4
+        week_number = 0
 
-        while week_end > oldest_date and empty_weeks_streak < MAX_EMPTY_WEEKS:
-            week_start = week_end - _td(days=7)
+        def _schedule_weeks():
+            while len(week_tasks) < FETCH_AHEAD_WEEKS:
+                week = next(weeks, None)
+                if week is None:
+                    return
+                week_tasks.append((week, asyncio.create_task(_fetch_week(client, week[0], week[1]))))
+
+        _schedule_weeks()
+        while week_tasks and empty_weeks_streak < MAX_EMPTY_WEEKS:
+            (week_start, week_end), fetch_task = week_tasks.popleft()
+            _schedule_weeks()
             week_number += 1
             week_label = f"{week_start.strftime('%d/%m/%Y')} → {week_end.strftime('%d/%m/%Y')}"
 
@@ -404,121 +407,55 @@ async def _run_sync(pool, client: YCloudClient, tenant_id: int, task_id: str, bu
                 logger.info(f"[ycloud_sync] Sync {task_id} was cancelled")
                 break
 
-            # Fetch all pages for this week
-            cursor = None
-            week_new = 0
-            page_in_week = 0
+            pages, fetch_error = await fetch_task
+            if fetch_error:
+                errors.append(f"Fetch error week {week_number}: {fetch_error}")
 
-            while True:
-                try:
-                    result = await client.fetch_messages(
-                        cursor=cursor, limit=100,
-                        from_date=week_start.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
-                        to_date=week_end.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
-                    )
-                except RateLimitError as e:
-                    errors.append(f"Rate limit week {week_number}: {e}")
-                    logger.warning(f"[ycloud_sync] Rate limit on week {week_number}, waiting 60s")
-                    await asyncio.sleep(60)
-                    continue
-                except Exception as e:
-                    errors.append(f"Fetch error week {week_number}: {e}")
-                    logger.error(f"[ycloud_sync] Fetch error week {week_number}: {e}")
-                    break
-
-                messages = result.get("messages") or result.get("items") or []
-                if not messages:
-                    break
-
-                # Detect duplicates within this week's pages
-                page_ids = {m.get("id") for m in messages if m.get("id")}
-                overlap = page_ids & seen_ids
-                if overlap and len(overlap) > len(page_ids) * 0.8:
-                    break  # All duplicates, move to next week
-                seen_ids |= page_ids
-
-                new_count = len(page_ids - overlap)
+            week_new = 0
+            for messages in pages:
                 total_fetched += len(messages)
-                week_new += new_count
-                page_in_week += 1
-
-                # Process each message in this page
+                parsed = []
                 for msg in messages:
+                    ext_id = msg.get("id")
+                    if not ext_id or ext_id in seen_ids:
+                        continue
+                    seen_ids.add(ext_id)
                     try:
-                        msg_data = _parse_ycloud_message(msg, tenant_id, business_number)
-                        if not msg_data.get("external_id"):
-                            continue
-
-                        # Upsert into whatsapp_messages
-                        msg_db_id = await pool.fetchval("""
-                        INSERT INTO whatsapp_messages
-                        (tenant_id, external_id, wamid, from_number, to_number, direction,
-                         message_type, content, media_id, media_mime_type, media_filename,
-                         created_at, status)
-                        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13)
-                        ON CONFLICT (external_id) DO UPDATE SET
-                            content = EXCLUDED.content,
-                            synced_at = NOW()
-                        RETURNING id
-                        """,
-                            msg_data["tenant_id"], msg_data["external_id"], msg_data.get("wamid"),
-                            msg_data["from_number"], msg_data["to_number"], msg_data["direction"],
-                            msg_data["message_type"], msg_data.get("content"),
-                            msg_data.get("media_id"), msg_data.get("media_mime_type"),
-                            msg_data.get("media_filename"), msg_data["created_at"], msg_data["status"],
-                        )
-
-                        total_saved += 1
-
-                        # Upsert chat conversation + message for UI
-                        from_num = msg_data["from_number"]
-                        to_num = msg_data["to_number"]
-                        external_user_id = from_num if msg_data["direction"] == "inbound" else to_num
-
-                        if external_user_id:
-                            seen_phones.add(external_user_id)
-                            wa_name = await _get_wa_name(external_user_id)
-                            await _upsert_chat_record(pool, tenant_id, msg_data, external_user_id, wa_name)
-
-                        # Download media if present
-                        if msg_data.get("media_id") and msg_db_id:
-                            media_ok = await _download_and_save_media(client, tenant_id, msg, msg_db_id)
-                            if media_ok:
-                                total_media += 1
-                                orig_filename = msg_data.get("media_filename") or ""
-                                ext = orig_filename.split(".")[-1] if "." in orig_filename else "bin"
-                                media_rel_path = f"/uploads/{tenant_id}/whatsapp_media/{msg_db_id}.{ext}"
-                                await pool.execute(
-                                    "UPDATE whatsapp_messages SET media_url = $1 WHERE id = $2",
-                                    media_rel_path, msg_db_id,
-                                )
-
+                        parsed.append(_parse_ycloud_message(msg, tenant_id, business_number))
                     except Exception as e:
-                        error_msg = f"Failed to persist message {msg.get('id')}: {e}"
-                        logger.warning(f"[ycloud_sync] {error_msg}")
-                        errors.append(error_msg)
+                        errors.append(f"Failed to parse message {ext_id}: {e}")
+                week_new += len(parsed)
+                if not parsed:
+                    continue
+
+                phones = {_conversation_phone(m) for m in parsed} - {""}
+                seen_phones |= phones
+                await _resolve_contact_names(pool, client, tenant_id, phones, contact_names_cache)
+
+                try:
+                    saved, media_jobs = await _persist_page(pool, tenant_id, parsed, contact_names_cache)
+                except Exception as e:
+                    error_msg = f"Failed to persist page ({len(parsed)} messages) week {week_number}: {e}"
+                    logger.warning(f"[ycloud_sync] {error_msg}")
+                    errors.append(error_msg)
+                    continue
+                total_saved += saved
+                for job in media_jobs:
+                    await media_queue.put(job)  # bounded: backpressure when downloads lag
+                await _flush_media_urls(pool, media_results)
 
                 # Update progress after each page
                 await _update_progress(
                     tenant_id=tenant_id, task_id=task_id, status="processing",
                     messages_fetched=total_fetched, messages_saved=total_saved,
-                    media_downloaded=total_media, errors=errors[-10:], started_at=started_at,
+                    media_downloaded=media["downloaded"], errors=errors[-10:], started_at=started_at,
                 )
 
-                # Next page within this week (cursor-based)
-                next_cursor = result.get("next_cursor")
-                if next_cursor:
-                    cursor = next_cursor
-                else:
-                    break  # Last page for this week
-
-                await asyncio.sleep(0.3)
-
             # End of week — track empty streaks and log
             if week_new > 0:
                 empty_weeks_streak = 0
                 entry = f"✅ {week_label}: {week_new} nuevos"
-                logger.info(f"[ycloud_sync] {entry} ({page_in_week} pages, total: {total_saved} saved)")
+                logger.info(f"[ycloud_sync] {entry} ({len(pages)} pages, total: {total_saved} saved)")
             else:
                 empty_weeks_streak += 1
                 entry = f"— {week_label}: sin mensajes"
@@ -532,24 +469,26 @@ async def _run_sync(pool, client: YCloudClient, tenant_id: int, task_id: str, bu
             await _update_progress(
                 tenant_id=tenant_id, task_id=task_id, status="processing",
                 messages_fetched=total_fetched, messages_saved=total_saved,
-                media_downloaded=total_media, errors=errors[-10:], started_at=started_at,
+                media_downloaded=media["downloaded"], errors=errors[-10:], started_at=started_at,
                 current_week=week_label, unique_conversations=len(seen_phones),
                 week_log=week_log,
             )
 
-            # Move backwards one week
-            week_end = week_start
-            await asyncio.sleep(0.2)
+        # Let queued media finish before reporting completion
+        for _ in media_workers:
+            await media_queue.put(None)
+        await asyncio.gather(*media_workers, return_exceptions=True)
+        await _flush_media_urls(pool, media_results)
 
         # Completed
         final_status = "completed" if not errors else "completed_with_errors"
         await _update_progress(
             tenant_id=tenant_id, task_id=task_id, status=final_status,
             messages_fetched=total_fetched, messages_saved=total_saved,
-            media_downloaded=total_media, errors=errors[-20:],
+            media_downloaded=media["downloaded"], errors=errors[-20:],
             started_at=started_at, completed_at=datetime.now(timezone.utc),
         )
-        logger.info(f"[ycloud_sync] Sync {task_id} completed: {total_fetched} fetched, {total_saved} saved, {total_media} media")
+        logger.info(f"[ycloud_sync] Sync {task_id} completed: {total_fetched} fetched, {total_saved} saved, {media['downloaded']} media")
 
     except Exception as e:
         logger.error(f"[ycloud_sync] Sync {task_id} failed: {e}")
@@ -557,104 +496,261 @@ async def _run_sync(pool, client: YCloudClient, tenant_id: int, task_id: str, bu
         await _update_progress(
             tenant_id=tenant_id, task_id=task_id, status="error",
             messages_fetched=total_fetched, messages_saved=total_saved,
-            media_downloaded=total_media, errors=errors,
+            media_downloaded=media["downloaded"], errors=errors,
             started_at=started_at, completed_at=datetime.now(timezone.utc),
         )
 
     finally:
+        for _, fetch_task in week_tasks:
+            fetch_task.cancel()
+        for worker in media_workers:
+            worker.cancel()
         await _release_lock(tenant_id)
 
 
-async def _upsert_chat_record(pool, tenant_id: int, msg_data: dict, external_user_id: str, wa_name: str = ""):
-    """Create/update chat_conversations and insert into chat_messages for UI display."""
-    try:
-        import json as _json
+# ── Pipeline stages ──────────────────────────────────────────────────────
 
-        # 1. Best name: patient DB name > WhatsApp profile name > phone number
-        display_name = wa_name or external_user_id
+def _week_ranges(newest: datetime, oldest: datetime):
+    """Yield (week_start, week_end) backwards from newest until oldest."""
+    week_end = newest
+    while week_end > oldest:
+        week_start = week_end - timedelta(days=7)
+        yield week_start, week_end
+        week_end = week_start
+
+
+async def _fetch_week(client: YCloudClient, week_start: datetime, week_end: datetime) -> Tuple[List[list], Optional[str]]:
+    """Fetch every page of one week (cursor-chained). Returns (pages, error or None)."""
+    pages: List[list] = []
+    week_ids: set = set()
+    cursor = None
+    while True:
+        try:
+            result = await client.fetch_messages(
+                cursor=cursor, limit=PAGE_SIZE,
+                from_date=week_start.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                to_date=week_end.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            )
+        except RateLimitError as e:
+            wait = min(max(getattr(e, "retry_after", 60) or 60, 1), MAX_BACKOFF)
+            logger.warning(f"[ycloud_sync] Rate limit on week {week_start:%d/%m/%Y}, waiting {wait}s")
+            await asyncio.sleep(wait)
+            continue
+        except Exception as e:
+            logger.error(f"[ycloud_sync] Fetch error week {week_start:%d/%m/%Y}: {e}")
+            return pages, str(e)
+
+        messages = result.get("messages") or result.get("items") or []
+        if not messages:
+            break
+
+        # Detect pagination loops within this week's pages
+        page_ids = {m.get("id") for m in messages if m.get("id")}
+        overlap = page_ids & week_ids
+        if overlap and len(overlap) > len(page_ids) * 0.8:
+            break
+        week_ids |= page_ids
+        pages.append(messages)
+
+        # Next page within this week (cursor-based)
+        cursor = result.get("next_cursor")
+        if not cursor:
+            break
+        await asyncio.sleep(0.3)
+    return pages, None
+
+
+def _conversation_phone(msg_data: dict) -> str:
+    """The patient's side of the conversation."""
+    return msg_data["from_number"] if msg_data["direction"] == "inbound" else msg_data["to_number"]
+
+
+async def _resolve_contact_names(pool, client: YCloudClient, tenant_id: int, phones: set, cache: Dict[str, str]) -> None:
+    """Best name per phone: patient DB name > WhatsApp profile name (one query + bounded API calls per page)."""
+    missing = [p for p in phones if p not in cache]
+    if not missing:
+        return
+
+    rows = await pool.fetch(
+        "SELECT phone_number, first_name, last_name FROM patients WHERE tenant_id = $1 AND phone_number = ANY($2::text[])",
+        tenant_id, missing,
+    )
+    for row in rows:
+        name = f"{row['first_name'] or ''} {row['last_name'] or ''}".strip()
+        if name and row["phone_number"] not in cache:
+            cache[row["phone_number"]] = name
+
+    semaphore = asyncio.Semaphore(CONTACT_LOOKUP_CONCURRENCY)
+
+    async def _lookup(phone: str):
+        async with semaphore:
+            try:
+                cache[phone] = await client.get_contact_profile(phone.lstrip("+")) or ""
+            except Exception as e:
+                logger.debug(f"[ycloud_sync] WA name API failed for {phone}: {e}")
+                cache[phone] = ""
+
+    await asyncio.gather(*(_lookup(p) for p in missing if p not in cache))
 
-        # 2. Find existing conversation (by phone, any provider — reuse existing)
-        conv_id = await pool.fetchval(
-            "SELECT id FROM chat_conversations WHERE tenant_id = $1 AND external_user_id = $2 ORDER BY updated_at DESC LIMIT 1",
-            tenant_id, external_user_id,
-        )
 
-        if not conv_id:
-            # Create new conversation
-            conv_id = await pool.fetchval("""
+_STAGE_COLUMNS = (
+    "external_id", "wamid", "from_number", "to_number", "direction", "message_type", "content",
+    "media_id", "media_mime_type", "media_filename", "created_at", "external_user_id", "display_name",
+)
+
+# Latest conversation per phone of the staged page (any channel/provider — reuse existing).
+_STAGE_CONVERSATIONS_CTE = """
+    conv AS (
+        SELECT DISTINCT ON (c.external_user_id) c.external_user_id, c.id
+        FROM chat_conversations c
+        WHERE c.tenant_id = $1
+          AND c.external_user_id IN (SELECT external_user_id FROM _ycloud_sync_stage)
+        ORDER BY c.external_user_id, c.updated_at DESC
+    )
+"""
+
+
+async def _persist_page(pool, tenant_id: int, parsed: List[dict], names: Dict[str, str]) -> Tuple[int, List[tuple]]:
+    """
+    Persist one page set-based: COPY into a temp stage table, then merge into
+    whatsapp_messages, create missing conversations, insert chat_messages and
+    refresh each conversation once. Returns (saved, [(message_db_id, media_id)])
+    where only messages still missing a media_url are queued for download.
+    """
+    records = []
+    for m in parsed:
+        phone = _conversation_phone(m)
+        records.append((
+            m["external_id"], m.get("wamid"), m["from_number"], m["to_number"], m["direction"],
+            m["message_type"], m.get("content"), m.get("media_id"), m.get("media_mime_type"),
+            m.get("media_filename"), m["created_at"], phone, names.get(phone, ""),
+        ))
+
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("""
+                CREATE TEMP TABLE _ycloud_sync_stage (
+                    external_id TEXT, wamid TEXT, from_number TEXT, to_number TEXT, direction TEXT,
+                    message_type TEXT, content TEXT, media_id TEXT, media_mime_type TEXT,
+                    media_filename TEXT, created_at TIMESTAMPTZ, external_user_id TEXT, display_name TEXT
+                ) ON COMMIT DROP
+            """)
+            await conn.copy_records_to_table("_ycloud_sync_stage", records=records, columns=_STAGE_COLUMNS)
+
+            merged = await conn.fetch("""
+                INSERT INTO whatsapp_messages
+                (tenant_id, external_id, wamid, from_number, to_number, direction,
+                 message_type, content, media_id, media_mime_type, media_filename,
+                 created_at, status)
+                SELECT DISTINCT ON (external_id)
+                    $1, external_id, wamid, from_number, to_number, direction,
+                    message_type, content, media_id, media_mime_type, media_filename,
+                    created_at, 'synced'
+                FROM _ycloud_sync_stage
+                ORDER BY external_id
+                ON CONFLICT (external_id) DO UPDATE SET
+                    content = EXCLUDED.content,
+                    synced_at = NOW()
+                RETURNING id, media_id, media_url
+            """, tenant_id)
+
+            # One new conversation per phone that has none yet
+            await conn.execute("""
                 INSERT INTO chat_conversations (tenant_id, channel, provider, external_user_id, display_name, status)
-                VALUES ($1, 'whatsapp', 'ycloud', $2, $3, 'active')
+                SELECT DISTINCT ON (s.external_user_id)
+                    $1, 'whatsapp', 'ycloud', s.external_user_id,
+                    COALESCE(NULLIF(s.display_name, ''), s.external_user_id), 'active'
+                FROM _ycloud_sync_stage s
+                WHERE s.external_user_id <> ''
+                  AND NOT EXISTS (
+                      SELECT 1 FROM chat_conversations c
+                      WHERE c.tenant_id = $1 AND c.external_user_id = s.external_user_id
+                  )
+                ORDER BY s.external_user_id
                 ON CONFLICT DO NOTHING
-                RETURNING id
-            """, tenant_id, external_user_id, display_name)
-            if not conv_id:
-                conv_id = await pool.fetchval(
-                    "SELECT id FROM chat_conversations WHERE tenant_id = $1 AND external_user_id = $2 ORDER BY updated_at DESC LIMIT 1",
-                    tenant_id, external_user_id,
-                )
-        else:
-            # Update display_name if we have a name
-            if display_name and display_name != external_user_id:
-                await pool.execute(
-                    "UPDATE chat_conversations SET display_name = COALESCE(NULLIF($1, ''), display_name) WHERE id = $2 AND (display_name IS NULL OR display_name = external_user_id)",
-                    display_name, conv_id,
+            """, tenant_id)
+
+            # Messages for the UI (dedup by YCloud external_id via the provider_message_id unique index)
+            await conn.execute(f"""
+                WITH {_STAGE_CONVERSATIONS_CTE}
+                INSERT INTO chat_messages (tenant_id, conversation_id, from_number, role, content, created_at, platform_metadata, content_attributes)
+                SELECT
+                    $1, conv.id,
+                    CASE WHEN s.direction = 'inbound' THEN s.external_user_id ELSE s.from_number END,
+                    CASE WHEN s.direction = 'inbound' THEN 'user' ELSE 'assistant' END,
+                    COALESCE(NULLIF(s.content, ''), '[' || s.message_type || ']'),
+                    s.created_at,
+                    jsonb_build_object('provider_message_id', s.external_id, 'source', 'ycloud_sync'),
+                    CASE WHEN s.media_id IS NULL THEN '[]'::jsonb ELSE jsonb_build_array(jsonb_build_object(
+                        'type', s.message_type,
+                        'url', NULL,
+                        'file_name', COALESCE(s.media_filename, 'media.' || s.message_type),
+                        'mime_type', COALESCE(s.media_mime_type, 'application/octet-stream'),
+                        'ycloud_media_id', s.media_id
+                    )) END
+                FROM (SELECT DISTINCT ON (external_id) * FROM _ycloud_sync_stage ORDER BY external_id) s
+                JOIN conv ON conv.external_user_id = s.external_user_id
+                ON CONFLICT DO NOTHING
+            """, tenant_id)
+
+            # Conversation timestamps + last message preview + display_name, once per conversation
+            await conn.execute(f"""
+                WITH {_STAGE_CONVERSATIONS_CTE},
+                latest AS (
+                    SELECT DISTINCT ON (external_user_id)
+                        external_user_id, created_at, display_name,
+                        LEFT(COALESCE(NULLIF(content, ''), '[' || message_type || ']'), 100) AS preview
+                    FROM _ycloud_sync_stage
+                    ORDER BY external_user_id, created_at DESC
                 )
-
-        if not conv_id:
-            return
-
-        # 3. Insert message (dedup by YCloud external_id)
-        role = "user" if msg_data["direction"] == "inbound" else "assistant"
-        ext_id = msg_data.get("external_id") or ""
-        platform_meta = _json.dumps({"provider_message_id": ext_id, "source": "ycloud_sync"})
-
-        # from_number: for inbound = patient, for outbound = business
-        from_num = external_user_id if msg_data["direction"] == "inbound" else msg_data.get("from_number", "")
-
-        # Build content_attributes for media (so it shows in chat UI)
-        content_attrs = []
-        if msg_data.get("media_id"):
-            media_type = msg_data.get("message_type", "document")
-            content_attrs.append({
-                "type": media_type,
-                "url": None,  # Will be updated after download
-                "file_name": msg_data.get("media_filename") or f"media.{media_type}",
-                "mime_type": msg_data.get("media_mime_type") or "application/octet-stream",
-                "ycloud_media_id": msg_data.get("media_id"),
-            })
-        content_attrs_json = _json.dumps(content_attrs)
-
-        await pool.execute("""
-            INSERT INTO chat_messages (tenant_id, conversation_id, from_number, role, content, created_at, platform_metadata, content_attributes)
-            SELECT $1, $2, $3, $4, $5, $6, $7::jsonb, $9::jsonb
-            WHERE NOT EXISTS (
-                SELECT 1 FROM chat_messages
-                WHERE conversation_id = $2
-                  AND platform_metadata->>'provider_message_id' = $8
-                  AND $8 != ''
-            )
-        """,
-            tenant_id, conv_id, from_num, role,
-            msg_data.get("content") or f"[{msg_data['message_type']}]",
-            msg_data["created_at"],
-            platform_meta,
-            ext_id,
-            content_attrs_json,
+                UPDATE chat_conversations c SET
+                    last_message_at = GREATEST(c.last_message_at, l.created_at),
+                    last_message_preview = CASE WHEN l.created_at >= COALESCE(c.last_message_at, '1970-01-01'::timestamptz)
+                                                THEN l.preview ELSE c.last_message_preview END,
+                    display_name = COALESCE(NULLIF(l.display_name, ''), c.display_name),
+                    updated_at = NOW()
+                FROM latest l JOIN conv ON conv.external_user_id = l.external_user_id
+                WHERE c.id = conv.id
+            """, tenant_id)
+
+    # Re-synced rows whose media was already downloaded keep their media_url
+    media_jobs = [(row["id"], row["media_id"]) for row in merged if row["media_id"] and not row["media_url"]]
+    return len(merged), media_jobs
+
+
+async def _media_worker(queue: asyncio.Queue, client: YCloudClient, tenant_id: int,
+                        results: List[tuple], counters: Dict[str, int]) -> None:
+    """Download queued media; (message_db_id, media_url) pairs are flushed in batches by the pipeline."""
+    while True:
+        job = await queue.get()
+        try:
+            if job is None:
+                return
+            message_db_id, media_id = job
+            media_path = await _download_and_save_media(client, tenant_id, {"mediaId": media_id}, message_db_id)
+            if media_path:
+                counters["downloaded"] += 1
+                results.append((message_db_id, f"/uploads/{tenant_id}/whatsapp_media/{media_path.name}"))
+        finally:
+            queue.task_done()
+
+
+async def _flush_media_urls(pool, results: List[tuple]) -> None:
+    if not results:
+        return
+    batch = results[:]
+    del results[: len(batch)]
+    try:
+        await pool.execute(
+            """
+            UPDATE whatsapp_messages w SET media_url = u.media_url
+            FROM unnest($1::bigint[], $2::text[]) AS u(id, media_url)
+            WHERE w.id = u.id
+            """,
+            [r[0] for r in batch], [r[1] for r in batch],
         )
-
-        # 4. Update conversation timestamps + last message preview + display_name
-        msg_preview = (msg_data.get("content") or f"[{msg_data.get('message_type', 'message')}]")[:100]
-        await pool.execute("""
-            UPDATE chat_conversations SET
-                last_message_at = GREATEST(last_message_at, $1),
-                last_message_preview = CASE WHEN $1 >= COALESCE(last_message_at, '1970-01-01'::timestamptz) THEN $3 ELSE last_message_preview END,
-                display_name = COALESCE(NULLIF($4, ''), display_name),
-                updated_at = NOW()
-            WHERE id = $2
-        """, msg_data["created_at"], conv_id, msg_preview, display_name)
-
     except Exception as e:
-        logger.warning(f"[ycloud_sync] chat record upsert failed (non-fatal): {e}")
+        logger.warning(f"[ycloud_sync] media_url update failed for {len(batch)} messages: {e}")
 
 
 async def cancel_sync(tenant_id: int, task_id: str) -> bool:
@@ -11,6 +11,8 @@ from typing import Any, Optional
 
 import httpx
 
+from services.http_clients import get_http_client
+
 logger = logging.getLogger(__name__)
 
 # Max media size to download (10MB)
@@ -74,23 +76,23 @@ class YCloudClient:
         if sender:
             payload["from"] = sender
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    url, json=payload, headers=self.headers, timeout=15.0
-                )
-                response.raise_for_status()
-                data = response.json()
-                logger.info(f"✅ YCloud message sent to {to}: {data.get('id')}")
-                return data
-            except httpx.HTTPStatusError as e:
-                logger.error(
-                    f"ycloud_send_failed: to={to} status={e.response.status_code} body={e.response.text[:200]}"
-                )
-                raise
-            except Exception as e:
-                logger.error(f"ycloud_send_error: to={to} error={str(e)}")
-                raise
+        client = get_http_client("ycloud")
+        try:
+            response = await client.post(
+                url, json=payload, headers=self.headers, timeout=15.0
+            )
+            response.raise_for_status()
+            data = response.json()
+            logger.info(f"✅ YCloud message sent to {to}: {data.get('id')}")
+            return data
+        except httpx.HTTPStatusError as e:
+            logger.error(
+                f"ycloud_send_failed: to={to} status={e.response.status_code} body={e.response.text[:200]}"
+            )
+            raise
+        except Exception as e:
+            logger.error(f"ycloud_send_error: to={to} error={str(e)}")
+            raise
 
     async def send_image(
         self,
@@ -108,23 +110,23 @@ class YCloudClient:
         if sender:
             payload["from"] = sender
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    endpoint, json=payload, headers=self.headers, timeout=15.0
-                )
-                response.raise_for_status()
-                data = response.json()
-                logger.info(f"✅ YCloud image sent to {to}: {data.get('id')}")
-                return data
-            except httpx.HTTPStatusError as e:
-                logger.error(
-                    f"ycloud_send_image_failed: to={to} status={e.response.status_code} body={e.response.text[:200]}"
-                )
-                raise
-            except Exception as e:
-                logger.error(f"ycloud_send_image_error: to={to} error={str(e)}")
-                raise
+        client = get_http_client("ycloud")
+        try:
+            response = await client.post(
+                endpoint, json=payload, headers=self.headers, timeout=15.0
+            )
+            response.raise_for_status()
+            data = response.json()
+            logger.info(f"✅ YCloud image sent to {to}: {data.get('id')}")
+            return data
+        except httpx.HTTPStatusError as e:
+            logger.error(
+                f"ycloud_send_image_failed: to={to} status={e.response.status_code} body={e.response.text[:200]}"
+            )
+            raise
+        except Exception as e:
+            logger.error(f"ycloud_send_image_error: to={to} error={str(e)}")
+            raise
 
     async def upload_media(self, file_path: str, phone_number: str) -> str:
         """
@@ -151,29 +153,29 @@ class YCloudClient:
             "Accept": "application/json",
         }
 
-        async with httpx.AsyncClient() as client:
-            try:
-                with open(file_path, "rb") as f:
-                    file_content = f.read()
-                files = {
-                    "file": (os.path.basename(file_path), file_content, mime_type),
-                }
-                response = await client.post(
-                    endpoint, files=files, headers=upload_headers, timeout=30.0
-                )
-                response.raise_for_status()
-                data = response.json()
-                media_id = data.get("id") or data.get("media_id", "")
-                logger.info(f"✅ YCloud media uploaded: {media_id} ({file_path})")
-                return media_id
-            except httpx.HTTPStatusError as e:
-                logger.error(
-                    f"ycloud_upload_media_failed: file={file_path} status={e.response.status_code} body={e.response.text[:300]}"
-                )
-                raise
-            except Exception as e:
-                logger.error(f"ycloud_upload_media_error: file={file_path} error={str(e)}")
-                raise
+        client = get_http_client("ycloud")
+        try:
+            with open(file_path, "rb") as f:
+                file_content = f.read()
+            files = {
+                "file": (os.path.basename(file_path), file_content, mime_type),
+            }
+            response = await client.post(
+                endpoint, files=files, headers=upload_headers, timeout=30.0
+            )
+            response.raise_for_status()
+            data = response.json()
+            media_id = data.get("id") or data.get("media_id", "")
+            logger.info(f"✅ YCloud media uploaded: {media_id} ({file_path})")
+            return media_id
+        except httpx.HTTPStatusError as e:
+            logger.error(
+                f"ycloud_upload_media_failed: file={file_path} status={e.response.status_code} body={e.response.text[:300]}"
+            )
+            raise
+        except Exception as e:
+            logger.error(f"ycloud_upload_media_error: file={file_path} error={str(e)}")
+            raise
 
     async def send_document_by_media_id(
         self,
@@ -201,23 +203,23 @@ class YCloudClient:
         if sender:
             payload["from"] = sender
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    endpoint, json=payload, headers=self.headers, timeout=15.0
-                )
-                response.raise_for_status()
-                data = response.json()
-                logger.info(f"✅ YCloud document sent to {to_number} via media_id: {data.get('id')}")
-                return data
-            except httpx.HTTPStatusError as e:
-                logger.error(
-                    f"ycloud_send_document_failed: to={to_number} status={e.response.status_code} body={e.response.text[:200]}"
-                )
-                raise
-            except Exception as e:
-                logger.error(f"ycloud_send_document_error: to={to_number} error={str(e)}")
-                raise
+        client = get_http_client("ycloud")
+        try:
+            response = await client.post(
+                endpoint, json=payload, headers=self.headers, timeout=15.0
+            )
+            response.raise_for_status()
+            data = response.json()
+            logger.info(f"✅ YCloud document sent to {to_number} via media_id: {data.get('id')}")
+            return data
+        except httpx.HTTPStatusError as e:
+            logger.error(
+                f"ycloud_send_document_failed: to={to_number} status={e.response.status_code} body={e.response.text[:200]}"
+            )
+            raise
+        except Exception as e:
+            logger.error(f"ycloud_send_document_error: to={to_number} error={str(e)}")
+            raise
 
     async def send_document(
         self,
@@ -245,23 +247,23 @@ class YCloudClient:
         if sender:
             payload["from"] = sender
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    endpoint, json=payload, headers=self.headers, timeout=15.0
-                )
-                response.raise_for_status()
-                data = response.json()
-                logger.info(f"✅ YCloud document sent to {to_number}: {data.get('id')}")
-                return data
-            except httpx.HTTPStatusError as e:
-                logger.error(
-                    f"ycloud_send_document_failed: to={to_number} status={e.response.status_code} body={e.response.text[:200]}"
-                )
-                raise
-            except Exception as e:
-                logger.error(f"ycloud_send_document_error: to={to_number} error={str(e)}")
-                raise
+        client = get_http_client("ycloud")
+        try:
+            response = await client.post(
+                endpoint, json=payload, headers=self.headers, timeout=15.0
+            )
+            response.raise_for_status()
+            data = response.json()
+            logger.info(f"✅ YCloud document sent to {to_number}: {data.get('id')}")
+            return data
+        except httpx.HTTPStatusError as e:
+            logger.error(
+                f"ycloud_send_document_failed: to={to_number} status={e.response.status_code} body={e.response.text[:200]}"
+            )
+            raise
+        except Exception as e:
+            logger.error(f"ycloud_send_document_error: to={to_number} error={str(e)}")
+            raise
 
     async def send_audio(
         self,
@@ -278,23 +280,23 @@ class YCloudClient:
         if sender:
             payload["from"] = sender
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    endpoint, json=payload, headers=self.headers, timeout=15.0
-                )
-                response.raise_for_status()
-                data = response.json()
-                logger.info(f"✅ YCloud audio sent to {to}: {data.get('id')}")
-                return data
-            except httpx.HTTPStatusError as e:
-                logger.error(
-                    f"ycloud_send_audio_failed: to={to} status={e.response.status_code} body={e.response.text[:200]}"
-                )
-                raise
-            except Exception as e:
-                logger.error(f"ycloud_send_audio_error: to={to} error={str(e)}")
-                raise
+        client = get_http_client("ycloud")
+        try:
+            response = await client.post(
+                endpoint, json=payload, headers=self.headers, timeout=15.0
+            )
+            response.raise_for_status()
+            data = response.json()
+            logger.info(f"✅ YCloud audio sent to {to}: {data.get('id')}")
+            return data
+        except httpx.HTTPStatusError as e:
+            logger.error(
+                f"ycloud_send_audio_failed: to={to} status={e.response.status_code} body={e.response.text[:200]}"
+            )
+            raise
+        except Exception as e:
+            logger.error(f"ycloud_send_audio_error: to={to} error={str(e)}")
+            raise
 
     async def send_template(
         self,
@@ -329,28 +331,28 @@ class YCloudClient:
         import json as _json
         logger.info(f"📤 TEMPLATE PAYLOAD: {_json.dumps(payload, ensure_ascii=False)[:500]}")
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    url, json=payload, headers=self.headers, timeout=15.0
-                )
-                response.raise_for_status()
-                data = response.json()
-                logger.info(
-                    f"✅ YCloud HSM template '{template_name}' sent to {to}: {data.get('id')}"
-                )
-                return data
-            except httpx.HTTPStatusError as e:
-                logger.error(
-                    f"ycloud_send_template_failed: to={to} template={template_name} "
-                    f"status={e.response.status_code} body={e.response.text}"
-                )
-                raise
-            except Exception as e:
-                logger.error(
-                    f"ycloud_send_template_error: to={to} template={template_name} error={str(e)}"
-                )
-                raise
+        client = get_http_client("ycloud")
+        try:
+            response = await client.post(
+                url, json=payload, headers=self.headers, timeout=15.0
+            )
+            response.raise_for_status()
+            data = response.json()
+            logger.info(
+                f"✅ YCloud HSM template '{template_name}' sent to {to}: {data.get('id')}"
+            )
+            return data
+        except httpx.HTTPStatusError as e:
+            logger.error(
+                f"ycloud_send_template_failed: to={to} template={template_name} "
+                f"status={e.response.status_code} body={e.response.text}"
+            )
+            raise
+        except Exception as e:
+            logger.error(
+                f"ycloud_send_template_error: to={to} template={template_name} error={str(e)}"
+            )
+            raise
 
     async def fetch_messages(
         self,
@@ -385,92 +387,92 @@ class YCloudClient:
         if to_date:
             params["filter.createTime.lte"] = to_date
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(
-                    url, headers=self.headers, params=params, timeout=30.0
-                )
-
-                # Handle rate limiting
-                if response.status_code == 429:
-                    retry_after = int(response.headers.get("Retry-After", 60))
-                    raise RateLimitError(
-                        f"Rate limited. Retry after {retry_after}s",
-                        retry_after=retry_after,
-                    )
-
-                response.raise_for_status()
-                data = response.json()
-
-                # YCloud v2 returns messages in "items" key with cursor-based pagination
-                messages = (
-                    data.get("items")
-                    or data.get("messages")
-                    or data.get("data")
-                    or data.get("results")
-                    or (data if isinstance(data, list) else [])
+        client = get_http_client("ycloud")
+        try:
+            response = await client.get(
+                url, headers=self.headers, params=params, timeout=30.0
+            )
+
+            # Handle rate limiting
+            if response.status_code == 429:
+                retry_after = int(response.headers.get("Retry-After", 60))
+                raise RateLimitError(
+                    f"Rate limited. Retry after {retry_after}s",
+                    retry_after=retry_after,
                 )
 
-                # YCloud v2 cursor-based pagination: nextPageToken or page.after
-                next_cursor = (
-                    data.get("nextPageToken")
-                    or data.get("nextCursor")
-                    or data.get("next_cursor")
-                )
-                # Fallback: if no explicit cursor but we got a full page, use
-                # the last item's ID as cursor (YCloud page.after accepts item IDs)
-                if not next_cursor and len(messages) >= limit:
-                    last_id = messages[-1].get("id") if messages else None
-                    if last_id:
-                        next_cursor = last_id
-
-                page_length = data.get("length", len(messages))
-
-                logger.info(
-                    f"ycloud_fetch_messages: status={response.status_code} "
-                    f"keys={list(data.keys()) if isinstance(data, dict) else 'list'} "
-                    f"messages_count={len(messages)} has_next={bool(next_cursor)}"
+            response.raise_for_status()
+            data = response.json()
+
+            # YCloud v2 returns messages in "items" key with cursor-based pagination
+            messages = (
+                data.get("items")
+                or data.get("messages")
+                or data.get("data")
+                or data.get("results")
+                or (data if isinstance(data, list) else [])
+            )
+
+            # YCloud v2 cursor-based pagination: nextPageToken or page.after
+            next_cursor = (
+                data.get("nextPageToken")
+                or data.get("nextCursor")
+                or data.get("next_cursor")
+            )
+            # Fallback: if no explicit cursor but we got a full page, use
+            # the last item's ID as cursor (YCloud page.after accepts item IDs)
+            if not next_cursor and len(messages) >= limit:
+                last_id = messages[-1].get("id") if messages else None
+                if last_id:
+                    next_cursor = last_id
+
+            page_length = data.get("length", len(messages))
+
+            logger.info(
+                f"ycloud_fetch_messages: status={response.status_code} "
+                f"keys={list(data.keys()) if isinstance(data, dict) else 'list'} "
+                f"messages_count={len(messages)} has_next={bool(next_cursor)}"
+            )
+
+            # Log sample if first page and empty
+            if not messages and not cursor:
+                logger.warning(
+                    f"ycloud_fetch_messages: EMPTY response. Raw keys: "
+                    f"{list(data.keys()) if isinstance(data, dict) else 'N/A'}. "
+                    f"Raw body (first 500 chars): {str(data)[:500]}"
                 )
 
-                # Log sample if first page and empty
-                if not messages and not cursor:
-                    logger.warning(
-                        f"ycloud_fetch_messages: EMPTY response. Raw keys: "
-                        f"{list(data.keys()) if isinstance(data, dict) else 'N/A'}. "
-                        f"Raw body (first 500 chars): {str(data)[:500]}"
-                    )
+            return {
+                "messages": messages,
+                "next_cursor": next_cursor,
+                "has_more": bool(next_cursor),
+                "total": data.get("total", len(messages)),
+                "offset": data.get("offset", 0),
+                "length": page_length,
+            }
 
-                return {
-                    "messages": messages,
-                    "next_cursor": next_cursor,
-                    "has_more": bool(next_cursor),
-                    "total": data.get("total", len(messages)),
-                    "offset": data.get("offset", 0),
-                    "length": page_length,
-                }
-
-            except httpx.HTTPStatusError as e:
-                logger.error(
-                    f"ycloud_fetch_messages_failed: status={e.response.status_code} body={e.response.text[:200]}"
-                )
-                raise
-            except Exception as e:
-                logger.error(f"ycloud_fetch_messages_error: {str(e)}")
-                raise
+        except httpx.HTTPStatusError as e:
+            logger.error(
+                f"ycloud_fetch_messages_failed: status={e.response.status_code} body={e.response.text[:200]}"
+            )
+            raise
+        except Exception as e:
+            logger.error(f"ycloud_fetch_messages_error: {str(e)}")
+            raise
 
     async def get_contacts(self, limit: int = 100, offset: int = 0) -> list:
         """Fetch WhatsApp contacts from YCloud API. Returns list of contacts with phone + name."""
         url = f"{self.base_url}/whatsapp/phoneNumbers"
         params = {"limit": min(limit, 100), "offset": offset}
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, headers=self.headers, params=params, timeout=30.0)
-                if response.status_code == 200:
-                    data = response.json()
-                    return data.get("items") or data.get("phoneNumbers") or data.get("data") or []
-                else:
-                    logger.warning(f"ycloud_get_contacts: status={response.status_code}")
-                    return []
+            client = get_http_client("ycloud")
+            response = await client.get(url, headers=self.headers, params=params, timeout=30.0)
+            if response.status_code == 200:
+                data = response.json()
+                return data.get("items") or data.get("phoneNumbers") or data.get("data") or []
+            else:
+                logger.warning(f"ycloud_get_contacts: status={response.status_code}")
+                return []
         except Exception as e:
             logger.warning(f"ycloud_get_contacts failed: {e}")
             return []
@@ -484,23 +486,23 @@ class YCloudClient:
         ]
         for url in endpoints:
             try:
-                async with httpx.AsyncClient() as client:
-                    response = await client.get(url, headers=self.headers, timeout=10.0)
-                    if response.status_code == 200:
-                        data = response.json()
-                        name = (
-                            data.get("waName")
-                            or data.get("name")
-                            or data.get("profileName")
-                            or data.get("pushName")
-                            or data.get("displayName")
-                            or data.get("display_name")
-                        )
-                        if name:
-                            logger.info(f"ycloud_contact_profile: {phone_number} → {name} (from {url})")
-                            return name
-                    elif response.status_code != 404:
-                        logger.debug(f"ycloud_contact_profile: {url} returned {response.status_code}: {response.text[:200]}")
+                client = get_http_client("ycloud")
+                response = await client.get(url, headers=self.headers, timeout=10.0)
+                if response.status_code == 200:
+                    data = response.json()
+                    name = (
+                        data.get("waName")
+                        or data.get("name")
+                        or data.get("profileName")
+                        or data.get("pushName")
+                        or data.get("displayName")
+                        or data.get("display_name")
+                    )
+                    if name:
+                        logger.info(f"ycloud_contact_profile: {phone_number} → {name} (from {url})")
+                        return name
+                elif response.status_code != 404:
+                    logger.debug(f"ycloud_contact_profile: {url} returned {response.status_code}: {response.text[:200]}")
             except Exception as e:
                 logger.debug(f"ycloud_contact_profile failed for {url}: {e}")
         return None
@@ -517,36 +519,36 @@ class YCloudClient:
         """
         url = f"{self.base_url}/whatsapp/media/{media_id}"
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, headers=self.headers, timeout=15.0)
+        client = get_http_client("ycloud")
+        try:
+            response = await client.get(url, headers=self.headers, timeout=15.0)
 
-                if response.status_code == 429:
-                    retry_after = int(response.headers.get("Retry-After", 60))
-                    raise RateLimitError(
-                        f"Rate limited. Retry after {retry_after}s",
-                        retry_after=retry_after,
-                    )
+            if response.status_code == 429:
+                retry_after = int(response.headers.get("Retry-After", 60))
+                raise RateLimitError(
+                    f"Rate limited. Retry after {retry_after}s",
+                    retry_after=retry_after,
+                )
 
-                response.raise_for_status()
-                data = response.json()
+            response.raise_for_status()
+            data = response.json()
 
-                return {
-                    "url": data.get("url"),
-                    "mime_type": data.get("mimeType") or data.get("mime_type"),
-                    "filename": data.get("filename"),
-                }
+            return {
+                "url": data.get("url"),
+                "mime_type": data.get("mimeType") or data.get("mime_type"),
+                "filename": data.get("filename"),
+            }
 
-            except httpx.HTTPStatusError as e:
-                logger.error(
-                    f"ycloud_get_media_url_failed: media_id={media_id} status={e.response.status_code}"
-                )
-                raise
-            except Exception as e:
-                logger.error(
-                    f"ycloud_get_media_url_error: media_id={media_id} error={str(e)}"
-                )
-                raise
+        except httpx.HTTPStatusError as e:
+            logger.error(
+                f"ycloud_get_media_url_failed: media_id={media_id} status={e.response.status_code}"
+            )
+            raise
+        except Exception as e:
+            logger.error(
+                f"ycloud_get_media_url_error: media_id={media_id} error={str(e)}"
+            )
+            raise
 
     async def download_media(
         self,
@@ -563,29 +565,29 @@ class YCloudClient:
         Returns:
             bytes of the media content
         """
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(
-                    url, timeout=float(timeout), follow_redirects=True
+        client = get_http_client("media")
+        try:
+            response = await client.get(
+                url, timeout=float(timeout), follow_redirects=True
+            )
+            response.raise_for_status()
+
+            content_length = response.headers.get("content-length")
+            if content_length and int(content_length) > MAX_MEDIA_SIZE_BYTES:
+                raise MediaSizeError(
+                    f"Media too large: {content_length} bytes (max {MAX_MEDIA_SIZE_BYTES})"
                 )
-                response.raise_for_status()
 
-                content_length = response.headers.get("content-length")
-                if content_length and int(content_length) > MAX_MEDIA_SIZE_BYTES:
-                    raise MediaSizeError(
-                        f"Media too large: {content_length} bytes (max {MAX_MEDIA_SIZE_BYTES})"
-                    )
-
-                return response.content
+            return response.content
 
-            except httpx.HTTPStatusError as e:
-                logger.error(
-                    f"ycloud_download_media_failed: url={url} status={e.response.status_code}"
-                )
-                raise
-            except Exception as e:
-                logger.error(f"ycloud_download_media_error: url={url} error={str(e)}")
-                raise
+        except httpx.HTTPStatusError as e:
+            logger.error(
+                f"ycloud_download_media_failed: url={url} status={e.response.status_code}"
+            )
+            raise
+        except Exception as e:
+            logger.error(f"ycloud_download_media_error: url={url} error={str(e)}")
+            raise
 
 
 class RateLimitError(Exception):
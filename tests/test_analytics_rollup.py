@@ -0,0 +1,151 @@
+"""Tests for services/analytics_rollup.py and the dashboards that read its daily fact tables."""
+
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from services import analytics_rollup
+from services.financial_dashboard_service import FinancialDashboardService
+
+
+def _conn_pool(claim_batches):
+    conn = MagicMock()
+    conn.fetch = AsyncMock(side_effect=claim_batches)
+    conn.execute = AsyncMock()
+    tx = MagicMock()
+    tx.__aenter__ = AsyncMock(return_value=tx)
+    tx.__aexit__ = AsyncMock(return_value=False)
+    conn.transaction = MagicMock(return_value=tx)
+    acquire = MagicMock()
+    acquire.__aenter__ = AsyncMock(return_value=conn)
+    acquire.__aexit__ = AsyncMock(return_value=False)
+    pool = MagicMock()
+    pool.acquire = MagicMock(return_value=acquire)
+    return pool, conn
+
+
+def _claimed(*pairs):
+    return [{"tenant_id": t, "day": d} for t, d in pairs]
+
+
+@pytest.mark.asyncio
+async def test_refresh_rebuilds_claimed_days_batch_by_batch():
+    pool, conn = _conn_pool([
+        _claimed((1, date(2026, 3, 1)), (1, date(2026, 3, 2))),
+        _claimed((2, date(2026, 3, 1))),
+    ])
+
+    rebuilt = await analytics_rollup.refresh_dirty_days(pool, batch_days=2)
+
+    assert rebuilt == 3
+    assert conn.fetch.await_count == 2
+    assert conn.fetch.await_args_list[0].args[1:] == (None, None, None, 2)
+    # delete + insert for appointment facts and cash facts, per batch
+    assert conn.execute.await_count == 8
+    first_batch = conn.execute.await_args_list[0].args
+    assert first_batch[1:] == ([1, 1], [date(2026, 3, 1), date(2026, 3, 2)])
+    assert "analytics_daily_appointments" in first_batch[0]
+
+
+@pytest.mark.asyncio
+async def test_refresh_with_nothing_queued_does_not_rebuild():
+    pool, conn = _conn_pool([[]])
+    assert await analytics_rollup.refresh_dirty_days(pool, 3, date(2026, 1, 1), date(2026, 1, 31)) == 0
+    assert conn.fetch.await_args.args[1:4] == (3, date(2026, 1, 1), date(2026, 1, 31))
+    conn.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_ensure_fresh_never_breaks_the_read():
+    with patch.object(analytics_rollup, "refresh_dirty_days", AsyncMock(side_effect=RuntimeError("lock"))):
+        await analytics_rollup.ensure_fresh(MagicMock(), 1, date(2026, 1, 1), date(2026, 1, 31))
+
+
+@pytest.mark.asyncio
+async def test_reconcile_queues_the_window_around_today():
+    pool = MagicMock()
+    pool.execute = AsyncMock()
+    with patch.object(analytics_rollup, "refresh_dirty_days", AsyncMock(return_value=7)) as refresh:
+        assert await analytics_rollup.reconcile_recent_days(pool, today=date(2026, 5, 10), past_days=10, future_days=5) == 7
+    _sql, start, end, tenant_id = pool.execute.await_args.args
+    assert (start, end, tenant_id) == (date(2026, 4, 30), date(2026, 5, 15), None)
+    refresh.assert_awaited_once_with(pool)
+
+
+def test_cash_rebuild_buckets_timestamped_plan_payments_by_utc_day():
+    # treatment_plan_payments.payment_date is TIMESTAMPTZ: a payment at 15:42
+    # must land in its day, which an equality against the date never matched.
+    sql = " ".join(analytics_rollup._INSERT_CASH_FACTS_SQL.split())
+    plan_payments = sql.split("FROM treatment_plan_payments", 1)[1].split(") pp", 1)[0]
+    assert "payment_date = d.day" not in plan_payments
+    assert "payment_date >= (d.day::timestamp AT TIME ZONE 'UTC')" in plan_payments
+    assert "payment_date < ((d.day + 1)::timestamp AT TIME ZONE 'UTC')" in plan_payments
+
+    paid_at = datetime(2026, 3, 1, 15, 42, tzinfo=timezone.utc)
+    day = date(2026, 3, 1)
+    start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+    assert start <= paid_at < start + timedelta(days=1)
+
+
+@pytest.mark.asyncio
+async def test_financial_summary_reads_fact_totals():
+    pool = MagicMock()
+    pool.fetchrow = AsyncMock(side_effect=[
+        {
+            "paid_amount": Decimal("1000"),
+            "completed_billed_amount": Decimal("1500"),
+            "pending_amount": Decimal("200"),
+            "plan_payments": Decimal("500"),
+            "payouts": Decimal("300"),
+        },
+        {"total": 2, "pending": 1, "paid": 1},
+    ])
+    with patch("services.financial_dashboard_service.ensure_fresh", AsyncMock()) as fresh:
+        summary = await FinancialDashboardService().get_financial_summary(
+            pool, 1, date(2026, 3, 1), date(2026, 3, 31)
+        )
+
+    fresh.assert_awaited_once_with(pool, 1, date(2026, 3, 1), date(2026, 3, 31))
+    assert "analytics_daily_appointments" in pool.fetchrow.await_args_list[0].args[0]
+    assert summary["total_revenue"] == 1500.0
+    assert summary["net_profit"] == 1200.0
+    assert summary["total_billed"] == 1500.0 and summary["total_pending"] == 200.0
+    assert summary["liquidations_generated"] == 2
+
+
+@pytest.mark.asyncio
+async def test_professionals_summary_runs_a_fixed_number_of_queries():
+    from analytics_service import AnalyticsService
+
+    professionals = [
+        {"id": 1, "first_name": "Ana", "last_name": "Paz", "specialty": None, "google_calendar_id": None},
+        {"id": 2, "first_name": "Luis", "last_name": None, "specialty": "Orto", "google_calendar_id": None},
+    ]
+    stats = [{
+        "professional_id": 1, "total": 10, "completed": 10, "cancelled": 0, "no_show": 0,
+        "total_revenue": Decimal("80000"), "paid_count": 6, "partial_count": 1,
+    }]
+    patients = [{"professional_id": 1, "unique_patients": 4, "returning_patients": 3}]
+    top = [{"professional_id": 1, "appointment_type": "ENDO", "name": "Endodoncia", "cnt": 7}]
+    busiest = [{"professional_id": 1, "dow": 2, "cnt": 5}]
+
+    pool = MagicMock()
+    pool.fetch = AsyncMock(side_effect=[professionals, stats, patients, top, busiest])
+    with patch("analytics_service.db") as mock_db, \
+            patch("services.analytics_rollup.ensure_fresh", AsyncMock()):
+        mock_db.pool = pool
+        result = await AnalyticsService().get_professionals_summary(
+            datetime(2026, 3, 1), datetime(2026, 3, 31), tenant_id=1
+        )
+
+    assert pool.fetch.await_count == 5
+    ana, luis = result
+    assert ana["metrics"]["total_appointments"] == 10
+    assert ana["metrics"]["retention_rate"] == 75.0
+    assert ana["metrics"]["revenue"] == 80000.0
+    assert ana["top_treatment"] == {"name": "Endodoncia", "count": 7}
+    assert ana["busiest_day"] == "Martes"
+    assert set(ana["tags"]) >= {"High Performance", "Retention Master", "Top Revenue", "High Ticket"}
+    assert luis["metrics"]["total_appointments"] == 0 and luis["busiest_day"] == "N/A"
@@ -0,0 +1,88 @@
+"""Tests for services/availability_engine.py — minute bitmaps + vectorized slot search."""
+
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from services.availability_engine import (
+    compile_availability,
+    free_slots_from_busy_sets,
+)
+
+TZ = ZoneInfo("America/Argentina/Buenos_Aires")
+MONDAY = date(2026, 5, 11)
+TENANT_WH = {
+    "monday": {"enabled": True, "slots": [{"start": "09:00", "end": "12:00"}, {"start": "13:00", "end": "15:00"}]},
+    "tuesday": {"enabled": True, "slots": [{"start": "09:00", "end": "12:00"}]},
+    "wednesday": {"enabled": False, "slots": []},
+}
+
+
+def _prof(pid, monday=None):
+    wh = {"monday": {"enabled": True, "slots": [monday]}} if monday else {}
+    return {"id": pid, "first_name": f"P{pid}", "working_hours": wh}
+
+
+def _at(day, hh, mm):
+    return datetime(day.year, day.month, day.day, hh, mm, tzinfo=TZ)
+
+
+def test_busy_sets_match_legacy_fifteen_minute_sampling():
+    busy = {1: {"09:00", "09:15"}, 2: {"09:00", "10:00"}}
+    slots = free_slots_from_busy_sets(busy, 9 * 60, 11 * 60, 30, interval_minutes=15, limit=50)
+    # 09:00 busy for both; 09:15 free for prof 2 (09:15, 09:30 sampled); 10:30 last fit.
+    assert slots == ["09:15", "09:30", "09:45", "10:00", "10:15", "10:30"]
+    assert free_slots_from_busy_sets(busy, 9 * 60, 11 * 60, 30, interval_minutes=15,
+                                     time_preference="tarde") == []
+    assert free_slots_from_busy_sets(busy, 9 * 60, 11 * 60, 30, interval_minutes=15,
+                                     min_time="10:00", max_time="10:15", not_after_or_at=10 * 60) == ["10:15"]
+
+
+def test_compile_applies_window_gaps_and_working_hours():
+    bitmap = compile_availability(MONDAY, 3, [_prof(1, {"start": "10:00", "end": "14:00"})], TENANT_WH, tz=TZ)
+    slots = bitmap.free_slots_by_day(60, step_minutes=30)
+
+    # Prof starts at 10:00, lunch gap 12-13 is closed for everyone, prof leaves at 14:00.
+    assert slots[MONDAY] == ["10:00", "10:30", "11:00", "13:00"]
+    assert slots[MONDAY + timedelta(days=1)] == ["09:00", "09:30", "10:00", "10:30", "11:00"]
+    assert slots[MONDAY + timedelta(days=2)] == []  # tenant disabled Wednesday
+
+
+def test_appointments_and_blocks_are_exact_to_the_minute():
+    appointments = [{"professional_id": 1, "start": _at(MONDAY, 10, 10), "duration_minutes": 20},
+                    {"professional_id": 1, "start": _at(MONDAY, 13, 0), "duration_minutes": None}]
+    blocks = [{"professional_id": None, "start": _at(MONDAY, 9, 0), "end": _at(MONDAY, 9, 30)}]
+    bitmap = compile_availability(MONDAY, 1, [_prof(1)], TENANT_WH, tz=TZ,
+                                  appointments=appointments, calendar_blocks=blocks)
+
+    morning = bitmap.free_slots(MONDAY, 30, max_time="11:30")
+    assert morning == ["09:30", "10:30", "10:45", "11:00", "11:15", "11:30"]
+    # NULL duration counts as 60 minutes.
+    assert bitmap.free_slots(MONDAY, 30, min_time="13:00") == ["14:00", "14:15", "14:30"]
+
+
+def test_any_free_professional_offers_the_slot():
+    appointments = [{"professional_id": 1, "start": _at(MONDAY, 9, 0), "duration_minutes": 60}]
+    bitmap = compile_availability(MONDAY, 1, [_prof(1), _prof(2)], TENANT_WH, tz=TZ, appointments=appointments,
+                                  blocked_professionals={})
+    assert bitmap.free_slots(MONDAY, 60)[0] == "09:00"
+
+    blocked = compile_availability(MONDAY, 1, [_prof(1), _prof(2)], TENANT_WH, tz=TZ, appointments=appointments,
+                                   blocked_professionals={MONDAY: {2}})
+    assert blocked.free_slots(MONDAY, 60)[0] == "10:00"
+
+
+def test_holidays_close_the_day_or_narrow_the_window():
+    tuesday = MONDAY + timedelta(days=1)
+    bitmap = compile_availability(
+        MONDAY, 2, [_prof(1)], TENANT_WH, tz=TZ,
+        holidays={MONDAY: (True, None), tuesday: (True, {"start": "10:00", "end": "11:00"})},
+    )
+    slots = bitmap.free_slots_by_day(30, step_minutes=30)
+    assert slots == {MONDAY: [], tuesday: ["10:00", "10:30"]}
+
+
+def test_today_drops_past_starts():
+    bitmap = compile_availability(MONDAY, 2, [_prof(1)], TENANT_WH, tz=TZ)
+    slots = bitmap.free_slots_by_day(30, step_minutes=30, now=_at(MONDAY, 14, 0))
+    assert slots[MONDAY] == ["14:30"]
+    assert slots[MONDAY + timedelta(days=1)][0] == "09:00"
@@ -270,3 +270,123 @@ class TestComputeChecksum:
         data = b"ClinicForge backup integrity check"
         expected = hashlib.sha256(data).hexdigest()
         assert _compute_checksum(data) == expected
+
+
+class TestStreamingExport:
+    """Tables are streamed from a cursor into NDJSON ZIP entries; restore reads them back."""
+
+    def _conn(self, tables):
+        from contextlib import asynccontextmanager
+        from unittest.mock import AsyncMock, MagicMock
+
+        conn = MagicMock()
+        conn.fetchrow = AsyncMock(return_value={"has_tid": True, "has_id": True})
+        conn.queries = []
+
+        @asynccontextmanager
+        async def _transaction(**kwargs):
+            yield
+
+        def _cursor(sql, *args, prefetch=None):
+            conn.queries.append((sql, prefetch))
+            table = sql.split(" FROM ")[1].split()[0]
+
+            async def _rows():
+                for row in tables.get(table, []):
+                    if isinstance(row, Exception):
+                        raise row
+                    yield row
+
+            return _rows()
+
+        conn.transaction = _transaction
+        conn.cursor = _cursor
+        return conn
+
+    def test_export_writes_ndjson_with_streaming_checksums(self, tmp_path):
+        import asyncio
+        import hashlib
+        import zipfile
+        from contextlib import asynccontextmanager
+        from unittest.mock import AsyncMock, MagicMock, patch
+
+        import backup_service
+        import restore_service
+
+        tables = {
+            "patients": [{"id": 1, "tenant_id": 5, "first_name": "Ana", "created_at": datetime(2026, 1, 2, 3, 4)}],
+            "patient_documents": [{"id": 9, "tenant_id": 5, "patient_id": 1, "file_path": "/x/estudio.pdf"}],
+        }
+        conn = self._conn(tables)
+
+        @asynccontextmanager
+        async def _acquire():
+            yield conn
+
+        pool = MagicMock()
+        pool.acquire = _acquire
+        backup_service._TABLE_SHAPES.clear()
+
+        zip_path = tmp_path / "b.zip"
+        with patch.object(backup_service, "_update_progress", AsyncMock()), \
+                patch.object(backup_service, "EXPORT_TABLES", ["tenants", "patients", "patient_documents"]):
+            with zipfile.ZipFile(zip_path, "w") as zf:
+                counts, checksums, documents = asyncio.run(
+                    backup_service._export_tables(pool, zf, "pfx", 5, "t1")
+                )
+
+        assert counts == {"patients": 1, "patient_documents": 1}
+        assert documents == [(1, "/x/estudio.pdf")]
+        assert all(prefetch == backup_service.CURSOR_PREFETCH for _, prefetch in conn.queries)
+        assert "ORDER BY id" in conn.queries[1][0] and "OFFSET" not in conn.queries[1][0]
+
+        with zipfile.ZipFile(zip_path) as zf:
+            raw = zf.read("pfx/data/patients.ndjson")
+            assert hashlib.sha256(raw).hexdigest() == checksums["data/patients.ndjson"]
+            assert restore_service.verify_checksums(zf, {"checksums": checksums}, "pfx") == []
+            entry = restore_service._data_entry(zf, "pfx", "patients")
+            rows = list(restore_service._iter_table_rows(zf, entry))
+        assert rows == [{"id": 1, "tenant_id": 5, "first_name": "Ana", "created_at": "2026-01-02T03:04:00"}]
+
+    def test_failed_table_leaves_no_partial_entry(self, tmp_path):
+        import asyncio
+        import zipfile
+        from contextlib import asynccontextmanager
+        from unittest.mock import AsyncMock, MagicMock, patch
+
+        import backup_service
+        import restore_service
+
+        conn = self._conn({
+            "patients": [{"id": 1, "tenant_id": 5}, RuntimeError("connection lost")],
+            "appointments": [{"id": 3, "tenant_id": 5}],
+        })
+
+        @asynccontextmanager
+        async def _acquire():
+            yield conn
+
+        pool = MagicMock()
+        pool.acquire = _acquire
+        backup_service._TABLE_SHAPES.clear()
+
+        zip_path = tmp_path / "b.zip"
+        with patch.object(backup_service, "_update_progress", AsyncMock()), \
+                patch.object(backup_service, "EXPORT_TABLES", ["patients", "appointments"]):
+            with zipfile.ZipFile(zip_path, "w") as zf:
+                counts, checksums, _ = asyncio.run(backup_service._export_tables(pool, zf, "pfx", 5, "t1"))
+
+        assert counts == {"appointments": 1}
+        with zipfile.ZipFile(zip_path) as zf:
+            assert zf.namelist() == ["pfx/data/appointments.ndjson"]
+            assert restore_service._data_entry(zf, "pfx", "patients") is None
+
+    def test_table_shape_is_introspected_once(self):
+        import asyncio
+        import backup_service
+
+        backup_service._TABLE_SHAPES.clear()
+        conn = self._conn({})
+        asyncio.run(backup_service._table_query(conn, "appointments"))
+        asyncio.run(backup_service._table_query(conn, "appointments"))
+        assert conn.fetchrow.await_count == 1
@@ -132,6 +132,7 @@ class TestStateHooksInTools:
                         "is_priority_professional": False,
                     }
                 ],
+                [],   # tenant holiday calendar (range resolver)
                 [],   # existing appointments (no conflicts)
                 [],   # gcal_blocks
                 [],   # all_day_apts
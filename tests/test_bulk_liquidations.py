@@ -0,0 +1,151 @@
+"""Tests for the set-based LiquidationService.generate_bulk_liquidations."""
+
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from services import liquidation_service as ls
+from services.liquidation_service import LiquidationService
+
+PERIOD = (date(2026, 6, 1), date(2026, 6, 30))
+
+
+def _appt(prof_id, amount, code="ENDO", payment_status="paid", status="completed", **pcts):
+    row = {
+        "professional_id": prof_id,
+        "appointment_id": prof_id * 100 + int(amount),
+        "appointment_datetime": datetime(2026, 6, 10, 10, 0),
+        "appointment_status": status,
+        "payment_status": payment_status,
+        "billing_amount": Decimal(str(amount)),
+        "treatment_code": code,
+        "plan_id": None,
+        "plan_approved_total": None,
+        "plan_status": None,
+        "history_treatment_pct": None,
+        "current_treatment_pct": None,
+        "history_default_pct": None,
+        "current_default_pct": None,
+    }
+    row.update(pcts)
+    return row
+
+
+def _pool(professionals, existing, appointments, upserted=(), treatment_types=()):
+    conn = MagicMock()
+    conn.execute = AsyncMock()
+    conn.fetch = AsyncMock(return_value=list(upserted))
+    tx = MagicMock()
+    tx.__aenter__ = AsyncMock(return_value=tx)
+    tx.__aexit__ = AsyncMock(return_value=False)
+    conn.transaction = MagicMock(return_value=tx)
+    acquire = MagicMock()
+    acquire.__aenter__ = AsyncMock(return_value=conn)
+    acquire.__aexit__ = AsyncMock(return_value=False)
+
+    pool = MagicMock()
+    pool.acquire = MagicMock(return_value=acquire)
+    pool.fetch = AsyncMock(side_effect=[professionals, existing, appointments, list(treatment_types)])
+    return pool, conn
+
+
+def _prof(prof_id, first="Ana"):
+    return {"id": prof_id, "first_name": first, "last_name": "Paz"}
+
+
+def test_resolve_commission_prefers_history_then_current_config():
+    row = _appt(1, 100, history_treatment_pct=Decimal("55"), current_treatment_pct=Decimal("30"),
+                history_default_pct=Decimal("35"))
+    assert ls._resolve_commission_pct(row, None) == (55.0, False)
+
+    row = _appt(1, 100, current_treatment_pct=Decimal("30"), current_default_pct=Decimal("20"))
+    assert ls._resolve_commission_pct(row, None) == (30.0, False)
+
+    row = _appt(1, 100, code="OTHER", history_default_pct=Decimal("35"), current_default_pct=Decimal("20"))
+    assert ls._resolve_commission_pct(row, None) == (35.0, False)
+
+
+def test_resolve_commission_default_zero_splits_override_everything():
+    splits = ls._default_zero_splits([
+        {"code": "ENDO", "name": "Endodoncia"},
+        {"code": "CONS", "name": "Consulta"},
+        {"code": "LIMP", "name": "Limpieza"},
+    ])
+    assert set(splits) == {"ENDO", "CONS"}
+
+    assert ls._resolve_commission_pct(_appt(1, 100, history_treatment_pct=Decimal("10")), splits) == (60.0, True)
+    assert ls._resolve_commission_pct(_appt(1, 100, code="LIMP"), splits) == (40.0, True)
+    assert set(ls._default_zero_splits([])) == {"root_canal", "orthodontics", "consultation"}
+
+
+@pytest.mark.asyncio
+async def test_bulk_writes_every_professional_in_one_upsert():
+    appointments = [
+        _appt(1, 100, history_default_pct=Decimal("50")),
+        _appt(1, 50, payment_status="pending", history_default_pct=Decimal("50")),
+        _appt(1, 200, status="cancelled", history_default_pct=Decimal("50")),
+        _appt(2, 80, code="CONS", current_default_pct=Decimal("25")),
+    ]
+    upserted = [
+        {"id": 11, "professional_id": 1, "total_billed": Decimal("150"), "status": "generated"},
+        {"id": 12, "professional_id": 2, "total_billed": Decimal("80"), "status": "draft"},
+    ]
+    pool, conn = _pool([_prof(1), _prof(2, "Luis")], [
+        {"id": 12, "professional_id": 2, "status": "draft", "total_billed": Decimal("0")},
+    ], appointments, upserted)
+    service = LiquidationService()
+
+    with patch.object(service, "invalidate_liquidation_pdf", AsyncMock()) as invalidate:
+        result = await service.generate_bulk_liquidations(pool, 1, *PERIOD, "admin@clinic.com")
+
+    # professionals, existing records, appointments; no plans nor default-zero lookups
+    assert pool.fetch.await_count == 3
+    conn.transaction.assert_called_once()
+    conn.fetch.assert_awaited_once()
+    sql, *args = conn.fetch.await_args.args
+    assert "ON CONFLICT" in sql and "unnest" in sql
+    assert args[:4] == [1, *PERIOD, "admin@clinic.com"]
+    assert json.loads(args[4])["audit_trail"][0]["action"] == "generated"
+    ids, billed, paid, pending, pct, commission, payout = args[5:]
+    assert ids == [1, 2]
+    assert billed == [150.0, 80.0] and paid == [100.0, 80.0] and pending == [50.0, 0.0]
+    assert commission == [50.0, 20.0] and payout == commission
+    assert pct[0] == pytest.approx(100 * 50 / 150)
+
+    invalidate.assert_awaited_once_with(1, 12)
+    assert result["generated_count"] == 2 and result["skipped_count"] == 0
+    assert [r["professional_name"] for r in result["liquidations"]] == ["Ana Paz", "Luis Paz"]
+    assert all("compute_ms" in r for r in result["liquidations"])
+    assert set(result["timings"]) == {"load_ms", "compute_ms", "write_ms", "total_ms"}
+
+
+@pytest.mark.asyncio
+async def test_bulk_preserves_approved_and_drops_stale_drafts():
+    pool, conn = _pool(
+        [_prof(1), _prof(2), _prof(3)],
+        [
+            {"id": 21, "professional_id": 1, "status": "approved", "total_billed": Decimal("900")},
+            {"id": 22, "professional_id": 2, "status": "generated", "total_billed": Decimal("40")},
+        ],
+        [_appt(1, 100), _appt(3, 10, code="ZZZ")],
+        upserted=[{"id": 23, "professional_id": 3, "total_billed": Decimal("10"), "status": "generated"}],
+        treatment_types=[{"code": "ENDO", "name": "Endodoncia"}],
+    )
+    service = LiquidationService()
+
+    with patch.object(service, "invalidate_liquidation_pdf", AsyncMock()) as invalidate:
+        result = await service.generate_bulk_liquidations(pool, 1, *PERIOD, "admin@clinic.com")
+
+    # Professional 2 has no appointments: its generated record is removed
+    delete_sql, tenant_id, to_delete = conn.execute.await_args.args
+    assert "DELETE FROM liquidation_records" in delete_sql and to_delete == [22]
+    # Only professional 3 is recalculated, at the default-zero 40%
+    args = conn.fetch.await_args.args
+    assert args[6] == [3] and args[11] == [4.0]
+    invalidate.assert_not_awaited()
+
+    assert result["generated_count"] == 1 and result["skipped_count"] == 1
+    assert [(r["id"], r["status"]) for r in result["liquidations"]] == [(21, "approved"), (23, "generated")]
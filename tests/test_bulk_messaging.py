@@ -0,0 +1,150 @@
+"""Tests for services/bulk_messaging.py — background bulk WhatsApp sends."""
+
+import json
+import time
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from services import bulk_messaging
+
+
+def _pool(job=None, pending=()):
+    conn = MagicMock()
+    conn.fetchval = AsyncMock(return_value=42)
+    conn.execute = AsyncMock(return_value="UPDATE 1")
+
+    @asynccontextmanager
+    async def _transaction():
+        yield
+
+    @asynccontextmanager
+    async def _acquire():
+        yield conn
+
+    conn.transaction = _transaction
+    pool = MagicMock()
+    pool.acquire = _acquire
+    pool.conn = conn
+    pool.fetchrow = AsyncMock(return_value=job)
+    pool.fetch = AsyncMock(return_value=list(pending))
+    pool.fetchval = AsyncMock(side_effect=[0, 0])
+    pool.execute = AsyncMock(return_value="UPDATE 1")
+    return pool
+
+
+def _job(action="mensaje_libre", params=None, total=3):
+    return {"id": 7, "tenant_id": 1, "action": action, "status": "pending", "total_count": total,
+            "sent_count": 0, "failed_count": 0,
+            "params": json.dumps(params or {"mensaje": "Hola {nombre}"})}
+
+
+def _rec(rid, phone):
+    return {"id": rid, "patient_id": rid, "phone": phone, "patient_name": f"P{rid}"}
+
+
+@pytest.mark.asyncio
+async def test_create_job_dedupes_phones_and_inserts_recipients_in_one_statement():
+    pool = _pool()
+    recipients = [{"patient_id": 1, "phone": "+541", "patient_name": "Ana"},
+                  {"patient_id": 2, "phone": "+541", "patient_name": "Ana bis"},
+                  {"patient_id": 3, "phone": "+543", "patient_name": "Beto"},
+                  {"patient_id": 4, "phone": "", "patient_name": "Sin tel"}]
+
+    job_id = await bulk_messaging.create_bulk_job(pool, 1, "plantilla", {"template_name": "t"}, recipients)
+
+    assert job_id == 42
+    assert pool.conn.fetchval.await_args.args[4] == 2  # total_count
+    insert = pool.conn.execute.await_args
+    assert "unnest" in insert.args[0]
+    assert insert.args[3:] == ([1, 3], ["+541", "+543"], ["Ana", "Beto"])
+
+
+@pytest.mark.asyncio
+async def test_run_resolves_sender_once_and_retries_rate_limited_recipient():
+    pending = [_rec(1, "+541"), _rec(2, "+542"), _rec(3, "+543")]
+    pool = _pool(job=_job(), pending=pending)
+
+    sender = MagicMock(tenant_id=1, clinic_name=None)
+    calls = []
+
+    async def send_text(phone, text):
+        calls.append((phone, text))
+        if phone == "+542" and sum(1 for c in calls if c[0] == "+542") == 1:
+            return {"ok": False, "error": "rate_limited", "retry_after": 0}
+        if phone == "+543":
+            return {"ok": False, "error": "invalid number"}
+        return {"ok": True}
+
+    sender.send_text = send_text
+    resolve = AsyncMock(return_value=(sender, None))
+
+    with patch.object(bulk_messaging, "resolve_sender", resolve), \
+         patch.object(bulk_messaging, "get_tenant_send_limits", AsyncMock(return_value=(1000.0, 1000))), \
+         patch.object(bulk_messaging, "_emit_progress", AsyncMock()) as emit:
+        summary = await bulk_messaging._run_locked(pool, 7)
+
+    assert resolve.await_count == 1
+    assert ("+541", "Hola P1") in calls
+    assert sum(1 for c in calls if c[0] == "+542") == 2
+    assert summary == {"job_id": 7, "status": "completed", "total": 3, "sent": 2, "failed": 1, "pending": 0}
+    assert emit.await_args.args[1]["status"] == "completed"
+
+    results = next(c for c in pool.conn.execute.await_args_list if "bulk_send_recipients" in c.args[0])
+    by_id = dict(zip(results.args[1], zip(results.args[2], results.args[4])))
+    assert by_id == {1: ("sent", 1), 2: ("sent", 2), 3: ("failed", 1)}
+
+
+@pytest.mark.asyncio
+async def test_messaging_tier_caps_the_run_and_parks_the_job():
+    pool = _pool(job=_job(total=5), pending=[_rec(1, "+541")])
+    pool.fetchval = AsyncMock(side_effect=[999, 4])  # 999 sent in the last 24h, 4 still pending
+
+    sender = MagicMock(tenant_id=1, clinic_name=None)
+    sender.send_text = AsyncMock(return_value={"ok": True})
+
+    with patch.object(bulk_messaging, "resolve_sender", AsyncMock(return_value=(sender, None))), \
+         patch.object(bulk_messaging, "get_tenant_send_limits", AsyncMock(return_value=(1000.0, 1000))), \
+         patch.object(bulk_messaging, "_emit_progress", AsyncMock()):
+        summary = await bulk_messaging._run_locked(pool, 7)
+
+    assert pool.fetch.await_args.args[2] == 1  # LIMIT = remaining tier quota
+    assert summary["status"] == "paused" and summary["pending"] == 4
+    final = pool.execute.await_args_list[-1]
+    assert "resume_after" in final.args[0] and final.args[2] == "paused"
+
+
+@pytest.mark.asyncio
+async def test_missing_credentials_fail_the_job_without_sending():
+    pool = _pool(job=_job())
+    with patch.object(bulk_messaging, "resolve_sender", AsyncMock(return_value=(None, "No YCloud API key"))), \
+         patch.object(bulk_messaging, "_emit_progress", AsyncMock()):
+        summary = await bulk_messaging._run_locked(pool, 7)
+
+    assert summary == {"status": "failed", "error": "No YCloud API key"}
+    assert "status = 'failed'" in pool.execute.await_args.args[0]
+    pool.fetch.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_paces_sends_and_honours_pause():
+    bucket = bulk_messaging.TokenBucket(rate=50)
+    bucket.tokens = 0
+    start = time.monotonic()
+    for _ in range(3):
+        await bucket.acquire()
+    assert time.monotonic() - start >= 0.05
+
+    bucket.pause(0.1)
+    start = time.monotonic()
+    await bucket.acquire()
+    assert time.monotonic() - start >= 0.09
+
+
+def test_template_components_fill_positional_and_named_variables():
+    components = [{"type": "BODY", "text": "Hola {{1}}, tu turno es el {{fecha}}"},
+                  {"type": "FOOTER", "text": "sin variables"}]
+    built = bulk_messaging.build_template_components(components, "Ana", {"fecha": "lunes"})
+    assert built == [{"type": "body", "parameters": [{"type": "text", "text": "Ana"},
+                                                     {"type": "text", "text": "lunes"}]}]
@@ -34,7 +34,7 @@ class TestConversationState:
         """Case 1: Get state when not found - returns IDLE"""
         # Setup fresh mock
         mock_r = MagicMock()
-        mock_r.get = AsyncMock(return_value=None)
+        mock_r.hgetall = AsyncMock(return_value={})
 
         with patch("services.relay.get_redis", return_value=mock_r):
             from conversation_state import get_state
@@ -47,9 +47,14 @@ class TestConversationState:
     async def test_set_and_get_roundtrip(self):
         """Case 2: Set state then get - returns same state"""
         mock_r = MagicMock()
-        mock_r.setex = AsyncMock(return_value=True)
-        mock_r.get = AsyncMock(
-            return_value=b'{"state": "OFFERED_SLOTS", "last_offered_slots": [], "last_locked_slot": null, "updated_at": "2026-01-01T00:00:00"}'
+        mock_r.pipeline.return_value.execute = AsyncMock(return_value=[1, True])
+        mock_r.hgetall = AsyncMock(
+            return_value={
+                b"state": b'"OFFERED_SLOTS"',
+                b"last_offered_slots": b"[]",
+                b"last_locked_slot": b"null",
+                b"updated_at": b'"2026-01-01T00:00:00"',
+            }
         )
 
         with patch("services.relay.get_redis", return_value=mock_r):
@@ -64,13 +69,17 @@ class TestConversationState:
             result = await get_state(1, "5491112345678")
 
         assert result["state"] == "OFFERED_SLOTS"
+        # Transition fields go out in one HSET; anti-loop fields are never read first.
+        written = mock_r.pipeline.return_value.hset.call_args.kwargs["mapping"]
+        assert written["state"] == '"OFFERED_SLOTS"'
+        assert "failed_slots" not in written
 
     @pytest.mark.asyncio
     async def test_transition_happy(self):
         """Case 3: Transition from expected state - succeeds"""
         mock_r = MagicMock()
-        mock_r.get = AsyncMock(return_value=b'{"state": "OFFERED_SLOTS"}')
-        mock_r.setex = AsyncMock(return_value=True)
+        script = AsyncMock(return_value=1)
+        mock_r.register_script.return_value = script
 
         with patch("services.relay.get_redis", return_value=mock_r):
             from conversation_state import transition
@@ -84,12 +93,16 @@ class TestConversationState:
             )
 
         assert result is True
+        args = script.await_args.kwargs["args"]
+        assert args[2] == "OFFERED_SLOTS"
+        assert args[3:5] == ["state", '"SLOT_LOCKED"']
 
     @pytest.mark.asyncio
     async def test_transition_conflict_returns_false(self):
         """Case 4: Transition from wrong state - returns False"""
         mock_r = MagicMock()
-        mock_r.get = AsyncMock(return_value=b'{"state": "IDLE"}')
+        # The check-and-set script returns 0 when the current state differs
+        mock_r.register_script.return_value = AsyncMock(return_value=0)
 
         with patch("services.relay.get_redis", return_value=mock_r):
             from conversation_state import transition
@@ -127,7 +140,7 @@ class TestConversationState:
     async def test_redis_fail_on_set_warns_no_raise(self):
         """Case 7: Redis fail on set - logs warning, no exception"""
         mock_r = MagicMock()
-        mock_r.setex = AsyncMock(side_effect=Exception("Redis down"))
+        mock_r.pipeline.return_value.execute = AsyncMock(side_effect=Exception("Redis down"))
 
         with patch("services.relay.get_redis", return_value=mock_r):
             from conversation_state import set_state
@@ -0,0 +1,136 @@
+"""Tests for services/conversation_state.py — hash layout and server-side field ops."""
+
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+_REDIS_TARGET = "services.relay.get_redis"
+_KEY = "convstate:1:5491112345678"
+
+
+def _redis_with_script(result=1):
+    r = MagicMock()
+    script = AsyncMock(return_value=result)
+    r.register_script.return_value = script
+    return r, script
+
+
+@pytest.mark.asyncio
+async def test_get_state_decodes_fields_and_fills_defaults():
+    from services.conversation_state import get_state
+
+    r = MagicMock()
+    r.hgetall = AsyncMock(return_value={
+        "state": '"SLOT_LOCKED"',
+        "failed_slots": '[{"date": "2026-05-12", "time": "10:00", "code": "UNAVAILABLE"}]',
+        "booking_attempts": "2",
+        "statements_made:abc123": "3",
+    })
+    with patch(_REDIS_TARGET, return_value=r):
+        state = await get_state(1, "+54 9 11 1234-5678")
+
+    r.hgetall.assert_awaited_once_with(_KEY)
+    assert state["state"] == "SLOT_LOCKED"
+    assert state["failed_slots"][0]["code"] == "UNAVAILABLE"
+    assert state["booking_attempts"] == 2
+    assert state["statements_made"] == {"abc123": 3}
+    # Never-written fields get the same defaults set_state used to copy in.
+    assert state["excluded_days"] == [] and state["frustration_mode"] is False
+    assert state["booking_targets"][0]["type"] == "self"
+
+
+@pytest.mark.asyncio
+async def test_mutators_are_single_script_calls():
+    from services import conversation_state as cs
+
+    r, script = _redis_with_script(result=4)
+    with patch(_REDIS_TARGET, return_value=r):
+        count = await cs.increment_booking_attempts(1, "+5491112345678")
+        await cs.append_failed_slot(1, "+5491112345678", {"date": "2026-05-12", "time": "10:00", "code": "X"})
+        await cs.decrement_booking_attempts(1, "+5491112345678")
+        stmt = await cs.track_statement(1, "+5491112345678", "abc123")
+
+    assert count == 4 and stmt == 4
+    assert script.await_count == 4
+    r.get.assert_not_called()
+    incr, append, decr, track = [c.kwargs for c in script.await_args_list]
+    assert incr["keys"] == [_KEY]
+    assert incr["args"][2:] == ["booking_attempts", 1, ""]
+    assert append["args"][2] == "failed_slots"
+    assert append["args"][4] == "date,time,code"
+    assert decr["args"][2:] == ["booking_attempts", -1, 0]
+    assert track["args"][2] == "statements_made:abc123"
+
+
+@pytest.mark.asyncio
+async def test_error_history_append_is_capped_server_side():
+    from services import conversation_state as cs
+
+    r, script = _redis_with_script()
+    with patch(_REDIS_TARGET, return_value=r):
+        await cs.append_error_history(1, "+5491112345678", {"category": "x"})
+
+    args = script.await_args.kwargs["args"]
+    assert args[2] == "error_history"
+    assert args[-1] == cs.ERROR_HISTORY_CAP
+
+
+@pytest.mark.asyncio
+async def test_legacy_json_key_is_migrated_then_retried():
+    from redis.exceptions import ResponseError
+
+    from services import conversation_state as cs
+
+    r = MagicMock()
+    script = AsyncMock(side_effect=[ResponseError("WRONGTYPE Operation against a key"), 3])
+    r.register_script.return_value = script
+    r.get = AsyncMock(return_value=json.dumps({"state": "BOOKED", "turn_count": 2, "statements_made": {"h": 1}}))
+    r.ttl = AsyncMock(return_value=900)
+    pipe = r.pipeline.return_value
+    pipe.execute = AsyncMock(return_value=[1, 3, True])
+
+    with patch(_REDIS_TARGET, return_value=r):
+        count = await cs.increment_turn_count(1, "+5491112345678")
+
+    assert count == 3
+    assert script.await_count == 2
+    pipe.delete.assert_called_once_with(_KEY)
+    mapping = pipe.hset.call_args.kwargs["mapping"]
+    assert mapping == {"state": '"BOOKED"', "turn_count": "2", "statements_made:h": "1"}
+    pipe.expire.assert_called_once_with(_KEY, 900)
+
+
+@pytest.mark.asyncio
+async def test_redis_errors_fail_open():
+    from services import conversation_state as cs
+
+    r = MagicMock()
+    r.register_script.return_value = AsyncMock(side_effect=ConnectionError("down"))
+    with patch(_REDIS_TARGET, return_value=r):
+        assert await cs.track_statement(1, "+5491112345678", "abc") == 1
+        assert await cs.increment_frustration(1, "+5491112345678") == 0
+        assert await cs.transition(1, "+5491112345678", "IDLE", "OFFERED_SLOTS") is False
+
+
+@pytest.mark.asyncio
+async def test_state_changes_clear_turn_scoped_flags():
+    from services import conversation_state as cs
+
+    r, script = _redis_with_script()
+    pipe = r.pipeline.return_value
+    pipe.execute = AsyncMock(return_value=[1, 1, True])
+    with patch(_REDIS_TARGET, return_value=r):
+        await cs.update_fields(1, "+5491112345678", has_correction=True)
+        assert script.await_args.kwargs["args"][2:] == ["has_correction", "true"]
+
+        await cs.set_state(1, "+5491112345678", "OFFERED_SLOTS")
+        pipe.hdel.assert_called_once_with(_KEY, "has_correction", "compound_intent")
+        assert "has_correction" not in pipe.hset.call_args.kwargs["mapping"]
+
+        assert await cs.transition(1, "+5491112345678", "OFFERED_SLOTS", "SLOT_LOCKED") is True
+
+    transition_script = r.register_script.call_args.args[0]
+    hdel = transition_script.index("redis.call('HDEL', key, 'has_correction', 'compound_intent')")
+    # Cleared only once the expected-state check passed, before the new fields are written
+    assert transition_script.index("return 0") < hdel < transition_script.index("'HSET', key, ARGV[i]")
@@ -0,0 +1,112 @@
+"""Tests for core/credentials.py — cached credential reads, invalidation and webhook token map."""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+_REDIS_TARGET = "services.relay.get_redis"
+
+
+@pytest.fixture(autouse=True)
+def _reset_cache():
+    from core import credentials
+
+    credentials._drop_cached_credentials()
+    credentials._WEBHOOK_TOKEN_MAP.clear()
+    with patch(_REDIS_TARGET, return_value=None):
+        yield
+    credentials._drop_cached_credentials()
+    credentials._WEBHOOK_TOKEN_MAP.clear()
+
+
+def _pool(fetchrow=None, fetch=None):
+    pool = MagicMock()
+    pool.fetchrow = AsyncMock(return_value=fetchrow)
+    pool.fetch = AsyncMock(return_value=fetch or [])
+    pool.execute = AsyncMock()
+    return pool
+
+
+@pytest.mark.asyncio
+async def test_repeated_reads_hit_cache():
+    from core import credentials
+
+    pool = _pool(fetchrow={"value": "sk-tenant"})
+    with patch.object(credentials, "get_pool", return_value=pool):
+        first = await credentials.get_tenant_credential(1, "OPENAI_API_KEY")
+        second = await credentials.get_tenant_credential(1, "OPENAI_API_KEY")
+
+    assert first == second == "sk-tenant"
+    assert pool.fetchrow.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_missing_row_is_negatively_cached_with_env_fallback(monkeypatch):
+    from core import credentials
+
+    monkeypatch.setenv("YCLOUD_API_KEY", " env-key ")
+    pool = _pool(fetchrow=None)
+    with patch.object(credentials, "get_pool", return_value=pool):
+        assert await credentials.get_tenant_credential(1, "YCLOUD_API_KEY") == "env-key"
+        monkeypatch.delenv("YCLOUD_API_KEY")
+        assert await credentials.get_tenant_credential(1, "YCLOUD_API_KEY") is None
+
+    assert pool.fetchrow.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_save_invalidates_and_publishes():
+    from core import credentials
+
+    redis = MagicMock()
+    redis.publish = AsyncMock()
+    pool = _pool(fetchrow={"value": "old"})
+    with patch.object(credentials, "get_pool", return_value=pool), \
+            patch.object(credentials, "encrypt_value", side_effect=lambda v: v):
+        assert await credentials.get_tenant_credential(1, "YCLOUD_API_KEY") == "old"
+        with patch(_REDIS_TARGET, return_value=redis):
+            assert await credentials.save_tenant_credential(1, "YCLOUD_API_KEY", "new")
+        pool.fetchrow.return_value = {"value": "new"}
+        assert await credentials.get_tenant_credential(1, "YCLOUD_API_KEY") == "new"
+
+    redis.publish.assert_awaited_once_with(credentials.CREDENTIAL_INVALIDATE_CHANNEL, "1:YCLOUD_API_KEY")
+
+
+def test_invalidation_messages_scope():
+    from core import credentials
+
+    for key in [(1, "A"), (1, "B"), (2, "A")]:
+        credentials._CREDENTIAL_CACHE[key] = (float("inf"), "v")
+
+    credentials._apply_invalidation_message("1:A")
+    assert set(credentials._CREDENTIAL_CACHE) == {(1, "B"), (2, "A")}
+    credentials._apply_invalidation_message("2:*")
+    assert set(credentials._CREDENTIAL_CACHE) == {(1, "B")}
+    credentials._apply_invalidation_message("garbage")
+    credentials._apply_invalidation_message("*")
+    assert credentials._CREDENTIAL_CACHE == {}
+
+
+@pytest.mark.asyncio
+async def test_webhook_token_map_resolves_encrypted_and_throttles_misses():
+    from core import credentials
+
+    rows = [{"tenant_id": 1, "value": "enc:tok-a"}, {"tenant_id": 2, "value": "tok-b"}]
+    pool = _pool(fetch=rows)
+    decrypt = lambda v: v.removeprefix("enc:")
+    with patch.object(credentials, "get_pool", return_value=pool), \
+            patch.object(credentials, "decrypt_value", side_effect=decrypt):
+        assert await credentials.resolve_tenant_from_webhook_token(" tok-a ") == 1
+        assert await credentials.resolve_tenant_from_webhook_token("tok-b") == 2
+        # Unknown tokens within the refresh window never reach the DB.
+        assert await credentials.resolve_tenant_from_webhook_token("bogus") is None
+        assert await credentials.resolve_tenant_from_webhook_token("bogus") is None
+        assert await credentials.resolve_tenant_from_webhook_token("") is None
+
+        assert pool.fetch.await_count == 1
+
+        # A rotated token is picked up right after invalidation.
+        pool.fetch.return_value = [{"tenant_id": 1, "value": "tok-new"}]
+        await credentials.invalidate_tenant_credential(1, credentials.WEBHOOK_ACCESS_TOKEN)
+        assert await credentials.resolve_tenant_from_webhook_token("tok-new") == 1
+        assert await credentials.resolve_tenant_from_webhook_token("tok-a") is None
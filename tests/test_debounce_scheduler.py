@@ -0,0 +1,125 @@
+"""Tests for services/debounce_scheduler.py — event-driven debounce over a due-time ZSET."""
+
+import asyncio
+import time
+
+import pytest
+
+from services.debounce_scheduler import DebounceScheduler
+
+
+class FakeZsetRedis:
+    """Just enough of redis.asyncio for the scheduler, with call counting."""
+
+    def __init__(self):
+        self.zset = {}
+        self.ttls = {}  # key -> monotonic expiry
+        self.calls = []
+
+    async def zadd(self, key, mapping, gt=False):
+        self.calls.append("zadd")
+        for member, score in mapping.items():
+            if not gt or member not in self.zset or score > self.zset[member]:
+                self.zset[member] = score
+
+    async def zmscore(self, key, members):
+        self.calls.append("zmscore")
+        return [self.zset.get(m) for m in members]
+
+    async def pttl(self, key):
+        self.calls.append("pttl")
+        if key not in self.ttls:
+            return -2
+        return max(int((self.ttls[key] - time.monotonic()) * 1000), -2)
+
+    async def eval(self, script, numkeys, key, now, *members):
+        self.calls.append("eval")
+        popped = []
+        for m in members:
+            if m not in self.zset or self.zset[m] <= now:
+                self.zset.pop(m, None)
+                popped.append(m)
+        return popped
+
+    async def zremrangebyscore(self, key, low, high):
+        self.calls.append("zremrangebyscore")
+
+
+@pytest.mark.asyncio
+async def test_waiter_released_at_due_time_without_polling():
+    r = FakeZsetRedis()
+    scheduler = DebounceScheduler()
+    await scheduler.schedule(r, "timer:a", 0.2)
+
+    started = time.monotonic()
+    await asyncio.wait_for(scheduler.wait_until_due(r, "timer:a"), timeout=2)
+
+    assert time.monotonic() - started >= 0.15
+    assert "timer:a" not in r.zset
+    # One read before sleeping, one at the due time — not one per second.
+    assert r.calls.count("zmscore") == 2
+
+
+@pytest.mark.asyncio
+async def test_extension_while_waiting_pushes_release_back():
+    r = FakeZsetRedis()
+    scheduler = DebounceScheduler()
+    await scheduler.schedule(r, "timer:a", 0.1)
+    waiter = asyncio.create_task(scheduler.wait_until_due(r, "timer:a"))
+
+    await asyncio.sleep(0.05)
+    await scheduler.schedule(r, "timer:a", 0.3)
+    # A shorter window never cuts an open one.
+    await scheduler.schedule(r, "timer:a", 0.01)
+    await asyncio.sleep(0.15)
+    assert not waiter.done()
+
+    await asyncio.wait_for(waiter, timeout=2)
+    assert scheduler._waiters == {}
+
+
+@pytest.mark.asyncio
+async def test_many_waiters_share_one_read_per_wakeup():
+    r = FakeZsetRedis()
+    scheduler = DebounceScheduler()
+    members = [f"timer:{i}" for i in range(20)]
+    for m in members:
+        await scheduler.schedule(r, m, 0.1)
+
+    await asyncio.wait_for(
+        asyncio.gather(*(scheduler.wait_until_due(r, m) for m in members)), timeout=2
+    )
+
+    assert r.calls.count("zmscore") <= 3
+    assert r.zset == {}
+
+
+@pytest.mark.asyncio
+async def test_unscheduled_member_honours_timer_key_ttl():
+    r = FakeZsetRedis()
+    r.ttls["timer:legacy"] = time.monotonic() + 0.15
+    scheduler = DebounceScheduler()
+
+    started = time.monotonic()
+    await asyncio.wait_for(scheduler.wait_until_due(r, "timer:legacy"), timeout=2)
+    assert time.monotonic() - started >= 0.1
+
+    r.ttls.clear()
+    started = time.monotonic()
+    await asyncio.wait_for(scheduler.wait_until_due(r, "timer:gone"), timeout=2)
+    assert time.monotonic() - started < 0.1
+
+
+@pytest.mark.asyncio
+async def test_redis_failure_falls_back_to_ttl_polling():
+    class BrokenRedis(FakeZsetRedis):
+        async def zmscore(self, key, members):
+            raise ConnectionError("ERR unknown command 'ZMSCORE'")
+
+        async def ttl(self, key):
+            return -2
+
+    r = BrokenRedis()
+    scheduler = DebounceScheduler()
+    await asyncio.wait_for(scheduler.wait_until_due(r, "timer:a"), timeout=2)
+    assert scheduler._waiters == {}
@@ -0,0 +1,239 @@
+"""Tests for services/embedding_service.py — batched embedding client, embedding cache, FAQ matrix."""
+
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+_REDIS_TARGET = "services.relay.get_redis"
+
+
+class _FakePipeline:
+    def __init__(self, store):
+        self.store = store
+        self.ops = []
+
+    def setex(self, key, ttl, value):
+        self.ops.append((key, value))
+
+    async def execute(self):
+        for key, value in self.ops:
+            self.store[key] = value
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    async def mget(self, keys):
+        return [self.store.get(k) for k in keys]
+
+    def pipeline(self):
+        return _FakePipeline(self.store)
+
+
+def _fake_client(dim=3):
+    """AsyncOpenAI stand-in: vector i is [len(text), i, 0...], data returned out of order."""
+    calls = []
+
+    async def _create(input, model):
+        calls.append(list(input))
+        data = [
+            SimpleNamespace(index=i, embedding=[float(len(t)), float(i)] + [0.0] * (dim - 2))
+            for i, t in enumerate(input)
+        ]
+        return SimpleNamespace(data=list(reversed(data)), usage=None)
+
+    client = MagicMock()
+    client.embeddings.create = AsyncMock(side_effect=_create)
+    return client, calls
+
+
+@pytest.fixture(autouse=True)
+def _env(monkeypatch):
+    from services import embedding_service
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    embedding_service.clear_embedding_cache()
+    with patch.object(embedding_service, "_get_config", AsyncMock(side_effect=lambda k, d: d)):
+        yield
+    embedding_service.clear_embedding_cache()
+
+
+@pytest.mark.asyncio
+async def test_batches_inputs_and_preserves_order():
+    from services import embedding_service
+
+    client, calls = _fake_client()
+    texts = [f"texto {i}" for i in range(7)] + ["texto 0", "  "]
+    with patch.object(embedding_service, "_get_openai_client", return_value=client), \
+            patch.object(embedding_service, "EMBEDDING_BATCH_SIZE", 3), \
+            patch(_REDIS_TARGET, return_value=None):
+        vectors = await embedding_service.generate_embeddings(texts)
+
+    # 7 distinct non-blank texts → 3 requests of ≤3 inputs; duplicate and blank never sent.
+    assert [len(c) for c in calls] == [3, 3, 1]
+    assert vectors[0] == vectors[7]
+    assert vectors[8] is None
+    assert [v[0] for v in vectors[:7]] == [float(len(t)) for t in texts[:7]]
+
+
+@pytest.mark.asyncio
+async def test_repeated_query_is_served_from_local_cache():
+    from services import embedding_service
+
+    client, calls = _fake_client()
+    with patch.object(embedding_service, "_get_openai_client", return_value=client), \
+            patch(_REDIS_TARGET, return_value=None):
+        first = await embedding_service.generate_embedding("¿Cuánto sale un implante?")
+        second = await embedding_service.generate_embedding("¿Cuánto sale un implante?")
+
+    assert first == second
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_redis_cache_shared_across_processes():
+    from services import embedding_service
+
+    redis = _FakeRedis()
+    client, calls = _fake_client()
+    with patch.object(embedding_service, "_get_openai_client", return_value=client), \
+            patch(_REDIS_TARGET, return_value=redis):
+        first = await embedding_service.generate_embedding("hola, ¿atienden OSDE?")
+
+    assert len(redis.store) == 1
+    assert json.loads(next(iter(redis.store.values()))) == first
+
+    # Another replica: empty local cache, Redis hit, no API call.
+    embedding_service.clear_embedding_cache()
+    other_client, other_calls = _fake_client()
+    with patch.object(embedding_service, "_get_openai_client", return_value=other_client), \
+            patch(_REDIS_TARGET, return_value=redis):
+        again = await embedding_service.generate_embedding("hola, ¿atienden OSDE?")
+
+    assert again == first
+    assert other_calls == []
+
+
+@pytest.mark.asyncio
+async def test_use_cache_false_skips_cache_layers():
+    from services import embedding_service
+
+    redis = _FakeRedis()
+    client, calls = _fake_client()
+    with patch.object(embedding_service, "_get_openai_client", return_value=client), \
+            patch(_REDIS_TARGET, return_value=redis):
+        await embedding_service.generate_embeddings(["faq a", "faq b"], use_cache=False)
+        await embedding_service.generate_embeddings(["faq a", "faq b"], use_cache=False)
+
+    assert len(calls) == 2
+    assert redis.store == {}
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_returns_none_for_its_inputs():
+    from services import embedding_service
+
+    client = MagicMock()
+    client.embeddings.create = AsyncMock(side_effect=RuntimeError("rate limited"))
+    with patch.object(embedding_service, "_get_openai_client", return_value=client), \
+            patch(_REDIS_TARGET, return_value=None):
+        vectors = await embedding_service.generate_embeddings(["a", "b"])
+
+    assert vectors == [None, None]
+
+
+@pytest.mark.asyncio
+async def test_faq_sync_embeds_all_pending_faqs_in_one_pass():
+    from services import embedding_service
+
+    faqs = [{"id": i, "question": f"P{i}", "answer": f"R{i}"} for i in range(1, 4)]
+    fake_db = MagicMock()
+    fake_db.pool.fetchval = AsyncMock(return_value=3)
+    fake_db.pool.fetch = AsyncMock(return_value=faqs)
+    embed_many = AsyncMock(return_value=[[0.1], None, [0.3]])
+    store = AsyncMock(return_value=True)
+
+    with patch.object(embedding_service, "db", fake_db), \
+            patch.object(embedding_service, "check_pgvector_available", AsyncMock(return_value=True)), \
+            patch.object(embedding_service, "generate_embeddings", embed_many), \
+            patch.object(embedding_service, "_store_faq_embedding", store):
+        count = await embedding_service.sync_tenant_faq_embeddings(1)
+
+    embed_many.assert_awaited_once_with(["P1 R1", "P2 R2", "P3 R3"], use_cache=False)
+    assert count == 2
+    assert [c.args[1] for c in store.await_args_list] == [1, 3]
+
+
+# ── JSON fallback: per-tenant FAQ matrix ─────────────────────────────────────
+
+
+def _faq_rows():
+    return [
+        {"faq_id": 1, "embedding": json.dumps([1.0, 0.0, 0.0]), "question": "¿Horario?", "answer": "9 a 18", "category": "G"},
+        {"faq_id": 2, "embedding": [0.0, 2.0, 0.0], "question": "¿Precio?", "answer": "Consultar", "category": "P"},
+        {"faq_id": 3, "embedding": [0.6, 0.8, 0.0], "question": "¿OSDE?", "answer": "Sí", "category": "O"},
+        {"faq_id": 4, "embedding": [1.0, 0.0], "question": "Modelo viejo", "answer": "-", "category": "G"},
+    ]
+
+
+@pytest.fixture
+def _json_fallback_db():
+    from services import embedding_service
+
+    embedding_service.invalidate_faq_matrix()
+    fake_db = MagicMock()
+    fake_db.pool.fetch = AsyncMock(return_value=_faq_rows())
+    fake_db.pool.execute = AsyncMock()
+    with patch.object(embedding_service, "db", fake_db), \
+            patch.object(embedding_service, "check_pgvector_available", AsyncMock(return_value=False)):
+        yield fake_db
+    embedding_service.invalidate_faq_matrix()
+
+
+@pytest.mark.asyncio
+async def test_json_fallback_scores_with_cached_matrix(_json_fallback_db):
+    from services import embedding_service
+
+    with patch.object(embedding_service, "generate_embedding", AsyncMock(return_value=[0.0, 1.0, 0.0])):
+        first = await embedding_service.search_similar_faqs(1, "¿cuánto sale?", top_k=2, threshold=0.5)
+        second = await embedding_service.search_similar_faqs(1, "¿cuánto sale?", top_k=2, threshold=0.5)
+
+    assert [f["faq_id"] for f in first] == [2, 3]
+    assert first[0]["similarity"] == 1.0 and first[1]["similarity"] == 0.8
+    assert second == first
+    # Matrix built once: a single SELECT over faq_embeddings_json for both queries.
+    assert _json_fallback_db.pool.fetch.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_faq_upsert_and_delete_invalidate_matrix(_json_fallback_db):
+    from services import embedding_service
+
+    with patch.object(embedding_service, "generate_embedding", AsyncMock(return_value=[1.0, 0.0, 0.0])):
+        await embedding_service.search_similar_faqs(1, "horario", top_k=3, threshold=0.9)
+        assert 1 in embedding_service._FAQ_MATRIX_CACHE
+
+        await embedding_service.upsert_faq_embedding(1, 5, "Nueva", "FAQ")
+        assert 1 not in embedding_service._FAQ_MATRIX_CACHE
+
+        await embedding_service.search_similar_faqs(1, "horario", top_k=3, threshold=0.9)
+        await embedding_service.delete_faq_embedding(5, 1)
+        assert 1 not in embedding_service._FAQ_MATRIX_CACHE
+
+
+def test_top_k_from_matrix_orders_and_thresholds():
+    import numpy as np
+
+    from services.embedding_service import _top_k_from_matrix
+
+    meta = [{"faq_id": i} for i in range(5)]
+    matrix = np.eye(5, dtype=np.float32)
+    query = [0.1, 0.9, 0.0, 0.5, 0.3]
+
+    result = _top_k_from_matrix(meta, matrix, query, top_k=2, threshold=0.2)
+    assert [r["faq_id"] for r in result] == [1, 3]
+    assert _top_k_from_matrix(meta, matrix, [0.0] * 5, top_k=2, threshold=0.0) == []
+    assert _top_k_from_matrix(meta, matrix, [1.0, 0.0], top_k=2, threshold=0.0) == []
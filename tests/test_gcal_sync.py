@@ -0,0 +1,109 @@
+"""Tests for services/gcal_sync.py — incremental Google Calendar sync with bulk upserts."""
+
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from services import gcal_sync
+
+
+def _event(gid, status="confirmed", start="2026-05-12T10:00:00-03:00", end="2026-05-12T11:00:00-03:00"):
+    return {"id": gid, "status": status, "summary": f"Evento {gid}",
+            "start": {"dateTime": start}, "end": {"dateTime": end}}
+
+
+def _recent():
+    return datetime.now(timezone.utc) - timedelta(hours=1)
+
+
+def _pool(cursor=None):
+    pool = MagicMock()
+    pool.fetchrow = AsyncMock(return_value=cursor)
+    pool.execute = AsyncMock(return_value="DELETE 0")
+    return pool
+
+
+@pytest.mark.asyncio
+async def test_apply_changes_is_one_delete_and_one_bulk_upsert():
+    pool = _pool()
+    events = [_event("a"), _event("b"), _event("gone", status="cancelled"), _event("apt-1")]
+
+    stats = await gcal_sync.apply_changes(pool, 1, 7, events, appointment_event_ids={"apt-1"})
+
+    assert stats == {"upserted": 2, "deleted": 1}
+    assert pool.execute.await_count == 2
+    delete, upsert = pool.execute.await_args_list
+    assert "DELETE FROM google_calendar_blocks" in delete.args[0]
+    assert delete.args[3] == ["gone"]
+    assert "unnest" in upsert.args[0] and "ON CONFLICT (google_event_id) DO UPDATE" in upsert.args[0]
+    assert upsert.args[3] == ["a", "b"]
+    assert upsert.args[-1] == gcal_sync.SYNC_STATUS
+
+
+@pytest.mark.asyncio
+async def test_incremental_sync_uses_stored_token_and_skips_reconcile():
+    pool = _pool(cursor={"calendar_id": "cal@x", "sync_token": "tok-1", "last_full_sync_at": _recent()})
+    service = MagicMock()
+    service.sync_events.return_value = ([_event("a")], "tok-2")
+
+    with patch("gcal_service.gcal_service", service):
+        await gcal_sync.sync_professional(pool, 1, 7, "cal@x", set())
+
+    assert service.sync_events.call_args.args[:2] == ("cal@x", "tok-1")
+    sqls = [c.args[0] for c in pool.execute.await_args_list]
+    assert not any("NOT (google_event_id = ANY" in s for s in sqls)
+    cursor_save = pool.execute.await_args_list[-1]
+    assert "gcal_sync_cursors" in cursor_save.args[0]
+    assert cursor_save.args[4] == "tok-2" and cursor_save.args[5] is False
+
+
+@pytest.mark.asyncio
+async def test_expired_token_falls_back_to_full_resync_and_reconciles():
+    from gcal_service import SyncTokenExpired
+
+    pool = _pool(cursor={"calendar_id": "cal@x", "sync_token": "stale", "last_full_sync_at": _recent()})
+    service = MagicMock()
+    service.sync_events.side_effect = [SyncTokenExpired("cal@x"), ([_event("a"), _event("b")], "fresh")]
+
+    with patch("gcal_service.gcal_service", service):
+        await gcal_sync.sync_professional(pool, 1, 7, "cal@x", set())
+
+    assert service.sync_events.call_args.args[1] is None
+    time_min, time_max = service.sync_events.call_args.args[2:]
+    assert time_min < time_max
+    reconcile = next(c for c in pool.execute.await_args_list if "NOT (google_event_id = ANY" in c.args[0])
+    # Any row mirroring a Google event (legacy 'synced' ones too); hand-made blocks have no event id.
+    assert "google_event_id IS NOT NULL" in reconcile.args[0]
+    assert "sync_status" not in reconcile.args[0]
+    # Bounded to the listed window
+    since, until = reconcile.args[3:5]
+    assert since < datetime.now(timezone.utc) < until
+    assert reconcile.args[5] == ["a", "b"]
+    assert pool.execute.await_args_list[-1].args[5] is True
+
+
+@pytest.mark.asyncio
+async def test_changed_calendar_id_forces_full_sync():
+    pool = _pool(cursor={"calendar_id": "old@x", "sync_token": "tok-1"})
+    service = MagicMock()
+    service.sync_events.return_value = ([], "tok-new")
+
+    with patch("gcal_service.gcal_service", service):
+        await gcal_sync.sync_professional(pool, 1, 7, "new@x", set())
+
+    assert service.sync_events.call_args.args[:2] == ("new@x", None)
+
+
+@pytest.mark.asyncio
+async def test_stale_full_listing_forces_full_resync():
+    old = datetime.now(timezone.utc) - timedelta(days=gcal_sync.FULL_RESYNC_INTERVAL_DAYS + 1)
+    pool = _pool(cursor={"calendar_id": "cal@x", "sync_token": "tok-1", "last_full_sync_at": old})
+    service = MagicMock()
+    service.sync_events.return_value = ([_event("a")], "tok-new")
+
+    with patch("gcal_service.gcal_service", service):
+        await gcal_sync.sync_professional(pool, 1, 7, "cal@x", set())
+
+    assert service.sync_events.call_args.args[:2] == ("cal@x", None)
+    assert pool.execute.await_args_list[-1].args[5] is True
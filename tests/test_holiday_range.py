@@ -0,0 +1,78 @@
+"""Tests for holiday_service range resolution — cached tenant calendar, parity with is_holiday."""
+
+from datetime import date, time
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from services import holiday_service as hs
+
+
+def _row(d, name, holiday_type="closure", recurring=False, hours=None, prof=None):
+    return {
+        "country_code": "AR", "language": "es",
+        "date": d, "name": name, "holiday_type": holiday_type, "is_recurring": recurring,
+        "custom_hours_start": hours[0] if hours else None,
+        "custom_hours_end": hours[1] if hours else None,
+        "professional_id": prof, "scope": "professional" if prof else "global",
+    }
+
+
+CALENDAR_ROWS = [
+    _row(date(2025, 5, 20), "Aniversario", recurring=True),
+    _row(date(2026, 7, 9), "Abrimos 9/7", holiday_type="override_open", hours=(time(10, 0), time(14, 0))),
+    _row(date(2026, 7, 13), "Congreso", prof=7),
+]
+
+
+@pytest.fixture(autouse=True)
+def _clean_cache():
+    hs._drop_cached_calendars()
+    with patch("services.relay.get_redis", return_value=None):
+        yield
+    hs._drop_cached_calendars()
+
+
+def _pool(rows):
+    pool = AsyncMock()
+    pool.fetch.return_value = rows
+    return pool
+
+
+@pytest.mark.asyncio
+async def test_range_matches_is_holiday_semantics_with_one_query():
+    pool = _pool(CALENDAR_ROWS)
+    result = await hs.resolve_holiday_range(pool, 1, date(2026, 7, 8), date(2026, 7, 15))
+    per_prof = await hs.resolve_professional_holiday_range(pool, 1, date(2026, 7, 8), date(2026, 7, 15), [7, 8])
+
+    assert pool.fetch.await_count == 1
+    assert result[date(2026, 7, 9)] == (True, "Abrimos 9/7", {"start": "10:00", "end": "14:00"})
+    assert result[date(2026, 7, 10)][0] is True  # library bridge holiday (AR)
+    assert result[date(2026, 7, 13)] == (False, None, None)  # professional block is not global
+    assert result[date(2026, 7, 15)] == (False, None, None)
+    assert per_prof[date(2026, 7, 13)] == {7: (True, "Congreso", None), 8: (False, None, None)}
+    # Library holidays never block a professional context (same as is_holiday).
+    assert per_prof[date(2026, 7, 10)][7] == (False, None, None)
+
+
+@pytest.mark.asyncio
+async def test_recurring_rows_project_onto_every_year():
+    pool = _pool(CALENDAR_ROWS)
+    result = await hs.resolve_holiday_range(pool, 1, date(2027, 5, 19), date(2027, 5, 21))
+    assert [d.day for d, r in result.items() if r[0]] == [20]
+
+
+@pytest.mark.asyncio
+async def test_invalidation_forces_reload_and_missing_tenant_is_negative_cached():
+    pool = _pool(CALENDAR_ROWS)
+    await hs.resolve_holiday_range(pool, 1, date(2026, 7, 9), date(2026, 7, 9))
+    await hs.invalidate_holiday_calendar(1)
+    await hs.resolve_holiday_range(pool, 1, date(2026, 7, 9), date(2026, 7, 9))
+    assert pool.fetch.await_count == 2
+
+    missing = _pool([])
+    assert await hs.resolve_holiday_range(missing, 2, date(2026, 7, 9), date(2026, 7, 9)) == {
+        date(2026, 7, 9): (False, None, None)
+    }
+    await hs.resolve_holiday_range(missing, 2, date(2026, 7, 9), date(2026, 7, 9))
+    assert missing.fetch.await_count == 1
@@ -0,0 +1,67 @@
+"""Tests for services/http_clients.py — pooled upstream clients with uniform retry and timing."""
+
+import httpx
+import pytest
+
+from services import http_clients
+
+
+def _client(upstream, responses, max_retries=2):
+    calls = []
+
+    def handler(request):
+        calls.append(request.method)
+        status, headers = responses[min(len(calls), len(responses)) - 1]
+        return httpx.Response(status, headers=headers, json={"n": len(calls)})
+
+    config = http_clients.UpstreamConfig(max_retries=max_retries)
+    transport = http_clients._make_transport(upstream, config, inner=httpx.MockTransport(handler))
+    return httpx.AsyncClient(transport=transport), calls
+
+
+@pytest.fixture(autouse=True)
+def _no_backoff(monkeypatch):
+    monkeypatch.setattr(http_clients, "BACKOFF_BASE_SECONDS", 0.0)
+    http_clients._STATS.clear()
+
+
+@pytest.mark.asyncio
+async def test_429_is_retried_even_for_post_and_counted():
+    client, calls = _client("t429", [(429, {"Retry-After": "0"}), (200, {})])
+    resp = await client.post("https://api.example.com/send", json={"to": "+54"})
+
+    assert resp.status_code == 200 and calls == ["POST", "POST"]
+    stats = http_clients.get_http_stats()["t429"]
+    assert stats["requests"] == 2 and stats["retries"] == 1
+    assert stats["status"] == {"4xx": 1, "2xx": 1}
+
+
+@pytest.mark.asyncio
+async def test_5xx_is_retried_only_for_idempotent_methods():
+    client, calls = _client("t5xx", [(503, {}), (503, {}), (200, {})])
+    assert (await client.post("https://api.example.com/send")).status_code == 503
+    assert calls == ["POST"]
+
+    client, calls = _client("t5xx", [(503, {}), (503, {}), (200, {})])
+    assert (await client.get("https://api.example.com/items")).status_code == 200
+    assert calls == ["GET", "GET", "GET"]
+    assert http_clients.get_http_stats()["t5xx"]["errors"] == 3
+
+
+@pytest.mark.asyncio
+async def test_long_retry_after_is_returned_to_the_caller():
+    client, calls = _client("tlong", [(429, {"Retry-After": "120"}), (200, {})])
+    resp = await client.get("https://api.example.com/items")
+    assert resp.status_code == 429 and calls == ["GET"]
+
+
+@pytest.mark.asyncio
+async def test_client_is_shared_per_upstream_until_closed():
+    ycloud = http_clients.get_http_client("ycloud")
+    assert http_clients.get_http_client("ycloud") is ycloud
+    assert http_clients.get_http_client("meta") is not ycloud
+
+    await http_clients.close_http_clients()
+    assert ycloud.is_closed
+    assert http_clients.get_http_client("ycloud") is not ycloud
+    await http_clients.close_http_clients()
@@ -0,0 +1,96 @@
+"""Tests for jobs/scheduler.py — lease-gated runs, persisted next_run_at and catch-up."""
+
+from datetime import datetime, time, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from jobs import scheduler as sched
+
+_REDIS_TARGET = "services.relay.get_redis"
+
+
+def _redis(acquired=True):
+    r = MagicMock()
+    r.set = AsyncMock(return_value=acquired)
+    r.eval = AsyncMock(return_value=1)
+    return r
+
+
+def _spec(func=None, **kwargs):
+    kwargs.setdefault("interval_seconds", 300)
+    return sched.JobSpec(func=func or AsyncMock(__name__="job"), **kwargs)
+
+
+def test_daily_next_after_uses_job_timezone():
+    spec = _spec(interval_seconds=0, daily_at=time(10, 0), tz=ZoneInfo("America/Argentina/Buenos_Aires"))
+    # 12:00 UTC = 09:00 ART → today 10:00 ART = 13:00 UTC
+    now = datetime(2026, 5, 12, 12, 0, tzinfo=timezone.utc)
+    assert spec.next_after(now) == datetime(2026, 5, 12, 13, 0, tzinfo=timezone.utc)
+    # Exactly at the slot → tomorrow, never the same slot twice.
+    assert spec.next_after(spec.next_after(now)) == datetime(2026, 5, 13, 13, 0, tzinfo=timezone.utc)
+
+
+@pytest.mark.asyncio
+async def test_run_once_executes_persists_and_releases_lease():
+    job = AsyncMock(__name__="job")
+    spec = _spec(job)
+    r = _redis(acquired=True)
+    with patch(_REDIS_TARGET, return_value=r), \
+            patch.object(sched, "_load_next_run", AsyncMock(return_value=None)), \
+            patch.object(sched, "_save_run", AsyncMock()) as save:
+        next_run = await sched.JobScheduler()._run_once(spec)
+
+    job.assert_awaited_once()
+    assert r.set.await_args.kwargs == {"nx": True, "px": sched.LEASE_TTL_SECONDS * 1000}
+    assert r.eval.await_args.args[0] == sched._LUA_RELEASE
+    save.assert_awaited_once_with(spec, next_run)
+    assert spec.last_status == "ok" and spec.run_count == 1 and spec.last_duration_ms is not None
+    assert next_run > datetime.now(timezone.utc) + timedelta(seconds=290)
+
+
+@pytest.mark.asyncio
+async def test_run_skipped_when_another_replica_holds_lease_or_already_ran():
+    job = AsyncMock(__name__="job")
+    spec = _spec(job)
+    later = datetime.now(timezone.utc) + timedelta(seconds=200)
+
+    with patch(_REDIS_TARGET, return_value=_redis(acquired=None)):
+        await sched.JobScheduler()._run_once(spec)
+    with patch(_REDIS_TARGET, return_value=_redis(acquired=True)), \
+            patch.object(sched, "_load_next_run", AsyncMock(return_value=later)):
+        assert await sched.JobScheduler()._run_once(spec) == later
+
+    job.assert_not_awaited()
+    assert spec.skipped_count == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_job_records_error_and_retries_sooner():
+    spec = _spec(AsyncMock(__name__="job", side_effect=RuntimeError("boom")), interval_seconds=86400)
+    with patch(_REDIS_TARGET, return_value=_redis()), \
+            patch.object(sched, "_load_next_run", AsyncMock(return_value=None)), \
+            patch.object(sched, "_save_run", AsyncMock()):
+        next_run = await sched.JobScheduler()._run_once(spec)
+
+    assert spec.last_status == "error" and spec.last_error == "boom"
+    assert next_run <= datetime.now(timezone.utc) + timedelta(seconds=300)
+
+
+@pytest.mark.asyncio
+async def test_initial_next_run_catches_up_missed_run_within_window():
+    now = datetime.now(timezone.utc)
+    daily = _spec(interval_seconds=0, daily_at=time(10, 0), catch_up_seconds=3600)
+    interval = _spec(run_at_startup=True)
+    s = sched.JobScheduler()
+
+    with patch.object(sched, "_load_next_run", AsyncMock(return_value=now - timedelta(minutes=10))):
+        assert await s._initial_next_run(daily) <= datetime.now(timezone.utc)
+    with patch.object(sched, "_load_next_run", AsyncMock(return_value=now - timedelta(hours=3))):
+        assert await s._initial_next_run(daily) > now
+    with patch.object(sched, "_load_next_run", AsyncMock(return_value=now + timedelta(minutes=2))):
+        assert await s._initial_next_run(interval) == now + timedelta(minutes=2)
+    # No persisted state yet: run_at_startup runs right away.
+    with patch.object(sched, "_load_next_run", AsyncMock(return_value=None)):
+        assert await s._initial_next_run(interval) <= datetime.now(timezone.utc)
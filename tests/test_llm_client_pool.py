@@ -0,0 +1,83 @@
+"""Tests for services/llm_client_pool.py — pooled per-tenant executors and shared HTTP clients."""
+
+from unittest.mock import MagicMock
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _clear_pool():
+    from services.llm_client_pool import invalidate_tenant_llm
+
+    invalidate_tenant_llm()
+    yield
+    invalidate_tenant_llm()
+
+
+def test_executor_reused_for_same_tenant_model_and_key():
+    from services.llm_client_pool import get_or_build_executor
+
+    build = MagicMock(side_effect=lambda: object())
+    first = get_or_build_executor(1, "gpt-4o-mini", "sk-a", build)
+    second = get_or_build_executor(1, "gpt-4o-mini", "sk-a", build)
+
+    assert second is first
+    assert build.call_count == 1
+
+
+def test_model_or_key_change_replaces_tenant_entry():
+    from services.llm_client_pool import _EXECUTORS, get_or_build_executor
+
+    build = MagicMock(side_effect=lambda: object())
+    old = get_or_build_executor(1, "gpt-4o-mini", "sk-a", build)
+    other_tenant = get_or_build_executor(2, "gpt-4o-mini", "sk-a", build)
+    new_model = get_or_build_executor(1, "deepseek-chat", "sk-a", build)
+    new_key = get_or_build_executor(1, "deepseek-chat", "sk-b", build)
+
+    assert len({id(old), id(new_model), id(new_key)}) == 3
+    assert [k[0] for k in _EXECUTORS] == [2, 1]
+    assert get_or_build_executor(2, "gpt-4o-mini", "sk-a", build) is other_tenant
+    # Raw keys never stored in the pool key.
+    assert all("sk-" not in k[2] for k in _EXECUTORS)
+
+
+def test_pool_is_bounded_and_none_is_not_cached(monkeypatch):
+    from services import llm_client_pool
+
+    monkeypatch.setattr(llm_client_pool, "EXECUTOR_POOL_SIZE", 2)
+    for tenant_id in (1, 2, 3):
+        llm_client_pool.get_or_build_executor(tenant_id, "m", "k", object)
+    assert [k[0] for k in llm_client_pool._EXECUTORS] == [2, 3]
+
+    build = MagicMock(return_value=None)
+    assert llm_client_pool.get_or_build_executor(9, "m", "k", build) is None
+    assert llm_client_pool.get_or_build_executor(9, "m", "k", build) is None
+    assert build.call_count == 2
+
+
+def test_invalidate_drops_executor_and_cached_model():
+    from services import llm_client_pool
+
+    llm_client_pool.set_cached_tenant_model(1, "gpt-4o")
+    llm_client_pool.set_cached_tenant_model(2, "gpt-4o")
+    llm_client_pool.get_or_build_executor(1, "gpt-4o", "k", object)
+
+    llm_client_pool.invalidate_tenant_llm(1)
+
+    assert llm_client_pool.get_cached_tenant_model(1) is None
+    assert llm_client_pool.get_cached_tenant_model(2) == "gpt-4o"
+    assert llm_client_pool._EXECUTORS == {}
+
+
+@pytest.mark.asyncio
+async def test_http_client_shared_per_base_url():
+    from services.llm_client_pool import close_shared_http_clients, get_shared_http_client
+
+    openai_client = get_shared_http_client()
+    assert get_shared_http_client(None) is openai_client
+    assert get_shared_http_client("https://api.deepseek.com") is not openai_client
+
+    await close_shared_http_clients()
+    assert openai_client.is_closed
+    assert get_shared_http_client() is not openai_client
+    await close_shared_http_clients()
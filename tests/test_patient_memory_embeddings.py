@@ -0,0 +1,142 @@
+"""Tests for services/patient_memory.py — stored memory embeddings and top-k retrieval."""
+
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+_EMBED = "services.embedding_service.generate_embedding"
+_PGVECTOR = "services.embedding_service.check_pgvector_available"
+
+
+def _memories(n):
+    return [{"memory": f"m{i}", "category": "general", "importance": 5} for i in range(n)]
+
+
+@pytest.mark.asyncio
+async def test_add_manual_memory_stores_embedding_json():
+    from services.patient_memory import add_manual_memory
+
+    pool = MagicMock()
+    pool.fetchval = AsyncMock(return_value=42)
+    pool.execute = AsyncMock()
+
+    with patch(_EMBED, AsyncMock(return_value=[0.1, 0.2])), \
+            patch(_PGVECTOR, AsyncMock(return_value=False)):
+        await add_manual_memory(pool, "+549111", 1, "Alérgico a la penicilina", "salud", 10)
+
+    insert_sql, *insert_args = pool.fetchval.await_args.args
+    assert "RETURNING id" in insert_sql
+    assert insert_args == [1, "+549111", "Alérgico a la penicilina", "salud", "manual", 10]
+    update_sql, payload, memory_id = pool.execute.await_args.args
+    assert "embedding_json" in update_sql
+    assert (json.loads(payload), memory_id) == ([0.1, 0.2], 42)
+
+
+@pytest.mark.asyncio
+async def test_embedding_failure_still_stores_memory():
+    from services.patient_memory import add_manual_memory
+
+    pool = MagicMock()
+    pool.fetchval = AsyncMock(return_value=7)
+    pool.execute = AsyncMock()
+
+    with patch(_EMBED, AsyncMock(return_value=None)):
+        await add_manual_memory(pool, "+549111", 1, "Prefiere turnos de mañana")
+
+    pool.fetchval.assert_awaited_once()
+    pool.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_relevant_memories_embed_only_the_query_with_pgvector():
+    from services.patient_memory import get_relevant_memories
+
+    ranked = [{"memory": "m3", "category": "miedo", "importance": 9}]
+    pool = MagicMock()
+    pool.fetch = AsyncMock(side_effect=[_memories(9), ranked])
+    embed = AsyncMock(return_value=[0.3, 0.4])
+
+    with patch(_EMBED, embed), patch(_PGVECTOR, AsyncMock(return_value=True)):
+        result = await get_relevant_memories(pool, "+549111", 1, "me dan miedo las agujas", top_k=8)
+
+    assert result == ranked
+    embed.assert_awaited_once_with("me dan miedo las agujas")
+    sql, *args = pool.fetch.await_args.args
+    assert "embedding <=> $3" in sql and "LIMIT $6" in sql
+    assert args[0:3] == ["+549111", 1, [0.3, 0.4]]
+    assert args[-1] == 8
+
+
+@pytest.mark.asyncio
+async def test_relevant_memories_json_fallback_ranks_stored_vectors():
+    from services.patient_memory import get_relevant_memories
+
+    stored = [
+        {"memory": "lejos", "category": "logistica", "importance": 5, "embedding_json": json.dumps([0.0, 1.0])},
+        {"memory": "cerca", "category": "logistica", "importance": 5, "embedding_json": [1.0, 0.0]},
+        {"memory": "sin vector", "category": "general", "importance": 10, "embedding_json": None},
+    ]
+    pool = MagicMock()
+    pool.fetch = AsyncMock(side_effect=[_memories(3), stored])
+
+    with patch(_EMBED, AsyncMock(return_value=[1.0, 0.0])) as embed, \
+            patch(_PGVECTOR, AsyncMock(return_value=False)):
+        result = await get_relevant_memories(pool, "+549111", 1, "consulta", top_k=2)
+
+    assert [m["memory"] for m in result] == ["sin vector", "cerca"]
+    assert all("embedding_json" not in m for m in result)
+    assert embed.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_few_memories_skip_embedding():
+    from services.patient_memory import get_relevant_memories
+
+    pool = MagicMock()
+    pool.fetch = AsyncMock(return_value=_memories(3))
+    embed = AsyncMock()
+
+    with patch(_EMBED, embed):
+        result = await get_relevant_memories(pool, "+549111", 1, "hola", top_k=8)
+
+    assert len(result) == 3
+    embed.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_backfill_embeds_rows_missing_vectors():
+    from services.patient_memory import backfill_memory_embeddings
+
+    pool = MagicMock()
+    pool.fetch = AsyncMock(return_value=[{"id": 1, "memory": "a"}, {"id": 2, "memory": "b"}])
+    pool.execute = AsyncMock()
+
+    embed_many = AsyncMock(return_value=[[0.1], None])
+    with patch("services.embedding_service.generate_embeddings", embed_many), \
+            patch(_PGVECTOR, AsyncMock(return_value=False)):
+        count = await backfill_memory_embeddings(pool, 1, batch_size=50)
+
+    embed_many.assert_awaited_once_with(["a", "b"], use_cache=False)
+    assert count == 1
+    assert "embedding_json IS NULL" in pool.fetch.await_args.args[0]
+    assert pool.execute.await_args.args[2] == 1
+
+
+@pytest.mark.asyncio
+async def test_backfill_runs_as_a_leased_scheduler_job():
+    from jobs import memory_embeddings
+    from jobs.scheduler import scheduler
+
+    assert "backfill_patient_memory_embeddings" in scheduler.jobs
+
+    pool = MagicMock()
+    pool.fetch = AsyncMock(return_value=[{"id": 1}, {"id": 2}])
+    backfill = AsyncMock(side_effect=[3, 0])
+    with patch("db.db") as mock_db, \
+            patch("services.patient_memory.ensure_memory_table", AsyncMock()), \
+            patch("services.patient_memory.backfill_memory_embeddings", backfill):
+        mock_db.pool = pool
+        await memory_embeddings.backfill_patient_memory_embeddings()
+
+    assert [c.args[1] for c in backfill.await_args_list] == [1, 2]
@@ -0,0 +1,223 @@
+"""Tests for services/patient_context.py — load_patient_snapshot and PatientContext.load."""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+_NEXT = datetime.now(timezone.utc) + timedelta(days=3)
+_LAST = datetime.now(timezone.utc) - timedelta(days=4)
+
+
+def _main_row(**overrides):
+    row = {
+        "linked_id": None,
+        "linked_phone_number": None,
+        "phone_match_id": 7,
+        "phone_match_phone_number": "+5491112345678",
+        "id": 7,
+        "first_name": "Ana",
+        "last_name": "Gómez",
+        "dni": "30111222",
+        "email": "ana@example.com",
+        "phone_number": "+5491112345678",
+        "birth_date": None,
+        "acquisition_source": "ORGANIC",
+        "anamnesis_token": "tok-ana",
+        "medical_history": '{"allergies": "penicilina"}',
+        "assigned_professional_id": 3,
+        "insurance_provider": "OSDE",
+        "human_override_until": None,
+        "urgency_level": None,
+        "assigned_first_name": "Laura",
+        "assigned_last_name": "Delgado",
+        "next_datetime": _NEXT,
+        "next_treatment_name": "Limpieza",
+        "next_professional_name": "Laura",
+        "next_professional_last_name": "Delgado",
+        "last_datetime": _LAST,
+        "last_treatment_name": None,
+        "last_professional_name": "Laura",
+        "last_professional_last_name": "Delgado",
+        "last_status": "completed",
+        "future_count": 2,
+        "visit_count": 5,
+        "plan_id": 11,
+        "plan_name": "Implantes",
+        "plan_status": "approved",
+        "plan_estimated_total": Decimal("100000"),
+        "plan_approved_total": Decimal("90000"),
+        "plan_notes": '{"installments": 3}',
+        "plan_total_paid": Decimal("30000"),
+    }
+    row.update(overrides)
+    return row
+
+
+def _make_pool(main_row=None, minors=None, family=None):
+    async def _fetch(sql, *args):
+        if "guardians AS" in sql:
+            return minors or []
+        if "ANY($2::int[])" in sql:
+            return family or []
+        return []
+
+    pool = MagicMock()
+    pool.fetchrow = AsyncMock(return_value=main_row)
+    pool.fetch = AsyncMock(side_effect=_fetch)
+    return pool
+
+
+@pytest.mark.asyncio
+async def test_snapshot_maps_flat_columns():
+    from services.patient_context import load_patient_snapshot
+
+    minors = [{
+        "id": 8, "first_name": "Tomás", "last_name": "Gómez", "dni": None,
+        "phone_number": "SIN-TEL-8", "anamnesis_token": None,
+        "next_datetime": _NEXT, "next_treatment_name": None, "next_professional_name": "Laura",
+    }]
+    pool = _make_pool(_main_row(), minors=minors)
+
+    snap = await load_patient_snapshot(pool, 1, "+54 9 11 1234-5678")
+
+    assert snap.patient_id == 7
+    assert snap.linked_patient is None
+    assert snap.phone_match == {"id": 7, "phone_number": "+5491112345678"}
+    assert snap.assigned_professional == {"id": 3, "first_name": "Laura", "last_name": "Delgado"}
+    assert snap.next_appointment["treatment_name"] == "Limpieza"
+    assert snap.last_appointment["status"] == "completed"
+    assert (snap.future_appointment_count, snap.visit_count) == (2, 5)
+    assert snap.treatment_plan["total_paid"] == Decimal("30000")
+    assert snap.minors[0]["next_appointment"]["appointment_datetime"] == _NEXT
+    assert snap.family == []
+
+    # Phone digits are bound as $2, the raw chat id as $3; all queries are tenant-scoped.
+    _, tenant_id, digits, raw, linked = pool.fetchrow.await_args.args
+    assert (tenant_id, digits, raw, linked) == (1, "5491112345678", "+54 9 11 1234-5678", None)
+    # No family ids → the family query is skipped entirely.
+    assert pool.fetch.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_snapshot_queries_run_concurrently():
+    from services.patient_context import load_patient_snapshot
+
+    in_flight = 0
+    peak = 0
+
+    async def _slow(result):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return result
+
+    async def _fetchrow(*args):
+        return await _slow(None)
+
+    async def _fetch(*args):
+        return await _slow([])
+
+    pool = MagicMock()
+    pool.fetchrow = AsyncMock(side_effect=_fetchrow)
+    pool.fetch = AsyncMock(side_effect=_fetch)
+
+    snap = await load_patient_snapshot(pool, 1, "5491112345678", family_patient_ids=[4, 5])
+
+    assert peak == 3
+    assert snap.patient is None
+    family_args = [c.args for c in pool.fetch.await_args_list if "ANY($2::int[])" in c.args[0]]
+    assert family_args[0][1:] == (1, [4, 5])
+
+
+@pytest.mark.asyncio
+async def test_snapshot_unknown_contact_is_empty():
+    from services.patient_context import load_patient_snapshot
+
+    pool = _make_pool(_main_row(
+        id=None, phone_match_id=None, linked_id=12, linked_phone_number="+5491100000000",
+    ))
+
+    snap = await load_patient_snapshot(pool, 1, "ig-psid-123", linked_patient_id=12)
+
+    assert snap.patient is None
+    assert snap.linked_patient == {"id": 12, "phone_number": "+5491100000000"}
+    assert snap.next_appointment is None and snap.treatment_plan is None
+    assert snap.visit_count == 0
+
+
+@pytest.mark.asyncio
+async def test_patient_context_load_builds_profile_from_snapshot():
+    from services.patient_context import PatientContext
+
+    family = [{
+        "id": 4, "first_name": "Luis", "last_name": "Gómez", "phone_number": "+5491199999999",
+        "next_datetime": None, "last_datetime": _LAST, "last_treatment_name": "Control",
+        "last_status": "completed", "visit_count": 2,
+        "diagnosis": "Caries", "treatment_plan": None,
+    }]
+    pool = _make_pool(_main_row(), family=family)
+    fake_db = MagicMock(pool=pool)
+
+    with patch("db.db", fake_db), patch(
+        "services.patient_memory.format_memories_for_prompt", AsyncMock(return_value="")
+    ):
+        ctx = await PatientContext.load(1, "+5491112345678", family_patient_ids=[4])
+
+    p = ctx.profile
+    assert p.is_new_lead is False
+    assert p.name == "Ana Gómez"
+    assert p.medical_history == {"allergies": "penicilina"}
+    assert p.assigned_professional == {"id": 3, "name": "Laura Delgado"}
+    assert p.next_appointment["professional_name"] == "Laura Delgado"
+    assert p.last_appointment["treatment_name"] == "Consulta"
+    assert p.visit_count == 5
+    assert p.treatment_plan["pending"] == 60000.0
+    assert p.treatment_plan["per_installment"] == 20000.0
+    assert p.family_members[0]["visits"] == 2
+    assert p.family_members[0]["diagnosis"] == "Caries"
+    assert "Control el" in p.family_members[0]["last_appointment_str"]
+    assert p.anamnesis_status["url"].endswith("/anamnesis/1/tok-ana")
+
+
+@pytest.mark.asyncio
+async def test_snapshot_degrades_per_section_when_a_query_fails():
+    import asyncpg
+
+    from services.patient_context import load_patient_snapshot
+
+    row = _main_row()
+    identity = {k: v for k, v in row.items() if not k.startswith(("next_", "last_", "plan_"))}
+    identity.pop("future_count"), identity.pop("visit_count")
+    appointments = {k: row[k] for k in row if k.startswith(("next_", "last_")) or k in ("future_count", "visit_count")}
+    missing = asyncpg.exceptions.UndefinedTableError('relation "treatment_plans" does not exist')
+
+    async def _fetchrow(sql, *args):
+        if "treatment_plans" in sql:
+            raise missing  # the one-statement main query and the plan section
+        if "next_datetime" in sql:
+            return appointments
+        return identity
+
+    async def _fetch(sql, *args):
+        raise asyncpg.exceptions.UndefinedColumnError('column "guardian_phone" does not exist')
+
+    pool = MagicMock()
+    pool.fetchrow = AsyncMock(side_effect=_fetchrow)
+    pool.fetch = AsyncMock(side_effect=_fetch)
+
+    snap = await load_patient_snapshot(pool, 1, "5491112345678", family_patient_ids=[4])
+
+    assert snap.patient_id == 7
+    assert snap.assigned_professional["first_name"] == "Laura"
+    assert snap.next_appointment["treatment_name"] == "Limpieza"
+    assert snap.visit_count == 5
+    assert snap.treatment_plan is None
+    assert snap.minors == [] and snap.family == []
+    # main + identity/appointments/plan sections; the sections bind only what they use
+    assert pool.fetchrow.await_count == 4
+    assert [len(c.args) for c in pool.fetchrow.await_args_list[1:]] == [5, 4, 4]
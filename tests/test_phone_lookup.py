@@ -0,0 +1,46 @@
+"""Tests for services/phone_lookup.py — phone_key resolver."""
+
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from services.phone_lookup import find_conversation, find_patient_id, phone_key
+
+
+@pytest.mark.parametrize("raw", ["+5492996114843", "+542996114843", "542996114843", "02996114843",
+                                 "2996114843", "+54 9 299 611-4843"])
+def test_all_formats_of_one_number_share_a_key(raw):
+    assert phone_key(raw) == "2996114843"
+
+
+def test_short_or_missing_values_have_no_key():
+    assert phone_key(None) is None
+    assert phone_key("ig_12345") is None
+    assert phone_key("") is None
+
+
+@pytest.mark.asyncio
+async def test_patient_lookup_is_one_indexed_query_preferring_exact_number():
+    pool = MagicMock()
+    pool.fetchval = AsyncMock(return_value=17)
+
+    assert await find_patient_id(pool, 3, "+542996114843") == 17
+    sql, tenant_id, key, exact = pool.fetchval.await_args.args
+    assert "phone_key = $2" in sql and "status != 'deleted'" in sql and "ILIKE" not in sql
+    assert (tenant_id, key, exact) == (3, "2996114843", "+542996114843")
+
+    pool.fetchval.reset_mock()
+    assert await find_patient_id(pool, 3, "abc") is None
+    pool.fetchval.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_conversation_lookup_filters_channel_unless_disabled():
+    pool = MagicMock()
+    pool.fetchrow = AsyncMock(return_value={"family_patient_ids": [1]})
+
+    row = await find_conversation(pool, 3, "5492996114843", channel=None, columns="family_patient_ids")
+    assert row == {"family_patient_ids": [1]}
+    sql, *args = pool.fetchrow.await_args.args
+    assert sql.lstrip().startswith("SELECT family_patient_ids FROM chat_conversations")
+    assert args == [3, "2996114843", "5492996114843", None]
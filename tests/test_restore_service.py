@@ -1,15 +1,13 @@
 """
 Tests for restore_service module.
 
-Verifies pure helper functions: manifest validation, type de-coercion,
-and tenant ID remapping. No DB or Redis required.
+Verifies manifest validation, COPY text conversion and the staging/merge
+SQL of the table restore (mocked connection). No DB or Redis required.
 """
 
 import sys
 import os
 import base64
-from datetime import datetime, date
-from decimal import Decimal
 
 # Add orchestrator_service to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "orchestrator_service"))
@@ -111,168 +109,223 @@ class TestValidateManifest:
         assert len(result) == 2
 
 
-class TestDecoerceValue:
-    """Test _decoerce_value for each type marker."""
+class TestCopyText:
+    """Test _copy_text: backup JSON values → PostgreSQL text input for COPY."""
 
-    def test_decoerce_value_decimal(self):
-        from restore_service import _decoerce_value
+    def test_copy_text_decimal_marker(self):
+        from restore_service import _copy_text
 
-        result = _decoerce_value("Decimal:123.45")
-        assert result == Decimal("123.45")
-        assert isinstance(result, Decimal)
+        assert _copy_text("Decimal:123.45", "text") == "123.45"
 
-    def test_decoerce_value_decimal_zero(self):
-        from restore_service import _decoerce_value
+    def test_copy_text_base64_marker_to_bytea_hex(self):
+        from restore_service import _copy_text
 
-        result = _decoerce_value("Decimal:0.00")
-        assert result == Decimal("0.00")
+        encoded = "b64:" + base64.b64encode(b"hello").decode()
+        assert _copy_text(encoded, "bytea") == "\\x68656c6c6f"
 
-    def test_decoerce_value_decimal_large(self):
-        from restore_service import _decoerce_value
+    def test_copy_text_timedelta_marker_to_interval(self):
+        from restore_service import _copy_text
 
-        result = _decoerce_value("Decimal:9999999.99")
-        assert result == Decimal("9999999.99")
+        assert _copy_text("td:90.0", "interval") == "90.0 seconds"
 
-    def test_decoerce_value_base64(self):
-        from restore_service import _decoerce_value
+    def test_copy_text_iso_datetime_passthrough(self):
+        """Dates/timestamps keep their ISO text; the merge casts them to the column type."""
+        from restore_service import _copy_text
 
-        raw = b"\x89PNG\r\n"
-        encoded = "b64:" + base64.b64encode(raw).decode()
-        result = _decoerce_value(encoded)
-        assert result == raw
-        assert isinstance(result, bytes)
+        assert _copy_text("2026-04-10T15:30:00.123456", "text") == "2026-04-10T15:30:00.123456"
 
-    def test_decoerce_value_base64_empty(self):
-        from restore_service import _decoerce_value
+    def test_copy_text_none_is_null(self):
+        from restore_service import _copy_text
 
-        encoded = "b64:" + base64.b64encode(b"").decode()
-        result = _decoerce_value(encoded)
-        assert result == b""
+        assert _copy_text(None, "json") is None
 
-    def test_decoerce_value_datetime(self):
-        from restore_service import _decoerce_value
+    def test_copy_text_json_dict_and_preserialized_string(self):
+        from restore_service import _copy_text
 
-        result = _decoerce_value("2026-04-10T15:30:00")
-        assert isinstance(result, datetime)
-        assert result.year == 2026
-        assert result.month == 4
-        assert result.day == 10
-        assert result.hour == 15
-        assert result.minute == 30
+        assert _copy_text({"key": "válido"}, "json") == '{"key": "válido"}'
+        assert _copy_text('{"a": 1}', "json") == '{"a": 1}'
 
-    def test_decoerce_value_datetime_with_microseconds(self):
-        from restore_service import _decoerce_value
+    def test_copy_text_bool_and_int(self):
+        from restore_service import _copy_text
 
-        result = _decoerce_value("2026-04-10T15:30:00.123456")
-        assert isinstance(result, datetime)
-        assert result.microsecond == 123456
+        assert _copy_text(True, "bool") == "true"
+        assert _copy_text(42, "text") == "42"
 
-    def test_decoerce_value_date(self):
-        from restore_service import _decoerce_value
+    def test_copy_text_array_literal_quotes_and_nulls(self):
+        from restore_service import _copy_text
 
-        result = _decoerce_value("2026-04-10")
-        assert isinstance(result, date)
-        assert result.year == 2026
-        assert result.month == 4
-        assert result.day == 10
+        assert _copy_text(["a", 'b"c', None, 3], "array") == '{"a","b\\"c",NULL,"3"}'
+        assert _copy_text([[1, 2], [3, 4]], "array") == '{{"1","2"},{"3","4"}}'
 
-    def test_decoerce_value_none(self):
-        from restore_service import _decoerce_value
+    def test_copy_text_vector(self):
+        from restore_service import _copy_text
 
-        assert _decoerce_value(None) is None
+        assert _copy_text([0.1, 0.2], "vector") == "[0.1,0.2]"
 
-    def test_decoerce_value_int_passthrough(self):
-        from restore_service import _decoerce_value
 
-        assert _decoerce_value(42) == 42
+def _zip_with_rows(table, rows):
+    import io
+    import json
+    import zipfile
 
-    def test_decoerce_value_plain_string_passthrough(self):
-        from restore_service import _decoerce_value
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr(f"b/data/{table}.ndjson", "".join(json.dumps(r) + "\n" for r in rows))
+    buf.seek(0)
+    return zipfile.ZipFile(buf)
 
-        assert _decoerce_value("hello world") == "hello world"
 
-    def test_decoerce_value_dict_passthrough(self):
-        from restore_service import _decoerce_value
+def _conn(columns):
+    from unittest.mock import AsyncMock, MagicMock
 
-        payload = {"key": "value"}
-        result = _decoerce_value(payload)
-        assert result == payload
+    conn = MagicMock()
+    conn.fetch = AsyncMock(return_value=[
+        {"name": name, "sql_type": sql_type, "type_name": sql_type, "category": "A" if sql_type.endswith("[]") else "S"}
+        for name, sql_type in columns
+    ])
+    conn.execute = AsyncMock(return_value="INSERT 0 2")
+    conn.copy_records_to_table = AsyncMock()
+    return conn
 
-    def test_decoerce_value_known_decimal_column_without_marker(self):
-        """Backward compat: plain numeric string in a known decimal column."""
-        from restore_service import _decoerce_value
 
-        result = _decoerce_value("500.00", col_name="billing_amount")
-        assert isinstance(result, Decimal)
-        assert result == Decimal("500.00")
+class TestRestoreTable:
+    """Test _restore_table: COPY into staging, set-based remap, typed merge."""
 
-    def test_decoerce_value_unknown_column_plain_numeric_stays_str(self):
-        """Non-decimal column: plain numeric string stays as string."""
-        from restore_service import _decoerce_value
+    def _run(self, conn, table, rows, source_tid=10, target_tid=99):
+        import asyncio
+        from restore_service import _restore_table
 
-        result = _decoerce_value("500.00", col_name="some_other_column")
-        assert isinstance(result, str)
-        assert result == "500.00"
+        zf = _zip_with_rows(table, rows)
+        return asyncio.run(_restore_table(conn, zf, f"b/data/{table}.ndjson", table, source_tid, target_tid))
 
+    def test_copies_rows_and_remaps_tenant_with_one_update(self):
+        conn = _conn([("id", "integer"), ("tenant_id", "integer"), ("first_name", "text"), ("search_name", "text")])
+        rows = [{"id": i, "tenant_id": 10, "first_name": f"P{i}", "ghost": 1} for i in range(3)]
 
-class TestRemapTenantId:
-    """Test _remap_tenant_id for cross-tenant restore."""
+        report = self._run(conn, "patients", rows)
 
-    def test_remap_tenant_id_replaces_tenant_id(self):
-        from restore_service import _remap_tenant_id
-
-        rows = [
-            {"id": 1, "tenant_id": 10, "name": "Alice"},
-            {"id": 2, "tenant_id": 10, "name": "Bob"},
-        ]
-        result = _remap_tenant_id(rows, source_tid=10, target_tid=99)
-        assert result[0]["tenant_id"] == 99
-        assert result[1]["tenant_id"] == 99
-
-    def test_remap_tenant_id_preserves_other_fields(self):
-        from restore_service import _remap_tenant_id
-
-        rows = [{"id": 7, "tenant_id": 10, "name": "Alice"}]
-        result = _remap_tenant_id(rows, source_tid=10, target_tid=99)
-        assert result[0]["id"] == 7
-        assert result[0]["name"] == "Alice"
-
-    def test_remap_tenant_id_same_source_target_returns_unchanged(self):
-        from restore_service import _remap_tenant_id
-
-        rows = [{"id": 1, "tenant_id": 10, "name": "Alice"}]
-        result = _remap_tenant_id(rows, source_tid=10, target_tid=10)
-        # Same source and target → returns the original list unchanged
-        assert result is rows
-
-    def test_remap_tenant_id_empty_list(self):
-        from restore_service import _remap_tenant_id
-
-        result = _remap_tenant_id([], source_tid=10, target_tid=99)
-        assert result == []
-
-    def test_remap_tenant_id_row_without_tenant_id_field(self):
-        """Rows without tenant_id column (e.g. junction tables) are left as-is."""
-        from restore_service import _remap_tenant_id
-
-        rows = [{"treatment_type_id": 1, "professional_id": 2}]
-        result = _remap_tenant_id(rows, source_tid=10, target_tid=99)
-        assert "tenant_id" not in result[0]
-        assert result[0]["treatment_type_id"] == 1
-
-    def test_remap_tenant_id_does_not_mutate_original_rows(self):
-        """Must not mutate the original dicts."""
-        from restore_service import _remap_tenant_id
-
-        rows = [{"id": 1, "tenant_id": 10}]
-        _remap_tenant_id(rows, source_tid=10, target_tid=99)
-        # Original row should still have tenant_id=10
-        assert rows[0]["tenant_id"] == 10
-
-    def test_remap_tenant_id_multiple_rows_correct_count(self):
-        from restore_service import _remap_tenant_id
-
-        rows = [{"id": i, "tenant_id": 5} for i in range(20)]
-        result = _remap_tenant_id(rows, source_tid=5, target_tid=42)
-        assert len(result) == 20
-        assert all(r["tenant_id"] == 42 for r in result)
+        copy = conn.copy_records_to_table.await_args
+        assert copy.args[0] == "_restore_stage"
+        assert copy.kwargs["columns"] == ["id", "tenant_id", "first_name"]
+        assert copy.kwargs["records"][0] == ("0", "10", "P0")
+        sqls = [c.args[0] for c in conn.execute.await_args_list]
+        assert any(c.args[0] == "UPDATE _restore_stage SET tenant_id = $1" and c.args[1] == "99"
+                   for c in conn.execute.await_args_list)
+        merge = next(s for s in sqls if s.startswith("INSERT INTO patients"))
+        assert "id::integer, tenant_id::integer, first_name::text" in merge
+        assert merge.endswith("ON CONFLICT DO NOTHING")
+        assert report["rows"] == 3 and report["inserted"] == 2 and report["skipped"] == 1
+
+    def test_same_tenant_skips_remap(self):
+        conn = _conn([("id", "integer"), ("tenant_id", "integer")])
+        self._run(conn, "patients", [{"id": 1, "tenant_id": 10}], source_tid=10, target_tid=10)
+        assert not any("UPDATE" in c.args[0] for c in conn.execute.await_args_list)
+
+    def test_tenants_table_upserts_and_remaps_id(self):
+        conn = _conn([("id", "integer"), ("clinic_name", "text")])
+        self._run(conn, "tenants", [{"id": 10, "clinic_name": "Clínica"}])
+        sqls = [c.args[0] for c in conn.execute.await_args_list]
+        assert "UPDATE _restore_stage SET id = $1" in sqls
+        merge = next(s for s in sqls if s.startswith("INSERT INTO tenants"))
+        assert "ON CONFLICT (id) DO UPDATE SET clinic_name = EXCLUDED.clinic_name" in merge
+
+    def test_excluded_fk_columns_are_nulled(self):
+        conn = _conn([("id", "integer"), ("tenant_id", "integer"), ("user_id", "uuid")])
+        self._run(conn, "professionals", [{"id": 1, "tenant_id": 10, "user_id": "u-1"}])
+        assert "UPDATE _restore_stage SET user_id = NULL" in [c.args[0] for c in conn.execute.await_args_list]
+
+    def test_unsafe_column_names_are_filtered(self):
+        conn = _conn([("id", "integer")])
+        report = self._run(conn, "clinic_faqs", [{"id": 1, "id; DROP TABLE x": 2}])
+        assert conn.copy_records_to_table.await_args.kwargs["columns"] == ["id"]
+        assert any("unsafe" in w for w in report["warnings"])
+
+    def test_missing_target_table_is_reported(self):
+        conn = _conn([])
+        report = self._run(conn, "clinic_faqs", [{"id": 1}])
+        conn.copy_records_to_table.assert_not_awaited()
+        assert report["rows"] == 0 and report["warnings"]
+
+
+def test_restore_invalidates_the_target_holiday_calendar(tmp_path):
+    import asyncio
+    import json
+    import zipfile
+    from unittest.mock import AsyncMock, MagicMock, patch
+
+    import restore_service
+
+    zip_path = tmp_path / "backup.zip"
+    manifest = {"version": "2.0", "alembic_head": "072", "tenant_id": 10,
+                "created_at": "2026-10-01T00:00:00", "table_counts": {"tenant_holidays": 1}}
+    with zipfile.ZipFile(zip_path, "w") as zf:
+        zf.writestr("b/manifest.json", json.dumps(manifest))
+        zf.writestr("b/data/tenant_holidays.ndjson", json.dumps({"id": 1, "tenant_id": 10}) + "\n")
+
+    conn = MagicMock()
+    conn.execute = AsyncMock()
+    tx = MagicMock()
+    tx.__aenter__ = AsyncMock(return_value=tx)
+    tx.__aexit__ = AsyncMock(return_value=False)
+    conn.transaction = MagicMock(return_value=tx)
+    acquire = MagicMock()
+    acquire.__aenter__ = AsyncMock(return_value=conn)
+    acquire.__aexit__ = AsyncMock(return_value=False)
+    pool = MagicMock()
+    pool.acquire = MagicMock(return_value=acquire)
+
+    report = {"rows": 1, "inserted": 1, "skipped": 0, "copy_ms": 1, "merge_ms": 1, "warnings": []}
+    with patch.object(restore_service, "validate_manifest", return_value=(True, "")), \
+            patch.object(restore_service, "check_schema_compatibility", AsyncMock(return_value=(True, ""))), \
+            patch.object(restore_service, "verify_checksums", return_value=[]), \
+            patch.object(restore_service, "_clean_target_tenant", AsyncMock()), \
+            patch.object(restore_service, "_restore_table", AsyncMock(return_value=report)), \
+            patch.object(restore_service, "_restore_files", AsyncMock(return_value=0)), \
+            patch.object(restore_service, "_update_progress", AsyncMock()), \
+            patch("services.holiday_service.invalidate_holiday_calendar", AsyncMock()) as invalidate:
+        summary = asyncio.run(restore_service.restore_from_zip(str(zip_path), 10, pool, target_tenant_id=99))
+
+    assert summary["tables_restored"] == {"tenant_holidays": 1}
+    invalidate.assert_awaited_once_with(99)
+
+
+def test_restore_route_takes_the_lock_atomically(tmp_path):
+    import asyncio
+    import io
+    import zipfile
+    from unittest.mock import AsyncMock, MagicMock, patch
+
+    from fastapi import HTTPException
+
+    from routes.backup_routes import restore_backup
+
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr("b/manifest.json", "{}")
+    upload = MagicMock(size=len(buf.getvalue()))
+    upload.read = AsyncMock(side_effect=[buf.getvalue(), b""])
+
+    redis = MagicMock()
+    redis.set = AsyncMock(side_effect=[True, None])
+    redis.hset = AsyncMock()
+    redis.expire = AsyncMock()
+    redis.delete = AsyncMock()
+    redis.exists = AsyncMock(return_value=0)
+    background = MagicMock()
+
+    with patch("services.relay.get_redis", return_value=redis), \
+            patch("tempfile.gettempdir", return_value=str(tmp_path)):
+        result = asyncio.run(restore_backup(background, upload, None, MagicMock(), 5))
+        try:
+            asyncio.run(restore_backup(background, upload, None, MagicMock(), 5))
+            raise AssertionError("second restore must be rejected")
+        except HTTPException as e:
+            assert e.status_code == 409
+
+    assert "task_id" in result
+    assert redis.set.await_args_list[0].args == ("restore:lock:5", "1")
+    assert redis.set.await_args_list[0].kwargs == {"nx": True, "ex": 3600}
+    redis.exists.assert_not_awaited()
+    background.add_task.assert_called_once()
+    # The queued task owns the lock; the rejected request must not release it
+    redis.delete.assert_not_awaited()
@@ -0,0 +1,78 @@
+"""Tests for services/search_service.py — indexed, ranked patient / message search."""
+
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from services.search_service import (
+    decode_cursor,
+    encode_cursor,
+    normalize_text,
+    patient_match_sql,
+    search_patients,
+    search_patients_by_messages,
+)
+
+
+def test_normalize_matches_search_name_expression():
+    assert normalize_text("  José  MUÑOZ ") == "jose munoz"
+
+
+def test_name_query_uses_search_name_pattern_and_similarity():
+    where_sql, rank_sql, params = patient_match_sql("Pérez Juan", first_param=3)
+    assert params == ["perez juan", "%perez%juan%"]
+    assert "p.search_name LIKE $4" in where_sql and "$3 <% p.search_name" in where_sql
+    assert "phone_digits" not in where_sql
+    assert rank_sql.startswith("ROUND(")
+
+
+def test_phone_query_matches_digits_regardless_of_formatting():
+    where_sql, rank_sql, params = patient_match_sql("+54 9 11 5555-1234")
+    assert params == ["5491155551234", "%5491155551234%"]
+    assert "p.phone_digits LIKE $2" in where_sql and "p.dni_digits LIKE $2" in where_sql
+    assert "search_name" not in where_sql
+    assert patient_match_sql("  ") is None and patient_match_sql("12") is None
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    assert decode_cursor(encode_cursor(Decimal("0.8123"), 42)) == (Decimal("0.8123"), 42)
+    assert decode_cursor(None) is None
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+@pytest.mark.asyncio
+async def test_search_patients_pages_with_keyset_cursor():
+    pool = MagicMock()
+    pool.fetch = AsyncMock(return_value=[
+        {"id": 9, "first_name": "Ana", "rank": Decimal("1.0000")},
+        {"id": 7, "first_name": "Ana Laura", "rank": Decimal("0.9000")},
+        {"id": 3, "first_name": "Anabel", "rank": Decimal("0.9000")},
+    ])
+
+    items, next_cursor = await search_patients(pool, [1], "ana", limit=2)
+
+    assert [r["id"] for r in items] == [9, 7]
+    assert decode_cursor(next_cursor) == (Decimal("0.9000"), 7)
+    args = pool.fetch.await_args.args
+    assert "p.status IS DISTINCT FROM 'deleted'" in args[0]
+    assert args[1:] == ([1], "ana", "%ana%", None, None, 3)
+
+    await search_patients(pool, [1], "ana", limit=2, cursor=next_cursor)
+    assert pool.fetch.await_args.args[4:6] == (Decimal("0.9000"), 7)
+
+
+@pytest.mark.asyncio
+async def test_message_search_is_scoped_to_tenants_and_patient_messages():
+    pool = MagicMock()
+    pool.fetch = AsyncMock(return_value=[])
+
+    assert await search_patients_by_messages(pool, [], "dolor") == ([], None)
+    pool.fetch.assert_not_awaited()
+
+    await search_patients_by_messages(pool, [1, 2], "dolor de muela")
+    sql, tenant_ids, query = pool.fetch.await_args.args[:3]
+    assert tenant_ids == [1, 2] and query == "dolor de muela"
+    assert "cm.tenant_id = ANY($1::int[])" in sql and "cm.role = 'user'" in sql
+    assert "to_tsvector('spanish', cm.content) @@" in sql
@@ -0,0 +1,98 @@
+"""Tests for services/socket_fanout.py — presence-aware, coalesced Socket.IO room emits."""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+import socketio
+
+from services import socket_fanout
+from services.socket_fanout import BATCH_EVENT, FanoutServer
+
+
+def _server(rooms=None, coalesce=0.01, redis_client=None, clustered=False):
+    with patch.dict("os.environ", {"SOCKETIO_REDIS_URL": "", "REDIS_URL": ""}):
+        srv = FanoutServer(async_mode="asgi", coalesce_seconds=coalesce, redis_client=redis_client)
+    srv.manager = MagicMock(rooms={"/": rooms if rooms is not None else {"tenant:1": {"sid1": "eio1"}}})
+    srv._clustered = clustered
+    return srv
+
+
+@pytest.mark.asyncio
+async def test_burst_is_merged_per_entity_and_sent_as_one_batch():
+    srv = _server()
+    with patch.object(socketio.AsyncServer, "emit", AsyncMock()) as base_emit:
+        await srv.emit("NEW_MESSAGE", {"phone_number": "+541", "message": "hola"}, room="tenant:1")
+        await srv.emit("PATIENT_UPDATED", {"patient_id": 7, "status": "active"}, room="tenant:1")
+        await srv.emit("NEW_MESSAGE", {"phone_number": "+541", "message": "otra"}, room="tenant:1")
+        await srv.emit("PATIENT_UPDATED", {"patient_id": 7, "phone": "+541"}, room="tenant:1")
+        await asyncio.sleep(0.05)
+
+    base_emit.assert_awaited_once()
+    event, payload = base_emit.await_args.args
+    assert event == BATCH_EVENT and base_emit.await_args.kwargs["room"] == "tenant:1"
+    assert payload["events"] == [
+        ["NEW_MESSAGE", {"phone_number": "+541", "message": "hola"}],
+        ["NEW_MESSAGE", {"phone_number": "+541", "message": "otra"}],
+        ["PATIENT_UPDATED", {"patient_id": 7, "status": "active", "phone": "+541"}],
+    ]
+    assert srv.stats["coalesced"] == 1
+
+
+@pytest.mark.asyncio
+async def test_single_event_keeps_its_own_name():
+    srv = _server()
+    with patch.object(socketio.AsyncServer, "emit", AsyncMock()) as base_emit:
+        await srv.emit("HUMAN_OVERRIDE_CHANGED", {"phone_number": "+541", "enabled": True}, room="tenant:1")
+        await asyncio.sleep(0.05)
+    assert base_emit.await_args.args == ("HUMAN_OVERRIDE_CHANGED", {"phone_number": "+541", "enabled": True})
+
+
+@pytest.mark.asyncio
+async def test_emit_to_empty_room_is_skipped_locally():
+    srv = _server(rooms={})
+    with patch.object(socketio.AsyncServer, "emit", AsyncMock()) as base_emit:
+        await srv.emit("NEW_MESSAGE", {"message": "x"}, room="tenant:2")
+        await asyncio.sleep(0.05)
+    base_emit.assert_not_awaited()
+    assert srv.stats["skipped_empty"] == 1
+
+
+@pytest.mark.asyncio
+async def test_clustered_presence_checks_other_replicas_and_errs_towards_emitting():
+    r = MagicMock()
+    r.hvals = AsyncMock(return_value=["0", "2"])
+    srv = _server(rooms={}, redis_client=r, clustered=True)
+    assert await srv.has_subscribers("tenant:3") is True
+
+    r.hvals = AsyncMock(return_value=[])
+    assert await srv.has_subscribers("tenant:4") is False
+    assert await srv.has_subscribers("tenant:4") is False
+    assert r.hvals.await_count == 1  # cached
+
+    r.hvals = AsyncMock(side_effect=ConnectionError("down"))
+    assert await srv.has_subscribers("tenant:5") is True
+
+
+@pytest.mark.asyncio
+async def test_sid_targets_and_callbacks_bypass_the_buffer():
+    srv = _server()
+    with patch.object(socketio.AsyncServer, "emit", AsyncMock()) as base_emit:
+        await srv.emit("NOVA_REPLY", {"x": 1}, to="sid1")
+    assert base_emit.await_args.kwargs["to"] == "sid1"
+    assert srv._pending == {}
+
+
+@pytest.mark.asyncio
+async def test_flush_all_emits_what_is_still_buffered():
+    srv = _server(coalesce=10)
+    with patch.object(socketio.AsyncServer, "emit", AsyncMock()) as base_emit:
+        await srv.emit("NEW_APPOINTMENT", {"id": 1}, room="tenant:1")
+        await srv.flush_all()
+    assert base_emit.await_args.args == ("NEW_APPOINTMENT", {"id": 1})
+
+
+def test_coalesce_key_only_merges_update_events_with_an_entity():
+    assert socket_fanout.coalesce_key("APPOINTMENT_UPDATED", {"id": 5}, 1) == ("APPOINTMENT_UPDATED", "id", "5")
+    assert socket_fanout.coalesce_key("NEW_MESSAGE", {"id": 5}, 2) == ("NEW_MESSAGE", 2)
+    assert socket_fanout.coalesce_key("CHAT_UPDATED", {"tenant_id": 1}, 3) == ("CHAT_UPDATED", 3)
@@ -0,0 +1,215 @@
+"""Tests for services/tenant_prompt_cache.py — versioned tenant prompt-context cache."""
+
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+_REDIS_TARGET = "services.relay.get_redis"
+
+
+def _make_pool(tenant_row=None, faqs=None, op_rules=None):
+    """AsyncMock pool that answers the loader's queries by SQL fragment."""
+    tenant_row = tenant_row if tenant_row is not None else {
+        "clinic_name": "Clínica Test",
+        "system_prompt_template": "Especialistas en\n   implantes.",
+        "consultation_price": Decimal("15000.00"),
+    }
+
+    async def _fetchrow(sql, *args):
+        if "FROM tenants" in sql:
+            return tenant_row
+        if "FROM professionals" in sql:
+            return {"first_name": "Laura", "last_name": "Delgado"}
+        return None
+
+    async def _fetch(sql, *args):
+        if "FROM clinic_faqs" in sql:
+            return faqs or []
+        if "FROM clinic_operational_rules" in sql:
+            return op_rules or []
+        return []
+
+    pool = MagicMock()
+    pool.fetchrow = AsyncMock(side_effect=_fetchrow)
+    pool.fetch = AsyncMock(side_effect=_fetch)
+    return pool
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    from services.tenant_prompt_cache import clear_tenant_prompt_cache
+
+    clear_tenant_prompt_cache()
+    yield
+    clear_tenant_prompt_cache()
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def setex(self, key, ttl, value):
+        self.store[key] = value
+
+    async def incr(self, key):
+        self.store[key] = str(int(self.store.get(key) or 0) + 1)
+        return int(self.store[key])
+
+
+@pytest.mark.asyncio
+async def test_second_read_is_served_from_memory():
+    from services.tenant_prompt_cache import get_tenant_prompt_context
+
+    pool = _make_pool(faqs=[{"category": "G", "question": "¿Horario?", "answer": "9 a 18"}])
+    redis = _FakeRedis()
+    with patch(_REDIS_TARGET, return_value=redis):
+        first = await get_tenant_prompt_context(pool, 1)
+        calls = pool.fetchrow.await_count + pool.fetch.await_count
+        second = await get_tenant_prompt_context(pool, 1)
+
+    assert second is first
+    assert pool.fetchrow.await_count + pool.fetch.await_count == calls
+    assert first.faqs[0]["question"] == "¿Horario?"
+    assert first.lead_professional_name == "Laura Delgado"
+    assert first.system_prompt_template == "Especialistas en implantes."
+
+
+@pytest.mark.asyncio
+async def test_other_process_reads_redis_payload_losslessly():
+    from services.tenant_prompt_cache import (
+        clear_tenant_prompt_cache,
+        get_tenant_prompt_context,
+    )
+
+    redis = _FakeRedis()
+    with patch(_REDIS_TARGET, return_value=redis):
+        await get_tenant_prompt_context(_make_pool(), 1)
+
+    # Simulate a second replica: empty L1, pool must not be touched.
+    clear_tenant_prompt_cache()
+    untouched = _make_pool()
+    with patch(_REDIS_TARGET, return_value=redis):
+        ctx = await get_tenant_prompt_context(untouched, 1)
+
+    untouched.fetchrow.assert_not_awaited()
+    assert ctx.tenant_row["consultation_price"] == Decimal("15000.00")
+
+
+@pytest.mark.asyncio
+async def test_invalidation_bumps_version_and_reloads():
+    from services.tenant_prompt_cache import (
+        get_tenant_prompt_context,
+        invalidate_tenant_prompt_context,
+    )
+
+    redis = _FakeRedis()
+    with patch(_REDIS_TARGET, return_value=redis):
+        before = await get_tenant_prompt_context(_make_pool(), 1)
+
+    updated = _make_pool(faqs=[{"category": "G", "question": "Nueva", "answer": "Sí"}])
+    with patch(_REDIS_TARGET, return_value=redis):
+        await invalidate_tenant_prompt_context(1)
+        after = await get_tenant_prompt_context(updated, 1)
+
+    assert redis.store["tenant_prompt_ctx_ver:1"] == "1"
+    assert before.faqs == []
+    assert after.faqs[0]["question"] == "Nueva"
+
+
+@pytest.mark.asyncio
+async def test_redis_down_falls_back_to_db_and_local_cache():
+    from services.tenant_prompt_cache import get_tenant_prompt_context
+
+    broken = MagicMock()
+    broken.get = AsyncMock(side_effect=ConnectionError("redis down"))
+    pool = _make_pool()
+    with patch(_REDIS_TARGET, return_value=broken):
+        first = await get_tenant_prompt_context(pool, 1)
+        second = await get_tenant_prompt_context(pool, 1)
+
+    assert first.tenant_row["clinic_name"] == "Clínica Test"
+    assert second is first
+
+
+@pytest.mark.asyncio
+async def test_unknown_tenant_is_not_cached():
+    from services.tenant_prompt_cache import _CACHE, get_tenant_prompt_context
+
+    pool = MagicMock()
+    pool.fetchrow = AsyncMock(return_value=None)
+    pool.fetch = AsyncMock(return_value=[])
+    with patch(_REDIS_TARGET, return_value=_FakeRedis()):
+        ctx = await get_tenant_prompt_context(pool, 99)
+
+    assert ctx.tenant_row is None
+    assert 99 not in _CACHE
+
+
+def test_operational_rules_window_evaluated_at_render_time():
+    from services.tenant_prompt_cache import TenantPromptContext
+
+    now = datetime(2026, 5, 10, 12, 0, tzinfo=timezone.utc)
+    ctx = TenantPromptContext(
+        tenant_row={},
+        operational_rules=[
+            {
+                "rule_name": "Promo mayo",
+                "rule_type": "promo",
+                "prompt_injection": "Ofrecer 10% off.",
+                "valid_from": now - timedelta(days=1),
+                "valid_until": now + timedelta(days=1),
+            },
+            {
+                "rule_name": "Futura",
+                "rule_type": "aviso",
+                "prompt_injection": "Todavía no.",
+                "valid_from": now + timedelta(days=2),
+                "valid_until": None,
+            },
+        ],
+    )
+
+    block = ctx.render_operational_rules_block(now)
+    assert "[PROMO] Promo mayo (vigente hasta 11/05/2026):" in block
+    assert "Futura" not in block
+    assert ctx.render_operational_rules_block(now + timedelta(days=5)).count("[") == 1
+
+
+@pytest.mark.asyncio
+async def test_nova_writes_to_prompt_inputs_invalidate_the_context():
+    from services import nova_tools
+
+    with patch("services.tenant_prompt_cache.invalidate_tenant_prompt_context", AsyncMock()) as invalidate:
+        await nova_tools._invalidate_prompt_context_for("FAQ_UPDATED", {"tenant_id": 3})
+        await nova_tools._invalidate_prompt_context_for("RECORD_UPDATED", {"tenant_id": 3, "table": "treatment_types"})
+        await nova_tools._invalidate_prompt_context_for("RECORD_UPDATED", {"tenant_id": 3, "entity": "insurance_provider"})
+        await nova_tools._invalidate_prompt_context_for("RECORD_UPDATED", {"tenant_id": 3, "table": "patients"})
+        await nova_tools._invalidate_prompt_context_for("PATIENT_UPDATED", {"tenant_id": 3, "patient_id": 1})
+
+    assert invalidate.await_count == 3
+    assert all(c.args == (3,) for c in invalidate.await_args_list)
+
+
+@pytest.mark.asyncio
+async def test_profile_rename_invalidates_every_professional_tenant():
+    import uuid
+
+    import auth_routes
+
+    user_id = str(uuid.uuid4())
+    fake_db = MagicMock()
+    fake_db.execute = AsyncMock()
+    fake_db.pool.fetch = AsyncMock(return_value=[{"tenant_id": 3}, {"tenant_id": 7}])
+
+    with patch.object(auth_routes, "get_me", AsyncMock(return_value={"user_id": user_id, "role": "professional"})), \
+            patch.object(auth_routes, "db", fake_db), \
+            patch("services.tenant_prompt_cache.invalidate_tenant_prompt_context", AsyncMock()) as invalidate:
+        await auth_routes.update_profile(auth_routes.ProfileUpdate(first_name="Ana"), MagicMock())
+
+    assert fake_db.pool.fetch.await_args.args[1] == uuid.UUID(user_id)
+    assert [c.args for c in invalidate.await_args_list] == [(3,), (7,)]
@@ -0,0 +1,150 @@
+"""Tests for dashboard/token_tracker.py — buffered token_usage writes flushed in batches."""
+
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from dashboard import token_tracker as tt
+from dashboard.token_tracker import TokenTracker, TokenUsage
+
+
+def _pool():
+    conn = MagicMock()
+    conn.copy_records_to_table = AsyncMock()
+    conn.execute = AsyncMock()
+    tx = MagicMock()
+    tx.__aenter__ = AsyncMock(return_value=tx)
+    tx.__aexit__ = AsyncMock(return_value=False)
+    conn.transaction = MagicMock(return_value=tx)
+    acquire = MagicMock()
+    acquire.__aenter__ = AsyncMock(return_value=conn)
+    acquire.__aexit__ = AsyncMock(return_value=False)
+    pool = MagicMock()
+    pool.acquire = MagicMock(return_value=acquire)
+    return pool, conn
+
+
+def _usage(tenant_id=1, total=30):
+    return TokenUsage(
+        conversation_id="c1",
+        patient_phone="+541",
+        model="gpt-4o-mini",
+        input_tokens=total - 10,
+        output_tokens=10,
+        total_tokens=total,
+        cost_usd=Decimal("0.000123"),
+        timestamp=datetime(2026, 1, 1, tzinfo=timezone.utc),
+        tenant_id=tenant_id,
+    )
+
+
+@pytest.mark.asyncio
+async def test_track_usage_only_buffers_and_flush_writes_one_batch():
+    pool, conn = _pool()
+    tracker = TokenTracker(pool)
+    with patch.object(tracker, "_ensure_flusher"):
+        await tracker.track_usage(_usage(tenant_id=2, total=30), update_tenant_totals=True)
+        await tracker.track_usage(_usage(tenant_id=1, total=50), update_tenant_totals=True)
+        await tracker.track_usage(_usage(tenant_id=2, total=20), update_tenant_totals=True)
+        await tracker.track_usage(_usage(tenant_id=1, total=5))
+    pool.acquire.assert_not_called()
+
+    assert await tracker.flush() == 4
+
+    conn.copy_records_to_table.assert_awaited_once()
+    assert conn.copy_records_to_table.await_args.args == ("token_usage",)
+    kwargs = conn.copy_records_to_table.await_args.kwargs
+    assert kwargs["columns"] == list(tt.TOKEN_USAGE_COLUMNS)
+    assert len(kwargs["records"]) == 4 and kwargs["records"][0][-1] == 2
+
+    sql, ids, tokens, calls = conn.execute.await_args.args
+    assert "UPDATE tenants" in sql
+    assert (ids, tokens, calls) == ([1, 2], [50, 50], [1, 2])
+    assert tracker._rows == [] and tracker._tenant_totals == {}
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_rows_and_totals_for_next_attempt():
+    pool, conn = _pool()
+    conn.copy_records_to_table.side_effect = ConnectionError("db down")
+    tracker = TokenTracker(pool)
+    with patch.object(tracker, "_ensure_flusher"):
+        await tracker.track_usage(_usage(), update_tenant_totals=True)
+        assert await tracker.flush() == 0
+        await tracker.track_usage(_usage(), update_tenant_totals=True)
+
+    assert len(tracker._rows) == 2
+    assert tracker._tenant_totals == {1: [60, 2]}
+    assert tracker.stats["flush_errors"] == 1
+
+    conn.copy_records_to_table.side_effect = None
+    assert await tracker.flush() == 2
+    assert conn.execute.await_args.args[1:] == ([1], [60], [2])
+
+
+def test_requeue_caps_the_buffer():
+    tracker = TokenTracker(MagicMock())
+    with patch.object(tt, "MAX_BUFFERED_ROWS", 3):
+        tracker._rows.append(("new",))
+        tracker._requeue([("oldest",), ("retry",), ("retry",)], {})
+    assert tracker._rows == [("retry",), ("retry",), ("new",)]
+    assert tracker.stats["dropped"] == 1
+
+
+@pytest.mark.asyncio
+async def test_close_flushes_pending_usage():
+    pool, conn = _pool()
+    tracker = TokenTracker(pool)
+    await tracker.track_usage(_usage())
+    assert tracker._flusher is not None
+
+    await tracker.close()
+
+    assert tracker._flusher is None
+    conn.copy_records_to_table.assert_awaited_once()
+    conn.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_track_service_usage_buffers_tenant_totals():
+    pool, _conn = _pool()
+    tracker = TokenTracker(pool)
+    with patch.object(tt, "token_tracker", tracker), patch.object(tracker, "_ensure_flusher"):
+        await tt.track_service_usage(pool, 7, "gpt-4o", 100, 20, source="vision_image")
+
+    pool.execute.assert_not_called()
+    assert tracker._tenant_totals == {7: [120, 1]}
+    assert tracker._rows[0][0] == "vision_image_7"
+
+
+@pytest.mark.asyncio
+async def test_bad_row_is_dropped_and_the_rest_commits_with_tenant_totals():
+    import asyncpg
+
+    pool, conn = _pool()
+    conn.copy_records_to_table.side_effect = asyncpg.exceptions.StringDataRightTruncationError("value too long")
+
+    async def _execute(sql, *args):
+        if "INSERT INTO token_usage" in sql and args[2] == "x" * 80:
+            raise asyncpg.exceptions.StringDataRightTruncationError("value too long")
+        return "OK"
+
+    conn.execute.side_effect = _execute
+    tracker = TokenTracker(pool)
+    bad = _usage(tenant_id=1)
+    bad.model = "x" * 80
+    with patch.object(tracker, "_ensure_flusher"):
+        await tracker.track_usage(_usage(tenant_id=1), update_tenant_totals=True)
+        await tracker.track_usage(bad, update_tenant_totals=True)
+        await tracker.track_usage(_usage(tenant_id=2), update_tenant_totals=True)
+
+    assert await tracker.flush() == 2
+
+    inserts = [c.args for c in conn.execute.await_args_list if "INSERT INTO token_usage" in c.args[0]]
+    assert len(inserts) == 3
+    update = conn.execute.await_args_list[-1].args
+    assert "UPDATE tenants" in update[0] and update[1:] == ([1, 2], [60, 30], [2, 1])
+    assert tracker._rows == [] and tracker._tenant_totals == {}
+    assert tracker.stats["bad_rows"] == 1 and tracker.stats["flush_errors"] == 0
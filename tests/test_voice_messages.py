@@ -75,7 +75,9 @@ def _make_httpx_stub() -> types.ModuleType:
     return mod
 
 
-if "httpx" not in sys.modules:
+try:
+    import httpx  # noqa: F401
+except ImportError:
     sys.modules["httpx"] = _make_httpx_stub()
 
 
@@ -101,10 +103,7 @@ class TestYCloudClientSendAudio:
         mock_http = AsyncMock()
         mock_http.post = AsyncMock(return_value=mock_response)
 
-        with patch("orchestrator_service.ycloud_client.httpx.AsyncClient") as mock_cls:
-            mock_cls.return_value.__aenter__ = AsyncMock(return_value=mock_http)
-            mock_cls.return_value.__aexit__ = AsyncMock(return_value=False)
-
+        with patch("orchestrator_service.ycloud_client.get_http_client", return_value=mock_http):
             result = await client.send_audio(
                 to="+5491144445555",
                 url="https://cdn.example.com/audio.ogg",
@@ -128,10 +127,7 @@ class TestYCloudClientSendAudio:
         mock_http = AsyncMock()
         mock_http.post = AsyncMock(return_value=mock_response)
 
-        with patch("orchestrator_service.ycloud_client.httpx.AsyncClient") as mock_cls:
-            mock_cls.return_value.__aenter__ = AsyncMock(return_value=mock_http)
-            mock_cls.return_value.__aexit__ = AsyncMock(return_value=False)
-
+        with patch("orchestrator_service.ycloud_client.get_http_client", return_value=mock_http):
             await client.send_audio(
                 to="+5491144445555",
                 url="https://cdn.example.com/audio.ogg",
@@ -150,10 +146,7 @@ class TestYCloudClientSendAudio:
         mock_http = AsyncMock()
         mock_http.post = AsyncMock(return_value=mock_response)
 
-        with patch("orchestrator_service.ycloud_client.httpx.AsyncClient") as mock_cls:
-            mock_cls.return_value.__aenter__ = AsyncMock(return_value=mock_http)
-            mock_cls.return_value.__aexit__ = AsyncMock(return_value=False)
-
+        with patch("orchestrator_service.ycloud_client.get_http_client", return_value=mock_http):
             await client.send_audio(
                 to="+5491144445555",
                 url="https://cdn.example.com/audio.ogg",
@@ -175,10 +168,7 @@ class TestYCloudClientSendAudio:
         mock_http = AsyncMock()
         mock_http.post = AsyncMock(return_value=mock_response)
 
-        with patch("orchestrator_service.ycloud_client.httpx.AsyncClient") as mock_cls:
-            mock_cls.return_value.__aenter__ = AsyncMock(return_value=mock_http)
-            mock_cls.return_value.__aexit__ = AsyncMock(return_value=False)
-
+        with patch("orchestrator_service.ycloud_client.get_http_client", return_value=mock_http):
             await client_sin_sender.send_audio(
                 to="+5491144445555",
                 url="https://cdn.example.com/audio.ogg",
@@ -204,10 +194,7 @@ class TestYCloudClientSendAudio:
         mock_http = AsyncMock()
         mock_http.post = AsyncMock(side_effect=http_error)
 
-        with patch("orchestrator_service.ycloud_client.httpx.AsyncClient") as mock_cls:
-            mock_cls.return_value.__aenter__ = AsyncMock(return_value=mock_http)
-            mock_cls.return_value.__aexit__ = AsyncMock(return_value=False)
-
+        with patch("orchestrator_service.ycloud_client.get_http_client", return_value=mock_http):
             with pytest.raises(httpx.HTTPStatusError):
                 await client.send_audio(
                     to="+5491144445555",
@@ -221,10 +208,7 @@ class TestYCloudClientSendAudio:
         mock_http = AsyncMock()
         mock_http.post = AsyncMock(side_effect=httpx.ConnectError("Connection refused"))
 
-        with patch("orchestrator_service.ycloud_client.httpx.AsyncClient") as mock_cls:
-            mock_cls.return_value.__aenter__ = AsyncMock(return_value=mock_http)
-            mock_cls.return_value.__aexit__ = AsyncMock(return_value=False)
-
+        with patch("orchestrator_service.ycloud_client.get_http_client", return_value=mock_http):
             with pytest.raises(httpx.ConnectError):
                 await client.send_audio(
                     to="+5491144445555",
@@ -240,10 +224,7 @@ class TestYCloudClientSendAudio:
         mock_http = AsyncMock()
         mock_http.post = AsyncMock(return_value=mock_response)
 
-        with patch("orchestrator_service.ycloud_client.httpx.AsyncClient") as mock_cls:
-            mock_cls.return_value.__aenter__ = AsyncMock(return_value=mock_http)
-            mock_cls.return_value.__aexit__ = AsyncMock(return_value=False)
-
+        with patch("orchestrator_service.ycloud_client.get_http_client", return_value=mock_http):
             await client.send_audio(
                 to="+5491144445555",
                 url="https://cdn.example.com/audio.ogg",
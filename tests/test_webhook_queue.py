@@ -0,0 +1,96 @@
+"""Tests for services/webhook_queue.py — durable inbound webhook stream with consumer-group workers."""
+
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from services import webhook_queue
+
+
+def _redis():
+    r = MagicMock()
+    for name in ("xadd", "xack", "hset", "hget", "hdel", "expire", "xrange", "xclaim", "xpending_range"):
+        setattr(r, name, AsyncMock())
+    r.hget.return_value = None
+    return r
+
+
+def _fields(kind="ycloud", tenant_id="1", payload=None):
+    return {"kind": kind, "tenant_id": tenant_id, "payload": json.dumps(payload or {"id": "m1"}), "received_at": "0"}
+
+
+@pytest.mark.asyncio
+async def test_enqueue_is_inline_until_the_queue_is_started():
+    r = _redis()
+    with patch.object(webhook_queue, "_redis", return_value=r), patch.object(webhook_queue, "_started", False):
+        assert await webhook_queue.enqueue("ycloud", 1, {"a": 1}) is None
+    r.xadd.assert_not_awaited()
+
+    r.xadd.return_value = "1-0"
+    with patch.object(webhook_queue, "_redis", return_value=r), patch.object(webhook_queue, "_started", True):
+        assert await webhook_queue.enqueue("ycloud", 1, {"a": 1}) == "1-0"
+    key, fields = r.xadd.await_args.args
+    assert key == webhook_queue.STREAM_KEY
+    assert fields["kind"] == "ycloud" and fields["tenant_id"] == "1" and json.loads(fields["payload"]) == {"a": 1}
+    assert r.xadd.await_args.kwargs["approximate"] is True
+
+
+@pytest.mark.asyncio
+async def test_enqueue_falls_back_inline_when_xadd_fails():
+    r = _redis()
+    r.xadd.side_effect = ConnectionError("down")
+    with patch.object(webhook_queue, "_redis", return_value=r), patch.object(webhook_queue, "_started", True):
+        assert await webhook_queue.enqueue("meta_lead", None, {}) is None
+
+
+@pytest.mark.asyncio
+async def test_handle_runs_handler_and_background_tasks_then_acks():
+    r = _redis()
+    ran = []
+
+    async def handler(tenant_id, payload, background_tasks):
+        background_tasks.add_task(ran.append, payload["id"])
+        return {"status": "processed", "count": 1, "failed": 0}
+
+    with patch.dict(webhook_queue._HANDLERS, {"ycloud": handler}):
+        assert await webhook_queue._handle(r, "5-0", _fields()) is True
+
+    assert ran == ["m1"]
+    r.xack.assert_awaited_once_with(webhook_queue.STREAM_KEY, webhook_queue.GROUP, "5-0")
+
+
+@pytest.mark.asyncio
+async def test_released_messages_leave_the_entry_pending_for_retry():
+    r = _redis()
+    handler = AsyncMock(return_value={"status": "processed", "count": 0, "failed": 1})
+
+    with patch.dict(webhook_queue._HANDLERS, {"ycloud": handler}):
+        assert await webhook_queue._handle(r, "5-0", _fields()) is False
+
+    r.xack.assert_not_awaited()
+    assert r.hset.await_args.args[1] == "5-0"
+
+
+@pytest.mark.asyncio
+async def test_reclaim_retries_idle_entries_and_dead_letters_exhausted_ones():
+    r = _redis()
+    r.xpending_range.return_value = [
+        {"message_id": "1-0", "times_delivered": webhook_queue.MAX_DELIVERIES},
+        {"message_id": "2-0", "times_delivered": 1},
+    ]
+    r.xrange.return_value = [("1-0", _fields())]
+    r.hget.return_value = "boom"
+    r.xclaim.return_value = [("2-0", _fields(payload={"id": "m2"}))]
+    handler = AsyncMock(return_value={"status": "processed", "count": 1, "failed": 0})
+
+    with patch.dict(webhook_queue._HANDLERS, {"ycloud": handler}):
+        assert await webhook_queue._reclaim_once(r, "me") == 2
+
+    dead_key, dead_fields = r.xadd.await_args.args
+    assert dead_key == webhook_queue.DEAD_LETTER_KEY
+    assert dead_fields["source_id"] == "1-0" and dead_fields["error"] == "boom"
+    assert r.xclaim.await_args.args[2:] == ("me", webhook_queue.CLAIM_IDLE_MS, ["2-0"])
+    assert handler.await_args.args[:2] == (1, {"id": "m2"})
+    acked = [c.args[2] for c in r.xack.await_args_list]
+    assert acked == ["1-0", "2-0"]
@@ -0,0 +1,136 @@
+"""Tests for services/ycloud_sync_service.py — staged COPY + set-based history sync."""
+
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from services import ycloud_sync_service as sync
+
+
+def _pool(merged=()):
+    conn = MagicMock()
+    conn.execute = AsyncMock(return_value="INSERT 0 1")
+    conn.copy_records_to_table = AsyncMock()
+    conn.fetch = AsyncMock(return_value=list(merged))
+
+    @asynccontextmanager
+    async def _transaction():
+        yield
+
+    @asynccontextmanager
+    async def _acquire():
+        yield conn
+
+    conn.transaction = _transaction
+    pool = MagicMock()
+    pool.acquire = _acquire
+    pool.conn = conn
+    pool.fetch = AsyncMock(return_value=[])
+    pool.execute = AsyncMock(return_value="UPDATE 1")
+    return pool
+
+
+def _msg(ext_id, direction="inbound", media_id=None):
+    return {
+        "external_id": ext_id, "wamid": f"wamid.{ext_id}", "direction": direction,
+        "from_number": "+5491100" if direction == "inbound" else "+5490000",
+        "to_number": "+5490000" if direction == "inbound" else "+5491100",
+        "message_type": "image" if media_id else "text", "content": None if media_id else "hola",
+        "media_id": media_id, "media_mime_type": "image/jpeg" if media_id else None,
+        "media_filename": None, "created_at": datetime(2026, 5, 1, tzinfo=timezone.utc),
+    }
+
+
+@pytest.mark.asyncio
+async def test_persist_page_copies_once_and_merges_set_based():
+    pool = _pool(merged=[{"id": 10, "media_id": None, "media_url": None}, {"id": 11, "media_id": "m-1", "media_url": None}])
+    parsed = [_msg("a"), _msg("b", direction="outbound", media_id="m-1")]
+
+    saved, media_jobs = await sync._persist_page(pool, 1, parsed, {"+5491100": "Ana"})
+
+    assert saved == 2
+    assert media_jobs == [(11, "m-1")]
+    copy = pool.conn.copy_records_to_table.await_args
+    assert copy.args[0] == "_ycloud_sync_stage" and len(copy.kwargs["records"]) == 2
+    # Both messages belong to the patient's conversation and carry the resolved name.
+    assert {r[11] for r in copy.kwargs["records"]} == {"+5491100"}
+    assert {r[12] for r in copy.kwargs["records"]} == {"Ana"}
+    assert "ON CONFLICT (external_id)" in pool.conn.fetch.await_args.args[0]
+    statements = [c.args[0] for c in pool.conn.execute.await_args_list]
+    assert any("INSERT INTO chat_conversations" in s for s in statements)
+    assert any("INSERT INTO chat_messages" in s for s in statements)
+    assert sum("UPDATE chat_conversations" in s for s in statements) == 1
+
+
+@pytest.mark.asyncio
+async def test_persist_page_skips_media_already_downloaded_on_resync():
+    pool = _pool(merged=[
+        {"id": 11, "media_id": "m-1", "media_url": "/media/1/m-1.jpg"},
+        {"id": 12, "media_id": "m-2", "media_url": None},
+    ])
+    parsed = [_msg("b", media_id="m-1"), _msg("c", media_id="m-2")]
+
+    saved, media_jobs = await sync._persist_page(pool, 1, parsed, {})
+
+    assert saved == 2
+    assert media_jobs == [(12, "m-2")]
+    assert "RETURNING id, media_id, media_url" in pool.conn.fetch.await_args.args[0]
+
+
+@pytest.mark.asyncio
+async def test_contact_names_prefer_patients_and_query_each_phone_once():
+    pool = _pool()
+    pool.fetch = AsyncMock(return_value=[{"phone_number": "+541", "first_name": "Ana", "last_name": "Paz"}])
+    client = MagicMock()
+    client.get_contact_profile = AsyncMock(side_effect=["Beto WA", RuntimeError("boom")])
+    cache = {}
+
+    await sync._resolve_contact_names(pool, client, 1, {"+541", "+542", "+543"}, cache)
+    await sync._resolve_contact_names(pool, client, 1, {"+541", "+542"}, cache)
+
+    assert cache["+541"] == "Ana Paz"
+    assert sorted(v for k, v in cache.items() if k != "+541") == ["", "Beto WA"]
+    assert pool.fetch.await_count == 1
+    assert client.get_contact_profile.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_media_workers_download_and_flush_urls_in_one_update(tmp_path):
+    pool = _pool()
+    queue = asyncio.Queue()
+    results, counters = [], {"downloaded": 0}
+
+    async def fake_download(client, tenant_id, message, db_id):
+        return tmp_path / f"{message['mediaId']}.jpg"
+
+    with patch.object(sync, "_download_and_save_media", side_effect=fake_download):
+        workers = [asyncio.create_task(sync._media_worker(queue, MagicMock(), 1, results, counters)) for _ in range(2)]
+        for job in [(10, "m-1"), (11, "m-2"), None, None]:
+            await queue.put(job)
+        await asyncio.gather(*workers)
+
+    await sync._flush_media_urls(pool, results)
+
+    assert counters["downloaded"] == 2 and results == []
+    args = pool.execute.await_args.args
+    assert "unnest" in args[0]
+    assert dict(zip(args[1], args[2])) == {10: "/uploads/1/whatsapp_media/m-1.jpg",
+                                           11: "/uploads/1/whatsapp_media/m-2.jpg"}
+
+
+@pytest.mark.asyncio
+async def test_fetch_week_follows_cursor_and_stops_on_repeated_page():
+    page = {"items": [{"id": "a"}, {"id": "b"}], "next_cursor": "c1"}
+    client = MagicMock()
+    client.fetch_messages = AsyncMock(side_effect=[page, {"items": [{"id": "c"}], "next_cursor": "c2"}, page])
+
+    with patch.object(sync.asyncio, "sleep", AsyncMock()):
+        pages, error = await sync._fetch_week(client, datetime(2026, 5, 1, tzinfo=timezone.utc),
+                                              datetime(2026, 5, 8, tzinfo=timezone.utc))
+
+    assert error is None
+    assert [len(p) for p in pages] == [2, 1]
+    assert client.fetch_messages.await_args_list[1].kwargs["cursor"] == "c1"